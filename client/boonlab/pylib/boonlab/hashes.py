@@ -1,6 +1,6 @@
 import random
-import numpy as np
 from boonsdk import app_from_env
+from boonsdk.simhash import decode_hashes
 
 
 def read_hash_as_vectors(search=None,
@@ -33,14 +33,11 @@ def read_hash_as_vectors(search=None,
     assets = []
     for a in search.assets:
         if random.random()*100 < percentage:
-            num_hash = []
             hash = a.get_attr(attr)
             if hash is not None:
-                for char in hash:
-                    num_hash.append(ord(char))
-                all_data.append(num_hash)
+                all_data.append(hash)
                 assets.append(a)
 
-    x = np.asarray(all_data, dtype=np.float64)
+    x = decode_hashes(all_data)
 
     return x, assets
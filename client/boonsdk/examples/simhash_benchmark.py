@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+
+Benchmarks converting similarity hashes to and from numpy arrays with
+the per character ord() and chr() loops versus the boonsdk.simhash codec,
+along with the size of the packed binary form.
+
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from boonsdk import simhash
+
+
+def decode_loop(hashes):
+    data = []
+    for shash in hashes:
+        num_hash = []
+        for char in shash:
+            num_hash.append(ord(char))
+        data.append(num_hash)
+    return np.asarray(data, dtype=np.float64)
+
+
+def encode_loop(values):
+    return ["".join([chr(item) for item in row]) for row in values]
+
+
+def bench(func, arg, rounds):
+    """
+    Time a conversion.
+
+    Args:
+        func (func): The conversion function.
+        arg (mixed): The argument to the function.
+        rounds (int): The number of rounds.
+
+    Returns:
+        float: The average seconds.
+    """
+    elapsed = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(arg)
+        elapsed += time.perf_counter() - start
+    return elapsed / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the similarity hash codec')
+    parser.add_argument('-c', '--count', type=int, default=100000,
+                        help="The number of hashes. Defaults to 100000")
+    parser.add_argument('-l', '--length', type=int, default=2048,
+                        help="The length of each hash. Defaults to 2048")
+    parser.add_argument('-r', '--rounds', type=int, default=3,
+                        help="The number of rounds to average. Defaults to 3")
+    args = parser.parse_args()
+
+    random.seed(0)
+    hashes = ["".join(random.choice("ABCDEFGHIJKLMNOP") for _ in range(args.length))
+              for _ in range(args.count)]
+    values = simhash.decode_hashes(hashes, np.int64)
+    # Make sure both implementations agree.
+    assert np.array_equal(decode_loop(hashes[:100]), simhash.decode_hashes(hashes[:100]))
+    assert encode_loop(values[:100]) == simhash.encode_hashes(values[:100])
+
+    print("{:<10}{:>14}{:>14}{:>10}".format("op", "loop ms", "codec ms", "speedup"))
+    for name, loop, codec, arg in (("decode", decode_loop, simhash.decode_hashes, hashes),
+                                   ("encode", encode_loop, simhash.encode_hashes, values)):
+        loop_time = bench(loop, arg, args.rounds)
+        codec_time = bench(codec, arg, args.rounds)
+        print("{:<10}{:>14.1f}{:>14.1f}{:>9.1f}x".format(
+            name, loop_time * 1000, codec_time * 1000, loop_time / codec_time))
+
+    packed = simhash.pack_hashes(values)
+    print("size MB: str {:.1f}, float64 {:.1f}, packed {:.1f}".format(
+        sum(len(h) for h in hashes) / 1024 ** 2,
+        values.size * 8 / 1024 ** 2, packed.nbytes / 1024 ** 2))
+
+
+if __name__ == '__main__':
+    main()
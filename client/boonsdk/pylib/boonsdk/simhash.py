@@ -0,0 +1,153 @@
+"""
+Conversions between similarity hashes and numpy arrays.
+
+A similarity hash is stored on an Asset as a string with one character per
+dimension, the character code being the value of the dimension.  Rather than
+calling ord() or chr() for every character, hashes are converted to and from
+numpy arrays a batch at a time through a single bytes buffer.
+"""
+import numpy as np
+
+__all__ = [
+    'decode_hashes',
+    'decode_hash',
+    'encode_hashes',
+    'encode_hash',
+    'pack_hashes',
+    'unpack_hashes'
+]
+
+HASH_OFFSET = 65
+"""The character code of the lowest value of a similarity hash, 'A'"""
+
+
+def decode_hashes(hashes, dtype=np.float64):
+    """
+    Convert a list of similarity hashes of the same length into a 2D array.
+
+    Args:
+        hashes (list): A list of hash strings.
+        dtype (numpy.dtype): The dtype of the array.
+
+    Returns:
+        numpy.ndarray: An array with a row for each hash.
+
+    Raises:
+        ValueError: If the hashes are not all the same length.
+    """
+    hashes = list(hashes)
+    if not hashes:
+        return np.empty((0, 0), dtype=dtype)
+
+    length = len(hashes[0])
+    if any(len(h) != length for h in hashes):
+        raise ValueError('Similarity hashes must all be the same length')
+
+    joined = ''.join(hashes)
+
+    try:
+        values = np.frombuffer(joined.encode('latin-1'), dtype=np.uint8)
+    except UnicodeEncodeError:
+        values = np.frombuffer(joined.encode('utf-32-le'), dtype='<u4')
+    return values.reshape(len(hashes), length).astype(dtype)
+
+
+def decode_hash(simhash, dtype=np.float64):
+    """
+    Convert a similarity hash into a 1D array.
+
+    Args:
+        simhash (str): The hash string.
+        dtype (numpy.dtype): The dtype of the array.
+
+    Returns:
+        numpy.ndarray: The hash values.
+    """
+    return decode_hashes([simhash], dtype)[0]
+
+
+def encode_hashes(values):
+    """
+    Convert a 2D array of hash values into a list of similarity hashes.
+
+    Args:
+        values (numpy.ndarray): An array with a row for each hash.
+
+    Returns:
+        list: A list of hash strings.
+    """
+    values = np.asarray(values)
+    if values.ndim != 2:
+        raise ValueError('Similarity hash values must be a 2D array')
+    count, length = values.shape
+    if values.size and (values.min() < 0 or values.max() > 0x10FFFF):
+        raise ValueError('Similarity hash values must be valid character codes')
+
+    if not values.size or values.max() < 256:
+        joined = np.ascontiguousarray(values, dtype=np.uint8).tobytes().decode('latin-1')
+    else:
+        joined = np.ascontiguousarray(values, dtype='<u4').tobytes().decode('utf-32-le')
+    return [joined[idx * length:(idx + 1) * length] for idx in range(count)]
+
+
+def encode_hash(values):
+    """
+    Convert a 1D array of hash values into a similarity hash.
+
+    Args:
+        values (numpy.ndarray): The hash values.
+
+    Returns:
+        str: The hash string.
+    """
+    return encode_hashes(np.asarray(values).reshape(1, -1))[0]
+
+
+def pack_hashes(hashes, offset=HASH_OFFSET):
+    """
+    Pack similarity hashes with 16 levels per dimension, like the ResNet
+    image similarity hash, into 4 bits per dimension.
+
+    Args:
+        hashes (mixed): A list of hash strings or a 2D array of hash values.
+        offset (int): The value of the lowest level.
+
+    Returns:
+        numpy.ndarray: A uint8 array with a row of packed bytes for each hash.
+
+    Raises:
+        ValueError: If a value is outside of the 16 levels.
+    """
+    if not isinstance(hashes, np.ndarray):
+        hashes = decode_hashes(hashes, np.int64)
+    levels = hashes.astype(np.int64) - offset
+    if levels.size and (levels.min() < 0 or levels.max() > 15):
+        raise ValueError('Similarity hash values must be within {} and {}'.format(
+            offset, offset + 15))
+
+    levels = levels.astype(np.uint8)
+    if levels.shape[1] % 2:
+        levels = np.pad(levels, ((0, 0), (0, 1)))
+    return (levels[:, 0::2] << 4) | levels[:, 1::2]
+
+
+def unpack_hashes(packed, length, offset=HASH_OFFSET):
+    """
+    Unpack similarity hashes packed by pack_hashes().
+
+    Args:
+        packed (numpy.ndarray): The packed hashes, a row of bytes per hash.
+        length (int): The number of dimensions of each hash.
+        offset (int): The value of the lowest level.
+
+    Returns:
+        numpy.ndarray: A 2D array of hash values, which can be converted
+            into hash strings with encode_hashes().
+    """
+    packed = np.asarray(packed, dtype=np.uint8)
+    if packed.ndim == 1:
+        packed = packed.reshape(1, -1)
+    levels = np.empty((packed.shape[0], packed.shape[1] * 2), dtype=np.uint8)
+    levels[:, 0::2] = packed >> 4
+    levels[:, 1::2] = packed & 0x0F
+    return levels[:, :length].astype(np.int64) + offset
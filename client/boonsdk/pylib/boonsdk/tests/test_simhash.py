@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from boonsdk import simhash
+
+
+class SimHashTests(unittest.TestCase):
+
+    def test_decode_hashes(self):
+        hashes = simhash.decode_hashes(['ABC', 'PPA'])
+        assert hashes.dtype == np.float64
+        assert hashes.tolist() == [[65, 66, 67], [80, 80, 65]]
+
+    def test_decode_hashes_empty(self):
+        assert simhash.decode_hashes([]).shape == (0, 0)
+
+    def test_decode_hashes_wide_chars(self):
+        hashes = simhash.decode_hashes(['AĀ'], np.int64)
+        assert hashes.tolist() == [[65, 256]]
+
+    def test_decode_hashes_uneven(self):
+        with self.assertRaises(ValueError):
+            simhash.decode_hashes(['AB', 'ABC'])
+
+    def test_decode_hash(self):
+        assert simhash.decode_hash('AAB').tolist() == [65, 65, 66]
+
+    def test_encode_hashes(self):
+        assert simhash.encode_hashes(np.array([[65, 66], [80, 90]])) == ['AB', 'PZ']
+        assert simhash.encode_hashes(np.array([[65, 256]])) == ['AĀ']
+        assert simhash.encode_hash([65, 66, 67]) == 'ABC'
+
+    def test_encode_decode(self):
+        hashes = [''.join(chr(c) for c in np.random.randint(65, 81, 2048)) for _ in range(10)]
+        assert simhash.encode_hashes(simhash.decode_hashes(hashes, np.int64)) == hashes
+
+    def test_pack_hashes(self):
+        hashes = ['ABCDEFGHIJKLMNOPA', 'PONMLKJIHGFEDCBAP']
+        packed = simhash.pack_hashes(hashes)
+        assert packed.shape == (2, 9)
+        assert packed[0, 0] == 0x01
+
+        unpacked = simhash.unpack_hashes(packed, 17)
+        assert simhash.encode_hashes(unpacked) == hashes
+
+    def test_pack_hashes_out_of_range(self):
+        with self.assertRaises(ValueError):
+            simhash.pack_hashes(['AZ'])
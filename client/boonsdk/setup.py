@@ -15,7 +15,8 @@ requirements = [
     "backoff",
     "pytest",
     "deprecation",
-    "flask"
+    "flask",
+    "numpy"
 ]
 
 setup(
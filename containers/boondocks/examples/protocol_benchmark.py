@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+
+Benchmarks the encode and decode time of the JSON and msgpack event
+protocols used between the Analyst and the container, per 1,000 assets
+with analysis, timelines and file lists.
+
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from boondocks.protocol import EventCodec, MSGPACK, JSON
+
+
+def make_asset(labels=20, clips=50):
+    """
+    Make a realistic asset with analysis and timeline clips.
+
+    Args:
+        labels (int): The number of predictions per analysis module.
+        clips (int): The number of timeline clips.
+
+    Returns:
+        dict: The asset.
+    """
+    asset_id = str(uuid.uuid4())
+
+    def predictions():
+        return [{
+            "label": "label-{}".format(i),
+            "score": round(random.random(), 3),
+            "bbox": [round(random.random(), 3) for _ in range(4)]
+        } for i in range(labels)]
+
+    return {
+        "id": asset_id,
+        "document": {
+            "source": {
+                "path": "gs://boonai-data/video/{}.mp4".format(asset_id),
+                "filename": "{}.mp4".format(asset_id),
+                "extension": "mp4",
+                "mimetype": "video/mp4",
+                "filesize": random.randint(10 ** 6, 10 ** 9)
+            },
+            "media": {
+                "type": "video",
+                "width": 1920,
+                "height": 1080,
+                "length": 600.5,
+                "orientation": "landscape"
+            },
+            "files": [{
+                "id": "assets/{}/proxy/image_{}.jpg".format(asset_id, i),
+                "category": "proxy",
+                "mimetype": "image/jpeg",
+                "size": random.randint(10 ** 4, 10 ** 6),
+                "attrs": {"width": 512 * i, "height": 288 * i}
+            } for i in range(1, 4)],
+            "analysis": {
+                "boonai-label-detection": {"type": "labels", "predictions": predictions()},
+                "boonai-object-detection": {"type": "labels", "predictions": predictions()},
+                "boonai-image-similarity": {
+                    "type": "similarity",
+                    "simhash": "".join(random.choice("ABCDEFGHIJKLMNOP") for _ in range(2048))
+                }
+            },
+            "clip": {
+                "timeline": "boonai-label-detection",
+                "track": "dog",
+                "start": 10.0,
+                "stop": 20.0,
+                "length": 10.0
+            },
+            "timelines": [{
+                "name": "gcp-video-label-detection",
+                "tracks": [{
+                    "name": "track-{}".format(t),
+                    "clips": [{
+                        "start": i * 1.5,
+                        "stop": i * 1.5 + 1.0,
+                        "content": ["label-{}".format(i)],
+                        "score": round(random.random(), 3)
+                    } for i in range(clips)]
+                } for t in range(4)]
+            }]
+        }
+    }
+
+
+def bench(protocol, event, rounds):
+    """
+    Time encoding and decoding an event.
+
+    Args:
+        protocol (str): The protocol.
+        event (dict): The event.
+        rounds (int): The number of rounds.
+
+    Returns:
+        tuple: The average encode seconds, decode seconds and encoded size.
+    """
+    codec = EventCodec(protocol)
+    encode_time = 0
+    decode_time = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        frames = codec.encode(event)
+        encode_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        codec.decode(frames)
+        decode_time += time.perf_counter() - start
+
+    return encode_time / rounds, decode_time / rounds, sum(len(f) for f in frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the container event protocols')
+    parser.add_argument('-a', '--assets', type=int, default=1000,
+                        help="The number of assets per event. Defaults to 1000")
+    parser.add_argument('-r', '--rounds', type=int, default=5,
+                        help="The number of rounds to average. Defaults to 5")
+    args = parser.parse_args()
+
+    random.seed(0)
+    assets = [make_asset() for _ in range(args.assets)]
+    event = {"type": "execute", "payload": {"ref": {}, "assets": assets, "settings": {}}}
+    # Make sure the event survives the round trip.
+    assert json.loads(json.dumps(event)) == EventCodec.decode(EventCodec(MSGPACK).encode(event))
+
+    scale = 1000.0 / args.assets
+    print("{:<10}{:>14}{:>14}{:>14}".format("protocol", "encode ms", "decode ms", "size MB"))
+    for protocol in (JSON, MSGPACK):
+        encode_time, decode_time, size = bench(protocol, event, args.rounds)
+        print("{:<10}{:>14.1f}{:>14.1f}{:>14.1f}".format(
+            protocol, encode_time * scale * 1000, decode_time * scale * 1000,
+            size * scale / 1024 ** 2))
+    print("(per 1,000 assets)")
+
+
+if __name__ == '__main__':
+    main()
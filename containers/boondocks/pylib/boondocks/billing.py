@@ -0,0 +1,165 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import requests
+import sentry_sdk
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'BillingMetrics',
+    'billing_metrics'
+]
+
+
+class BillingMetrics:
+    """
+    Buffers billing metric records and sends them to the metrics service in
+    bulk, rather than making a request per asset from the processing thread.
+
+    The buffer is flushed once it's full, when it's older than the flush
+    interval, and when a processor is torn down.  If the metrics service
+    can't be reached the records are spilled to disk and resent with the
+    next flush.  Every record has a dedup key, so resending records which
+    were received can't double bill.
+
+    """
+
+    # The max number of records to buffer before sending them.
+    batch_size = int(os.environ.get('BOONAI_BILLING_BATCH_SIZE', 100))
+
+    # The max number of seconds a record is buffered for.
+    flush_interval = float(os.environ.get('BOONAI_BILLING_FLUSH_INTERVAL', 10))
+
+    # The directory records are spilled to when they can't be sent.
+    spill_dir = os.environ.get('BOONAI_BILLING_SPILL_DIR', '/tmp/boonai-billing')
+
+    # Seconds to wait for the metrics service.
+    timeout = 30
+
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.timer = None
+
+    @property
+    def url(self):
+        """
+        The URL of the bulk endpoint, which depends on the task environment.
+        """
+        billing_service = os.environ.get('BOONAI_BILLING_METRICS_SERVICE', 'http://metrics')
+        return f'{billing_service}/api/v1/apicalls/bulk'
+
+    def add(self, record):
+        """
+        Add a billing metric record to the buffer.
+
+        Args:
+            record (dict): An API call record with a dedup_key.
+
+        """
+        with self.lock:
+            self.records.append(record)
+            full = len(self.records) >= self.batch_size
+            if not self.timer:
+                self.timer = threading.Thread(target=self.__flush_periodically, daemon=True)
+                self.timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Send the buffered records along with any which were spilled to disk.
+
+        Returns:
+            int: The number of records sent.
+        """
+        with self.flush_lock:
+            with self.lock:
+                records, self.records = self.records, []
+            records = self.__load_spilled() + records
+            if not records:
+                return 0
+
+            try:
+                response = requests.post(self.url, json=records, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                msg = 'Unable to register billing metrics, could not connect to metrics service.'
+                sentry_sdk.capture_exception(e)
+                logger.debug(msg)
+                self.__spill(records)
+                return 0
+
+            if response.status_code >= 500:
+                logger.debug(f'Unable to register billing metrics. {response.status_code}: '
+                             f'{response.reason}')
+                self.__spill(records)
+                return 0
+            elif not response.ok:
+                # The records were rejected, sending them again won't help.
+                msg = (f'Unable to register billing metrics. {response.status_code}: '
+                       f'{response.reason}')
+                sentry_sdk.capture_message(msg)
+                logger.debug(msg)
+                logger.debug(f'Metrics missed: {records}')
+                return 0
+            return len(records)
+
+    def __flush_periodically(self):
+        """
+        Flush the buffer every flush interval, run from within a Thread.
+        """
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.debug('Failed to flush billing metrics, {}'.format(e))
+
+    def __spill(self, records):
+        """
+        Write records which couldn't be sent to the spill directory.
+
+        Args:
+            records (list): The records.
+
+        """
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, '{}.json'.format(uuid.uuid4()))
+            with open(path + '.tmp', 'w') as fp:
+                json.dump(records, fp)
+            os.rename(path + '.tmp', path)
+            logger.debug('Spilled {} billing metrics to {}'.format(len(records), path))
+        except OSError as e:
+            sentry_sdk.capture_exception(e)
+            logger.debug(f'Metrics missed: {records}')
+
+    def __load_spilled(self):
+        """
+        Load and remove the records in the spill directory.
+
+        Returns:
+            list: The spilled records.
+        """
+        records = []
+        for path in glob.glob(os.path.join(self.spill_dir, '*.json')):
+            try:
+                with open(path) as fp:
+                    records.extend(json.load(fp))
+                os.unlink(path)
+            except (OSError, ValueError) as e:
+                logger.debug('Failed to load spilled billing metrics {}, {}'.format(path, e))
+        return records
+
+
+"""
+The billing metrics buffer shared by all processors in the container.
+"""
+billing_metrics = BillingMetrics()
@@ -1,12 +1,11 @@
-import json
 import logging
 import sys
 import threading
 
 import zmq
 
-from boonsdk.util import BoonSdkJsonEncoder
 from .process import ProcessorExecutor
+from .protocol import EventCodec
 from .reactor import Reactor
 
 logger = logging.getLogger(__name__)
@@ -17,13 +16,17 @@ class BoonDockDaemon:
     in the image on asset metadata.
     """
 
+    # Optional features the Analyst can use, sent in the 'ok' event.
+    capabilities = ["fuse"]
+
     def __init__(self, port, reactor=None):
         self.port = port
         self.socket = self.__setup_zmq_socket(port)
+        self.codec = EventCodec()
         self.reactor = reactor
 
         if not reactor:
-            self.reactor = Reactor(ZmqEventEmitter(self.socket))
+            self.reactor = Reactor(ZmqEventEmitter(self.socket, self.codec))
         self.executor = ProcessorExecutor(self.reactor)
 
     def __setup_zmq_socket(self, port):
@@ -40,7 +43,7 @@ class BoonDockDaemon:
         logger.info("Analyst container server listening on port: %d" % self.port)
         while True:
             logger.info("Waiting for Analyst...")
-            event = self.socket.recv_json()
+            event = self.codec.recv(self.socket)
             try:
                 self.handle_event(event)
             except Exception as e:
@@ -55,15 +58,26 @@ class BoonDockDaemon:
         etype = event["type"]
         logger.info("handling event: {}".format(etype))
         if etype == "ready":
-            self.reactor.write_event("ok", {})
+            # Older Analysts don't offer any protocols and continue to use JSON.
+            self.codec.negotiate(event["payload"].get("protocols"))
+            self.reactor.write_event("ok", {
+                "protocol": self.codec.protocol,
+                "capabilities": self.capabilities
+            })
         elif etype == "preprocess":
             self.executor.execute_preprocess(event["payload"])
         elif etype == "execute":
-            self.executor.execute_processor(event["payload"])
+            if "refs" in event["payload"]:
+                self.executor.execute_processors(event["payload"])
+            else:
+                self.executor.execute_processor(event["payload"])
         elif etype == "generate":
             self.executor.execute_generator(event["payload"])
         elif etype == "teardown":
             self.executor.teardown_processor(event["payload"])
+        elif etype == "reset":
+            self.executor.reset(event["payload"])
+            self.reactor.write_event("ok", {})
         elif etype == "stop":
             logger.warning("Exiting container via stop event")
             sys.exit(event["payload"].get("status", 0))
@@ -76,14 +90,16 @@ class ZmqEventEmitter(object):
     An event emitter that emits to a ZMQ socket.
     """
 
-    def __init__(self, socket):
+    def __init__(self, socket, codec=None):
         """
         Initialize a new ZmqEventEmitter.
 
         Args:
             socket (zmq.socket): A ZMQ socket.
+            codec (EventCodec): The codec used to encode events, defaults to JSON.
         """
         self.socket = socket
+        self.codec = codec or EventCodec()
         self.emitter_lock = threading.Lock()
 
     def write(self, event):
@@ -93,6 +109,6 @@ class ZmqEventEmitter(object):
         Args:
             event (dict): the event dict
         """
-        sanitized = json.dumps(event, cls=BoonSdkJsonEncoder)
+        frames = self.codec.encode(event)
         with self.emitter_lock:
-            self.socket.send_string(sanitized)
+            self.socket.send_multipart(frames)
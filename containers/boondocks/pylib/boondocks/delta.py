@@ -0,0 +1,111 @@
+import contextlib
+import logging
+
+from boonsdk import Asset
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'TrackedAsset'
+]
+
+
+class TrackedAsset(Asset):
+    """
+    An Asset which records the document paths a processor changes, so only those
+    paths have to be sent back to the Analyst rather than the entire document.
+
+    Paths are recorded when they're set or deleted, and when a dict, list or set
+    is read with get_attr(), since the processor may modify it in place.  If the
+    document itself is accessed, changes can't be tracked and the patch is None.
+
+    """
+
+    # Values which can be modified in place after being returned by get_attr().
+    mutable_types = (dict, list, set)
+
+    def __init__(self, data):
+        self.__depth = 0
+        self.__document = None
+        super(TrackedAsset, self).__init__(data)
+        self.changes = set()
+        self.untracked = False
+
+    @property
+    def document(self):
+        if not self.__depth:
+            self.untracked = True
+        return self.__document
+
+    @document.setter
+    def document(self, value):
+        self.untracked = True
+        self.__document = value
+
+    def set_attr(self, attr, value):
+        self.changes.add(attr)
+        with self.__tracked():
+            super(TrackedAsset, self).set_attr(attr, value)
+
+    def del_attr(self, attr):
+        self.changes.add(attr)
+        with self.__tracked():
+            return super(TrackedAsset, self).del_attr(attr)
+
+    def get_attr(self, attr, default=None):
+        with self.__tracked():
+            value = super(TrackedAsset, self).get_attr(attr, default)
+        if value is not default and isinstance(value, self.mutable_types):
+            self.changes.add(attr)
+        return value
+
+    def attr_exists(self, attr):
+        with self.__tracked():
+            return super(TrackedAsset, self).attr_exists(attr)
+
+    def for_json(self):
+        # Serializing the asset doesn't change it.
+        with self.__tracked():
+            return super(TrackedAsset, self).for_json()
+
+    def get_patch(self):
+        """
+        Return a patch which applies the changes made to the document.  Changed
+        paths which are inside of another changed path are not included.
+
+        Returns:
+            dict: A dict with a 'set' dict of paths to values and an 'unset' list
+                of deleted paths, or None if the changes were not tracked.
+        """
+        if self.untracked:
+            return None
+
+        patch = {'set': {}, 'unset': []}
+        kept = set()
+        for attr in sorted(self.changes, key=lambda a: a.count('.')):
+            parts = attr.split('.')
+            if any('.'.join(parts[:i]) in kept for i in range(1, len(parts))):
+                continue
+            kept.add(attr)
+
+            doc = self.__document
+            for k in parts:
+                if not isinstance(doc, dict) or k not in doc:
+                    patch['unset'].append(attr)
+                    break
+                doc = doc[k]
+            else:
+                patch['set'][attr] = doc
+        return patch
+
+    @contextlib.contextmanager
+    def __tracked(self):
+        """
+        A context manager for accessing the document from a method which
+        tracks its own changes.
+        """
+        self.__depth += 1
+        try:
+            yield
+        finally:
+            self.__depth -= 1
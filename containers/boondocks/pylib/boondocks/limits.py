@@ -0,0 +1,112 @@
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'get_cpu_count',
+    'get_memory_limit'
+]
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+"""The mount point of the container's cgroup hierarchy."""
+
+
+def get_cpu_count():
+    """
+    Return the number of CPUs the container may use.  Inside a container
+    os.cpu_count() is the number of cores of the host, not the share of the
+    task slot the container runs in, so the CPU quota of the container's
+    cgroup is used first.  Without a quota, ANALYST_THREADS, which the Analyst
+    sets to the number of CPUs of the slot, is used.  Otherwise it's the number
+    of CPUs this process can be scheduled on.
+
+    Returns:
+        int: The number of CPUs, at least 1.
+    """
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cores = os.cpu_count() or 1
+
+    quota = _read_cpu_quota()
+    if quota:
+        return max(1, min(cores, int(math.ceil(quota))))
+
+    threads = os.environ.get('ANALYST_THREADS')
+    if threads:
+        try:
+            return max(1, min(cores, int(threads)))
+        except ValueError:
+            logger.warning('Invalid ANALYST_THREADS value "{}"'.format(threads))
+    return max(cores, 1)
+
+
+def get_memory_limit():
+    """
+    Return the memory limit of the container's cgroup, or the physical memory
+    of the host if the container has no limit.
+
+    Returns:
+        int: The limit in bytes, or None if it can't be determined.
+    """
+    try:
+        physical = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, OSError, ValueError):
+        physical = None
+
+    # cgroup v2, then v1 which reports no limit as a huge number.
+    limit = _read_cgroup_value('memory.max') or \
+        _read_cgroup_value('memory', 'memory.limit_in_bytes')
+    if limit and (not physical or limit < physical):
+        return limit
+    return physical
+
+
+def _read_cpu_quota():
+    """
+    Read the CPU quota of the container's cgroup.
+
+    Returns:
+        float: The number of CPUs of the quota, or None if there is no quota.
+    """
+    # cgroup v2 has the quota and period in a single file.
+    path = os.path.join(CGROUP_ROOT, 'cpu.max')
+    try:
+        with open(path) as fp:
+            quota, period = fp.read().split()[:2]
+        if quota == 'max':
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    quota = _read_cgroup_value('cpu', 'cpu.cfs_quota_us')
+    period = _read_cgroup_value('cpu', 'cpu.cfs_period_us')
+    if quota and quota > 0 and period:
+        return quota / period
+    return None
+
+
+def _read_cgroup_value(*path):
+    """
+    Read an integer from a cgroup file.
+
+    Args:
+        *path (str): The path of the file relative to the cgroup root.
+
+    Returns:
+        int: The value, or None if the file doesn't exist or has no limit.
+    """
+    try:
+        with open(os.path.join(CGROUP_ROOT, *path)) as fp:
+            value = fp.read().strip()
+    except OSError:
+        return None
+    if value == 'max':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
@@ -0,0 +1,359 @@
+import importlib
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+
+from boonflow import Frame
+from .delta import TrackedAsset
+from .limits import get_cpu_count, get_memory_limit
+from .reactor import Reactor
+from .residency import get_rss
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'ProcessorPool'
+]
+
+
+class ProcessorPool:
+    """
+    Runs a list of processors which are not thread safe in a pool of worker
+    processes, so they can use more than one core.  Each worker initializes
+    its own instances of the processors once, then receives batches of assets
+    over a pipe and runs them through the processors in order.
+
+    Workers send back a patch of the changes made to each asset along with the
+    stats of each processor.  Every other event a worker emits, like errors and
+    expands, is forwarded to the Reactor as is.  If a worker dies the remaining
+    batches are processed in this process.
+
+    The first worker is started on its own, and once it has initialized its
+    processors the memory it uses decides how many more workers fit within the
+    container's memory limit.
+
+    Attributes:
+        wrappers (list): The ProcessorWrappers, which receive the stats of the workers.
+        reactor (Reactor): The Reactor which receives the events of the workers.
+        num_workers (int): The number of worker processes.
+
+    """
+
+    # The number of worker processes, defaults to the number of CPUs of the container.
+    default_num_workers = int(os.environ.get('BOONAI_PROCESS_WORKERS', 0)) or get_cpu_count()
+
+    # The fraction of the container's memory limit the processes may use together.
+    memory_fraction = float(os.environ.get('BOONAI_PROCESS_MEMORY_FRACTION', 0.8))
+
+    # Spawning is slower than forking, but ML engines are rarely safe to fork once initialized.
+    start_method = os.environ.get('BOONAI_PROCESS_START_METHOD', 'spawn')
+
+    # Seconds to wait for a result before checking the workers are alive.
+    poll_timeout = 1
+
+    def __init__(self, wrappers, reactor, num_workers=None):
+        """
+        Create a new ProcessorPool and start the worker processes.
+
+        Args:
+            wrappers (list): The ProcessorWrappers to run in the workers.
+            reactor (Reactor): The Reactor which receives the events of the workers.
+            num_workers (int): The max number of worker processes.
+        """
+        self.wrappers = wrappers
+        self.reactor = reactor
+        self.counter = itertools.count()
+        self.broken = False
+        self.closed = False
+
+        self.ctx = multiprocessing.get_context(self.start_method)
+        self.tasks = self.ctx.Queue()
+        self.results = self.ctx.Queue()
+        self.workers = []
+
+        max_workers = max(num_workers or self.default_num_workers, 1)
+        self.__start_workers(1)
+        worker_memory = self.__wait_ready()
+        if worker_memory is not None:
+            self.__start_workers(self.get_worker_limit(max_workers, worker_memory) - 1)
+        self.num_workers = len(self.workers)
+        logger.info('Started {} worker processes for {}'.format(
+            self.num_workers, [wrapper.class_name for wrapper in wrappers]))
+
+    @classmethod
+    def is_enabled(cls):
+        """
+        Return True if there is more than one core to use.
+
+        Returns:
+            bool: True if processors can be run in a ProcessorPool.
+        """
+        return cls.default_num_workers > 1
+
+    @classmethod
+    def get_worker_limit(cls, max_workers, worker_memory):
+        """
+        Return the number of workers which fit within the container's memory
+        limit, along with this process.
+
+        Args:
+            max_workers (int): The max number of workers.
+            worker_memory (int): The memory used by a worker, in bytes.
+
+        Returns:
+            int: The number of workers, at least 1.
+        """
+        limit = get_memory_limit()
+        if not limit or not worker_memory:
+            return max_workers
+        available = limit * cls.memory_fraction - get_rss()
+        return max(min(int(available // worker_memory), max_workers), 1)
+
+    def process(self, frames, batch_size=1):
+        """
+        Run the Frames through the processors.  The Frames are updated in place
+        once they're processed, and asset events are left to the caller.
+
+        Args:
+            frames (list): The Frames to process.
+            batch_size (int): The number of Frames sent to a worker at once.
+
+        """
+        pending = {}
+        for idx in range(0, len(frames), max(batch_size, 1)):
+            batch = frames[idx:idx + batch_size]
+            if self.broken:
+                run_local(self.wrappers, batch)
+                continue
+            task_id = next(self.counter)
+            pending[task_id] = batch
+            self.tasks.put((task_id, [frame.asset.for_json() for frame in batch]))
+
+        while pending:
+            message = self.__get_result()
+            if message is None:
+                logger.warning('A worker process exited, processing {} batches locally'.format(
+                    len(pending)))
+                self.close()
+                for batch in pending.values():
+                    run_local(self.wrappers, batch)
+                break
+
+            kind = message[0]
+            if kind == 'event':
+                self.reactor.emitter.write(message[1])
+            elif kind == 'done':
+                _, task_id, results, stats = message
+                for frame, result in zip(pending.pop(task_id), results):
+                    apply_result(frame, result)
+                self.__add_stats(stats)
+
+    def close(self):
+        """
+        Stop the worker processes, which run the teardown of their processors.
+        Any remaining events and stats are forwarded.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for _ in self.workers:
+            self.tasks.put(None)
+
+        running = 0 if self.broken else len(self.workers)
+        self.broken = True
+        while running:
+            message = self.__get_result()
+            if message is None:
+                break
+            if message[0] == 'event':
+                self.reactor.emitter.write(message[1])
+            elif message[0] == 'exit':
+                self.__add_stats(message[1])
+                running -= 1
+
+        for worker in self.workers:
+            worker.join(self.poll_timeout)
+            if worker.is_alive():
+                worker.terminate()
+
+    def __start_workers(self, count):
+        """
+        Start worker processes.
+
+        Args:
+            count (int): The number of workers to start.
+        """
+        refs = [wrapper.ref for wrapper in self.wrappers]
+        for _ in range(count):
+            worker = self.ctx.Process(target=_worker_main,
+                                      args=(refs, self.wrappers[0].settings,
+                                            self.tasks, self.results),
+                                      daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def __wait_ready(self):
+        """
+        Wait for the first worker to initialize its processors, forwarding
+        any events it emits.
+
+        Returns:
+            int: The memory used by the worker in bytes, or None if it exited.
+        """
+        while True:
+            message = self.__get_result()
+            if message is None:
+                logger.warning('The worker process exited while initializing')
+                return None
+            if message[0] == 'event':
+                self.reactor.emitter.write(message[1])
+            elif message[0] == 'ready':
+                return message[1]
+
+    def __get_result(self):
+        """
+        Wait for the next message from a worker.
+
+        Returns:
+            tuple: The message, or None if a worker exited.
+        """
+        while True:
+            try:
+                return self.results.get(timeout=self.poll_timeout)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    self.broken = True
+                    return None
+
+    def __add_stats(self, stats):
+        """
+        Add the stats counted by a worker to the ProcessorWrappers.
+
+        Args:
+            stats (list): A dict of stats for each ProcessorWrapper.
+
+        """
+        for wrapper, counts in zip(self.wrappers, stats):
+            for key, value in counts.items():
+                wrapper.increment_stat(key, value)
+
+
+class QueueEventEmitter:
+    """
+    An event emitter used by workers to send events back to the ProcessorPool.
+    """
+
+    def __init__(self, results):
+        self.results = results
+
+    def write(self, event):
+        self.results.put(('event', event))
+
+
+def run_local(wrappers, frames):
+    """
+    Run Frames through the processors in this process.
+
+    Args:
+        wrappers (list): The ProcessorWrappers.
+        frames (list): The Frames.
+
+    """
+    from .process import WorkQueue
+    WorkQueue.run_frames(wrappers, frames)
+
+
+def apply_result(frame, result):
+    """
+    Apply the result of processing an asset in a worker to its Frame.
+
+    Args:
+        frame (Frame): The Frame.
+        result (dict): A dict with either a 'patch' or the entire 'document', and 'skip'.
+
+    """
+    patch = result.get('patch')
+    if patch is None:
+        frame.asset.document.clear()
+        frame.asset.document.update(result['document'])
+    else:
+        for path, value in patch['set'].items():
+            frame.asset.set_attr(path, value)
+        for path in patch['unset']:
+            frame.asset.del_attr(path)
+    frame.skip = frame.skip or result['skip']
+
+
+def take_stats(wrappers):
+    """
+    Return the numeric stats of each ProcessorWrapper and reset them to zero.
+
+    Args:
+        wrappers (list): The ProcessorWrappers.
+
+    Returns:
+        list: A dict of stats for each ProcessorWrapper.
+    """
+    result = []
+    for wrapper in wrappers:
+        with wrapper.stat_lock:
+            counts = {k: v for k, v in wrapper.stats.items()
+                      if isinstance(v, (int, float)) and v}
+            wrapper.stats.update({k: 0 for k in counts})
+            wrapper.timing = [0.0, 0.0, 0]
+        result.append(counts)
+    return result
+
+
+def _worker_main(refs, settings, tasks, results):
+    """
+    The entry point of a worker process.
+
+    Args:
+        refs (list): The processor refs.
+        settings (dict): The script settings.
+        tasks (Queue): The queue of batches to process.
+        results (Queue): The queue of results and events.
+
+    """
+    from .logs import setup_logging, AssetLogger
+    from .process import ProcessorWrapper, WorkQueue
+    setup_logging()
+
+    reactor = Reactor(QueueEventEmitter(results))
+    wrappers = []
+    for ref in refs:
+        mod_name, cls_name = ref['className'].rsplit('.', 1)
+        instance = getattr(importlib.import_module(mod_name), cls_name)()
+        wrapper = ProcessorWrapper(instance, ref, reactor, settings)
+        wrapper.init()
+        wrappers.append(wrapper)
+    results.put(('ready', get_rss()))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, assets = task
+        frames = [Frame(TrackedAsset(asset)) for asset in assets]
+        WorkQueue.run_frames(wrappers, frames)
+        AssetLogger.clear_asset_id()
+
+        payloads = []
+        for frame in frames:
+            patch = frame.asset.get_patch()
+            if patch is None:
+                payloads.append({'document': frame.asset.document, 'skip': frame.skip})
+            else:
+                payloads.append({'patch': patch, 'skip': frame.skip})
+        results.put(('done', task_id, payloads, take_stats(wrappers)))
+
+    for wrapper in wrappers:
+        try:
+            wrapper.instance.teardown()
+        except Exception as e:
+            reactor.error(None, wrapper.instance, e, False, 'teardown')
+    reactor.check_expand(force=True)
+    results.put(('exit', take_stats(wrappers)))
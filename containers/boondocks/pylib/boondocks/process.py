@@ -1,19 +1,26 @@
 import datetime
+import functools
 import hashlib
 import json
 import logging
 import os
 import sys
+import tempfile
 import threading
 import time
 from queue import Queue
 
-import requests
 import sentry_sdk
 
 from boonsdk import Asset
-from boonflow import Frame, Context, FatalProcessorException, BoonEnv
+from boonflow import Frame, Context, FatalProcessorException, BoonEnv, file_storage, \
+    AssetProcessor, app_instance, image_cache
+from .billing import billing_metrics
+from .delta import TrackedAsset
+from .limits import get_cpu_count
 from .logs import AssetLogger
+from .pool import ProcessorPool
+from .residency import ResidentProcessorCache, get_rss
 
 sentry_sdk.init('https://8d2c5bb15a2241349c05f8915e10a888@o280392.ingest.sentry.io/5600983',
                 environment=os.environ.get('ENVIRONMENT', 'local-dev'))
@@ -23,12 +30,30 @@ logger = logging.getLogger(__name__)
 class ProcessorExecutor:
     """
     Handles execution of a single Processor on a single data object.
+
+    The number of processing threads adapts to the processors being run.
+    Threads which spend most of their time waiting, on HTTP calls for example,
+    leave cores idle, so the thread count is the number of cores divided by the
+    fraction of its wall time a processor spends using the CPU, within bounds.
+    Until that has been measured the processor's thread_profile hint is used.
     """
 
+    # The number of threads used for processors with no measurements or hints.
+    default_threads = int(os.environ.get("ANALYST_THREADS", "4"))
+
+    # The bounds of the number of threads.
+    min_threads = int(os.environ.get("ANALYST_MIN_THREADS", "1"))
+    max_threads = int(os.environ.get("ANALYST_MAX_THREADS", "32"))
+
+    # The number of processed frames needed before the CPU use is trusted.
+    min_timed_frames = 5
+
     def __init__(self, reactor):
         self.reactor = reactor
         self.processors = {}
-        self.queue = WorkQueue(int(os.environ.get("ANALYST_THREADS", "4")))
+        self.pools = {}
+        self.resident = ResidentProcessorCache()
+        self.queue = WorkQueue(self.default_threads)
 
     def execute_generator(self, request):
         if logger.isEnabledFor(logging.DEBUG):
@@ -69,22 +94,45 @@ class ProcessorExecutor:
         ref = request["ref"]
         assets = request.get("assets")
         settings = request.get("settings", {})
+        # The Analyst can apply patches to its copy of the assets.
+        delta = request.get("delta", False)
 
         wrapper = self.get_processor_wrapper(ref, settings)
 
         # Multi-thread
         if wrapper.instance:
 
-            if wrapper.instance.use_threads:
+            pool = self.get_processor_pool([wrapper])
+            if pool:
+                frames = [Frame(TrackedAsset(asset) if delta else Asset(asset))
+                          for asset in assets]
+                pool.process(frames, wrapper.batch_size)
+                for frame in frames:
+                    self.reactor.write_event("asset", ProcessorWrapper.get_asset_payload(frame))
+
+            elif wrapper.has_process_batch():
+                size = wrapper.batch_size
+                batches = [assets[i:i + size] for i in range(0, len(assets), size)]
+                if wrapper.instance.use_threads:
+                    self.resize_queue([wrapper])
+                    for batch in batches:
+                        self.queue.add_assets(wrapper, batch, delta)
+                    self.queue.join()
+                else:
+                    for batch in batches:
+                        self.queue.process_assets(wrapper, batch, delta)
+
+            elif wrapper.instance.use_threads:
+                self.resize_queue([wrapper])
                 for asset in assets:
-                    self.queue.add_asset(wrapper, asset)
+                    self.queue.add_asset(wrapper, asset, delta)
                 # Wait on the thread pool to be empty.
                 self.queue.join()
 
             # Single thread
             else:
                 for asset in assets:
-                    self.queue.process_asset(wrapper, asset)
+                    self.queue.process_asset(wrapper, asset, delta)
         else:
             logger.warning(
                 "The processor {} has no instance, the class was not found".format(
@@ -92,6 +140,87 @@ class ProcessorExecutor:
 
         return assets
 
+    def execute_processors(self, request):
+        """
+        Executes a run of processors on a list of data objects, each object is
+        passed through every processor in turn without waiting on the other
+        objects.  An 'asset' event is emitted for each object once it has been
+        through the entire run or is skipped.
+
+        A processor with a preprocess() method needs the other objects in their
+        processed state, so the run waits for every object to catch up before
+        calling it.
+
+        Args:
+            request (dict): An execution request with a list of processor refs.
+
+        Returns:
+            list: The processed data objects.
+        """
+        refs = request["refs"]
+        assets = request.get("assets")
+        settings = request.get("settings", {})
+        delta = request.get("delta", False)
+
+        wrappers = []
+        for ref in refs:
+            wrapper = self.get_processor_wrapper(ref, settings)
+            if wrapper.instance:
+                wrappers.append(wrapper)
+            else:
+                logger.warning(
+                    "The processor {} has no instance, the class was not found".format(
+                        wrapper.class_name))
+
+        # Split the run where a processor has a preprocess step.
+        stages = []
+        for wrapper in wrappers:
+            if not stages or wrapper.has_preprocess():
+                stages.append([])
+            stages[-1].append(wrapper)
+
+        frames = [Frame(TrackedAsset(asset) if delta else Asset(asset)) for asset in assets]
+        live = frames
+        for idx, stage in enumerate(stages):
+            last = idx == len(stages) - 1
+            # Frames skipped by an earlier stage are done.
+            for frame in live:
+                if frame.skip:
+                    self.reactor.write_event("asset", ProcessorWrapper.get_asset_payload(frame))
+            live = [frame for frame in live if not frame.skip]
+
+            if stage[0].has_preprocess():
+                if not stage[0].preprocess([frame.asset for frame in live]):
+                    self.reactor.write_event("hardfailure", {
+                        "message": "Preprocess failed for {}".format(stage[0].class_name)})
+                    return assets
+
+            # Frames move through the stage in batches if any processor prefers them.
+            size = max(wrapper.batch_size if wrapper.has_process_batch() else 1
+                       for wrapper in stage)
+            batches = [live[i:i + size] for i in range(0, len(live), size)]
+            pool = self.get_processor_pool(stage)
+            if all(wrapper.instance.use_threads for wrapper in stage):
+                self.resize_queue(stage)
+                for batch in batches:
+                    self.queue.add_frames(stage, batch, last)
+                self.queue.join()
+            elif pool:
+                pool.process(live, size)
+                if last:
+                    for frame in live:
+                        self.reactor.write_event(
+                            "asset", ProcessorWrapper.get_asset_payload(frame))
+            else:
+                for batch in batches:
+                    self.queue.process_frames(stage, batch, last)
+
+        if not stages:
+            for frame in frames:
+                self.reactor.write_event("asset", ProcessorWrapper.get_asset_payload(frame))
+
+        return [frame.asset.for_json() for frame in frames if not frame.skip]
+
     def teardown_processor(self, request):
         """
         Run the teardown for a give n
@@ -112,13 +241,47 @@ class ProcessorExecutor:
         key = self.get_processor_key(ref)
         wrapper = self.processors.get(key)
         if wrapper:
+            # Stop the worker processes first so their stats are included.
+            for keys in [keys for keys in self.pools if key in keys]:
+                self.pools.pop(keys).close()
             wrapper.teardown()
             del self.processors[key]
+            # Keep the initialized processor for the next task.
+            self.resident.put(key, wrapper)
             return True
         else:
             self.warning("Failed to teardown processor, missing from cache {}".format(ref))
         return False
 
+    def reset(self, request):
+        """
+        Reset the executor so the container can be reused to run
+        processors for another task.
+
+        Args:
+            request (dict): A reset request with the new task environment.
+
+        """
+        if self.processors:
+            logger.warning("Discarding {} processors which were not torn down".format(
+                len(self.processors)))
+            self.processors.clear()
+
+        for pool in self.pools.values():
+            pool.close()
+        self.pools.clear()
+
+        self.reactor.clear_expand_frames()
+        # Send any billing metrics before the billing service can change.
+        billing_metrics.flush()
+        os.environ.update(request.get("env", {}))
+
+        # Rebuild the temp and file cache dirs from the new TMPDIR.
+        tempfile.tempdir = None
+        file_storage.cache.reset()
+        file_storage.models.release_models()
+        logger.info("Reset executor for task {}".format(BoonEnv.get_task_id()))
+
     def get_processor_key(self, ref):
         """
         Given a processor reference, calculate a unique hash.
@@ -147,33 +310,145 @@ class ProcessorExecutor:
         # Determine if we already have a processor instance.
         # Utilize the existing instance.
         key = self.get_processor_key(ref)
-        if key not in self.processors:
+        if key not in self.processors and key in self.resident.wrappers:
+            wrapper = self.resident.take(key)
+            wrapper.reuse(settings)
+            self.processors[key] = wrapper
+            logger.info("Reusing resident processor {}".format(ref["className"]))
+
+        elif key not in self.processors:
             wrapper = ProcessorWrapper(
                 self.new_processor_instance(ref), ref, self.reactor, settings)
             self.processors[key] = wrapper
 
-            try:
-                wrapper.init()
-            except Exception as e:
-                # set the instance to None
-                wrapper.instance = None
-
-                msg = "Failed to init() instance of {}, unexpected: " \
-                      "'{}' exception".format(ref["className"], e)
-                logger.exception(msg)
-
-                # If its a standard module it can't fail so its a hard error.
-                # Otherwise we get tons of random errors and its hard to figure
-                # out what is going on..
-                if ref.get("module") == "standard":
-                    self.reactor.write_event("hardfailure", {"message": msg + "(standard)"})
-                else:
-                    self.reactor.error(None, ref["className"], e, False, "init")
+            if self.is_pool_only(wrapper):
+                # The worker processes initialize their own instances, so this
+                # one is only initialized if it ever has to run in this process.
+                wrapper.pending_init = functools.partial(self.init_processor, wrapper)
+            else:
+                self.init_processor(wrapper)
         else:
             wrapper = self.processors[key]
 
         return wrapper
 
+    def init_processor(self, wrapper):
+        """
+        Initialize the Processor instance of a ProcessorWrapper, recording the
+        memory it used.  If init() fails the instance is discarded.
+
+        Args:
+            wrapper (ProcessorWrapper): The wrapper to initialize.
+
+        """
+        ref = wrapper.ref
+        rss = get_rss()
+        try:
+            wrapper.init()
+            wrapper.memory = max(get_rss() - rss, 0)
+        except Exception as e:
+            # set the instance to None
+            wrapper.instance = None
+
+            msg = "Failed to init() instance of {}, unexpected: " \
+                  "'{}' exception".format(ref["className"], e)
+            logger.exception(msg)
+
+            # If its a standard module it can't fail so its a hard error.
+            # Otherwise we get tons of random errors and its hard to figure
+            # out what is going on..
+            if ref.get("module") == "standard":
+                self.reactor.write_event("hardfailure", {"message": msg + "(standard)"})
+            else:
+                self.reactor.error(None, ref["className"], e, False, "init")
+
+    @staticmethod
+    def is_pool_only(wrapper):
+        """
+        Return True if a processor will run in a ProcessorPool rather than in
+        this process, because it can use worker processes but not threads.
+
+        Args:
+            wrapper (ProcessorWrapper): The wrapper.
+
+        Returns:
+            bool: True if the processor runs in worker processes.
+        """
+        instance = wrapper.instance
+        return bool(instance) and ProcessorPool.is_enabled() \
+            and getattr(instance, "use_processes", False) \
+            and not getattr(instance, "use_threads", False)
+
+    def get_thread_count(self, wrappers):
+        """
+        Return the number of threads to run a list of processors with, based
+        on the fraction of the time they spend using the CPU or their hints.
+
+        Args:
+            wrappers (list): The ProcessorWrappers which process each frame.
+
+        Returns:
+            int: The number of threads.
+        """
+        cores = get_cpu_count()
+        timings = [wrapper.get_timing() for wrapper in wrappers]
+        if all(count >= self.min_timed_frames for _, _, count in timings):
+            cpu_time = sum(cpu for cpu, _, _ in timings)
+            wall_time = sum(wall for _, wall, _ in timings)
+            ratio = cpu_time / wall_time if wall_time else 1
+            threads = int(round(cores / max(ratio, 1.0 / self.max_threads)))
+        else:
+            profiles = [wrapper.instance.thread_profile for wrapper in wrappers]
+            if "cpu" in profiles:
+                threads = cores
+            elif all(profile == "io" for profile in profiles):
+                threads = self.max_threads
+            else:
+                threads = self.default_threads
+        return max(self.min_threads, min(threads, self.max_threads))
+
+    def resize_queue(self, wrappers):
+        """
+        Resize the WorkQueue for a list of processors and record the number
+        of threads in their stats.
+
+        Args:
+            wrappers (list): The ProcessorWrappers which process each frame.
+
+        """
+        threads = self.get_thread_count(wrappers)
+        if threads != self.queue.num_workers:
+            logger.info("Resizing the work queue from {} to {} threads for {}".format(
+                self.queue.num_workers, threads, [wrapper.class_name for wrapper in wrappers]))
+            self.queue.resize(threads)
+        for wrapper in wrappers:
+            with wrapper.stat_lock:
+                wrapper.stats["threads"] = threads
+
+    def get_processor_pool(self, wrappers):
+        """
+        Return a ProcessorPool for a run of processors which can't use threads
+        but can use worker processes, starting it if necessary.
+
+        Args:
+            wrappers (list): The ProcessorWrappers.
+
+        Returns:
+            ProcessorPool: The pool, or None if the processors should run in this process.
+        """
+        if not ProcessorPool.is_enabled():
+            return None
+        if all(wrapper.instance.use_threads for wrapper in wrappers):
+            return None
+        if not all(wrapper.instance.use_threads or wrapper.instance.use_processes
+                   for wrapper in wrappers):
+            return None
+
+        keys = tuple(self.get_processor_key(wrapper.ref) for wrapper in wrappers)
+        if keys not in self.pools:
+            self.pools[keys] = ProcessorPool(wrappers, self.reactor)
+        return self.pools[keys]
+
     def new_processor_instance(self, ref):
         """
         Construct and return an instance of the processor described by
@@ -234,16 +509,15 @@ class ProcessorWrapper:
         self.instance = instance
         self.ref = ref or {}
         self.reactor = reactor
-        self.stats = {
-            "processor": ref["className"],
-            "image": ref["image"],
-            "error_count": 0,
-            "unrecoverable_error_count": 0,
-            "process_count": 0,
-            "total_time": 0
-        }
         self.stat_lock = threading.RLock()
         self.settings = settings
+        self.reset_stats()
+        # The memory used to initialize the instance, in bytes.
+        self.memory = 0
+        # A function which initializes the instance when it's first used, if
+        # the init() was deferred.
+        self.pending_init = None
+        self.init_lock = threading.Lock()
 
     @property
     def class_name(self):
@@ -265,6 +539,52 @@ class ProcessorWrapper:
                                               self.settings))
             self.instance.init()
 
+    def ensure_init(self):
+        """
+        Run the deferred initialization of the Processor instance, if any,
+        before it's used in this process.
+
+        """
+        if self.pending_init is None:
+            return
+        with self.init_lock:
+            if self.pending_init is not None:
+                self.pending_init()
+                self.pending_init = None
+
+    def reuse(self, settings):
+        """
+        Prepare a resident Processor instance, which was initialized by a
+        previous task, for the current task.  The instance gets a new Context
+        and a BoonApp for the current task, but init() is not called again.
+
+        Args:
+            settings (dict): The script settings of the current task.
+
+        """
+        self.settings = settings
+        self.reset_stats()
+        if self.instance:
+            self.instance.app = app_instance()
+            self.instance.set_context(Context(self.reactor,
+                                              self.ref.get("args"),
+                                              self.settings))
+
+    def reset_stats(self):
+        """
+        Reset the stats and timings to zero.
+        """
+        with self.stat_lock:
+            self.stats = {
+                "processor": self.ref["className"],
+                "image": self.ref["image"],
+                "error_count": 0,
+                "unrecoverable_error_count": 0,
+                "process_count": 0,
+                "total_time": 0
+            }
+            self.timing = [0.0, 0.0, 0]
+
     def generate(self, settings):
         consumer = AssetConsumer(self.reactor, settings)
         start_time = time.monotonic()
@@ -274,6 +594,7 @@ class ProcessorWrapper:
             if not consumer.file_types:
                 raise ValueError("No file types were supplied in job settings property")
 
+            self.ensure_init()
             if self.instance:
                 self.instance.generate(consumer)
                 total_time = round(time.monotonic() - start_time, 2)
@@ -298,9 +619,21 @@ class ProcessorWrapper:
             consumer.check_expand(True)
             self.reactor.write_event("finished", {})
 
+    def has_preprocess(self):
+        """
+        Return True if the Processor instance implements preprocess().
+
+        Returns:
+            bool: True if the Processor has a preprocess step.
+        """
+        preprocess = getattr(type(self.instance), "preprocess", None)
+        return preprocess is not None and preprocess is not AssetProcessor.preprocess
+
     def preprocess(self, assets):
         start_time = time.monotonic()
+        success = True
         try:
+            self.ensure_init()
             if self.instance:
                 self.instance.preprocess(assets)
                 total_time = round(time.monotonic() - start_time, 2)
@@ -312,6 +645,7 @@ class ProcessorWrapper:
                         self.class_name))
         except Exception as e:
             # Preprocess is fatal.
+            success = False
             self.increment_stat("unrecoverable_error_count")
             self.reactor.error(None, self.ref, e,
                                True, "preprocess", sys.exc_info()[2])
@@ -319,15 +653,18 @@ class ProcessorWrapper:
             # Always show metrics even if it was skipped because otherwise
             # the pipeline checksums don't work.
             self.reactor.write_event("preprocess", {})
+        return success
 
-    def process(self, frame, force=False):
+    def process(self, frame, force=False, emit=True):
         """
         Run the Processor instance on the given Frame.
         Args:
             frame (Frame): The Frame to process.
             force (bool): Force processing even if the file was processed or has no type.
+            emit (bool): Emit the asset event once the Frame is processed.
 
         """
+        self.ensure_init()
         start_time = time.monotonic()
         error = None
         total_time = 0
@@ -343,19 +680,14 @@ class ProcessorWrapper:
                                .format(self.ref))
                 return processed
 
-            if not force:
-                if self.is_already_processed(frame.asset):
-                    logger.debug("The asset {} is already processed".format(frame.asset.id))
-                    return processed
-
-                if self.instance.file_types:
-                    if not is_file_type_allowed(frame.asset, self.instance.file_types):
-                        # No need to log, this is normal.
-                        return processed
+            if not force and not self.is_processable(frame):
+                return processed
 
             self.instance.logger.info("started processor")
 
+            cpu_start = time.thread_time()
             retval = self.instance.process(frame)
+            self.add_timing(time.thread_time() - cpu_start, time.monotonic() - start_time)
             # a -1 means the processor was skipped internally.
             processed = retval != -1
 
@@ -366,36 +698,187 @@ class ProcessorWrapper:
             # Check the expand queue.  A force check is done at teardown.
             self.reactor.check_expand()
 
-        except FatalProcessorException as upe:
-            # Set the asset to be skipped for further processing
-            # It will not be included in result
-            frame.skip = True
-            error = "fatal"
-            self.increment_stat("unrecoverable_error_count")
-            self.reactor.error(frame, self.ref,
-                               upe, True, "execute", sys.exc_info()[2])
         except Exception as e:
-            if self.instance.fatal_errors:
-                error = "fatal"
-                frame.skip = True
-                self.increment_stat("unrecoverable_error_count")
-            else:
-                error = "error"
-                self.increment_stat("error_count")
-            self.reactor.error(frame, self.ref, e,
-                               self.instance.fatal_errors, "execute", sys.exc_info()[2])
+            error = self.handle_error(frame, e, sys.exc_info()[2])
         finally:
             # Always show metrics even if it was skipped because otherwise
             # the pipeline checksums don't work.
-            self.instance.logger.info("completed processor in {0:.2f}".format(total_time))
+            if self.instance:
+                self.instance.logger.info("completed processor in {0:.2f}".format(total_time))
             self.apply_metrics(frame.asset, processed, total_time, error)
-            self.reactor.write_event("asset", {
-                "asset": frame.asset.for_json(),
-                "skip": frame.skip
-            })
+            if emit:
+                self.reactor.write_event("asset", self.get_asset_payload(frame))
 
         return processed
 
+    def has_process_batch(self):
+        """
+        Return True if the Processor instance implements process_batch() and
+        prefers batches of more than one Frame.
+
+        Returns:
+            bool: True if Frames should be processed in batches.
+        """
+        process_batch = getattr(type(self.instance), "process_batch", None)
+        return process_batch is not None \
+            and process_batch is not AssetProcessor.process_batch \
+            and self.batch_size > 1
+
+    @property
+    def batch_size(self):
+        """
+        The preferred number of Frames per call to process_batch().
+        """
+        return max(int(getattr(self.instance, "batch_size", 1) or 1), 1)
+
+    def process_batch(self, frames, force=False, emit=True):
+        """
+        Run the Processor instance on a batch of Frames.  Frames which are
+        skipped are handled as they would be by process().  Each Frame gets
+        its own metrics, stats and asset event, and an error returned for a
+        Frame only affects that Frame.  If the entire batch fails, the Frames
+        are re-processed one at a time so a single bad Frame can't fail the rest.
+
+        Args:
+            frames (list): The Frames to process.
+            force (bool): Force processing even if the file was processed or has no type.
+            emit (bool): Emit the asset event once each Frame is processed.
+
+        Returns:
+            list: A bool for each Frame, True if the Frame was processed.
+        """
+        self.ensure_init()
+        results = [False] * len(frames)
+        batch = []
+        for idx, frame in enumerate(frames):
+            if self.instance and (force or self.is_processable(frame)):
+                batch.append(idx)
+            else:
+                results[idx] = self.process(frame, force, emit)
+
+        if batch:
+            start_time = time.monotonic()
+            cpu_start = time.thread_time()
+            try:
+                self.instance.logger.info("started processor on {} frames".format(len(batch)))
+                retvals = self.instance.process_batch([frames[idx] for idx in batch])
+                if len(retvals) != len(batch):
+                    raise ValueError("process_batch() returned {} results for {} frames"
+                                     .format(len(retvals), len(batch)))
+            except Exception as e:
+                logger.warning("Batch of {} frames failed in {}, processing them "
+                               "individually: {}".format(len(batch), self.class_name, e))
+                for idx in batch:
+                    results[idx] = self.process(frames[idx], True, emit)
+                return results
+
+            # Split the batch time evenly between the Frames.
+            batch_time = time.monotonic() - start_time
+            self.add_timing(time.thread_time() - cpu_start, batch_time, len(batch))
+            total_time = round(batch_time / len(batch), 2)
+            self.instance.logger.info("completed processor on {0} frames in {1:.2f}".format(
+                len(batch), batch_time))
+
+            for idx, retval in zip(batch, retvals):
+                frame = frames[idx]
+                error = None
+                processed = False
+                exec_time = 0
+                if isinstance(retval, Exception):
+                    error = self.handle_error(frame, retval, retval.__traceback__)
+                else:
+                    # a -1 means the processor was skipped internally.
+                    processed = retval != -1
+                    exec_time = total_time
+                    self.increment_stat("process_count")
+                    self.increment_stat("total_time", total_time)
+                self.apply_metrics(frame.asset, processed, exec_time, error)
+                if emit:
+                    self.reactor.write_event("asset", self.get_asset_payload(frame))
+                results[idx] = processed
+
+            # Check the expand queue.  A force check is done at teardown.
+            self.reactor.check_expand()
+
+        return results
+
+    def is_processable(self, frame):
+        """
+        Return True if the Frame should be handed to the Processor instance,
+        which is not the case if the asset was already processed or its file
+        type is not supported by the Processor.
+
+        Args:
+            frame (Frame): The Frame.
+
+        Returns:
+            bool: True if the Frame should be processed.
+        """
+        if self.is_already_processed(frame.asset):
+            logger.debug("The asset {} is already processed".format(frame.asset.id))
+            return False
+
+        if self.instance.file_types:
+            if not is_file_type_allowed(frame.asset, self.instance.file_types):
+                # No need to log, this is normal.
+                return False
+        return True
+
+    def handle_error(self, frame, e, exec_traceback):
+        """
+        Handle an exception raised while processing a Frame by updating the
+        stats and emitting an error event.  The Frame is skipped if the
+        error is fatal.
+
+        Args:
+            frame (Frame): The Frame which failed.
+            e (Exception): The exception.
+            exec_traceback (traceback): The traceback of the exception.
+
+        Returns:
+            str: The type of error, fatal or error.
+        """
+        if isinstance(e, FatalProcessorException):
+            fatal = True
+        else:
+            fatal = self.instance.fatal_errors
+
+        if fatal:
+            # Set the asset to be skipped for further processing
+            # It will not be included in result
+            frame.skip = True
+            self.increment_stat("unrecoverable_error_count")
+        else:
+            self.increment_stat("error_count")
+        self.reactor.error(frame, self.ref, e, fatal, "execute", exec_traceback)
+        return "fatal" if fatal else "error"
+
+    @staticmethod
+    def get_asset_payload(frame):
+        """
+        Return the payload of the asset event for a processed Frame.  If the
+        Asset tracked its changes, the payload contains a patch of the changed
+        document paths rather than the entire asset.
+
+        Args:
+            frame (Frame): The processed Frame.
+
+        Returns:
+            dict: The asset event payload.
+        """
+        if isinstance(frame.asset, TrackedAsset):
+            patch = frame.asset.get_patch()
+            if patch is not None:
+                return {
+                    "id": frame.asset.id,
+                    "patch": patch,
+                    "skip": frame.skip
+                }
+        return {
+            "asset": frame.asset.for_json(),
+            "skip": frame.skip
+        }
+
     def teardown(self):
         """
         Run the teardown for the wrapped Processor instance.
@@ -405,9 +888,14 @@ class ProcessorWrapper:
             logger.warning("Teardown error, instance for '{}' does not exist.".format(self.ref))
             return
         try:
-            self.instance.teardown()
+            # A deferred instance was never initialized, so has nothing to tear down.
+            if self.pending_init is None:
+                self.instance.teardown()
             # When the processor tears down then force an expand check.
             self.reactor.check_expand(force=True)
+            billing_metrics.flush()
+            self.stats["file_cache"] = file_storage.cache.get_stats()
+            self.stats["image_cache"] = image_cache.get_stats()
             self.reactor.write_event("stats", [self.stats])
         except Exception as e:
             self.reactor.error(None, self.instance, e, False, "teardown", sys.exc_info()[2])
@@ -428,6 +916,33 @@ class ProcessorWrapper:
             self.stats[key] = val
             return val
 
+    def add_timing(self, cpu_time, wall_time, count=1):
+        """
+        Add the CPU and wall time used to process Frames, which is used to size
+        the thread pool.  The total CPU time is included in the stats.
+
+        Args:
+            cpu_time (float): The CPU time used by the processing thread.
+            wall_time (float): The wall time.
+            count (int): The number of Frames.
+
+        """
+        with self.stat_lock:
+            self.timing[0] += cpu_time
+            self.timing[1] += wall_time
+            self.timing[2] += count
+            self.stats["cpu_time"] = round(self.timing[0], 2)
+
+    def get_timing(self):
+        """
+        Return the CPU and wall time used to process Frames.
+
+        Returns:
+            tuple: The CPU time, wall time and number of Frames.
+        """
+        with self.stat_lock:
+            return tuple(self.timing)
+
     def apply_metrics(self, asset, processed, exec_time, error):
         """
         Apply execution metrics to the given asset.
@@ -509,25 +1024,24 @@ class ProcessorWrapper:
             return any(value)
 
     def _record_analysis_metric(self, asset):
-        """Helper to make the call to record billing metrics.
+        """Helper to record billing metrics.
 
         Builds the required body to track asset, project, module, and image/video data
-        for billing purposes. If the request fails for any reason, the failure is logged
-        and execution continues
+        for billing purposes and adds it to the billing metrics buffer, which sends
+        records to the metrics service in bulk.  Each record has a dedup key derived
+        from the task, so records which are resent can't be double billed.
 
         Args:
             asset (:obj:`Asset`): The asset to register a billing metric for.
-            module_name (:obj:`str`): The module namespace to record on the billing metric.
 
         """
-        billing_service = os.environ.get('BOONAI_BILLING_METRICS_SERVICE', 'http://metrics')
-        url = f'{billing_service}/api/v1/apicalls'
         # Abbreviate the string path
         source_path = asset.get_attr('source.path', default='')
         if len(source_path) > 255:
             # Include starting ellipses as an indicator, favor end of path
             source_path = '...' + source_path[len(source_path)-252:]
         image_count, video_seconds = self._get_count_and_seconds(asset)
+        project = BoonEnv.get_project_id() or asset.get_attr("system.projectId")
 
         # Some processors, like gcp-video-intelligence, apply multiple modules at once
         # and track them in a temporary namespace on the asset. Record analysis for every
@@ -535,33 +1049,17 @@ class ProcessorWrapper:
         modules = asset.get_attr('tmp.produced_analysis') or [self.ref['module']]
 
         for service in modules:
-            body = {
-                'project': BoonEnv.get_project_id() or asset.get_attr("system.projectId"),
+            dedup_key = hashlib.sha256(':'.join(
+                [str(project), str(BoonEnv.get_task_id()), service, asset.id]).encode('utf-8'))
+            billing_metrics.add({
+                'project': project,
                 'service': service,
                 'asset_id': asset.id,
                 'asset_path': source_path,
                 'image_count': image_count,
                 'video_seconds': video_seconds,
-            }
-            sentry_sdk.set_context('billing_metric', body)
-            try:
-                # Attention: please only log internal messages stuff to debug.  This way it shows
-                # up in GCP logs but not in the users log or affects their job.
-                response = requests.post(url, json=body)
-                if not response.ok:
-                    duplicate_msg = 'The fields service, asset_id, project must make a unique set.'
-                    if duplicate_msg not in response.json().get('non_field_errors'):
-                        msg = (f'Unable to register billing metrics. {response.status_code}: '
-                               f'{response.reason}')
-                        logger.debug(msg)
-                        sentry_sdk.capture_message(msg)
-                        msg = f'Metric missed: {body}'
-                        logger.debug(msg)
-            except requests.exceptions.ConnectionError as e:
-                msg = ('Unable to register billing metrics, could not connect to metrics service.')
-                sentry_sdk.capture_message(msg)
-                sentry_sdk.capture_exception(e)
-                logger.debug(msg)
+                'dedup_key': dedup_key.hexdigest()
+            })
 
     def _get_count_and_seconds(self, asset):
         """Helper to return total images and number of video seconds for an asset.
@@ -687,27 +1185,72 @@ class WorkQueue(Queue):
             num_workers (int): The number of worker threads to spawn.
         """
         Queue.__init__(self)
-        self.num_workers = num_workers
-        self.__start_workers()
+        self.num_workers = 0
+        self.__start_workers(num_workers)
 
-    def __start_workers(self):
+    def __start_workers(self, count):
         """
-        Start the worker threads.
+        Start worker threads.
+
+        Args:
+            count (int): The number of threads to start.
         """
-        for i in range(self.num_workers):
+        for i in range(count):
             t = threading.Thread(target=self.worker)
             t.daemon = True
             t.start()
+        self.num_workers += count
+
+    def resize(self, num_workers):
+        """
+        Grow or shrink the number of worker threads.  This must be called
+        while the queue is idle, it waits for any extra threads to exit.
 
-    def add_asset(self, wrapper, asset):
+        Args:
+            num_workers (int): The number of worker threads.
+        """
+        num_workers = max(num_workers, 1)
+        if num_workers > self.num_workers:
+            self.__start_workers(num_workers - self.num_workers)
+        elif num_workers < self.num_workers:
+            for _ in range(self.num_workers - num_workers):
+                self.put(None)
+            self.join()
+            self.num_workers = num_workers
+
+    def add_asset(self, wrapper, asset, delta=False):
         """
         Add an asset to the processing queue.
 
         Args:
             wrapper (ProcessorWrapper): A ProceessorWrapper instance.
             asset (dict): An asset dictionary.
+            delta (bool): Send a patch of the changes rather than the whole asset.
+        """
+        self.put([self.process_asset, (wrapper, asset, delta)])
+
+    def add_assets(self, wrapper, assets, delta=False):
         """
-        self.put([wrapper, asset])
+        Add a batch of assets to the processing queue.
+
+        Args:
+            wrapper (ProcessorWrapper): A ProceessorWrapper instance.
+            assets (list): A list of asset dictionaries.
+            delta (bool): Send a patch of the changes rather than the whole asset.
+        """
+        self.put([self.process_assets, (wrapper, assets, delta)])
+
+    def add_frames(self, wrappers, frames, emit=True):
+        """
+        Add a batch of frames to the processing queue, to be run through a
+        list of processors.
+
+        Args:
+            wrappers (list): A list of ProcessorWrapper instances.
+            frames (list): The frames.
+            emit (bool): Emit the asset events once the frames are processed.
+        """
+        self.put([self.process_frames, (wrappers, frames, emit)])
 
     def worker(self):
         """
@@ -715,25 +1258,96 @@ class WorkQueue(Queue):
         """
         while True:
             # All threads block on get() until something appears in the queue.
-            wrapper, asset = self.get()
+            item = self.get()
+            if item is None:
+                # The queue is shrinking.
+                self.task_done()
+                return
+            func, args = item
             try:
-                self.process_asset(wrapper, asset)
+                func(*args)
+            except Exception:
+                # Processor errors are reported by the wrapper, anything else
+                # must not kill the worker thread.
+                logger.exception('Unexpected error running {}'.format(func.__name__))
             finally:
                 self.task_done()
 
-    def process_asset(self, wrapper, asset):
+    def process_asset(self, wrapper, asset, delta=False):
         """
         Processes a given asset using the given processor wrapper.
 
         Args:
             wrapper (ProcessorWrapper): The processor wrapper to execute.
             asset (dict): The asset dictionary.
+            delta (bool): Send a patch of the changes rather than the whole asset.
         """
-        frame = Frame(Asset(asset))
+        frame = Frame(TrackedAsset(asset) if delta else Asset(asset))
         # This has to be done in the thread for
         # the logger to pick up the thread local value.
         AssetLogger.set_asset_id(frame.asset.id)
         try:
-            wrapper.process(frame)
+            with file_storage.cache.pin_scope():
+                wrapper.process(frame)
         finally:
             AssetLogger.clear_asset_id()
+
+    def process_assets(self, wrapper, assets, delta=False):
+        """
+        Processes a batch of assets using the given processor wrapper.
+
+        Args:
+            wrapper (ProcessorWrapper): The processor wrapper to execute.
+            assets (list): The asset dictionaries.
+            delta (bool): Send a patch of the changes rather than the whole asset.
+        """
+        frames = [Frame(TrackedAsset(asset) if delta else Asset(asset)) for asset in assets]
+        with file_storage.cache.pin_scope():
+            wrapper.process_batch(frames)
+
+    def process_frames(self, wrappers, frames, emit=True):
+        """
+        Runs a batch of frames through a list of processor wrappers.  A frame
+        which is skipped is not passed to the remaining processors.
+
+        Args:
+            wrappers (list): A list of ProcessorWrapper instances.
+            frames (list): The frames.
+            emit (bool): Emit the asset events once the frames are processed.
+        """
+        try:
+            self.run_frames(wrappers, frames)
+        finally:
+            AssetLogger.clear_asset_id()
+            if emit:
+                for frame in frames:
+                    try:
+                        wrappers[0].reactor.write_event(
+                            "asset", ProcessorWrapper.get_asset_payload(frame))
+                    except Exception:
+                        logger.exception('Failed to emit asset {}'.format(frame.asset.id))
+
+    @staticmethod
+    def run_frames(wrappers, frames):
+        """
+        Runs a batch of frames through a list of processor wrappers without
+        emitting asset events.  A frame which is skipped is not passed to the
+        remaining processors.  Files localized for the frames stay pinned in the
+        file cache until the frames have been through every processor.
+
+        Args:
+            wrappers (list): A list of ProcessorWrapper instances.
+            frames (list): The frames.
+        """
+        with file_storage.cache.pin_scope():
+            for wrapper in wrappers:
+                live = [frame for frame in frames if not frame.skip]
+                if not live:
+                    break
+                if wrapper.has_process_batch():
+                    AssetLogger.clear_asset_id()
+                    wrapper.process_batch(live, emit=False)
+                else:
+                    for frame in live:
+                        AssetLogger.set_asset_id(frame.asset.id)
+                        wrapper.process(frame, emit=False)
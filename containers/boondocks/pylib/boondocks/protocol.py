@@ -0,0 +1,116 @@
+import json
+import logging
+
+import msgpack
+
+from boonsdk.util import BoonSdkJsonEncoder
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'EventCodec',
+    'MSGPACK',
+    'JSON'
+]
+
+MSGPACK = 'msgpack'
+JSON = 'json'
+
+
+class EventCodec:
+    """
+    Encodes and decodes the events sent over the ZMQ socket between the Analyst
+    and the container.
+
+    JSON events are sent as a single frame, which is what older Analysts expect.
+    Msgpack events are sent as two frames, a header frame naming the protocol and
+    the packed event.  Received events are decoded based on their frames, so the
+    protocol only changes how events are sent.  The Analyst offers the protocols
+    it supports in the 'ready' event and the container picks one with negotiate().
+
+    """
+
+    # The protocols the container supports, most preferred first.
+    supported = (MSGPACK, JSON)
+
+    def __init__(self, protocol=JSON):
+        """
+        Create a new EventCodec.
+
+        Args:
+            protocol (str): The protocol used to send events.
+        """
+        self.protocol = protocol
+        self.encoder = BoonSdkJsonEncoder()
+
+    def negotiate(self, protocols):
+        """
+        Pick the protocol used to send events from the protocols offered by the
+        Analyst.  JSON is used if the Analyst doesn't offer any protocols.
+
+        Args:
+            protocols (list): The protocols the Analyst supports, most preferred first.
+
+        Returns:
+            str: The protocol.
+        """
+        self.protocol = next((p for p in protocols or [] if p in self.supported), JSON)
+        logger.info('Using the {} event protocol'.format(self.protocol))
+        return self.protocol
+
+    def encode(self, event):
+        """
+        Encode an event into ZMQ frames.  Falls back to JSON if the event
+        can't be packed.
+
+        Args:
+            event (dict): The event.
+
+        Returns:
+            list[bytes]: The frames.
+        """
+        if self.protocol == MSGPACK:
+            try:
+                return [MSGPACK.encode('utf-8'),
+                        msgpack.packb(event, default=self.encoder.default, use_bin_type=True)]
+            except (TypeError, ValueError, OverflowError) as e:
+                logger.debug('Unable to pack event, falling back to JSON: {}'.format(e))
+        return [json.dumps(event, cls=BoonSdkJsonEncoder).encode('utf-8')]
+
+    @staticmethod
+    def decode(frames):
+        """
+        Decode an event from ZMQ frames.
+
+        Args:
+            frames (list[bytes]): The frames.
+
+        Returns:
+            dict: The event.
+        """
+        if len(frames) == 2 and frames[0] == MSGPACK.encode('utf-8'):
+            return msgpack.unpackb(frames[1], raw=False, strict_map_key=False)
+        return json.loads(frames[-1])
+
+    def send(self, socket, event):
+        """
+        Send an event.
+
+        Args:
+            socket (zmq.Socket): The socket.
+            event (dict): The event.
+
+        """
+        socket.send_multipart(self.encode(event))
+
+    def recv(self, socket):
+        """
+        Block until an event is received.
+
+        Args:
+            socket (zmq.Socket): The socket.
+
+        Returns:
+            dict: The event.
+        """
+        return self.decode(socket.recv_multipart())
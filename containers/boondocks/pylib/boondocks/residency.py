@@ -0,0 +1,125 @@
+import collections
+import gc
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'ResidentProcessorCache',
+    'get_rss'
+]
+
+
+class ResidentProcessorCache:
+    """
+    Keeps initialized ProcessorWrappers after they're torn down, so a later task
+    running the same processor ref on a reused container doesn't have to import
+    the processor and call init() again, which may have to load model weights.
+
+    Wrappers are keyed by the hash of their processor ref.  The memory used by
+    each processor is estimated from the growth of the container's RSS while it
+    was initialized, and the least recently used processors are evicted to stay
+    within the memory budget.  Processors opt out by setting resident to False.
+
+    Attributes:
+        max_bytes (int): The memory budget in bytes, 0 to disable the cache.
+
+    """
+
+    # The memory budget for resident processors.
+    default_max_mb = int(os.environ.get('BOONAI_RESIDENT_PROCESSOR_MB', 2048))
+
+    def __init__(self, max_mb=None):
+        """
+        Create a new ResidentProcessorCache.
+
+        Args:
+            max_mb (int): The memory budget in megabytes.
+        """
+        self.max_bytes = (self.default_max_mb if max_mb is None else max_mb) * 1024 * 1024
+        self.wrappers = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def put(self, key, wrapper):
+        """
+        Keep a torn down wrapper so it can be reused, evicting the least
+        recently used wrappers if the memory budget is exceeded.
+
+        Args:
+            key (str): The processor ref hash.
+            wrapper (ProcessorWrapper): The wrapper.
+
+        Returns:
+            bool: True if the wrapper was kept.
+        """
+        if not wrapper.instance or not getattr(wrapper.instance, 'resident', False):
+            return False
+        if wrapper.memory > self.max_bytes:
+            logger.info('Not keeping {}, {} MB is over the budget'.format(
+                wrapper.class_name, wrapper.memory // 1024 // 1024))
+            return False
+
+        evicted = []
+        with self.lock:
+            old = self.wrappers.pop(key, None)
+            if old:
+                self.size -= old.memory
+            self.wrappers[key] = wrapper
+            self.size += wrapper.memory
+            while self.size > self.max_bytes:
+                _, lru = self.wrappers.popitem(last=False)
+                self.size -= lru.memory
+                evicted.append(lru)
+
+        if evicted:
+            logger.info('Evicted resident processors {}'.format(
+                [lru.class_name for lru in evicted]))
+            del evicted
+            gc.collect()
+        return True
+
+    def take(self, key):
+        """
+        Remove and return the wrapper for a processor ref hash.
+
+        Args:
+            key (str): The processor ref hash.
+
+        Returns:
+            ProcessorWrapper: The wrapper, or None if the processor is not resident.
+        """
+        with self.lock:
+            wrapper = self.wrappers.pop(key, None)
+            if wrapper:
+                self.size -= wrapper.memory
+            return wrapper
+
+    def clear(self):
+        """
+        Discard every resident processor.
+        """
+        with self.lock:
+            self.wrappers.clear()
+            self.size = 0
+        gc.collect()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.wrappers)
+
+
+def get_rss():
+    """
+    Return the resident set size of this process.
+
+    Returns:
+        int: The RSS in bytes, or 0 if it can't be determined.
+    """
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from boondocks.billing import BillingMetrics
+
+
+class BillingMetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = BillingMetrics()
+        self.metrics.spill_dir = tempfile.mkdtemp()
+        self.metrics.batch_size = 2
+
+    def record(self, idx):
+        return {
+            'project': '00000000-0000-0000-0000-000000000000',
+            'service': 'boonai-label-detection',
+            'asset_id': str(idx),
+            'image_count': 1,
+            'video_seconds': 0.0,
+            'dedup_key': 'key-{}'.format(idx)
+        }
+
+    @patch('boondocks.billing.requests.post')
+    def test_flush_when_full(self, post_patch):
+        post_patch.return_value = MagicMock(ok=True, status_code=201)
+        self.metrics.add(self.record(1))
+        post_patch.assert_not_called()
+
+        self.metrics.add(self.record(2))
+        post_patch.assert_called_once()
+        assert post_patch.call_args[0][0].endswith('/api/v1/apicalls/bulk')
+        assert len(post_patch.call_args[1]['json']) == 2
+        assert not self.metrics.records
+
+    @patch('boondocks.billing.requests.post')
+    def test_spill_when_unavailable(self, post_patch):
+        post_patch.side_effect = requests.exceptions.ConnectionError()
+        self.metrics.add(self.record(1))
+        assert self.metrics.flush() == 0
+        assert len(os.listdir(self.metrics.spill_dir)) == 1
+
+        post_patch.side_effect = None
+        post_patch.return_value = MagicMock(ok=True, status_code=201)
+        self.metrics.add(self.record(2))
+        assert self.metrics.flush() == 2
+        assert [r['dedup_key'] for r in post_patch.call_args[1]['json']] == ['key-1', 'key-2']
+        assert not os.listdir(self.metrics.spill_dir)
+
+    @patch('boondocks.billing.requests.post')
+    def test_spill_on_server_error(self, post_patch):
+        post_patch.return_value = MagicMock(ok=False, status_code=503)
+        self.metrics.add(self.record(1))
+        assert self.metrics.flush() == 0
+        assert len(os.listdir(self.metrics.spill_dir)) == 1
+
+    @patch('boondocks.billing.requests.post')
+    def test_drop_on_client_error(self, post_patch):
+        post_patch.return_value = MagicMock(ok=False, status_code=400)
+        self.metrics.add(self.record(1))
+        assert self.metrics.flush() == 0
+        assert not os.listdir(self.metrics.spill_dir)
@@ -1,4 +1,6 @@
 import logging
+import os
+import tempfile
 import unittest
 
 import pytest
@@ -117,6 +119,19 @@ class BoonDockerDaemonTests(unittest.TestCase):
         }
         self.zpsd.handle_event(event)
         assert self.emitter.event_count("ok") == 1
+        assert self.emitter.get_events("ok")[0]["payload"]["protocol"] == "json"
+
+    def test_handle_ready_negotiate_protocol(self):
+        event = {
+            "type": "ready",
+            "payload": {
+                "protocols": ["avro", "msgpack", "json"]
+            }
+        }
+        self.zpsd.handle_event(event)
+        assert self.emitter.get_events("ok")[0]["payload"]["protocol"] == "msgpack"
+        assert self.zpsd.codec.protocol == "msgpack"
+        assert "fuse" in self.emitter.get_events("ok")[0]["payload"]["capabilities"]
 
     def test_handle_teardown_warning(self):
         event = {
@@ -156,6 +171,28 @@ class BoonDockerDaemonTests(unittest.TestCase):
         self.zpsd.handle_event(event)
         assert self.emitter.event_count("warning") == 0
 
+    def test_handle_reset(self):
+        self.zpsd.executor.processors["abc"] = object()
+        task_cache = tempfile.mkdtemp()
+        event = {
+            "type": "reset",
+            "payload": {
+                "env": {
+                    "BOONAI_TASK_ID": "abc123",
+                    "TMPDIR": task_cache
+                }
+            }
+        }
+        try:
+            self.zpsd.handle_event(event)
+            assert self.emitter.event_count("ok") == 1
+            assert not self.zpsd.executor.processors
+            assert tempfile.gettempdir() == task_cache
+        finally:
+            del os.environ["BOONAI_TASK_ID"]
+            del os.environ["TMPDIR"]
+            tempfile.tempdir = None
+
     def test_handle_stop(self):
         event = {
             "type": "stop",
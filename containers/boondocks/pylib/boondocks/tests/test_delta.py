@@ -0,0 +1,53 @@
+import unittest
+
+from boondocks.delta import TrackedAsset
+
+
+class TrackedAssetTests(unittest.TestCase):
+
+    def setUp(self):
+        self.asset = TrackedAsset({
+            "id": "1234",
+            "document": {
+                "source": {"path": "/foo/bar.jpg"},
+                "media": {"width": 100, "height": 50},
+                "metrics": {"pipeline": []}
+            }
+        })
+
+    def test_no_changes(self):
+        assert self.asset.uri == "/foo/bar.jpg"
+        assert self.asset.get_patch() == {"set": {}, "unset": []}
+
+    def test_set_attr(self):
+        self.asset.set_attr("media.orientation", "landscape")
+        self.asset.add_analysis("test", {"count": 1})
+        patch = self.asset.get_patch()
+        assert patch["set"] == {
+            "media.orientation": "landscape",
+            "analysis.test": {"count": 1}
+        }
+
+    def test_del_attr(self):
+        self.asset.del_attr("media.width")
+        self.asset.del_attr("foo.bar")
+        patch = self.asset.get_patch()
+        assert sorted(patch["unset"]) == ["foo.bar", "media.width"]
+
+    def test_modified_in_place(self):
+        self.asset.get_attr("metrics.pipeline").append({"processor": "foo"})
+        assert self.asset.get_patch()["set"] == {"metrics.pipeline": [{"processor": "foo"}]}
+
+    def test_nested_changes(self):
+        self.asset.set_attr("media.width", 200)
+        self.asset.set_attr("media", {"width": 300})
+        self.asset.set_attr("media.height", 150)
+        assert self.asset.get_patch()["set"] == {"media": {"width": 300, "height": 150}}
+
+    def test_untracked(self):
+        self.asset.document["foo"] = "bar"
+        assert self.asset.get_patch() is None
+
+    def test_for_json(self):
+        assert self.asset.for_json()["id"] == "1234"
+        assert self.asset.get_patch() == {"set": {}, "unset": []}
@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from boondocks import limits
+
+
+class LimitsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.patch = patch.object(limits, 'CGROUP_ROOT', self.root)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        shutil.rmtree(self.root)
+
+    def write(self, value, *path):
+        path = os.path.join(self.root, *path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(value)
+
+    @patch('os.sched_getaffinity', return_value=set(range(64)))
+    def test_get_cpu_count_cgroup_v2(self, _):
+        self.write('150000 100000\n', 'cpu.max')
+        assert limits.get_cpu_count() == 2
+
+    @patch('os.sched_getaffinity', return_value=set(range(64)))
+    def test_get_cpu_count_cgroup_v1(self, _):
+        self.write('400000\n', 'cpu', 'cpu.cfs_quota_us')
+        self.write('100000\n', 'cpu', 'cpu.cfs_period_us')
+        assert limits.get_cpu_count() == 4
+
+    @patch.dict(os.environ, {'ANALYST_THREADS': '3'})
+    @patch('os.sched_getaffinity', return_value=set(range(64)))
+    def test_get_cpu_count_analyst_threads(self, _):
+        self.write('max 100000\n', 'cpu.max')
+        assert limits.get_cpu_count() == 3
+
+    @patch.dict(os.environ, {'ANALYST_THREADS': ''})
+    @patch('os.sched_getaffinity', return_value=set(range(8)))
+    def test_get_cpu_count_no_limit(self, _):
+        assert limits.get_cpu_count() == 8
+
+    def test_get_memory_limit(self):
+        self.write('1073741824\n', 'memory.max')
+        assert limits.get_memory_limit() == 1073741824
+
+    def test_get_memory_limit_unlimited(self):
+        self.write('9223372036854771712\n', 'memory', 'memory.limit_in_bytes')
+        physical = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        assert limits.get_memory_limit() == physical
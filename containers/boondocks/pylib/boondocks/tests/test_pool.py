@@ -0,0 +1,143 @@
+import unittest
+from unittest.mock import patch
+
+from boondocks import pool as pool_module
+from boondocks.pool import ProcessorPool
+from boondocks.process import ProcessorExecutor, ProcessorWrapper
+from boondocks.reactor import Reactor
+from boonflow import Frame
+from boonflow.testing import TestEventEmitter, TestAsset, TestProcessor
+
+TEST_IMAGE = "boonai/plugins-base:latest"
+
+
+class ProcessorPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.emitter = TestEventEmitter()
+        self.reactor = Reactor(self.emitter)
+        self.frames = [Frame(TestAsset("/foo/bar{}.jpg".format(i), id=str(i)))
+                       for i in range(4)]
+
+    def get_wrapper(self, args):
+        ref = {
+            "className": "boonflow.testing.TestProcessor",
+            "args": args,
+            "image": TEST_IMAGE
+        }
+        wrapper = ProcessorWrapper(TestProcessor(), ref, self.reactor, {})
+        wrapper.init()
+        return wrapper
+
+    def test_process(self):
+        wrapper = self.get_wrapper({"sleep": 0})
+        pool = ProcessorPool([wrapper], self.reactor, 2)
+        try:
+            pool.process(self.frames, 2)
+        finally:
+            pool.close()
+
+        for frame in self.frames:
+            metrics = frame.asset.get_attr("metrics.pipeline")
+            assert metrics[0]["processor"] == "boonflow.testing.TestProcessor"
+            assert "error" not in metrics[0]
+        assert wrapper.stats["process_count"] == 4
+        assert self.emitter.event_count("error") == 0
+
+    def test_process_errors(self):
+        wrapper = self.get_wrapper({"sleep": 0, "raise_fatal": True})
+        pool = ProcessorPool([wrapper], self.reactor, 2)
+        try:
+            pool.process(self.frames)
+        finally:
+            pool.close()
+
+        assert self.emitter.event_count("error") == 4
+        assert all(frame.skip for frame in self.frames)
+        assert wrapper.stats["unrecoverable_error_count"] == 4
+
+    def test_process_worker_exited(self):
+        wrapper = self.get_wrapper({"sleep": 0})
+        pool = ProcessorPool([wrapper], self.reactor, 1)
+        pool.workers[0].terminate()
+        pool.workers[0].join()
+
+        pool.process(self.frames)
+        assert pool.broken
+        assert all(frame.asset.get_attr("metrics.pipeline") for frame in self.frames)
+        pool.close()
+
+    @patch.object(pool_module, "get_memory_limit", return_value=1)
+    def test_memory_limit(self, _):
+        wrapper = self.get_wrapper({"sleep": 0})
+        pool = ProcessorPool([wrapper], self.reactor, 4)
+        try:
+            assert pool.num_workers == 1
+            pool.process(self.frames)
+        finally:
+            pool.close()
+        assert wrapper.stats["process_count"] == 4
+
+    @patch.object(pool_module, "get_rss", return_value=0)
+    @patch.object(pool_module, "get_memory_limit", return_value=10 * 1024 ** 3)
+    def test_get_worker_limit(self, *_):
+        gb = 1024 ** 3
+        assert ProcessorPool.get_worker_limit(8, 3 * gb) == 2
+        assert ProcessorPool.get_worker_limit(8, 20 * gb) == 1
+        assert ProcessorPool.get_worker_limit(2, gb) == 2
+        assert ProcessorPool.get_worker_limit(8, 0) == 8
+
+
+class ProcessorExecutorPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.emitter = TestEventEmitter()
+        self.pe = ProcessorExecutor(Reactor(self.emitter))
+
+    @patch.object(ProcessorPool, "default_num_workers", 2)
+    @patch.object(TestProcessor, "use_processes", True)
+    @patch.object(TestProcessor, "use_threads", False)
+    def test_execute_processor(self):
+        ref = {
+            "className": "boonflow.testing.TestProcessor",
+            "args": {"sleep": 0},
+            "image": TEST_IMAGE
+        }
+        req = {
+            "ref": ref,
+            "assets": [
+                {"id": "1234", "document": {"source": {"path": "/foo/bar.jpg"}}},
+                {"id": "5678", "document": {"source": {"path": "/foo/bing.jpg"}}}
+            ],
+            "delta": True
+        }
+        self.pe.execute_processor(req)
+        assert len(self.pe.pools) == 1
+        assert self.emitter.event_count("asset") == 2
+
+        payload = self.emitter.get_events("asset")[0]["payload"]
+        assert "metrics.pipeline" in payload["patch"]["set"]
+
+        assert self.pe.teardown_processor({"ref": ref})
+        assert not self.pe.pools
+        stats = self.emitter.get_events("stats")[0]["payload"][0]
+        assert stats["process_count"] == 2
+
+    @patch.object(ProcessorPool, "default_num_workers", 2)
+    @patch.object(TestProcessor, "use_processes", True)
+    @patch.object(TestProcessor, "use_threads", False)
+    def test_deferred_init(self):
+        ref = {
+            "className": "boonflow.testing.TestProcessor",
+            "args": {"sleep": 0},
+            "image": TEST_IMAGE
+        }
+        wrapper = self.pe.get_processor_wrapper(ref, {})
+        assert wrapper.pending_init is not None
+        assert wrapper.instance.context is None
+
+        # The instance is initialized when it has to run in this process.
+        frame = Frame(TestAsset("/foo/bar.jpg", id="1"))
+        assert wrapper.process(frame, emit=False)
+        assert wrapper.pending_init is None
+        assert wrapper.instance.context is not None
@@ -1,10 +1,12 @@
+import threading
 import unittest
 from unittest.mock import patch
 
 from boondocks.logs import setup_logging
-from boondocks.process import ProcessorExecutor, AssetConsumer, is_file_type_allowed
+from boondocks.process import ProcessorExecutor, AssetConsumer, is_file_type_allowed, \
+    WorkQueue
 from boondocks.reactor import Reactor
-from boonflow import Frame
+from boonflow import Frame, AssetProcessor, ProcessorException
 from boonflow.testing import TestEventEmitter, TestAsset, TestProcessor
 
 setup_logging()
@@ -12,6 +14,43 @@ setup_logging()
 TEST_IMAGE = "boonai/plugins-base:latest"
 
 
+class BatchProcessor(AssetProcessor):
+    """
+    A processor which records the size of each batch it's handed.
+    """
+
+    batch_size = 2
+
+    batches = []
+
+    def process(self, frame):
+        frame.asset.set_attr("batched", False)
+
+    def process_batch(self, frames):
+        BatchProcessor.batches.append(len(frames))
+        results = []
+        for frame in frames:
+            if frame.asset.id == "bad":
+                results.append(ProcessorException("Bad asset"))
+            else:
+                frame.asset.set_attr("batched", True)
+                results.append(None)
+        return results
+
+
+class SkipProcessor(AssetProcessor):
+    """
+    A processor with a preprocess step which skips the asset with the id 'skip'.
+    """
+
+    def preprocess(self, assets):
+        pass
+
+    def process(self, frame):
+        if frame.asset.id == "skip":
+            frame.skip = True
+
+
 class ProcessorExecutorTests(unittest.TestCase):
 
     def setUp(self):
@@ -52,6 +91,244 @@ class ProcessorExecutorTests(unittest.TestCase):
         assert "boonflow.testing.TestProcessor" \
                == assets[0]["document"]["metrics"]["pipeline"][0]["processor"]
 
+    def test_execute_processor_delta(self):
+        req = {
+            "ref": {
+                "className": "boonflow.testing.TestProcessor",
+                "args": {},
+                "image": TEST_IMAGE
+            },
+            "assets": [
+                {"id": "1234", "document": {"source": {"path": "/foo/bar.jpg"}}}
+            ],
+            "delta": True
+        }
+        self.pe.execute_processor(req)
+        payload = self.emitter.get_events("asset")[0]["payload"]
+        assert "asset" not in payload
+        assert payload["id"] == "1234"
+        assert "source" not in payload["patch"]["set"]
+        assert payload["patch"]["set"]["metrics.pipeline"][0]["processor"] == \
+            "boonflow.testing.TestProcessor"
+
+    def test_execute_processors(self):
+        req = {
+            "refs": [
+                {
+                    "className": "boonflow.testing.TestProcessor",
+                    "args": {"sleep": 0},
+                    "module": "first",
+                    "image": TEST_IMAGE
+                },
+                {
+                    "className": "boonflow.testing.TestProcessor",
+                    "args": {"sleep": 0},
+                    "module": "second",
+                    "image": TEST_IMAGE
+                }
+            ],
+            "assets": [
+                {"id": "1234", "document": {"source": {"path": "/foo/bar.jpg"}}},
+                {"id": "5678", "document": {"source": {"path": "/foo/bing.jpg"}}}
+            ],
+            "delta": True
+        }
+        assets = self.pe.execute_processors(req)
+        assert self.emitter.event_count("asset") == 2
+        assert self.emitter.event_count("preprocess") == 2
+        assert self.emitter.event_count("error") == 0
+        assert len(assets) == 2
+        assert assets[0]["document"]["tmp"]["produced_analysis"] == {"first", "second"}
+
+        payload = self.emitter.get_events("asset")[0]["payload"]
+        assert payload["patch"]["set"]["tmp.produced_analysis"] == {"first", "second"}
+
+    @patch.object(TestProcessor, "preprocess", AssetProcessor.preprocess)
+    def test_execute_processors_skip(self):
+        req = {
+            "refs": [
+                {
+                    "className": "boonflow.testing.TestProcessor",
+                    "args": {"sleep": 0, "raise_fatal": True},
+                    "image": TEST_IMAGE
+                },
+                {
+                    "className": "boonflow.testing.TestProcessor",
+                    "args": {"sleep": 0},
+                    "module": "second",
+                    "image": TEST_IMAGE
+                }
+            ],
+            "assets": [
+                {"id": "1234", "document": {"source": {"path": "/foo/bar.jpg"}}}
+            ]
+        }
+        assets = self.pe.execute_processors(req)
+        assert assets == []
+        assert self.emitter.event_count("preprocess") == 0
+        assert self.emitter.event_count("asset") == 1
+        payload = self.emitter.get_events("asset")[0]["payload"]
+        assert payload["skip"]
+        assert "tmp" not in payload["asset"]["document"]
+
+    def test_execute_processors_skip_middle_stage(self):
+        req = {
+            "refs": [
+                {
+                    "className": "boonflow.testing.TestProcessor",
+                    "args": {"sleep": 0},
+                    "module": "first",
+                    "image": TEST_IMAGE
+                },
+                {
+                    "className": "boondocks.tests.test_process.SkipProcessor",
+                    "image": TEST_IMAGE
+                },
+                {
+                    "className": "boonflow.testing.TestProcessor",
+                    "args": {"sleep": 0},
+                    "module": "third",
+                    "image": TEST_IMAGE
+                },
+                {
+                    "className": "boonflow.testing.TestProcessor",
+                    "args": {"sleep": 0},
+                    "module": "fourth",
+                    "image": TEST_IMAGE
+                }
+            ],
+            "assets": [
+                {"id": "1234", "document": {"source": {"path": "/foo/bar.jpg"}}},
+                {"id": "skip", "document": {"source": {"path": "/foo/bing.jpg"}}}
+            ]
+        }
+        assets = self.pe.execute_processors(req)
+        assert len(assets) == 1
+        assert assets[0]["id"] == "1234"
+        assert self.emitter.event_count("asset") == 2
+
+        payloads = {event["payload"]["asset"]["id"]: event["payload"]
+                    for event in self.emitter.get_events("asset")}
+        assert payloads["skip"]["skip"]
+        assert not payloads["1234"]["skip"]
+        assert assets[0]["document"]["tmp"]["produced_analysis"] == {"first", "third", "fourth"}
+
+    def test_execute_processor_batch(self):
+        BatchProcessor.batches = []
+        req = {
+            "ref": {
+                "className": "boondocks.tests.test_process.BatchProcessor",
+                "args": {},
+                "image": TEST_IMAGE
+            },
+            "assets": [
+                {"id": "1234", "document": {"source": {"path": "/foo/bar.jpg"}}},
+                {"id": "bad", "document": {"source": {"path": "/foo/bad.jpg"}}},
+                {"id": "5678", "document": {"source": {"path": "/foo/bing.jpg"}}}
+            ]
+        }
+        assets = self.pe.execute_processor(req)
+        assert sorted(BatchProcessor.batches) == [1, 2]
+        assert self.emitter.event_count("asset") == 3
+        assert self.emitter.event_count("error") == 1
+
+        docs = {a["id"]: a["document"] for a in assets}
+        assert docs["1234"]["batched"]
+        assert docs["5678"]["metrics"]["pipeline"][0]["executionTime"] >= 0
+        assert "batched" not in docs["bad"]
+        assert docs["bad"]["metrics"]["pipeline"][0]["error"] == "error"
+
+    def test_execute_processor_batch_failure(self):
+        req = {
+            "ref": {
+                "className": "boondocks.tests.test_process.BatchProcessor",
+                "args": {},
+                "image": TEST_IMAGE
+            },
+            "assets": [
+                {"id": "1234", "document": {"source": {"path": "/foo/bar.jpg"}}},
+                {"id": "5678", "document": {"source": {"path": "/foo/bing.jpg"}}}
+            ]
+        }
+        with patch.object(BatchProcessor, "process_batch", side_effect=RuntimeError("boom")):
+            assets = self.pe.execute_processor(req)
+        assert self.emitter.event_count("asset") == 2
+        assert self.emitter.event_count("error") == 0
+        assert all(a["document"]["batched"] is False for a in assets)
+
+    @patch.object(TestProcessor, "preprocess", AssetProcessor.preprocess)
+    def test_execute_processors_batch(self):
+        BatchProcessor.batches = []
+        req = {
+            "refs": [
+                {
+                    "className": "boonflow.testing.TestProcessor",
+                    "args": {"sleep": 0},
+                    "image": TEST_IMAGE
+                },
+                {
+                    "className": "boondocks.tests.test_process.BatchProcessor",
+                    "args": {},
+                    "image": TEST_IMAGE
+                }
+            ],
+            "assets": [
+                {"id": str(i), "document": {"source": {"path": "/foo/{}.jpg".format(i)}}}
+                for i in range(4)
+            ]
+        }
+        assets = self.pe.execute_processors(req)
+        assert BatchProcessor.batches == [2, 2]
+        assert self.emitter.event_count("asset") == 4
+        assert all(a["document"]["batched"] for a in assets)
+        assert all(len(a["document"]["metrics"]["pipeline"]) == 2 for a in assets)
+
+    @patch("boondocks.process.get_cpu_count", return_value=2)
+    def test_get_thread_count(self, _):
+        ref = {
+            "className": "boonflow.testing.TestProcessor",
+            "args": {},
+            "image": TEST_IMAGE
+        }
+        wrapper = self.pe.get_processor_wrapper(ref, {})
+        assert self.pe.get_thread_count([wrapper]) == self.pe.default_threads
+
+        with patch.object(TestProcessor, "thread_profile", "io"):
+            assert self.pe.get_thread_count([wrapper]) == self.pe.max_threads
+
+        # Scaled to the container's CPUs, not the host's.
+        with patch.object(TestProcessor, "thread_profile", "cpu"):
+            assert self.pe.get_thread_count([wrapper]) == 2
+
+        # Waiting 95% of the time
+        wrapper.add_timing(0.5, 10, 10)
+        assert self.pe.get_thread_count([wrapper]) == min(self.pe.max_threads, 2 * 20)
+
+        # Compute bound
+        wrapper.add_timing(1000, 990, 10)
+        assert self.pe.get_thread_count([wrapper]) == 2
+
+    def test_execute_processor_thread_stats(self):
+        ref = {
+            "className": "boonflow.testing.TestProcessor",
+            "args": {"sleep": 0},
+            "image": TEST_IMAGE
+        }
+        req = {
+            "ref": ref,
+            "assets": [
+                {"id": "1234", "document": {"source": {"path": "/foo/bar.jpg"}}}
+            ]
+        }
+        with patch.object(TestProcessor, "thread_profile", "io"):
+            self.pe.execute_processor(req)
+        assert self.pe.queue.num_workers == self.pe.max_threads
+
+        self.pe.teardown_processor({"ref": ref})
+        stats = self.emitter.get_events("stats")[0]["payload"][0]
+        assert stats["threads"] == self.pe.max_threads
+        assert stats["cpu_time"] >= 0
+
     def test_execute_processor_and_raise(self):
         req = {
             "ref": {
@@ -222,6 +499,7 @@ class ProcessorExecutorTests(unittest.TestCase):
         self.pe.teardown_processor(req)
         stats = self.emitter.get_events("stats")
         assert len(stats) == 1
+        assert "hits" in stats[0]["payload"][0]["file_cache"]
 
         react_patch.assert_called_with(force=True)
 
@@ -239,6 +517,37 @@ class ProcessorExecutorTests(unittest.TestCase):
         wrapper2 = self.pe.get_processor_wrapper(ref, {})
         assert wrapper2.ref == wrapper.ref
 
+    def test_get_processor_wrapper_resident(self):
+        ref = {
+            "className": "boonflow.testing.TestProcessor",
+            "args": {"sleep": 0},
+            "image": TEST_IMAGE
+        }
+        wrapper = self.pe.get_processor_wrapper(ref, {})
+        wrapper.increment_stat("process_count")
+        assert self.pe.teardown_processor({"ref": ref})
+        assert len(self.pe.resident) == 1
+
+        with patch.object(TestProcessor, "init") as init_patch:
+            reused = self.pe.get_processor_wrapper(ref, {"foo": "bar"})
+            init_patch.assert_not_called()
+        assert reused is wrapper
+        assert reused.settings == {"foo": "bar"}
+        assert reused.stats["process_count"] == 0
+        assert len(self.pe.resident) == 0
+
+    @patch.object(TestProcessor, "resident", False)
+    def test_get_processor_wrapper_not_resident(self):
+        ref = {
+            "className": "boonflow.testing.TestProcessor",
+            "args": {"sleep": 0},
+            "image": TEST_IMAGE
+        }
+        wrapper = self.pe.get_processor_wrapper(ref, {})
+        assert self.pe.teardown_processor({"ref": ref})
+        assert len(self.pe.resident) == 0
+        assert self.pe.get_processor_wrapper(ref, {}) is not wrapper
+
     def test_new_processor_instance(self):
         ref = {
             "className": "boonflow.testing.TestProcessor",
@@ -259,6 +568,25 @@ class ProcessorExecutorTests(unittest.TestCase):
         errors = self.emitter.get_events("error")
         assert len(errors) == 1
 
+    @patch("boondocks.process.billing_metrics")
+    def test_record_analysis_metric(self, billing_patch):
+        ref = {
+            "className": "boonflow.testing.TestProcessor",
+            "args": {},
+            "module": "boonai-label-detection",
+            "image": TEST_IMAGE
+        }
+        wrapper = self.pe.get_processor_wrapper(ref, {})
+        asset = TestAsset("/foo/bar.jpg", id="1234")
+        wrapper._record_analysis_metric(asset)
+        wrapper._record_analysis_metric(asset)
+
+        first, second = [c[0][0] for c in billing_patch.add.call_args_list]
+        assert first["service"] == "boonai-label-detection"
+        assert first["image_count"] == 1
+        assert len(first["dedup_key"]) == 64
+        assert first["dedup_key"] == second["dedup_key"]
+
     def test_is_aleady_processed(self):
         ref = {
             "className": "boonflow.testing.TestProcessor",
@@ -310,6 +638,38 @@ class ProcessorExecutorTests(unittest.TestCase):
         assert not wrapper.is_already_processed(frame.asset)
 
 
+class WorkQueueTests(unittest.TestCase):
+
+    def test_resize(self):
+        queue = WorkQueue(2)
+        threads = threading.active_count()
+        queue.resize(4)
+        assert queue.num_workers == 4
+        assert threading.active_count() == threads + 2
+
+        queue.resize(1)
+        assert queue.num_workers == 1
+
+        results = []
+        for i in range(3):
+            queue.put([results.append, (i,)])
+        queue.join()
+        assert sorted(results) == [0, 1, 2]
+
+    def test_worker_survives_error(self):
+        queue = WorkQueue(1)
+
+        def fail():
+            raise ValueError('boom')
+
+        results = []
+        queue.put([fail, ()])
+        queue.put([results.append, (1,)])
+        queue.join()
+        assert results == [1]
+        assert queue.num_workers == 1
+
+
 class TestAssetConsumer(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,63 @@
+import datetime
+import json
+import unittest
+
+import msgpack
+
+from boondocks.protocol import EventCodec, MSGPACK, JSON
+
+
+class EventCodecTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event = {
+            "type": "asset",
+            "payload": {
+                "asset": {
+                    "id": "12345",
+                    "document": {
+                        "source": {"path": "gs://foo/bar.jpg"},
+                        "labels": [{"label": "dog", "score": 0.95}]
+                    }
+                },
+                "skip": False
+            }
+        }
+
+    def test_encode_json(self):
+        codec = EventCodec()
+        frames = codec.encode(self.event)
+        assert len(frames) == 1
+        assert json.loads(frames[0]) == self.event
+
+    def test_encode_msgpack(self):
+        codec = EventCodec(MSGPACK)
+        frames = codec.encode(self.event)
+        assert len(frames) == 2
+        assert frames[0] == b"msgpack"
+        assert msgpack.unpackb(frames[1]) == self.event
+
+    def test_decode(self):
+        assert EventCodec.decode(EventCodec(JSON).encode(self.event)) == self.event
+        assert EventCodec.decode(EventCodec(MSGPACK).encode(self.event)) == self.event
+
+    def test_encode_msgpack_json_defaults(self):
+        codec = EventCodec(MSGPACK)
+        event = {"type": "ok", "payload": {
+            "time": datetime.datetime(2020, 1, 1), "tags": {"a"}}}
+        decoded = EventCodec.decode(codec.encode(event))
+        assert decoded["payload"]["time"] == "2020-01-01T00:00:00"
+        assert decoded["payload"]["tags"] == ["a"]
+
+    def test_encode_msgpack_fallback(self):
+        codec = EventCodec(MSGPACK)
+        event = {"type": "ok", "payload": {"count": 2 ** 70}}
+        frames = codec.encode(event)
+        assert len(frames) == 1
+        assert EventCodec.decode(frames) == event
+
+    def test_negotiate(self):
+        codec = EventCodec()
+        assert codec.negotiate(["cbor", "msgpack"]) == MSGPACK
+        assert codec.negotiate(["cbor"]) == JSON
+        assert codec.negotiate(None) == JSON
@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import MagicMock
+
+from boondocks.residency import ResidentProcessorCache, get_rss
+
+
+def mock_wrapper(name, memory, resident=True):
+    wrapper = MagicMock()
+    wrapper.class_name = name
+    wrapper.memory = memory
+    wrapper.instance.resident = resident
+    return wrapper
+
+
+class ResidentProcessorCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResidentProcessorCache(max_mb=10)
+        self.mb = 1024 * 1024
+
+    def test_put_take(self):
+        wrapper = mock_wrapper("foo.Bar", self.mb)
+        assert self.cache.put("key", wrapper)
+        assert self.cache.size == self.mb
+        assert self.cache.take("key") is wrapper
+        assert self.cache.take("key") is None
+        assert self.cache.size == 0
+
+    def test_put_not_resident(self):
+        assert not self.cache.put("key", mock_wrapper("foo.Bar", self.mb, False))
+        assert not self.cache.put("key", mock_wrapper("foo.Bar", 11 * self.mb))
+        assert len(self.cache) == 0
+
+    def test_evict_lru(self):
+        self.cache.put("a", mock_wrapper("A", 4 * self.mb))
+        self.cache.put("b", mock_wrapper("B", 4 * self.mb))
+        self.cache.put("c", mock_wrapper("C", 4 * self.mb))
+        assert list(self.cache.wrappers) == ["b", "c"]
+        assert self.cache.size == 8 * self.mb
+
+    def test_get_rss(self):
+        assert get_rss() >= 0
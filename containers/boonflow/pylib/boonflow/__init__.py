@@ -2,6 +2,7 @@
 from boonsdk.entity.asset import StoredFile
 from .base import *
 from .storage import file_storage
+from .imagecache import image_cache
 from .metrics import StopWatch
 from .analysis import *
 from .env import BoonEnv, app_instance
@@ -1,3 +1,4 @@
+import heapq
 
 __all__ = [
     'Prediction',
@@ -213,13 +214,17 @@ class LabelDetectionAnalysis:
         Returns:
             :obj:`dict`: A JSON serializable version of this Document.
         """
-        predictions = self.predictions_list()
-        predict_count = len(predictions)
+        if self.collapse_labels:
+            base_list = self.pred_map.values()
+        else:
+            base_list = self.pred_list
+
+        # Only the top predictions are kept, so there is no need to sort them all.
+        predictions = heapq.nlargest(self.max_predictions, base_list, key=lambda o: o.score)
         base = {
             'type': 'labels',
-            'count': min(predict_count, self.max_predictions),
-            'predictions': [p.for_json(self.save_pred_attrs)
-                            for p in predictions[0: min(predict_count, self.max_predictions)]]
+            'count': len(predictions),
+            'predictions': [p.for_json(self.save_pred_attrs) for p in predictions]
         }
         base.update(self.attrs)
         return base
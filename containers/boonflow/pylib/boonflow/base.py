@@ -9,6 +9,7 @@ import numpy as np
 from boonsdk import BoonSdkException
 
 from .env import app_instance
+from .imagecache import image_cache
 from .proxy import get_proxy_level_path
 
 logger = logging.getLogger(__name__)
@@ -206,9 +207,22 @@ class Processor:
     use_threads = True
     """If True, the processor executes batches of assets in parallel."""
 
+    use_processes = False
+    """If True and use_threads is False, the processor executes batches of assets
+    in parallel worker processes, each with its own instance of the processor."""
+
     fatal_errors = False
     """If True, all errors are fatal."""
 
+    thread_profile = None
+    """A hint for sizing the thread pool until the processor's CPU use has been
+    measured, 'io' if it mostly waits on network calls or 'cpu' if it's compute bound."""
+
+    resident = True
+    """If True, an initialized processor may be kept after teardown() and reused by
+    later tasks without calling init() again.  Processors which hold task specific
+    state from init(), or which can't be used after teardown(), should set this to False."""
+
     def __init__(self):
         self.execute = []
         self.filters = []
@@ -415,6 +429,11 @@ class AssetProcessor(Processor):
     which contains the Asset being processed.
     """
 
+    batch_size = 1
+    """The preferred number of frames passed to process_batch() at once.  Processors
+    which override process_batch() should set this to the batch size their model
+    runs most efficiently at."""
+
     def preprocess(self, assets):
         """
         Run a pre-process on the assets. The assets can not be modified.
@@ -441,6 +460,32 @@ class AssetProcessor(Processor):
         """
         raise NotImplementedError
 
+    def process_batch(self, frames):
+        """Process a batch of frames.
+
+        Processors which can run their model on many images at once should
+        override this method along with the batch_size attribute.  The default
+        implementation calls process() for each frame.
+
+        An error which only affects a single frame should be returned in that
+        frame's position rather than raised.  If the method raises, each frame
+        of the batch is re-processed individually with process().
+
+        Args:
+            frames (list): A list of :obj:`Frame` to be processed.
+
+        Returns:
+            list: A result for each frame, the value process() would have returned
+                or the Exception which the frame failed with.
+        """
+        results = []
+        for frame in frames:
+            try:
+                results.append(self.process(frame))
+            except Exception as e:
+                results.append(e)
+        return results
+
     def expand(self, parent_frame, expand_frame, batch_size=None, force=False):
         """Add an expand frame to the Reactor.
 
@@ -471,6 +516,27 @@ class AssetProcessor(Processor):
             proxy_path = get_proxy_level_path(frame.asset, size)
             return ImageInputStream.from_path(proxy_path)
 
+    def load_proxy_array(self, frame, level=1, mode='RGB', size=None, mean=None, std=None):
+        """
+        Return the decoded proxy image of the frame's asset.  The image is decoded
+        once per container and shared with every other processor which asks for
+        it, along with any resized or normalized version of it.
+
+        Args:
+            frame (Frame): The frame.
+            level (int): The proxy level.
+            mode (str): The colour space, one of RGB, BGR or GRAY.
+            size (tuple): An optional (width, height) to resize the image to.
+            mean (tuple): An optional per channel mean to normalize the image with.
+            std (tuple): An optional per channel standard deviation to normalize
+                the image with.
+
+        Returns:
+            numpy.ndarray: A read only image array, which must be copied to be modified.
+        """
+        proxy_path = get_proxy_level_path(frame.asset, level)
+        return image_cache.get_image(proxy_path, mode, size, mean, std)
+
 
 class ModelTrainer(AssetProcessor):
     """
@@ -483,6 +549,9 @@ class ModelTrainer(AssetProcessor):
     file_types = None
     """Set file types to None"""
 
+    resident = False
+    """Training runs once per task"""
+
     def __init__(self):
         super(ModelTrainer, self).__init__()
         self.add_arg(Argument("model_id", "str", required=True))
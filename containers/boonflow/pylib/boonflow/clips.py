@@ -1,4 +1,8 @@
 """Tools for building clips"""
+from array import array
+
+import numpy as np
+
 from boonflow import Prediction
 from boonsdk.entity import TimelineBuilder
 from boonsdk.util import as_collection
@@ -10,14 +14,49 @@ class ClipTracker:
     ML predictions on individual frames of a video in order to create a
     TimelineBuilder with tracks and clips.
 
+    Predictions are accumulated in compact columnar arrays, which are turned
+    into a score matrix with a row for every appended time and a column for every
+    label.  Clips are derived from the runs of each column all at once, rather
+    than tracking every open clip on every frame.  A clip starts at the first
+    time a label is predicted and stops at the first time it's not, with the
+    highest score of the run.
+
     When all the clips are loaded call build_timeline() with the final time
     to close all open clips.
 
     """
 
-    def __init__(self, asset, timeline_name):
-        self.clips = {}
-        self.timeline = TimelineBuilder(asset, timeline_name)
+    def __init__(self, asset, timeline_name, min_score=None, max_gap=0):
+        """
+        Create a new ClipTracker.
+
+        Args:
+            asset (Asset): The Asset or its unique ID.
+            timeline_name (str): The name of the timeline.
+            min_score (float): An optional minimum score for a label to count as
+                predicted at a time.
+            max_gap (float): Clips of the same label which are separated by no more
+                than this many seconds are merged into a single clip.
+        """
+        self.asset = asset
+        self.timeline_name = timeline_name
+        self.min_score = min_score
+        self.max_gap = max_gap
+
+        self.labels = {}
+        self.times = []
+        self.offsets = array('q')
+        self.cols = array('i')
+        self.scores = array('d')
+        self.bboxes = {}
+        self.previous = set()
+
+    @property
+    def timeline(self):
+        """
+        A TimelineBuilder with the clips which have been closed so far.
+        """
+        return self.__build_timeline()
 
     def append(self, time, predictions):
         """
@@ -43,31 +82,24 @@ class ClipTracker:
             time (float): Time in seconds.
             preds (list): A list of predictions.
         """
-
-        for pred in as_collection(preds):
-            label = pred.label
-            score = pred.score
-            current = self.clips.get(pred.label)
-            if not current:
-                self.clips[label] = {
-                    'start': time,
-                    'stop': time,
-                    'score': score,
-                    'bbox': pred.attrs.get('bbox')
-                }
-            else:
-                current['stop'] = time
-                current['score'] = max(current['score'], score)
-
-        to_remove = []
-        for label, clip in self.clips.items():
-            if clip['stop'] != time:
-                self.timeline.add_clip(
-                    label, clip['start'], time, label, clip['score'], bbox=clip['bbox'])
-                to_remove.append(label)
-
-        for label in to_remove:
-            del self.clips[label]
+        row = len(self.times)
+        self.times.append(time)
+        self.offsets.append(len(self.cols))
+
+        seen = set()
+        for pred in as_collection(preds) or []:
+            col = self.labels.setdefault(pred.label, len(self.labels))
+            self.cols.append(col)
+            self.scores.append(pred.score)
+
+            # A clip has the bbox of the first prediction it starts with, so
+            # bboxes are only kept where a clip can start.
+            if col not in seen:
+                seen.add(col)
+                bbox = pred.attrs.get('bbox')
+                if bbox is not None and (col not in self.previous or self.min_score is not None):
+                    self.bboxes[(row, col)] = bbox
+        self.previous = seen
 
     def build_timeline(self, final_time):
         """
@@ -82,3 +114,66 @@ class ClipTracker:
         """
         self.append(final_time, {})
         return self.timeline
+
+    def __build_timeline(self):
+        """
+        Build a TimelineBuilder from the clips which have been closed.
+
+        Returns:
+            TimelineBuilder
+
+        """
+        timeline = TimelineBuilder(self.asset, self.timeline_name)
+        count = len(self.times)
+        if not count or not self.labels:
+            return timeline
+
+        # Fill the score matrix, keeping the highest score of a label at each time.
+        scores = np.full((count, len(self.labels)), np.nan)
+        offsets = np.append(np.frombuffer(self.offsets, dtype=np.int64), len(self.cols))
+        rows = np.repeat(np.arange(count), np.diff(offsets))
+        np.fmax.at(scores, (rows, np.frombuffer(self.cols, dtype=np.int32)),
+                   np.frombuffer(self.scores, dtype=np.float64))
+
+        if self.min_score is None:
+            present = ~np.isnan(scores)
+        else:
+            with np.errstate(invalid='ignore'):
+                present = scores >= self.min_score
+
+        # Run length encode each column, a run starts where a label becomes
+        # present and stops at the first row it's absent.
+        edges = np.diff(np.pad(present.T.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+        cols, starts = np.nonzero(edges == 1)
+        stops = np.nonzero(edges == -1)[1]
+
+        times = np.array(self.times, dtype=np.float64)
+        if self.max_gap and len(starts) > 1:
+            gap = times[starts[1:]] - times[np.minimum(stops[:-1], count - 1)]
+            merge = (cols[1:] == cols[:-1]) & (stops[:-1] < count) & (gap <= self.max_gap)
+            first = np.concatenate(([True], ~merge))
+            last = np.concatenate((~merge, [True]))
+            cols, starts, stops = cols[first], starts[first], stops[last]
+
+        # Open clips are not part of the timeline until they stop.
+        closed = stops < count
+        cols, starts, stops = cols[closed], starts[closed], stops[closed]
+        if not len(cols):
+            return timeline
+
+        # The highest score of each clip, skipping rows where the label is absent.
+        masked = np.where(present, scores, np.nan).T.ravel()
+        bounds = np.empty(len(cols) * 2, dtype=np.int64)
+        bounds[0::2] = cols * count + starts
+        bounds[1::2] = cols * count + stops
+        with np.errstate(invalid='ignore'):
+            maxes = np.fmax.reduceat(np.append(masked, np.nan), bounds)[0::2]
+
+        names = list(self.labels)
+        order = np.lexsort((cols, starts, stops))
+        for col, start, stop, score in zip(cols[order].tolist(), starts[order].tolist(),
+                                           stops[order].tolist(), maxes[order].tolist()):
+            label = names[col]
+            timeline.add_clip(label, self.times[start], self.times[stop], label, score,
+                              bbox=self.bboxes.get((start, col)))
+        return timeline
@@ -0,0 +1,246 @@
+import collections
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'ImageCache',
+    'image_cache'
+]
+
+
+class ImageCache:
+    """
+    A memory bounded cache of decoded images, shared by every processor running
+    in the container.  Image pipelines run many processors over the same proxy,
+    so rather than each processor decoding the same JPEG again, the first one to
+    ask for it decodes it once and the rest get the same array.
+
+    Derived images, resized to a given shape, converted to a colour space and
+    optionally normalized, are memoized as well, so processors with the same
+    input size share the work of preparing their input.
+
+    Images are keyed by path, size and mtime so a replaced file is never served
+    stale.  The returned arrays are shared and read only, processors must copy
+    an array before modifying it.
+
+    Attributes:
+        max_bytes (int): The memory budget in bytes, 0 to disable the cache.
+
+    """
+
+    # The memory budget for decoded images.
+    default_max_mb = int(os.environ.get('BOONAI_IMAGE_CACHE_MB', 512))
+
+    # The supported colour spaces and the cv2 conversion from the decoded BGR image.
+    color_modes = {
+        'BGR': None,
+        'RGB': cv2.COLOR_BGR2RGB,
+        'GRAY': cv2.COLOR_BGR2GRAY
+    }
+
+    def __init__(self, max_mb=None):
+        """
+        Create a new ImageCache.
+
+        Args:
+            max_mb (int): The memory budget in megabytes.
+        """
+        self.max_bytes = (self.default_max_mb if max_mb is None else max_mb) * 1024 * 1024
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.reset_stats()
+
+    def get_image(self, path, mode='RGB', size=None, mean=None, std=None):
+        """
+        Return the decoded image at the given path, optionally resized and
+        normalized.
+
+        Args:
+            path (str): The path to the image file.
+            mode (str): The colour space, one of RGB, BGR or GRAY.
+            size (tuple): An optional (width, height) to resize the image to.
+            mean (tuple): An optional per channel mean, in the 0 to 1 range, to
+                normalize the image with.  Normalized images are float32.
+            std (tuple): An optional per channel standard deviation to normalize
+                the image with.
+
+        Returns:
+            numpy.ndarray: A read only HxWxC array, or HxW for GRAY.
+        """
+        mode = mode.upper()
+        if mode not in self.color_modes:
+            raise ValueError('Invalid colour mode "{}", expected one of {}'.format(
+                mode, list(self.color_modes)))
+
+        stat = os.stat(path)
+        source = (path, stat.st_size, stat.st_mtime)
+        size = tuple(size) if size else None
+        mean = tuple(mean) if mean is not None else None
+        std = tuple(std) if std is not None else None
+
+        if mean is not None or std is not None:
+            key = (source, mode, size, mean, std)
+            return self.__get(key, lambda: self.__normalize(
+                self.get_image(path, mode, size), mean, std))
+        elif size:
+            key = (source, mode, size)
+            return self.__get(key, lambda: cv2.resize(
+                self.get_image(path, mode), size, interpolation=cv2.INTER_AREA))
+        elif mode != 'BGR':
+            key = (source, mode)
+            return self.__get(key, lambda: cv2.cvtColor(
+                self.get_image(path, 'BGR'), self.color_modes[mode]))
+        else:
+            return self.__get((source, mode), lambda: self.__decode(path))
+
+    def clear(self):
+        """
+        Discard every cached image.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_stats(self):
+        """
+        Return the cache hit and miss counters along with the current size.
+
+        Returns:
+            dict: The cache stats.
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats['size'] = self.size
+            stats['entries'] = len(self.entries)
+        return stats
+
+    def reset_stats(self):
+        """
+        Reset the cache hit and miss counters to zero.
+        """
+        with self.lock:
+            self.counters = {
+                'hits': 0,
+                'misses': 0,
+                'evictions': 0
+            }
+
+    def __get(self, key, build):
+        """
+        Return the cached array for the key, building it once if it's not cached.
+
+        Args:
+            key (tuple): The cache key.
+            build (func): A function which returns the array.
+
+        Returns:
+            numpy.ndarray: The read only array.
+        """
+        with self.lock:
+            array = self.__lookup(key)
+            if array is not None:
+                return array
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread builds a given image, the others wait for it.
+        with key_lock:
+            with self.lock:
+                array = self.__lookup(key)
+                if array is not None:
+                    return array
+                self.counters['misses'] += 1
+            try:
+                array = build()
+                array.flags.writeable = False
+                self.__add(key, array)
+            finally:
+                with self.lock:
+                    self.key_locks.pop(key, None)
+        return array
+
+    def __lookup(self, key):
+        """
+        Return the array for the key and mark it most recently used.  Must be
+        called with the lock held.
+
+        Args:
+            key (tuple): The cache key.
+
+        Returns:
+            numpy.ndarray: The array or None if it's not cached.
+        """
+        array = self.entries.get(key)
+        if array is not None:
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+        return array
+
+    def __add(self, key, array):
+        """
+        Add an array to the cache, evicting the least recently used arrays if
+        the memory budget is exceeded.
+
+        Args:
+            key (tuple): The cache key.
+            array (numpy.ndarray): The array.
+
+        """
+        if array.nbytes > self.max_bytes:
+            return
+        with self.lock:
+            self.entries[key] = array
+            self.size += array.nbytes
+            while self.size > self.max_bytes:
+                _, lru = self.entries.popitem(last=False)
+                self.size -= lru.nbytes
+                self.counters['evictions'] += 1
+
+    @staticmethod
+    def __decode(path):
+        """
+        Decode an image file into a BGR array.
+
+        Args:
+            path (str): The path to the image file.
+
+        Returns:
+            numpy.ndarray: The BGR array.
+        """
+        array = cv2.imread(path, cv2.IMREAD_COLOR)
+        if array is None:
+            raise ValueError('Unable to decode image {}'.format(path))
+        return array
+
+    @staticmethod
+    def __normalize(array, mean, std):
+        """
+        Scale an 8 bit image to the 0 to 1 range and normalize it.
+
+        Args:
+            array (numpy.ndarray): The 8 bit image.
+            mean (tuple): The per channel mean, or None.
+            std (tuple): The per channel standard deviation, or None.
+
+        Returns:
+            numpy.ndarray: The normalized float32 image.
+        """
+        result = array.astype(np.float32) / 255.0
+        if mean is not None:
+            result -= np.array(mean, dtype=np.float32)
+        if std is not None:
+            result /= np.array(std, dtype=np.float32)
+        return result
+
+
+"""
+The decoded image cache shared by all processors in the container.
+"""
+image_cache = ImageCache()
@@ -9,13 +9,29 @@ from pathlib import Path
 
 from boonflow.base import FileTypes
 from boonflow import file_storage
+from boonflow.probe import probe_cache, read_image_size, read_movie_info
 
 logger = logging.getLogger(__name__)
 
 
 def media_size(path):
     """
-    Return the width, height of the given media path.
+    Return the width, height of the given media path.  The size of JPEG, PNG
+    and TIFF images and of MP4 and QuickTime movies is read from their headers,
+    other formats are probed with ffprobe or oiiotool.  Results are cached.
+
+    Args:
+        path (string): Path the image of video media.
+
+    Returns:
+        (width, height): The media dimensions in pixels.
+    """
+    return probe_cache.get('size', path, _probe_media_size)
+
+
+def _probe_media_size(path):
+    """
+    Determine the width, height of the given media path.
 
     Args:
         path (string): Path the image of video media.
@@ -24,6 +40,10 @@ def media_size(path):
         (width, height): The media dimensions in pixels.
     """
     if Path(path).suffix[1:] in FileTypes.videos:
+        info = read_movie_info(path)
+        if info and info['width'] and info['height']:
+            return info['width'], info['height']
+
         cmd = ["ffprobe",
                "-v",
                "error",
@@ -43,6 +63,10 @@ def media_size(path):
             raise ValueError("Invalid video file, unable to determine size: '{}".format(path))
 
     else:
+        size = read_image_size(path)
+        if size:
+            return size
+
         # Oiiotool supports the most image formats.
         # On large files, PIL blows up with PIL.Image.DecompressionBombError:
         # Image size (264192000 pixels) exceeds limit of 178956970 pixels,
@@ -60,7 +84,20 @@ def media_size(path):
 
 def get_image_metadata(file_path):
     """Extract and return image metadata from the given file path. Path must point
-    to an image.
+    to an image.  Results are cached.
+
+    Args:
+        file_path: (str):
+
+    Returns:
+        :obj:`dict`: The image metadata.
+
+    """
+    return probe_cache.get('image_metadata', file_path, _probe_image_metadata)
+
+
+def _probe_image_metadata(file_path):
+    """Extract image metadata from the given file path with oiiotool.
 
     Args:
         file_path: (str):
@@ -149,6 +186,19 @@ def get_output_dimension(size, width, height):
 
 def ffprobe(src_path):
     """Returns the json results of an ffprobe command as a dictionary.
+    Results are cached.
+
+    Args:
+        src_path (str): Path the the medis.
+
+    Returns:
+        dict: The media properties extracgted by ffprobe
+    """
+    return probe_cache.get('ffprobe', src_path, _run_ffprobe)
+
+
+def _run_ffprobe(src_path):
+    """Runs ffprobe and returns the json results as a dictionary.
 
     Args:
         src_path (str): Path the the medis.
@@ -301,13 +351,26 @@ class MediaInfo:
     """
 
     def __init__(self, path):
+        self.attrs = probe_cache.get('mediainfo', path, self.__run_mediainfo)
+
+    @staticmethod
+    def __run_mediainfo(path):
+        """
+        Run mediainfo and return the JSON results as a dictionary.
+
+        Args:
+            path (str): The path to the media.
+
+        Returns:
+            dict: The mediainfo attrs.
+        """
         cmd = [
             'mediainfo',
             '-f',
             '--Output=JSON',
             path
         ]
-        self.attrs = json.loads(check_output(cmd, shell=False))
+        return json.loads(check_output(cmd, shell=False))
 
     def is_streamable(self):
         """
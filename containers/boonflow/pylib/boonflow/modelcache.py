@@ -0,0 +1,342 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'ModelCache'
+]
+
+
+class ModelCache:
+    """
+    A content addressed cache of extracted model files.  The cache directory
+    can be shared by all of the containers on a node, regardless of project.
+
+    Models are stored by the checksum of the model zip file, and an index maps
+    a model file version to its checksum.  Processes hold a shared lock on each
+    model they're using, which acts as a reference count; the least recently used
+    models which are not in use are evicted when the cache is over its size budget.
+
+    Layout:
+        models/<checksum>/      The extracted model files.
+        models/<checksum>.json  The size of the extracted model.
+        models/<checksum>.lock  Locked shared while a process uses the model.
+        index/<key>             The checksum of a model file version.
+
+    """
+
+    # The max size of the cache in MB.
+    default_max_size_mb = int(os.environ.get('BOONAI_MODEL_CACHE_SIZE_MB', 20480))
+
+    # Seconds before a partially installed model is considered abandoned.
+    stale_install_age = 3600
+
+    def __init__(self, root, max_size_mb=None):
+        """
+        Create a new ModelCache.
+
+        Args:
+            root (str): The cache root directory.
+            max_size_mb (int): The size budget of the cache in MB.
+        """
+        self.root = root
+        self.max_size_mb = max_size_mb or self.default_max_size_mb
+
+        # Maps checksum to the file descriptor of a shared lock.
+        self.held = {}
+
+    def get(self, key):
+        """
+        Return the path to the model for the given key, if it's cached.  The model
+        is marked in use by this process until release() is called.
+
+        Args:
+            key (str): The model cache key.
+
+        Returns:
+            str: The path to the extracted model or None if it's not cached.
+        """
+        checksum = self.__read_index(key)
+        if not checksum:
+            return None
+
+        path = self.get_model_path(checksum)
+        if not self.__acquire(checksum):
+            logger.info(f'Cached model {checksum} was evicted')
+            self.__remove_index(key)
+            return None
+        return path
+
+    def put(self, key, zip_path):
+        """
+        Extract a model zip file into the cache and index it by the given key.  The
+        model is marked in use by this process until release() is called.
+
+        Args:
+            key (str): The model cache key.
+            zip_path (str): The path to the model zip file.
+
+        Returns:
+            str: The path to the extracted model.
+        """
+        checksum = self.checksum(zip_path)
+        path = self.get_model_path(checksum)
+        os.makedirs(os.path.dirname(path), mode=0o777, exist_ok=True)
+
+        # Only one process extracts a given model.
+        with open(path + '.install', 'a') as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            if not os.path.exists(path):
+                self.__extract(zip_path, path)
+
+        self.__write_index(key, checksum)
+        if not self.__acquire(checksum):
+            raise RuntimeError(f'Model {checksum} was evicted during install')
+        self.evict()
+        return path
+
+    def contains(self, key):
+        """
+        Return True if the model for the given key is cached.
+
+        Args:
+            key (str): The model cache key.
+
+        Returns:
+            bool: True if the model is cached.
+        """
+        checksum = self.__read_index(key)
+        return bool(checksum) and os.path.exists(self.get_model_path(checksum))
+
+    def release(self):
+        """
+        Release all of the models used by this process so they can be evicted.
+        """
+        for fd in self.held.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.held.clear()
+
+    def evict(self):
+        """
+        Remove the least recently used models which are not in use until the
+        cache is within its size budget.  If another process is already evicting
+        then this method returns immediately.
+
+        Returns:
+            int: The number of models evicted.
+        """
+        models_dir = os.path.join(self.root, 'models')
+        if not os.path.exists(models_dir):
+            return 0
+
+        with open(os.path.join(self.root, '.evict.lock'), 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            self.__remove_stale_installs(models_dir)
+            entries = self.__get_entries(models_dir)
+            total = sum([e[2] for e in entries])
+            budget = self.max_size_mb * 1024 * 1024
+
+            evicted = 0
+            for _, checksum, size in entries:
+                if total <= budget:
+                    break
+                if checksum in self.held:
+                    continue
+                if self.__remove_model(checksum):
+                    total -= size
+                    evicted += 1
+            return evicted
+
+    def get_model_path(self, checksum):
+        """
+        Return the path to the extracted model with the given checksum.
+
+        Args:
+            checksum (str): The checksum of the model zip file.
+
+        Returns:
+            str: The model path.
+        """
+        return os.path.join(self.root, 'models', checksum)
+
+    @staticmethod
+    def checksum(path):
+        """
+        Return the sha256 checksum of a file.
+
+        Args:
+            path (str): The file path.
+
+        Returns:
+            str: The checksum in hex.
+        """
+        sha = hashlib.sha256()
+        with open(path, 'rb') as fp:
+            for block in iter(lambda: fp.read(1024 * 1024), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def __acquire(self, checksum):
+        """
+        Take a shared lock on a model, marking it in use by this process.
+
+        Args:
+            checksum (str): The model checksum.
+
+        Returns:
+            bool: True if the model exists and was locked.
+        """
+        path = self.get_model_path(checksum)
+        if checksum not in self.held:
+            fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o666)
+            # Blocks while the model is being evicted.
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            if not os.path.exists(path):
+                os.close(fd)
+                return False
+            self.held[checksum] = fd
+
+        # The lock file mtime is the last used time.
+        os.utime(path + '.lock')
+        return True
+
+    def __extract(self, zip_path, path):
+        """
+        Extract the model to a temp directory and move it into place.
+
+        Args:
+            zip_path (str): The model zip file.
+            path (str): The model path.
+
+        """
+        logger.info(f'Extracting model into {path}')
+        tmp_path = '{}.tmp-{}'.format(path, uuid.uuid4().hex)
+        try:
+            with zipfile.ZipFile(zip_path) as z:
+                z.extractall(path=tmp_path)
+
+            size = 0
+            for dirpath, _, files in os.walk(tmp_path):
+                size += sum([os.path.getsize(os.path.join(dirpath, f)) for f in files])
+            with open(path + '.json', 'w') as fp:
+                json.dump({'size': size}, fp)
+
+            os.chmod(tmp_path, 0o777)
+            os.rename(tmp_path, path)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def __remove_model(self, checksum):
+        """
+        Remove a model which is not in use.
+
+        Args:
+            checksum (str): The model checksum.
+
+        Returns:
+            bool: True if the model was removed.
+        """
+        path = self.get_model_path(checksum)
+        with open(path + '.lock', 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+
+            logger.info(f'Evicting model {checksum} from the model cache')
+            trash = '{}.evicted-{}'.format(path, uuid.uuid4().hex)
+            try:
+                os.rename(path, trash)
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(trash, ignore_errors=True)
+            try:
+                os.unlink(path + '.json')
+            except FileNotFoundError:
+                pass
+        return True
+
+    def __get_entries(self, models_dir):
+        """
+        Return the cached models, least recently used first.
+
+        Args:
+            models_dir (str): The models directory.
+
+        Returns:
+            list: A list of (last used time, checksum, size) tuples.
+        """
+        entries = []
+        for name in os.listdir(models_dir):
+            if not name.endswith('.json'):
+                continue
+            checksum = name[:-5]
+            path = self.get_model_path(checksum)
+            try:
+                with open(path + '.json') as fp:
+                    size = json.load(fp)['size']
+                last_used = os.path.getmtime(path + '.lock') \
+                    if os.path.exists(path + '.lock') else 0
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((last_used, checksum, size))
+        entries.sort()
+        return entries
+
+    def __remove_stale_installs(self, models_dir):
+        """
+        Remove temp directories left by installs which did not complete.
+
+        Args:
+            models_dir (str): The models directory.
+
+        """
+        cutoff = time.time() - self.stale_install_age
+        for name in os.listdir(models_dir):
+            if '.tmp-' not in name and '.evicted-' not in name:
+                continue
+            path = os.path.join(models_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def __index_path(self, key):
+        return os.path.join(self.root, 'index', key)
+
+    def __read_index(self, key):
+        try:
+            with open(self.__index_path(key)) as fp:
+                return fp.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def __write_index(self, key, checksum):
+        path = self.__index_path(key)
+        os.makedirs(os.path.dirname(path), mode=0o777, exist_ok=True)
+        tmp_path = '{}.tmp-{}'.format(path, uuid.uuid4().hex)
+        with open(tmp_path, 'w') as fp:
+            fp.write(checksum)
+        os.rename(tmp_path, path)
+
+    def __remove_index(self, key):
+        try:
+            os.unlink(self.__index_path(key))
+        except FileNotFoundError:
+            pass
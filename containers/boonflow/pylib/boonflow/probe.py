@@ -0,0 +1,332 @@
+import collections
+import copy
+import logging
+import os
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'ProbeCache',
+    'probe_cache',
+    'read_image_size',
+    'read_movie_info'
+]
+
+
+class ProbeCache:
+    """
+    Caches the result of probing a media file, so importers, proxy processors
+    and frame extractors which need the same properties of a file don't each
+    spawn ffprobe, oiiotool or mediainfo for it.
+
+    Results are keyed by the kind of probe along with the path, size and mtime
+    of the file, so a replaced file is probed again.  Files which can't be
+    stat'ed are never cached.  Every caller gets its own copy of the result.
+
+    Attributes:
+        max_entries (int): The max number of results to keep.
+
+    """
+
+    # The max number of probe results to keep.
+    default_max_entries = int(os.environ.get('BOONAI_PROBE_CACHE_SIZE', 4096))
+
+    def __init__(self, max_entries=None):
+        """
+        Create a new ProbeCache.
+
+        Args:
+            max_entries (int): The max number of results to keep.
+        """
+        self.max_entries = self.default_max_entries if max_entries is None else max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def get(self, kind, path, probe):
+        """
+        Return the cached result of probing a file, probing it if it's not cached.
+
+        Args:
+            kind (str): The kind of probe, results of each kind are cached separately.
+            path (str): The path to the media file.
+            probe (func): A function which takes the path and returns the result.
+
+        Returns:
+            mixed: A copy of the probe result.
+        """
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError, ValueError):
+            return probe(path)
+        key = (kind, str(path), stat.st_size, stat.st_mtime)
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return copy.deepcopy(self.entries[key])
+            self.counters['misses'] += 1
+
+        result = probe(path)
+        with self.lock:
+            self.entries[key] = copy.deepcopy(result)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """
+        Discard every cached result.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        """
+        Return the cache hit and miss counters along with the number of entries.
+
+        Returns:
+            dict: The cache stats.
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self.entries)
+        return stats
+
+    def reset_stats(self):
+        """
+        Reset the cache hit and miss counters to zero.
+        """
+        with self.lock:
+            self.counters = {
+                'hits': 0,
+                'misses': 0
+            }
+
+
+def read_image_size(path):
+    """
+    Read the width and height of a JPEG, PNG or TIFF image from its header
+    without decoding it.
+
+    Args:
+        path (str): The path to the image.
+
+    Returns:
+        tuple: The width and height, or None if the format isn't supported.
+    """
+    try:
+        with open(path, 'rb') as fp:
+            head = fp.read(32)
+            if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+            elif head.startswith(b'\xff\xd8'):
+                return _read_jpeg_size(fp)
+            elif head[:4] in (b'II*\x00', b'MM\x00*'):
+                return _read_tiff_size(fp, '<' if head[:2] == b'II' else '>')
+    except (OSError, struct.error, ValueError) as e:
+        logger.debug('Unable to read the image header of {}, {}'.format(path, e))
+    return None
+
+
+def read_movie_info(path):
+    """
+    Read the width and height of the first video track, along with the duration,
+    from the moov atom of an MP4 or QuickTime movie.
+
+    Args:
+        path (str): The path to the movie.
+
+    Returns:
+        dict: The width, height and duration in seconds, or None if the file is
+            not a movie or can't be parsed.
+    """
+    try:
+        with open(path, 'rb') as fp:
+            head = fp.read(8)
+            if head[4:8] not in (b'ftyp', b'moov', b'wide', b'free', b'mdat', b'skip'):
+                return None
+            size = os.fstat(fp.fileno()).st_size
+            for name, start, end in _iter_atoms(fp, 0, size):
+                if name == b'moov':
+                    fp.seek(start)
+                    return _parse_moov(fp.read(end - start))
+    except (OSError, struct.error, ValueError) as e:
+        logger.debug('Unable to read the movie header of {}, {}'.format(path, e))
+    return None
+
+
+# The JPEG start of frame markers, which hold the image size.
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _read_jpeg_size(fp):
+    """
+    Scan the JPEG markers for a start of frame segment.
+
+    Args:
+        fp (file): The file, any position.
+
+    Returns:
+        tuple: The width and height, or None if there is no frame.
+    """
+    fp.seek(2)
+    while True:
+        byte = fp.read(1)
+        while byte and byte != b'\xff':
+            byte = fp.read(1)
+        while byte == b'\xff':
+            byte = fp.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+        length = struct.unpack('>H', fp.read(2))[0]
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>xHH', fp.read(5))
+            return width, height
+        fp.seek(length - 2, os.SEEK_CUR)
+
+
+def _read_tiff_size(fp, order):
+    """
+    Read the image width and length tags of the first IFD of a TIFF.
+
+    Args:
+        fp (file): The file.
+        order (str): The struct byte order.
+
+    Returns:
+        tuple: The width and height, or None if the tags are missing.
+    """
+    fp.seek(4)
+    offset = struct.unpack(order + 'I', fp.read(4))[0]
+    fp.seek(offset)
+    count = struct.unpack(order + 'H', fp.read(2))[0]
+    tags = {}
+    for _ in range(count):
+        tag, type_, _, value = struct.unpack(order + 'HHI4s', fp.read(12))
+        if tag in (256, 257):
+            fmt = 'H' if type_ == 3 else 'I'
+            tags[tag] = struct.unpack(order + fmt, value[:struct.calcsize(fmt)])[0]
+    if 256 in tags and 257 in tags:
+        return tags[256], tags[257]
+    return None
+
+
+def _iter_atoms(fp, start, end):
+    """
+    Iterate the atoms between two offsets of a QuickTime file.
+
+    Args:
+        fp (file): The file.
+        start (int): The start offset.
+        end (int): The end offset.
+
+    Returns:
+        generator: The name, payload start and payload end of each atom.
+    """
+    pos = start
+    while pos + 8 <= end:
+        fp.seek(pos)
+        size, name = struct.unpack('>I4s', fp.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', fp.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield name, pos + header, min(pos + size, end)
+        pos += size
+
+
+def _iter_boxes(data):
+    """
+    Iterate the child atoms of an atom which is held in memory.
+
+    Args:
+        data (bytes): The atom payload.
+
+    Returns:
+        generator: The name and payload of each child atom.
+    """
+    pos = 0
+    while pos + 8 <= len(data):
+        size, name = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header:
+            return
+        yield name, data[pos + header:pos + size]
+        pos += size
+
+
+def _find_box(data, *path):
+    """
+    Return the payload of the first atom at the given path of child atoms.
+
+    Args:
+        data (bytes): The atom payload to search.
+        *path (bytes): The atom names.
+
+    Returns:
+        bytes: The payload or None if there is no such atom.
+    """
+    for name, payload in _iter_boxes(data):
+        if name == path[0]:
+            return payload if len(path) == 1 else _find_box(payload, *path[1:])
+    return None
+
+
+def _parse_moov(moov):
+    """
+    Parse the duration and the video track size from a moov atom.
+
+    Args:
+        moov (bytes): The moov atom payload.
+
+    Returns:
+        dict: The width, height and duration, or None if there is no video track.
+    """
+    mvhd = _find_box(moov, b'mvhd')
+    if not mvhd:
+        return None
+    if mvhd[0] == 1:
+        timescale, duration = struct.unpack_from('>IQ', mvhd, 20)
+    else:
+        timescale, duration = struct.unpack_from('>II', mvhd, 12)
+
+    for name, trak in _iter_boxes(moov):
+        if name != b'trak':
+            continue
+        hdlr = _find_box(trak, b'mdia', b'hdlr')
+        if not hdlr or hdlr[8:12] != b'vide':
+            continue
+        stsd = _find_box(trak, b'mdia', b'minf', b'stbl', b'stsd')
+        if not stsd or len(stsd) < 44:
+            continue
+        width, height = struct.unpack_from('>HH', stsd, 8 + 32)
+        return {
+            'width': width,
+            'height': height,
+            'duration': float(duration) / timescale if timescale else 0.0
+        }
+    return None
+
+
+"""
+The probe result cache shared by all processors in the container.
+"""
+probe_cache = ProbeCache()
@@ -1,14 +1,21 @@
+import base64
+import collections
+import contextlib
+import fcntl
 import glob
 import hashlib
+import json
 import logging
 import os
 import shutil
 import subprocess
 import tempfile
+import threading
 import time
 import urllib
 import uuid
-import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import flask
 from pathlib import Path
 from urllib.parse import urlparse
@@ -21,6 +28,7 @@ from boonsdk import Asset, StoredFile, AnalysisModule, \
 from .cloud import get_cached_google_storage_client, \
     get_cached_aws_client, get_cached_azure_storage_client
 from .env import BoonEnv, app_instance
+from .modelcache import ModelCache
 
 __all__ = [
     'file_storage',
@@ -41,9 +49,21 @@ class ModelStorage:
         self.app = app
         self.projects = projects
 
-        # When running within the analyst, our project specific
+        # When running within the analyst, the node's shared
         # model cache is mounted here.
-        self.root = os.environ.get("BOONAI_MODEL_CACHE", "/tmp/boonai/model-cache")
+        self.cache = ModelCache(os.environ.get("BOONAI_MODEL_CACHE", "/tmp/boonai/model-cache"))
+
+    @property
+    def root(self):
+        """
+        The model cache root directory.
+        """
+        return self.cache.root
+
+    @root.setter
+    def root(self, value):
+        self.cache.release()
+        self.cache = ModelCache(value)
 
     @staticmethod
     def get_model_file_id(model, tag):
@@ -60,24 +80,50 @@ class ModelStorage:
         file_id = getattr(model, 'file_id', None) or model
         return file_id.replace("__TAG__", tag)
 
-    def get_model_install_path(self, model, tag):
+    def get_model_cache_key(self, model, tag):
         """
-        Return the path to where the model should be installed.
+        Return the model cache key for the latest version of the model file.
 
         Args:
             model (mixed): A Model instance or model file id.
             tag (str): The Model version tag.
         Returns:
-            str: The model install path.
+            str: The model cache key.
         """
         model_file_id = self.get_model_file_id(model, tag)
-        base, ext = os.path.splitext(model_file_id)
-        base = base.replace('/', '_')
-        return os.path.join(self.root, base)
+        latest_ver = os.path.dirname(model_file_id) + self.model_ver_file
+        try:
+            with open(self.projects.localize_file(latest_ver), "rb") as fp:
+                version = fp.read().strip()
+        except Exception as e:
+            logger.warning(f"Model is unversioned {model_file_id}, {e}")
+            version = b"unversioned"
+
+        sha = hashlib.sha256()
+        sha.update(str(BoonEnv.get_project_id()).encode('utf-8'))
+        sha.update(model_file_id.encode('utf-8'))
+        sha.update(version)
+        return sha.hexdigest()
+
+    def get_model_install_path(self, model, tag):
+        """
+        Return the path the latest version of the model is installed at.
+
+        Args:
+            model (mixed): A Model instance or model file id.
+            tag (str): The Model version tag.
+        Returns:
+            str: The model install path, or None if the model is not installed.
+        """
+        key = self.get_model_cache_key(model, tag)
+        if not self.cache.contains(key):
+            return None
+        return self.cache.get(key)
 
     def install_model(self, model, tag):
         """
-        Install the given model file.
+        Install the given model file.  Models are shared by all of the containers on
+        the node and are only downloaded when the cache does not have the latest version.
 
         Args:
             model (mixed): The Model instance or the model file id.
@@ -88,20 +134,16 @@ class ModelStorage:
 
         """
         model_file_id = self.get_model_file_id(model, tag)
-        install_path = self.get_model_install_path(model, tag)
-
-        if not self.model_exists(model_file_id, tag):
-            logger.info(f'Installing model ({tag} into {install_path}')
-            model_zip = self.projects.localize_file(model_file_id)
-            os.makedirs(install_path, exist_ok=True)
+        key = self.get_model_cache_key(model_file_id, tag)
 
-            # extract all files
-            with zipfile.ZipFile(model_zip) as z:
-                z.extractall(path=install_path)
-        else:
+        install_path = self.cache.get(key)
+        if install_path:
             logger.info(f'Utilizing cached model {model_file_id}')
+            return install_path
 
-        return install_path
+        logger.info(f'Installing model {model_file_id} ({tag})')
+        model_zip = self.projects.localize_file(model_file_id)
+        return self.cache.put(key, model_zip)
 
     def model_exists(self, model, tag):
         """
@@ -113,28 +155,14 @@ class ModelStorage:
         Returns:
             bool: True if we have the latest model.
         """
-        model_file_id = self.get_model_file_id(model, tag)
-        install_path = self.get_model_install_path(model, tag)
-
-        if not os.path.exists(install_path):
-            return False
-
-        try:
-            with(open(install_path + self.model_ver_file, "r")) as fp:
-                this_version = fp.read().strip()
-
-            latest_ver = os.path.dirname(model_file_id) + self.model_ver_file
-            with open(self.projects.localize_file(latest_ver), "r") as fp:
-                latest_version = fp.read().strip()
-
-            if this_version != latest_version:
-                logger.info(f'Found new version of model {model_file_id}, {latest_ver}')
-                return False
+        return self.cache.contains(self.get_model_cache_key(model, tag))
 
-        except FileNotFoundError:
-            logger.warning(f"Model is unversioned {model_file_id}")
-
-        return True
+    def release_models(self):
+        """
+        Release the models used by this process so they can be
+        evicted from the model cache.
+        """
+        self.cache.release()
 
     def save_model(self, src_dir, model, tag, post_action):
         """
@@ -272,6 +300,12 @@ class ProjectStorage:
     Provides access to Project cloud storage.
     """
 
+    # The max number of files signed and finalized by store_files() in one request.
+    bulk_batch_size = 100
+
+    # The number of files uploaded at once by store_files().
+    bulk_upload_threads = int(os.environ.get('BOONAI_BULK_UPLOAD_THREADS', 8))
+
     def __init__(self, app, cache):
         self.app = app
         self.cache = cache
@@ -300,17 +334,15 @@ class ProjectStorage:
             "size": os.path.getsize(src_path)
         }
 
-        # To upload a file into project storage, first we get a signed upload URI.
-        # Doing it this way offloads upload IO from the Archivist to cloud storage.
-        # Additionally there is no size restriction like there would be with
-        # a multi-part upload.
-        signed = self.app.client.post("/api/v3/files/_signed_upload_uri", spec)
-        # Once we have that, we upload the file directly to the URI.
-        try:
-            self.__upload_to_signed_url(src_path, signed)
-        except Exception as e:
-            logger.debug("Failed to upload to {}".format(signed), e)
-            logger.warning("Failed to upload {}, was rejected by cloud storage".format(file_id))
+        if MultipartUploader.is_multipart(spec["size"]):
+            # Large files are uploaded in parts, which are signed individually.
+            self.__upload(src_path, spec, None)
+        else:
+            # To upload a file into project storage, first we get a signed upload URI.
+            # Doing it this way offloads upload IO from the Archivist to cloud storage.
+            signed = self.app.client.post("/api/v3/files/_signed_upload_uri", spec)
+            # Once we have that, we upload the file directly to the URI.
+            self.__upload(src_path, spec, signed)
 
         # Now that the file is in place, we add our attrs onto the file
         # This returns a StoredFile record which we can embed into the asset.
@@ -323,6 +355,121 @@ class ProjectStorage:
             self.cache.precache_file(result, path)
         return result
 
+    def store_files_by_id(self, files, precache=True):
+        """
+        Store many files using their unique file ids.  The files are signed in one
+        request, uploaded concurrently, and their attrs are set in one request, so
+        this is much faster than calling store_file_by_id() for many small files.
+
+        Args:
+            files (list): A list of (src_path, file_id, attrs) tuples, attrs may be None.
+            precache (bool): pre-cache the files into the storage cache.
+
+        Returns:
+            list: A StoredFile for each file, in the same order as the files.
+
+        """
+        results = []
+        for idx in range(0, len(files), self.bulk_batch_size):
+            results.extend(self.__store_batch(files[idx:idx + self.bulk_batch_size], precache))
+        return results
+
+    def store_files(self, files, precache=True):
+        """
+        Store many files against the project, see store_files_by_id().
+
+        Args:
+            files (list): A list of (src_path, entity, category, rename, attrs) tuples,
+                rename and attrs may be None.
+            precache (bool): pre-cache the files into the storage cache.
+
+        Returns:
+            list: A StoredFile for each file, in the same order as the files.
+
+        """
+        return self.store_files_by_id([
+            (src_path, self.__get_file_id(src_path, entity, category, rename), attrs)
+            for src_path, entity, category, rename, attrs in files], precache)
+
+    def __store_batch(self, files, precache):
+        """
+        Store a batch of files, see store_files_by_id().
+        """
+        specs = []
+        for src_path, file_id, attrs in files:
+            entity, entity_id, category, name = file_id.split("/", 3)
+            specs.append({
+                "entity": entity,
+                "entityId": entity_id,
+                "category": category,
+                "name": name,
+                "attrs": attrs or {},
+                "size": os.path.getsize(src_path)
+            })
+
+        # Large files are still uploaded in parts, which are signed individually.
+        small = [idx for idx, spec in enumerate(specs)
+                 if not MultipartUploader.is_multipart(spec["size"])]
+        signed = [None] * len(specs)
+        if small:
+            uris = self.app.client.post("/api/v3/files/_batch_signed_upload_uri",
+                                        [specs[idx] for idx in small])
+            for idx, uri in zip(small, uris):
+                signed[idx] = uri
+
+        with ThreadPoolExecutor(max_workers=self.bulk_upload_threads) as pool:
+            list(pool.map(self.__upload, [f[0] for f in files], specs, signed))
+
+        results = [StoredFile(result) for result in
+                   self.app.client.put("/api/v3/files/_batch_attrs", specs)]
+        if precache:
+            for result, (src_path, _, _) in zip(results, files):
+                self.cache.precache_file(result, urlparse(str(src_path)).path)
+        return results
+
+    def __upload(self, src_path, spec, signed):
+        """
+        Upload a file to cloud storage.  A failed upload to a signed URL is
+        logged as a warning, but a failed multipart upload is raised once its
+        parts have been retried, so the caller can retry and resume it.
+
+        Args:
+            src_path (str): The path to the source file.
+            spec (dict): The file spec.
+            signed (dict): The signed upload URI, or None to upload the file in parts.
+
+        Raises:
+            StorageException: If a multipart upload fails.
+
+        """
+        file_id = "{}/{}/{}/{}".format(
+            spec["entity"], spec["entityId"], spec["category"], spec["name"])
+        if signed is None:
+            try:
+                MultipartUploader(self.app, src_path, spec).upload()
+            except Exception as e:
+                raise StorageException(
+                    "Failed to upload {} in parts, {}".format(file_id, e)) from e
+            return
+
+        try:
+            self.__upload_to_signed_url(src_path, signed)
+        except Exception as e:
+            logger.debug("Failed to upload to {}, {}".format(signed, e))
+            logger.warning("Failed to upload {}, was rejected by cloud storage".format(file_id))
+
+    @staticmethod
+    def __get_file_id(src_path, entity, category, rename):
+        """
+        Return the file id of a file stored against an entity.
+        """
+        return "/".join((
+            entity.__class__.__name__.upper() + "S",
+            entity.id,
+            category,
+            rename or Path(src_path).name
+        ))
+
     @backoff.on_exception(backoff.expo, requests.exceptions.HTTPError, max_time=300)
     def __upload_to_signed_url(self, src_path, signed):
         size = os.path.getsize(src_path)
@@ -350,12 +497,7 @@ class ProjectStorage:
             StoredFile: A record for the stored file.
 
         """
-        fid = "/".join((
-            entity.__class__.__name__.upper() + "S",
-            entity.id,
-            category,
-            rename or Path(src_path).name
-        ))
+        fid = self.__get_file_id(src_path, entity, category, rename)
         return self.store_file_by_id(src_path, fid, attrs=attrs, precache=precache)
 
     def store_blob(self, src_blob, entity, category, name, attrs=None):
@@ -424,14 +566,11 @@ class ProjectStorage:
         _, suffix = os.path.splitext(file_id)
         cache_path = self.cache.get_path(file_id, suffix)
 
-        if not os.path.exists(cache_path):
-            try:
-                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-            except Exception as e:
-                logger.warning(f"Failed to create cache path dir: {cache_path}", e)
+        def download(path):
             logger.info("localizing file: {}".format(file_id))
-            self.app.client.stream('/api/v3/files/_stream/{}'.format(file_id), cache_path)
-        return cache_path
+            self.app.client.stream('/api/v3/files/_stream/{}'.format(file_id), path)
+
+        return self.cache.fetch(cache_path, download)
 
     def get_native_uri(self, stored_file):
         """
@@ -486,6 +625,302 @@ class ProjectStorage:
         return self.app.client.get(f"/api/v3/files/_locate/{entity_type}/{entity_id}")
 
 
+class RangedDownloader:
+    """
+    Downloads a large file as chunks fetched in parallel by byte range.  Each
+    chunk is written straight to its offset in the destination file, so memory
+    use is bounded by the number of threads rather than the file size.  A chunk
+    which fails is retried from the last byte written, and the MD5 of the whole
+    file is verified if the source provides one.
+
+    Attributes:
+        size (int): The size of the file in bytes.
+        read_range (func): A function which takes the first and last byte of a
+            range and returns an iterable of bytes blocks.
+        md5 (str): The expected hex MD5 of the file, if known.
+        name (str): A name for the file used in log messages.
+
+    """
+
+    # The size of each ranged request.
+    chunk_size = int(os.environ.get('BOONAI_DOWNLOAD_CHUNK_MB', 16)) * 1024 * 1024
+
+    # The number of chunks downloaded at once.
+    threads = int(os.environ.get('BOONAI_DOWNLOAD_THREADS', 8))
+
+    # Files smaller than this are downloaded with a single request.
+    min_size = int(os.environ.get('BOONAI_RANGED_DOWNLOAD_MIN_MB', 64)) * 1024 * 1024
+
+    # The number of times to try a chunk before giving up.
+    max_tries = 5
+
+    def __init__(self, size, read_range, md5=None, name=None):
+        self.size = size
+        self.read_range = read_range
+        self.md5 = md5
+        self.name = name
+
+    @classmethod
+    def is_ranged(cls, size):
+        """
+        Return True if a file of the given size should be downloaded in chunks.
+
+        Args:
+            size (int): The file size in bytes, or None if it's unknown.
+
+        Returns:
+            bool: True if the file should be downloaded in chunks.
+        """
+        return bool(size) and size >= cls.min_size
+
+    def download(self, path):
+        """
+        Download the file to the given path.
+
+        Args:
+            path (str): The destination path.
+
+        """
+        with open(path, 'wb') as fp:
+            fp.truncate(self.size)
+
+        chunks = [(start, min(start + self.chunk_size, self.size) - 1)
+                  for start in range(0, self.size, self.chunk_size)]
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            with ThreadPoolExecutor(max_workers=self.threads) as pool:
+                futures = [pool.submit(self.__download_chunk, fd, start, end)
+                           for start, end in chunks]
+                try:
+                    for done, future in enumerate(as_completed(futures), 1):
+                        future.result()
+                        logger.debug('Downloaded chunk {}/{} of {}'.format(
+                            done, len(chunks), self.name))
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            os.close(fd)
+
+        if self.md5:
+            checksum = get_md5(path)
+            if checksum != self.md5:
+                raise StorageException('Checksum mismatch downloading {}, {} != {}'.format(
+                    self.name, checksum, self.md5))
+
+    def __download_chunk(self, fd, start, end):
+        """
+        Download a byte range to the same range of the file, resuming from
+        the last byte written if the download fails.
+
+        Args:
+            fd (int): The destination file descriptor.
+            start (int): The first byte of the range.
+            end (int): The last byte of the range.
+
+        """
+        offset = start
+        for attempt in range(1, self.max_tries + 1):
+            try:
+                for block in self.read_range(offset, end):
+                    os.pwrite(fd, block, offset)
+                    offset += len(block)
+                if offset <= end:
+                    raise IOError('Range {}-{} ended at {}'.format(start, end, offset))
+                return
+            except Exception as e:
+                if attempt == self.max_tries:
+                    raise
+                logger.warning('Retrying chunk {}-{} of {} at {}, {}'.format(
+                    start, end, self.name, offset, e))
+                time.sleep(min(2 ** attempt, 30))
+
+
+class MultipartUploader:
+    """
+    Uploads a large file to project storage in parts, which are PUT to their
+    signed URLs in parallel.  Each part is streamed from its range of the file,
+    so memory use is bounded by the number of threads rather than the file size.
+
+    A part which fails is retried on its own.  The parts which were uploaded
+    are recorded in a state file, so if the upload fails part way, storing the
+    same file again resumes the upload rather than starting over.
+
+    Attributes:
+        app (BoonApp): The BoonApp used to sign the parts.
+        src_path (str): The path to the file.
+        spec (dict): The file spec, with the entity, entityId, category and name.
+
+    """
+
+    # The size of each part, S3 requires at least 5MB.
+    part_size = max(int(os.environ.get('BOONAI_UPLOAD_PART_MB', 16)), 5) * 1024 * 1024
+
+    # The number of parts uploaded at once.
+    threads = int(os.environ.get('BOONAI_UPLOAD_THREADS', 4))
+
+    # Files smaller than this are uploaded with a single request.
+    min_size = int(os.environ.get('BOONAI_MULTIPART_UPLOAD_MIN_MB', 64)) * 1024 * 1024
+
+    # The directory the state of unfinished uploads is kept in.
+    state_dir = os.environ.get('BOONAI_UPLOAD_STATE_DIR', '/tmp/boonai-uploads')
+
+    # Seconds before the state of an unfinished upload is discarded.
+    max_state_age = 86400
+
+    def __init__(self, app, src_path, spec):
+        self.app = app
+        self.src_path = src_path
+        self.spec = spec
+
+    @classmethod
+    def is_multipart(cls, size):
+        """
+        Return True if a file of the given size should be uploaded in parts.
+
+        Args:
+            size (int): The file size in bytes.
+
+        Returns:
+            bool: True if the file should be uploaded in parts.
+        """
+        return size >= cls.min_size
+
+    def upload(self):
+        """
+        Upload the file, resuming a previous upload of it if there is one.
+        """
+        size = os.path.getsize(self.src_path)
+        locator = {k: self.spec[k] for k in ('entity', 'entityId', 'category', 'name')}
+        state = self.__load_state()
+
+        req = dict(locator)
+        req['parts'] = (size + self.part_size - 1) // self.part_size
+        req['uploadId'] = state.get('uploadId')
+        signed = self.app.client.post('/api/v3/files/_signed_multipart_upload_uris', req)
+
+        if signed['uploadId'] != state.get('uploadId'):
+            state = {'uploadId': signed['uploadId'], 'time': time.time(), 'etags': {}}
+            self.__save_state(state)
+        etags = state['etags']
+        parts = [part for part in signed['parts'] if str(part['partNumber']) not in etags]
+        if len(parts) < len(signed['parts']):
+            logger.info('Resuming upload of {}, {} of {} parts remain'.format(
+                self.spec['name'], len(parts), len(signed['parts'])))
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            futures = {pool.submit(self.__upload_part, part['uri'], part['partNumber'], size):
+                       part['partNumber'] for part in parts}
+            error = None
+            for future in as_completed(futures):
+                try:
+                    etags[str(futures[future])] = future.result()
+                except Exception as e:
+                    # Parts which are in flight are still recorded, so they can be skipped.
+                    if not error:
+                        error = e
+                        for pending in futures:
+                            pending.cancel()
+                    continue
+                self.__save_state(state)
+                logger.debug('Uploaded part {}/{} of {}'.format(
+                    len(etags), len(signed['parts']), self.spec['name']))
+            if error:
+                raise error
+
+        req = dict(locator)
+        req['uploadId'] = signed['uploadId']
+        req['parts'] = [{'partNumber': int(num), 'etag': etag}
+                        for num, etag in sorted(etags.items(), key=lambda e: int(e[0]))]
+        self.app.client.post('/api/v3/files/_complete_multipart_upload', req)
+        os.unlink(self.__get_state_path())
+
+    @backoff.on_exception(backoff.expo, requests.exceptions.RequestException, max_time=300)
+    def __upload_part(self, uri, number, size):
+        """
+        Upload a part of the file to its signed URL.
+
+        Args:
+            uri (str): The signed URL.
+            number (int): The part number, starting from 1.
+            size (int): The size of the file.
+
+        Returns:
+            str: The ETag of the part.
+        """
+        start = (number - 1) * self.part_size
+        length = min(self.part_size, size - start)
+        with open(self.src_path, 'rb') as fp:
+            response = requests.put(uri,
+                                    headers={"Content-Length": str(length)},
+                                    data=FileRange(fp, start, length))
+            response.raise_for_status()
+        return response.headers.get('ETag')
+
+    def __get_state_path(self):
+        """
+        Return the path of the state file, which is unique to the destination
+        and the size and modified time of the source file.
+        """
+        stat = os.stat(self.src_path)
+        key = '{entity}/{entityId}/{category}/{name}'.format(**self.spec)
+        sha = hashlib.sha1('{}:{}:{}'.format(key, stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+        return os.path.join(self.state_dir, sha.hexdigest() + '.json')
+
+    def __load_state(self):
+        """
+        Load the state of an unfinished upload of the file.
+
+        Returns:
+            dict: The state, empty if there is no unfinished upload.
+        """
+        try:
+            with open(self.__get_state_path()) as fp:
+                state = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        if time.time() - state.get('time', 0) > self.max_state_age:
+            return {}
+        return state
+
+    def __save_state(self, state):
+        """
+        Write the state of the upload.
+
+        Args:
+            state (dict): The upload Id and the ETags of the uploaded parts.
+
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self.__get_state_path()
+        with open(path + '.tmp', 'w') as fp:
+            json.dump(state, fp)
+        os.replace(path + '.tmp', path)
+
+
+class FileRange:
+    """
+    A read only file-like view of a range of an open file.
+    """
+
+    def __init__(self, fp, start, length):
+        self.fp = fp
+        self.remaining = length
+        self.length = length
+        fp.seek(start)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fp.read(size)
+        self.remaining -= len(data)
+        return data
+
+
 class FileCache:
     """
     The LocalFileCache provides a temporary place for storing source and
@@ -504,12 +939,30 @@ class FileCache:
     List of supported URI schemas.
     """
 
-    def __init__(self, app):
+    # The max size of the files in the cache in MB.
+    default_max_size_mb = int(os.environ.get('BOONAI_FILE_CACHE_SIZE_MB', 10240))
+
+    def __init__(self, app, max_size_mb=None):
         """
         Create a new LocalFileCache instance.
+
+        Args:
+            app (BoonApp): The BoonApp used to download Boon AI files.
+            max_size_mb (int): The size budget of the cache in MB.
         """
         self.root = None
         self.app = app
+        self.max_size_mb = max_size_mb or self.default_max_size_mb
+
+        # Maps a cached path to its size, least recently used first.
+        self.entries = collections.OrderedDict()
+        self.pins = collections.Counter()
+        self.key_locks = {}
+        self.lock = threading.Lock()
+        # The pin scopes of each thread.
+        self.local = threading.local()
+        self.counters = {}
+        self.reset_stats()
 
     def __init_root(self):
         """
@@ -553,6 +1006,7 @@ class FileCache:
             shutil.copy(urlparse(precache_path).path, cache_path)
 
         logger.debug(f'Pre-caching {src_path}, linked: {symlinked}')
+        self.__add_entry(cache_path, os.path.getsize(cache_path))
         return cache_path
 
     def localize_uri(self, uri):
@@ -566,14 +1020,33 @@ class FileCache:
             str: The path within the local file cache.
 
         """
+        parsed_uri = urlparse(uri)
+
+        # File URIs and local paths are not cached.
+        if parsed_uri.scheme == 'file':
+            return parsed_uri.path
+        elif parsed_uri.scheme == '' and parsed_uri.path.startswith("/"):
+            return parsed_uri.path
+        elif parsed_uri.scheme not in ('http', 'https', 'boonai', 'gs', 's3', 'azure'):
+            raise StorageException('Invalid URI, unsupported scheme: {}'.format(parsed_uri))
+
         _, ext = os.path.splitext(uri)
         path = self.get_path(str(uri), ext)
-        parsed_uri = urlparse(uri)
+        return self.fetch(path, lambda dst: self.__download_uri(uri, dst))
 
-        if os.path.exists(path) and os.path.getsize(path) > 0:
-            return path
+    def __download_uri(self, uri, path):
+        """
+        Download the given URI to a path.  Large files are downloaded
+        in parallel chunks if the source supports byte ranges.
+
+        Args:
+            uri (str): A supported remote data URI.
+            path (str): The destination path.
 
+        """
         logger.info('Localizing URI: {}'.format(uri))
+        parsed_uri = urlparse(uri)
+
         # Remote HTTP/HTTPS Files
         if parsed_uri.scheme in ('http', 'https'):
             if uri.startswith('https://www.youtube.com/watch'):
@@ -583,13 +1056,23 @@ class FileCache:
                      '-f', 'mp4',
                      '--output', str(path),
                      f'https://www.youtube.com/watch?v={fname}'], shell=False)
+                return
+
+            rsp = requests.head(uri, allow_redirects=True, timeout=30)
+            size = int(rsp.headers.get('Content-Length', 0)) if rsp.ok else 0
+            if rsp.headers.get('Accept-Ranges') == 'bytes' and RangedDownloader.is_ranged(size):
+                def read_range(start, end):
+                    rsp = requests.get(uri, headers={'Range': f'bytes={start}-{end}'},
+                                       stream=True, timeout=60)
+                    rsp.raise_for_status()
+                    return rsp.iter_content(1024 * 1024)
+
+                md5 = rsp.headers.get('Content-MD5')
+                md5 = base64.b64decode(md5).hex() if md5 else None
+                RangedDownloader(size, read_range, md5, uri).download(path)
             else:
                 urllib.request.urlretrieve(uri, filename=str(path))
 
-        # File URIs
-        elif parsed_uri.scheme == 'file':
-            return parsed_uri.path
-
         # Boon AI ML storage
         elif parsed_uri.scheme == 'boonai':
             file_id = parsed_uri.netloc + parsed_uri.path
@@ -601,13 +1084,34 @@ class FileCache:
             gcs_client = get_cached_google_storage_client()
             bucket = gcs_client.get_bucket(parsed_uri.netloc)
             blob = bucket.blob(parsed_uri.path[1:])
-            blob.download_to_filename(path)
+            blob.reload()
+            if RangedDownloader.is_ranged(blob.size):
+                md5 = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else None
+                RangedDownloader(
+                    blob.size,
+                    lambda start, end: [blob.download_as_bytes(start=start, end=end)],
+                    md5, uri).download(path)
+            else:
+                blob.download_to_filename(path)
 
         # S3 buckets
         elif parsed_uri.scheme == 's3':
             # Using cache, client is slow to connect
             s3_client = get_cached_aws_client('s3')
-            s3_client.download_file(parsed_uri.netloc, parsed_uri.path[1:], path)
+            bucket, key = parsed_uri.netloc, parsed_uri.path[1:]
+            head = s3_client.head_object(Bucket=bucket, Key=key)
+            if RangedDownloader.is_ranged(head['ContentLength']):
+                def read_range(start, end):
+                    obj = s3_client.get_object(Bucket=bucket, Key=key,
+                                               Range=f'bytes={start}-{end}')
+                    return obj['Body'].iter_chunks(1024 * 1024)
+
+                # The ETag of a multipart upload is not an MD5.
+                etag = head.get('ETag', '').strip('"')
+                md5 = etag if etag and '-' not in etag else None
+                RangedDownloader(head['ContentLength'], read_range, md5, uri).download(path)
+            else:
+                s3_client.download_file(bucket, key, path)
 
         # Azure buckets
         elif parsed_uri.scheme == 'azure':
@@ -615,15 +1119,218 @@ class FileCache:
             azure_client = get_cached_azure_storage_client()
             container = azure_client.get_container_client(parsed_uri.netloc)
             blob = container.get_blob_client(parsed_uri.path[1:])
-            with open(path, "wb") as fp:
-                fp.write(blob.download_blob().readall())
+            props = blob.get_blob_properties()
+            if RangedDownloader.is_ranged(props.size):
+                md5 = props.content_settings.content_md5
+                RangedDownloader(
+                    props.size,
+                    lambda start, end: blob.download_blob(
+                        offset=start, length=end - start + 1).chunks(),
+                    bytes(md5).hex() if md5 else None, uri).download(path)
+            else:
+                with open(path, "wb") as fp:
+                    blob.download_blob().readinto(fp)
 
-        elif parsed_uri.scheme == '' and parsed_uri.path.startswith("/"):
-            path = parsed_uri.path
-        else:
-            raise StorageException('Invalid URI, unsupported scheme: {}'.format(parsed_uri))
+    def fetch(self, path, download):
+        """
+        Return the given cache path, calling the download function to create
+        the file if it's not cached.  Concurrent callers asking for the same
+        path, in this process or another one sharing the cache directory, wait
+        for a single download.  The file is downloaded to a temp file which
+        is renamed into place, so a partial file is never visible.
+
+        Args:
+            path (str): A path from get_path().
+            download (func): A function which downloads the file to the path it's given.
+
+        Returns:
+            str: The path.
+        """
+        if self.__is_cached(path):
+            self.__add_entry(path, os.path.getsize(path), hit=True)
+            return path
+
+        with self.__lock_key(path):
+            # Another caller may have downloaded the file while we waited.
+            if self.__is_cached(path):
+                self.__add_entry(path, os.path.getsize(path), hit=True)
+                return path
+
+            tmp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+            try:
+                download(tmp_path)
+                if os.path.exists(tmp_path):
+                    os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            with self.lock:
+                self.counters['misses'] += 1
+                self.counters['downloaded_bytes'] += size
+            self.__add_entry(path, size)
         return path
 
+    def pin(self, path):
+        """
+        Keep a cached file from being evicted until it's unpinned.  Pins
+        are counted, so each call to pin() needs a call to unpin().
+
+        Args:
+            path (str): A path within the cache.
+
+        """
+        with self.lock:
+            self.pins[path] += 1
+
+    def unpin(self, path):
+        """
+        Allow a pinned file to be evicted once it has no other pins.
+
+        Args:
+            path (str): A path within the cache.
+
+        """
+        with self.lock:
+            self.pins[path] -= 1
+            if self.pins[path] <= 0:
+                del self.pins[path]
+
+    @contextlib.contextmanager
+    def pinned(self, path):
+        """
+        A context manager which pins a cached file while it's in use.
+
+        Args:
+            path (str): A path within the cache.
+
+        """
+        self.pin(path)
+        try:
+            yield path
+        finally:
+            self.unpin(path)
+
+    @contextlib.contextmanager
+    def pin_scope(self):
+        """
+        A context manager which pins every file the current thread fetches or
+        precaches until it exits, so a file localized for a frame can't be
+        evicted by another thread while the frame is still being processed.
+        Scopes can be nested.
+
+        """
+        scopes = getattr(self.local, 'scopes', None)
+        if scopes is None:
+            scopes = self.local.scopes = []
+        paths = []
+        scopes.append(paths)
+        try:
+            yield
+        finally:
+            scopes.pop()
+            for path in paths:
+                self.unpin(path)
+
+    def get_stats(self):
+        """
+        Return the cache hit and miss counters along with the current size.
+
+        Returns:
+            dict: The cache stats.
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats['size'] = sum(self.entries.values())
+            stats['entries'] = len(self.entries)
+        return stats
+
+    def reset_stats(self):
+        """
+        Reset the cache hit and miss counters to zero.
+        """
+        with self.lock:
+            self.counters = {
+                'hits': 0,
+                'misses': 0,
+                'evictions': 0,
+                'downloaded_bytes': 0
+            }
+
+    def __is_cached(self, path):
+        """
+        Return True if there is a non-empty file at the given path.
+        """
+        return os.path.exists(path) and os.path.getsize(path) > 0
+
+    @contextlib.contextmanager
+    def __lock_key(self, path):
+        """
+        A context manager which holds a lock on a cache path, first between
+        the threads in this process and then between processes.
+
+        Args:
+            path (str): A path within the cache.
+
+        """
+        with self.lock:
+            key_lock = self.key_locks.setdefault(path, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                with open(path + '.lock', 'a') as fp:
+                    fcntl.flock(fp, fcntl.LOCK_EX)
+                    yield
+        finally:
+            with self.lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self.key_locks[path]
+
+    def __add_entry(self, path, size, hit=False):
+        """
+        Mark a cached file as the most recently used, then evict the least
+        recently used files which are not pinned until the cache is within
+        its size budget.
+
+        Args:
+            path (str): A path within the cache.
+            size (int): The size of the file.
+            hit (bool): True if the file was already cached.
+
+        """
+        budget = self.max_size_mb * 1024 * 1024
+        evicted = []
+        scopes = getattr(self.local, 'scopes', None)
+        with self.lock:
+            if hit:
+                self.counters['hits'] += 1
+            if scopes:
+                self.pins[path] += 1
+                scopes[-1].append(path)
+            self.entries.pop(path, None)
+            self.entries[path] = size
+            total = sum(self.entries.values())
+
+            for lru_path, lru_size in list(self.entries.items()):
+                if total <= budget:
+                    break
+                if lru_path == path or lru_path in self.pins or lru_path in self.key_locks:
+                    continue
+                del self.entries[lru_path]
+                total -= lru_size
+                evicted.append(lru_path)
+            self.counters['evictions'] += len(evicted)
+
+        for lru_path in evicted:
+            logger.debug('Evicting {} from the file cache'.format(lru_path))
+            for evicted_path in (lru_path, lru_path + '.lock'):
+                try:
+                    os.unlink(evicted_path)
+                except OSError:
+                    pass
+
     def get_path(self, key, suffix=""):
         """
         Get the local path for the give cache key.
@@ -654,6 +1361,7 @@ class FileCache:
         filename = sha.hexdigest()
 
         if request_id:
+            os.makedirs(os.path.join(self.root, request_id), exist_ok=True)
             parts = [self.root, request_id, filename + suffix]
         else:
             parts = [self.root, filename + suffix]
@@ -671,6 +1379,19 @@ class FileCache:
         files = glob.glob('{}/*'.format(self.root))
         for f in files:
             os.remove(f)
+        with self.lock:
+            self.entries.clear()
+
+    def reset(self):
+        """
+        Forget the cache root so it is rebuilt for the current task
+        the next time the cache is used.
+
+        """
+        self.root = None
+        with self.lock:
+            self.entries.clear()
+        self.reset_stats()
 
     def clear_request_cache(self):
         """
@@ -746,6 +1467,23 @@ class FileStorage:
                 f'cannot localize file {rep} unable to determine the remote file source')
 
 
+def get_md5(path):
+    """
+    Return the MD5 of a file, read in blocks.
+
+    Args:
+        path (str): The file path.
+
+    Returns:
+        str: The hex MD5.
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1024 * 1024), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
 class StorageException(BoonSdkException):
     """
     This exception is thrown if there are problems with storing or retrieving a file.
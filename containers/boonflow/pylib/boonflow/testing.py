@@ -12,6 +12,7 @@ from urllib.parse import urlparse
 import requests
 
 from boonsdk import FileImport, Asset, StoredFile
+from boonsdk.util import BoonSdkJsonEncoder
 from boonflow.base import Context, AssetProcessor, Generator, Argument, \
     FatalProcessorException, ProcessorException
 
@@ -172,7 +173,7 @@ class TestEventEmitter(object):
         """
         self.events.append(event)
         logger.debug("Event type='%s'" % event.get("type"))
-        logger.debug(json.dumps(event, sort_keys=True, indent=4))
+        logger.debug(json.dumps(event, sort_keys=True, indent=4, cls=BoonSdkJsonEncoder))
 
     def clear(self):
         """
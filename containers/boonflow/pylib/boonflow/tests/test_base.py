@@ -72,3 +72,12 @@ class TestBaseClasses(TestCase):
 
         res = json.loads(to_json(rsp))
         assert res['analysis']['cats']
+
+    def test_process_batch(self):
+        processor = testing.TestProcessor()
+        processor.set_context(base.Context(None, {"sleep": 0, "raise": True}))
+        frames = [base.Frame(testing.TestAsset("/foo/bar{}.jpg".format(i))) for i in range(2)]
+
+        results = processor.process_batch(frames)
+        assert len(results) == 2
+        assert all(isinstance(r, base.ProcessorException) for r in results)
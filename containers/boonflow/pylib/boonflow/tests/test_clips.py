@@ -55,3 +55,42 @@ class TestClipTracker(TestCase):
         assert 1.0 == tl.tracks['dog']['clips'][0]['score']
         assert 1.0 == tl.tracks['cat']['clips'][0]['score']
         assert 1.0 == tl.tracks['cow']['clips'][0]['score']
+
+    def test_timeline_before_build(self):
+        c = ClipTracker(TestAsset(), 'pets')
+        c.append(1, {'dog': 0.5, 'cat': 0.9})
+        c.append(2, {'dog': 0.7})
+        assert 'dog' not in c.timeline.tracks
+        assert [(1, 2, 0.9)] == [(clip['start'], clip['stop'], clip['score'])
+                                 for clip in c.timeline.tracks['cat']['clips']]
+
+        tl = c.build_timeline(3)
+        clip = tl.tracks['dog']['clips'][0]
+        assert (1, 3, 0.7) == (clip['start'], clip['stop'], clip['score'])
+
+    def test_build_timeline_bbox(self):
+        c = ClipTracker(TestAsset(), 'faces')
+        c.append_predictions(1, [Prediction('bob', 0.5, bbox=[0, 0, 1, 1])])
+        c.append_predictions(2, [Prediction('bob', 0.6, bbox=[0.5, 0.5, 1, 1])])
+        tl = c.build_timeline(3)
+        assert [0, 0, 1, 1] == tl.tracks['bob']['clips'][0]['bbox']
+
+    def test_build_timeline_min_score(self):
+        c = ClipTracker(TestAsset(), 'pets', min_score=0.5)
+        c.append(1, {'dog': 0.9})
+        c.append(2, {'dog': 0.2})
+        c.append(3, {'dog': 0.8})
+
+        tl = c.build_timeline(4)
+        clips = [(clip['start'], clip['stop'], clip['score'])
+                 for clip in tl.tracks['dog']['clips']]
+        assert [(1, 2, 0.9), (3, 4, 0.8)] == clips
+
+    def test_build_timeline_max_gap(self):
+        c = ClipTracker(TestAsset(), 'pets', max_gap=1)
+        for time, labels in enumerate([['dog'], [], ['dog'], [], [], [], ['dog']]):
+            c.append(time, labels)
+
+        tl = c.build_timeline(7)
+        clips = [(clip['start'], clip['stop']) for clip in tl.tracks['dog']['clips']]
+        assert [(0, 3), (6, 7)] == clips
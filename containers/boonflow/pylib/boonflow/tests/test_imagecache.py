@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+
+from boonflow import imagecache
+from boonflow.imagecache import ImageCache
+
+
+class ImageCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ImageCache(max_mb=1)
+        fd, self.path = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        image = np.zeros((100, 200, 3), dtype=np.uint8)
+        image[:, :, 2] = 255
+        cv2.imwrite(self.path, image)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_get_image_decodes_once(self):
+        with patch.object(imagecache.cv2, 'imread', wraps=cv2.imread) as imread_patch:
+            bgr = self.cache.get_image(self.path, 'BGR')
+            rgb = self.cache.get_image(self.path)
+            assert self.cache.get_image(self.path) is rgb
+            assert imread_patch.call_count == 1
+
+        assert bgr.shape == (100, 200, 3)
+        assert list(bgr[0, 0]) == [0, 0, 255]
+        assert list(rgb[0, 0]) == [255, 0, 0]
+        assert not rgb.flags.writeable
+        assert self.cache.get_image(self.path, 'GRAY').shape == (100, 200)
+
+    def test_get_image_resized_and_normalized(self):
+        resized = self.cache.get_image(self.path, size=(50, 25))
+        assert resized.shape == (25, 50, 3)
+
+        norm = self.cache.get_image(self.path, size=(50, 25), mean=(0.5, 0.5, 0.5),
+                                    std=(0.5, 0.5, 0.5))
+        assert norm.dtype == np.float32
+        np.testing.assert_allclose(norm[0, 0], [1.0, -1.0, -1.0])
+        assert self.cache.get_image(self.path, size=(50, 25), mean=(0.5, 0.5, 0.5),
+                                    std=(0.5, 0.5, 0.5)) is norm
+
+        stats = self.cache.get_stats()
+        assert stats['entries'] == 4
+        assert stats['hits'] == 2
+
+    def test_get_image_single_flight(self):
+        imread = cv2.imread
+        with patch.object(imagecache.cv2, 'imread',
+                          side_effect=lambda *a: time.sleep(0.1) or imread(*a)) as imread_patch:
+            with ThreadPoolExecutor(4) as pool:
+                results = list(pool.map(lambda _: self.cache.get_image(self.path, 'BGR'),
+                                        range(4)))
+        assert imread_patch.call_count == 1
+        assert all(result is results[0] for result in results)
+
+    def test_get_image_file_changed(self):
+        rgb = self.cache.get_image(self.path)
+        cv2.imwrite(self.path, np.zeros((10, 10, 3), dtype=np.uint8))
+        os.utime(self.path, (time.time() + 10, time.time() + 10))
+        assert self.cache.get_image(self.path) is not rgb
+        assert self.cache.get_image(self.path).shape == (10, 10, 3)
+
+    def test_evicts_lru(self):
+        self.cache.max_bytes = 100 * 200 * 3 * 2
+        self.cache.get_image(self.path, 'BGR')
+        self.cache.get_image(self.path, 'RGB')
+        self.cache.get_image(self.path, 'GRAY')
+        stats = self.cache.get_stats()
+        assert stats['evictions'] == 1
+        assert stats['size'] <= self.cache.max_bytes
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            self.cache.get_image(self.path, 'CMYK')
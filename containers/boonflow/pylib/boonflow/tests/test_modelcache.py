@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import TestCase
+
+from boonflow.modelcache import ModelCache
+
+
+def make_model_zip(name, size=1024):
+    """
+    Create a model zip with a single file of the given size.
+    """
+    path = os.path.join(tempfile.mkdtemp(), name + '.zip')
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr(name + '.dat', os.urandom(size))
+    return path
+
+
+class ModelCacheTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ModelCache(self.root, max_size_mb=1)
+
+    def tearDown(self):
+        self.cache.release()
+        shutil.rmtree(self.root)
+
+    def test_put_and_get(self):
+        assert self.cache.get('key1') is None
+        assert not self.cache.contains('key1')
+
+        path = self.cache.put('key1', make_model_zip('model1'))
+        assert os.path.exists(os.path.join(path, 'model1.dat'))
+        assert self.cache.contains('key1')
+        assert self.cache.get('key1') == path
+
+    def test_put_same_content(self):
+        zip_path = make_model_zip('model1')
+        path1 = self.cache.put('key1', zip_path)
+        path2 = self.cache.put('key2', zip_path)
+        assert path1 == path2
+        assert path1.endswith(ModelCache.checksum(zip_path))
+
+    def test_get_shared_by_caches(self):
+        path = self.cache.put('key1', make_model_zip('model1'))
+        other = ModelCache(self.root)
+        try:
+            assert other.get('key1') == path
+        finally:
+            other.release()
+
+    def test_evict_lru(self):
+        path1 = self.cache.put('key1', make_model_zip('model1', 400 * 1024))
+        path2 = self.cache.put('key2', make_model_zip('model2', 400 * 1024))
+        os.utime(path1 + '.lock', (1, 1))
+        self.cache.release()
+
+        path3 = self.cache.put('key3', make_model_zip('model3', 400 * 1024))
+        assert not os.path.exists(path1)
+        assert os.path.exists(path2)
+        assert os.path.exists(path3)
+        assert self.cache.get('key1') is None
+
+    def test_evict_skips_models_in_use(self):
+        path1 = self.cache.put('key1', make_model_zip('model1', 600 * 1024))
+
+        # Another process is using model1.
+        other = ModelCache(self.root, max_size_mb=1)
+        try:
+            path2 = other.put('key2', make_model_zip('model2', 600 * 1024))
+            assert os.path.exists(path1)
+            assert os.path.exists(path2)
+
+            self.cache.release()
+            assert other.evict() == 1
+            assert not os.path.exists(path1)
+        finally:
+            other.release()
+
+    def test_evict_stale_install(self):
+        models_dir = os.path.join(self.root, 'models')
+        stale = os.path.join(models_dir, 'abc.tmp-123')
+        os.makedirs(stale)
+        os.utime(stale, (1, 1))
+        self.cache.evict()
+        assert not os.path.exists(stale)
@@ -0,0 +1,97 @@
+import os
+import struct
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from PIL import Image
+
+from boonflow.probe import ProbeCache, read_image_size, read_movie_info
+
+
+def atom(name, payload):
+    return struct.pack('>I4s', len(payload) + 8, name) + payload
+
+
+def make_movie(width, height, timescale, duration):
+    mvhd = struct.pack('>I8xII', 0, timescale, duration) + bytes(80)
+    hdlr = bytes(8) + b'vide' + bytes(12)
+    entry = b'avc1' + bytes(6) + struct.pack('>H', 1) + bytes(16) + \
+        struct.pack('>HH', width, height) + bytes(50)
+    stsd = struct.pack('>II', 0, 1) + struct.pack('>I', len(entry) + 4) + entry
+    stbl = atom(b'stbl', atom(b'stsd', stsd))
+    mdia = atom(b'mdia', atom(b'hdlr', hdlr) + atom(b'minf', stbl))
+    moov = atom(b'moov', atom(b'mvhd', mvhd) + atom(b'trak', mdia))
+    return atom(b'ftyp', b'isom' + bytes(4)) + atom(b'mdat', bytes(64)) + moov
+
+
+class ProbeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def get_path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def test_read_image_size(self):
+        for fmt in ('jpeg', 'png', 'tiff'):
+            path = self.get_path('image.{}'.format(fmt))
+            Image.new('RGB', (320, 240)).save(path, format=fmt)
+            assert read_image_size(path) == (320, 240)
+
+    def test_read_image_size_unsupported(self):
+        path = self.get_path('image.bmp')
+        Image.new('RGB', (32, 24)).save(path, format='bmp')
+        assert read_image_size(path) is None
+
+    def test_read_movie_info(self):
+        path = self.get_path('movie.mp4')
+        with open(path, 'wb') as fp:
+            fp.write(make_movie(450, 360, 1000, 144450))
+
+        info = read_movie_info(path)
+        assert info == {'width': 450, 'height': 360, 'duration': 144.45}
+
+    def test_read_movie_info_not_a_movie(self):
+        path = self.get_path('movie.mp4')
+        with open(path, 'wb') as fp:
+            fp.write(b'not a movie')
+        assert read_movie_info(path) is None
+
+
+class ProbeCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ProbeCache()
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_get(self):
+        probe = MagicMock(return_value={'width': 100})
+        result = self.cache.get('size', self.path, probe)
+        result['width'] = 200
+
+        assert self.cache.get('size', self.path, probe) == {'width': 100}
+        assert probe.call_count == 1
+        assert self.cache.get_stats() == {'hits': 1, 'misses': 1, 'entries': 1}
+
+        self.cache.get('ffprobe', self.path, probe)
+        assert probe.call_count == 2
+
+    def test_get_file_changed(self):
+        probe = MagicMock(return_value=1)
+        self.cache.get('size', self.path, probe)
+        with open(self.path, 'w') as fp:
+            fp.write('changed')
+        self.cache.get('size', self.path, probe)
+        assert probe.call_count == 2
+
+    def test_get_missing_file(self):
+        probe = MagicMock(return_value=1)
+        self.cache.get('size', '/tmp/does/not/exist', probe)
+        self.cache.get('size', '/tmp/does/not/exist', probe)
+        assert probe.call_count == 2
+        assert self.cache.get_stats()['entries'] == 0
@@ -1,15 +1,20 @@
+import glob
+import hashlib
 import logging
 import os
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
 import flask
 import pytest
+import requests
 
 from boonflow import storage
 from boonflow.testing import test_data, TestAsset
-from boonsdk import StoredFile, BoonClient, AnalysisModule, Job, Model, app_from_env
+from boonsdk import StoredFile, BoonClient, AnalysisModule, Job, Model, VideoClip, app_from_env
 from boonsdk.app import ModelApp
 
 logging.basicConfig(level=logging.DEBUG)
@@ -34,6 +39,19 @@ class FileCacheTests(TestCase):
             del os.environ['BOONAI_TASK_ID']
             cache.close()
 
+    def test_reset(self):
+        os.environ['BOONAI_TASK_ID'] = '1234abcd5678'
+        try:
+            cache = storage.FileCache(app_from_env())
+            assert '1234abcd5678' in cache.get_path('foo')
+
+            os.environ['BOONAI_TASK_ID'] = '8765dcba4321'
+            cache.reset()
+            assert '8765dcba4321' in cache.get_path('foo')
+        finally:
+            del os.environ['BOONAI_TASK_ID']
+            cache.close()
+
     def test_localize_uri_http(self):
         path = self.lfc.localize_uri('https://i.imgur.com/WkomVeG.jpg')
         assert os.path.exists(path)
@@ -122,6 +140,171 @@ class FileCacheTests(TestCase):
         bird = test_data('images/set01/toucan.jpg', uri=False)
         self.assertRaises(storage.StorageException, self.lfc.precache_file, pfile, bird)
 
+    def test_fetch_single_flight(self):
+        downloads = []
+
+        def download(path):
+            downloads.append(path)
+            time.sleep(0.1)
+            with open(path, 'w') as fp:
+                fp.write('hello')
+
+        path = self.lfc.get_path('single-flight', '.txt')
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: self.lfc.fetch(path, download), range(4)))
+
+        assert results == [path] * 4
+        assert len(downloads) == 1
+        assert not glob.glob(path + '.*.tmp')
+        stats = self.lfc.get_stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 3
+        assert stats['downloaded_bytes'] == 5
+
+    def test_fetch_failed_download(self):
+        def download(path):
+            with open(path, 'w') as fp:
+                fp.write('partial')
+            raise IOError('connection reset')
+
+        path = self.lfc.get_path('failed', '.txt')
+        with pytest.raises(IOError):
+            self.lfc.fetch(path, download)
+        assert not os.path.exists(path)
+        assert not glob.glob(path + '.*.tmp')
+
+    def test_fetch_evicts_lru(self):
+        lfc = storage.FileCache(app_from_env(), max_size_mb=1)
+        try:
+            def download(path):
+                with open(path, 'wb') as fp:
+                    fp.write(b'0' * 400 * 1024)
+
+            paths = [lfc.get_path('evict-{}'.format(i)) for i in range(4)]
+            lfc.fetch(paths[0], download)
+            lfc.fetch(paths[1], download)
+            # Touching the first file makes the second the least recently used.
+            lfc.fetch(paths[0], download)
+            with lfc.pinned(paths[0]):
+                lfc.fetch(paths[2], download)
+                lfc.fetch(paths[3], download)
+
+            assert os.path.exists(paths[0])
+            assert not os.path.exists(paths[1])
+            assert not os.path.exists(paths[2])
+            assert os.path.exists(paths[3])
+            stats = lfc.get_stats()
+            assert stats['evictions'] == 2
+            assert stats['entries'] == 2
+            assert stats['size'] == 800 * 1024
+            assert not os.path.exists(paths[1] + '.lock')
+        finally:
+            lfc.close()
+
+    def test_fetch_pin_scope(self):
+        lfc = storage.FileCache(app_from_env(), max_size_mb=1)
+        try:
+            def download(path):
+                with open(path, 'wb') as fp:
+                    fp.write(b'0' * 400 * 1024)
+
+            paths = [lfc.get_path('scope-{}'.format(i)) for i in range(4)]
+            with lfc.pin_scope():
+                lfc.fetch(paths[0], download)
+                # Another thread fetching files can't evict the scoped file.
+                with ThreadPoolExecutor(max_workers=1) as pool:
+                    list(pool.map(lambda path: lfc.fetch(path, download), paths[1:3]))
+                assert os.path.exists(paths[0])
+                assert lfc.pins[paths[0]] == 1
+
+            assert not lfc.pins
+            lfc.fetch(paths[3], download)
+            assert not os.path.exists(paths[0])
+        finally:
+            lfc.close()
+
+
+class RangedDownloaderTests(TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(1000)
+        self.md5 = hashlib.md5(self.data).hexdigest()
+        self.path = tempfile.mktemp()
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def read_range(self, start, end):
+        # Return the range in small blocks to test the offsets.
+        return [self.data[i:min(i + 64, end + 1)] for i in range(start, end + 1, 64)]
+
+    @patch.object(storage.RangedDownloader, 'chunk_size', 100)
+    def test_download(self):
+        ranges = []
+
+        def read_range(start, end):
+            ranges.append((start, end))
+            return self.read_range(start, end)
+
+        storage.RangedDownloader(1000, read_range, self.md5, 'test').download(self.path)
+        with open(self.path, 'rb') as fp:
+            assert fp.read() == self.data
+        assert sorted(ranges) == [(i, i + 99) for i in range(0, 1000, 100)]
+
+    @patch('boonflow.storage.time.sleep')
+    @patch.object(storage.RangedDownloader, 'chunk_size', 300)
+    def test_download_retry_resumes(self, _):
+        ranges = []
+
+        def read_range(start, end):
+            ranges.append((start, end))
+            if len(ranges) == 1:
+                # Fail part way through the first request.
+                yield self.data[start:start + 50]
+                raise IOError('connection reset')
+            yield from self.read_range(start, end)
+
+        downloader = storage.RangedDownloader(1000, read_range, self.md5, 'test')
+        downloader.threads = 1
+        downloader.download(self.path)
+        with open(self.path, 'rb') as fp:
+            assert fp.read() == self.data
+        assert ranges[:2] == [(0, 299), (50, 299)]
+
+    @patch.object(storage.RangedDownloader, 'chunk_size', 100)
+    def test_download_checksum_mismatch(self):
+        downloader = storage.RangedDownloader(1000, self.read_range, '0' * 32, 'test')
+        with pytest.raises(storage.StorageException):
+            downloader.download(self.path)
+
+    @patch('boonflow.storage.requests.get')
+    @patch('boonflow.storage.requests.head')
+    @patch.object(storage.RangedDownloader, 'min_size', 500)
+    @patch.object(storage.RangedDownloader, 'chunk_size', 100)
+    def test_localize_uri_http(self, head_patch, get_patch):
+        head_patch.return_value = MagicMock(ok=True, headers={
+            'Content-Length': '1000', 'Accept-Ranges': 'bytes'})
+
+        def get(uri, headers, **kwargs):
+            start, end = [int(i) for i in headers['Range'][6:].split('-')]
+            return MagicMock(iter_content=lambda _: self.read_range(start, end))
+
+        get_patch.side_effect = get
+        cache = storage.FileCache(app_from_env())
+        try:
+            path = cache.localize_uri('https://example.com/video.mp4')
+            with open(path, 'rb') as fp:
+                assert fp.read() == self.data
+            assert get_patch.call_count == 10
+        finally:
+            cache.close()
+
+    def test_is_ranged(self):
+        assert not storage.RangedDownloader.is_ranged(None)
+        assert not storage.RangedDownloader.is_ranged(1024)
+        assert storage.RangedDownloader.is_ranged(storage.RangedDownloader.min_size)
+
 
 class FileStorageTests(TestCase):
 
@@ -263,6 +446,137 @@ class TestAssetStorage(TestCase):
         assert rsp == {uri}
 
 
+class MultipartUploaderTests(TestCase):
+
+    def setUp(self):
+        self.src_path = tempfile.mktemp()
+        self.data = os.urandom(2500)
+        with open(self.src_path, 'wb') as fp:
+            fp.write(self.data)
+        self.spec = {
+            'entity': 'assets',
+            'entityId': '12345',
+            'category': 'proxy',
+            'name': 'video.mp4',
+            'attrs': {},
+            'size': len(self.data)
+        }
+        self.signed = {
+            'uploadId': 'abc123',
+            'mediaType': 'video/mp4',
+            'parts': [{'partNumber': i, 'uri': 'http://localhost:9999/part/{}'.format(i)}
+                      for i in range(1, 4)]
+        }
+        self.uploaded = {}
+
+    def tearDown(self):
+        os.unlink(self.src_path)
+
+    def put(self, uri, headers, data):
+        number = int(uri.rsplit('/', 1)[1])
+        assert int(headers['Content-Length']) == len(data)
+        self.uploaded[number] = data.read()
+        return MagicMock(headers={'ETag': 'etag-{}'.format(number)})
+
+    def get_uploader(self):
+        uploader = storage.MultipartUploader(app_from_env(), self.src_path, self.spec)
+        uploader.part_size = 1000
+        uploader.state_dir = tempfile.mkdtemp()
+        return uploader
+
+    @patch('boonflow.storage.requests.put')
+    @patch.object(BoonClient, 'post')
+    def test_upload(self, post_patch, put_patch):
+        post_patch.return_value = self.signed
+        put_patch.side_effect = self.put
+
+        self.get_uploader().upload()
+        assert b''.join([self.uploaded[i] for i in range(1, 4)]) == self.data
+        assert post_patch.call_args_list[0][0][1]['parts'] == 3
+
+        complete = post_patch.call_args_list[1][0]
+        assert complete[0] == '/api/v3/files/_complete_multipart_upload'
+        assert complete[1]['uploadId'] == 'abc123'
+        assert complete[1]['parts'] == [{'partNumber': i, 'etag': 'etag-{}'.format(i)}
+                                        for i in range(1, 4)]
+
+    @patch('time.sleep')
+    @patch('boonflow.storage.requests.put')
+    @patch.object(BoonClient, 'post')
+    def test_upload_retries_part(self, post_patch, put_patch, _):
+        post_patch.return_value = self.signed
+        failed = []
+
+        def put(uri, headers, data):
+            if uri.endswith('/2') and not failed:
+                failed.append(uri)
+                raise requests.exceptions.ConnectionError()
+            return self.put(uri, headers, data)
+
+        put_patch.side_effect = put
+        self.get_uploader().upload()
+        assert failed
+        assert put_patch.call_count == 4
+        assert len(self.uploaded) == 3
+
+    @patch('boonflow.storage.requests.put')
+    @patch.object(BoonClient, 'post')
+    def test_upload_resume(self, post_patch, put_patch):
+        post_patch.return_value = self.signed
+
+        def put(uri, headers, data):
+            if uri.endswith('/2'):
+                raise ValueError('disk error')
+            return self.put(uri, headers, data)
+
+        put_patch.side_effect = put
+        uploader = self.get_uploader()
+        uploader.threads = 1
+        with pytest.raises(ValueError):
+            uploader.upload()
+        assert post_patch.call_count == 1
+
+        # The part which was uploaded is skipped.
+        self.uploaded.clear()
+        put_patch.side_effect = self.put
+        uploader.upload()
+        assert 1 not in self.uploaded
+        assert 2 in self.uploaded
+        assert post_patch.call_args_list[1][0][1]['uploadId'] == 'abc123'
+        assert len(post_patch.call_args_list[2][0][1]['parts']) == 3
+        assert not os.listdir(uploader.state_dir)
+
+    @patch.object(storage.MultipartUploader, 'upload')
+    @patch.object(storage.MultipartUploader, 'min_size', 1000)
+    @patch.object(BoonClient, 'put')
+    @patch.object(BoonClient, 'post')
+    def test_store_file_by_id(self, post_patch, put_patch, upload_patch):
+        put_patch.return_value = {
+            'id': 'assets/12345/proxy/video.mp4',
+            'name': 'video.mp4',
+            'category': 'proxy',
+            'entity': 'assets',
+            'size': 2500
+        }
+        fs = storage.FileStorage()
+        fs.projects.store_file_by_id(self.src_path, 'assets/12345/proxy/video.mp4',
+                                     precache=False)
+        upload_patch.assert_called_once()
+        post_patch.assert_not_called()
+
+    @patch.object(storage.MultipartUploader, 'upload')
+    @patch.object(storage.MultipartUploader, 'min_size', 1000)
+    @patch.object(BoonClient, 'put')
+    @patch.object(BoonClient, 'post')
+    def test_store_file_by_id_upload_failed(self, post_patch, put_patch, upload_patch):
+        upload_patch.side_effect = requests.exceptions.ConnectionError('reset')
+        fs = storage.FileStorage()
+        with pytest.raises(storage.StorageException):
+            fs.projects.store_file_by_id(self.src_path, 'assets/12345/proxy/video.mp4',
+                                         precache=False)
+        put_patch.assert_not_called()
+
+
 class TestProjectStorage(TestCase):
 
     def setUp(self):
@@ -338,6 +652,52 @@ class TestProjectStorage(TestCase):
         assert 'fake_model.dat' == result.name
         assert 'fake' == result.category
 
+    @patch.object(BoonClient, 'put')
+    @patch('requests.put')
+    @patch.object(BoonClient, 'post')
+    def test_store_files(self, post_patch, req_put_patch, put_patch):
+        post_patch.side_effect = lambda url, specs: [
+            {'uri': 'http://localhost:9999/{}/signed'.format(spec['name']),
+             'mediaType': 'image/jpeg'} for spec in specs]
+        req_put_patch.return_value = MockResponse()
+        put_patch.side_effect = lambda url, specs: [
+            {'id': 'clips/12345/proxy/{}'.format(spec['name']),
+             'name': spec['name'],
+             'category': spec['category'],
+             'attrs': spec['attrs'],
+             'size': spec['size']} for spec in specs]
+
+        path = os.path.dirname(__file__) + '/fake_model.dat'
+        clip = VideoClip({'id': '12345'})
+        files = [(path, clip, 'proxy', 'proxy{}.jpg'.format(i), {'idx': i}) for i in range(5)]
+        results = self.fs.projects.store_files(files, precache=False)
+
+        assert [r.name for r in results] == ['proxy{}.jpg'.format(i) for i in range(5)]
+        assert [r.attrs['idx'] for r in results] == list(range(5))
+        assert post_patch.call_count == 1
+        assert post_patch.call_args[0][0] == '/api/v3/files/_batch_signed_upload_uri'
+        assert put_patch.call_count == 1
+        assert put_patch.call_args[0][0] == '/api/v3/files/_batch_attrs'
+        assert sorted(c[0][0] for c in req_put_patch.call_args_list) == [
+            'http://localhost:9999/proxy{}.jpg/signed'.format(i) for i in range(5)]
+
+    @patch.object(storage.MultipartUploader, 'upload')
+    @patch.object(storage.MultipartUploader, 'min_size', 1)
+    @patch.object(BoonClient, 'put')
+    @patch.object(BoonClient, 'post')
+    def test_store_files_by_id_multipart(self, post_patch, put_patch, upload_patch):
+        put_patch.side_effect = lambda url, specs: [
+            {'id': 'x', 'name': spec['name'], 'category': spec['category'],
+             'size': spec['size']} for spec in specs]
+
+        path = os.path.dirname(__file__) + '/fake_model.dat'
+        results = self.fs.projects.store_files_by_id(
+            [(path, 'models/12345/model/model{}.zip'.format(i), None) for i in range(2)],
+            precache=False)
+        assert len(results) == 2
+        assert upload_patch.call_count == 2
+        post_patch.assert_not_called()
+
     @patch.object(BoonClient, 'stream')
     def test_localize_file(self, post_patch):
         post_patch.return_value = '/tmp/toucan.jpg'
@@ -456,12 +816,18 @@ class MockGcsClient:
     """
     A Mock GCS Storage client
     """
+    size = 5
+    md5_hash = None
+
     def get_bucket(self, *args, **kwars):
         return self
 
     def blob(self, *args, **kwargs):
         return self
 
+    def reload(self):
+        pass
+
     def download_to_filename(self, filename):
         with open(filename, 'w') as fp:
             fp.write("hello")
@@ -1,9 +1,13 @@
+import io
 import os
+import sys
 import tempfile
 import unittest
 import logging
 from unittest.mock import patch
 
+import numpy as np
+
 import boonflow.video as video
 import boonflow.media as media
 from boonflow.testing import test_path, TestAsset
@@ -66,6 +70,93 @@ class FrameExtractors(unittest.TestCase):
         assert 17 == len(frames)
         assert os.path.exists(frames[0][1])
 
+    @patch.object(video, 'decode_last_frame')
+    @patch.object(video, 'decode_frames')
+    @patch.object(video, 'get_video_duration')
+    def test_time_based_iterate_decoded(self, duration_patch, decode_patch, last_patch):
+        duration_patch.return_value = 2.5
+        frames = [np.full((4, 6, 3), i, dtype=np.uint8) for i in range(4)]
+        decode_patch.return_value = iter(frames)
+        last_patch.return_value = np.full((4, 6, 3), 9, dtype=np.uint8)
+
+        extractor = video.TimeBasedFrameExtractor(VIDEO_M4V, output='array')
+        result = list(extractor)
+        assert [t for t, _ in result] == [0, 1, 2, 2.5]
+        # The frame at the end of the video is the real last frame.
+        assert [f[0, 0, 0] for _, f in result] == [0, 1, 2, 9]
+        duration_patch.assert_called_once()
+
+    @patch.object(video, 'decode_last_frame')
+    @patch.object(video, 'decode_frames')
+    @patch.object(video, 'get_video_duration')
+    def test_time_based_iterate_no_last_frame(self, duration_patch, decode_patch, last_patch):
+        duration_patch.return_value = 1.5
+        decode_patch.return_value = iter([np.zeros((4, 6, 3), dtype=np.uint8)] * 2)
+        last_patch.return_value = None
+
+        extractor = video.TimeBasedFrameExtractor(VIDEO_M4V, output='array')
+        assert [t for t, _ in extractor] == [0, 1]
+
+    @patch.object(video, 'decode_last_frame')
+    @patch.object(video, 'decode_frames')
+    @patch.object(video, 'get_video_duration')
+    def test_time_based_iterate_files(self, duration_patch, decode_patch, last_patch):
+        duration_patch.return_value = 1.0
+        last_patch.return_value = np.zeros((4, 6, 3), dtype=np.uint8)
+        decode_patch.return_value = iter([np.zeros((4, 6, 3), dtype=np.uint8)] * 2)
+
+        extractor = video.TimeBasedFrameExtractor(VIDEO_M4V)
+        for _, path in extractor:
+            assert path == extractor.output_path
+            assert os.path.getsize(path) > 0
+
+    @patch.object(video, 'extract_thumbnail_from_video')
+    @patch.object(video.ShotBasedFrameExtractor, '_get_shot_times')
+    def test_shot_based_shared_catalog(self, shot_patch, extract_patch):
+        shot_patch.return_value = [0.0, 1.5, 4.0]
+        extract_patch.side_effect = lambda src, dst, t: open(dst, 'w').close()
+        video_file = tempfile.mkstemp('.mp4')[1]
+        with open(video_file, 'wb') as fp:
+            fp.write(os.urandom(1024))
+
+        extractor = video.ShotBasedFrameExtractor(video_file)
+        extractor.clean()
+        frames = list(extractor)
+        assert [t for t, _ in frames] == [0.0, 1.5, 4.0]
+        assert all(os.path.exists(path) for _, path in frames)
+
+        # Another extractor with the same settings reuses the catalog.
+        assert list(video.ShotBasedFrameExtractor(video_file)) == frames
+        assert shot_patch.call_count == 1
+        assert extract_patch.call_count == 3
+
+        other = video.ShotBasedFrameExtractor(video_file, sensitivity=0.1)
+        assert other.output_dir != extractor.output_dir
+        other.clean()
+        list(other)
+        assert shot_patch.call_count == 2
+
+    def test_read_ppm_frame(self):
+        pixels = bytes(range(2 * 3 * 3))
+        stream = io.BytesIO(b'P6\n3 2\n255\n' + pixels + b'P6\n3 2\n255\n' + pixels)
+        frame = video.read_ppm_frame(stream)
+        assert frame.shape == (2, 3, 3)
+        assert frame[1, 2].tolist() == [15, 16, 17]
+        assert video.read_ppm_frame(stream) is not None
+        assert video.read_ppm_frame(stream) is None
+
+    def test_decode_ppm_frames(self):
+        script = 'import sys; sys.stdout.buffer.write(b"P6\\n1 1\\n255\\n\\x01\\x02\\x03")'
+        frames = list(video.decode_ppm_frames([sys.executable, '-c', script]))
+        assert len(frames) == 1
+        assert frames[0][0, 0].tolist() == [1, 2, 3]
+
+    def test_decode_ppm_frames_failed(self):
+        script = 'import sys; sys.stderr.write("Invalid data"); sys.exit(1)'
+        with self.assertRaises(IOError) as ctx:
+            list(video.decode_ppm_frames([sys.executable, '-c', script]))
+        assert 'Invalid data' in str(ctx.exception)
+
     def test_shot_based_iterate(self):
         iter = video.ShotBasedFrameExtractor(VIDEO_M4V)
         iter.clean()
@@ -1,3 +1,5 @@
+import fcntl
+import functools
 import logging
 import os
 import subprocess
@@ -9,14 +11,34 @@ import shutil
 
 from datetime import datetime
 
+import numpy as np
+from PIL import Image
+
 from .env import app_instance
+from .probe import probe_cache, read_movie_info
 
 logger = logging.getLogger(__name__)
 
 
 def get_video_duration(video_path):
     """
-    Return the duration of the given video file path.
+    Return the duration of the given video file path.  The duration of MP4
+    and QuickTime movies is read from their header, other formats are probed
+    with ffprobe.  Results are cached.
+
+    Args:
+        video_path (str): A path to a video file/
+
+    Returns:
+        float: the duration in seconds.
+
+    """
+    return probe_cache.get('duration', video_path, _probe_video_duration)
+
+
+def _probe_video_duration(video_path):
+    """
+    Determine the duration of the given video file path.
 
     Args:
         video_path (str): A path to a video file/
@@ -25,6 +47,10 @@ def get_video_duration(video_path):
         float: the duration in seconds.
 
     """
+    info = read_movie_info(video_path)
+    if info and info['duration'] > 0:
+        return round(info['duration'], 3)
+
     duration_command = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
                         '-of', 'default=noprint_wrappers=1:nokey=1', video_path]
 
@@ -135,39 +161,196 @@ class VideoFrameExtractor:
 class TimeBasedFrameExtractor(VideoFrameExtractor):
     """
     A VideoFrameExtractor which generates an image for every N seconds
-    of a video.  Only 1 frame is on disk at any given time, each
-    iteration writes over the previous frame.
+    of a video.  The frames are decoded by a single ffmpeg process which
+    reads through the video once.
+
+    Frames are either numpy arrays or written to a temp file, in which case
+    only 1 frame is on disk at any given time, each iteration writes over
+    the previous frame.
     """
-    def __init__(self, video_file, seconds=1):
+    def __init__(self, video_file, seconds=1, output='file'):
         """
         Create a new TimeBasedFrameExtractor.
 
         Args:
             video_file (str): The path to the videp file.
             seconds (float): The number of second between each image.
+            output (str): 'file' to yield the path to a JPG of each frame, or
+                'array' to yield each frame as an RGB numpy array.
         """
         super(TimeBasedFrameExtractor, self).__init__(video_file)
+        if output not in ('file', 'array'):
+            raise ValueError("The output must be 'file' or 'array'")
         self.seconds = seconds
+        self.output = output
         self.duration = get_video_duration(self.video_file)
-        self.output_path = tempfile.mkstemp(".jpg")[1]
+        self.output_path = tempfile.mkstemp(".jpg")[1] if output == 'file' else None
 
     def __iter__(self):
         return self._generate()
 
     def _generate(self):
-        duration = get_video_duration(self.video_file)
-        scrubber = self.seconds * -1
-        while scrubber < duration:
-            scrubber = min(scrubber + self.seconds, duration)
-            extract_thumbnail_from_video(self.video_file, self.output_path, scrubber)
-            yield scrubber, self.output_path
+        # Frames are taken every N seconds, then the last frame of the video
+        # is taken at the end of the video.
+        decoded = False
+        for idx, frame in enumerate(decode_frames(self.video_file, self.seconds)):
+            scrubber = idx * self.seconds
+            if scrubber >= self.duration:
+                break
+            decoded = True
+            yield scrubber, self._get_output(frame)
+
+        if decoded:
+            frame = decode_last_frame(self.video_file)
+            if frame is not None:
+                yield self.duration, self._get_output(frame)
+
+    def _get_output(self, frame):
+        """
+        Return the frame in the output format.
+
+        Args:
+            frame (numpy.ndarray): An RGB frame.
+
+        Returns:
+            mixed: The frame or the path to the frame.
+        """
+        if self.output == 'array':
+            return frame
+        Image.fromarray(frame).save(self.output_path, quality=90)
+        return self.output_path
+
+
+def decode_frames(video_file, seconds):
+    """
+    Decode a frame every N seconds of a video with a single ffmpeg process,
+    which writes each frame to a pipe as a PPM image.
+
+    Args:
+        video_file (str): The video file path.
+        seconds (float): The number of seconds between each frame.
+
+    Yields:
+        numpy.ndarray: An RGB frame.
+
+    Raises:
+        (IOError): If ffmpeg fails to decode the video.
+    """
+    cmd = ['ffmpeg',
+           '-v', 'error',
+           '-i', str(video_file),
+           '-vf', 'fps=1/{}'.format(seconds),
+           '-f', 'image2pipe',
+           '-c:v', 'ppm',
+           'pipe:1']
+    return decode_ppm_frames(cmd)
+
+
+def decode_last_frame(video_file, window=1):
+    """
+    Decode the last frame of a video by decoding the frames of its final
+    seconds.
+
+    Args:
+        video_file (str): The video file path.
+        window (float): The number of seconds before the end of the video to start at.
+
+    Returns:
+        numpy.ndarray: An RGB frame, or None if there are no frames.
+
+    Raises:
+        (IOError): If ffmpeg fails to decode the video.
+    """
+    cmd = ['ffmpeg',
+           '-v', 'error',
+           '-sseof', '-{}'.format(window),
+           '-i', str(video_file),
+           '-f', 'image2pipe',
+           '-c:v', 'ppm',
+           'pipe:1']
+    frame = None
+    for frame in decode_ppm_frames(cmd):
+        pass
+    return frame
+
+
+def decode_ppm_frames(cmd):
+    """
+    Run a command which writes PPM images to stdout, yielding each image.  If
+    the command fails once all the images are read, an IOError is raised.
+
+    Args:
+        cmd (list): The command.
+
+    Yields:
+        numpy.ndarray: An RGB frame.
+
+    Raises:
+        (IOError): If the command exits with an error.
+    """
+    logger.debug("running command: %s" % cmd)
+    with tempfile.TemporaryFile() as errors:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors, shell=False)
+        try:
+            while True:
+                frame = read_ppm_frame(proc.stdout)
+                if frame is None:
+                    break
+                yield frame
+        except BaseException:
+            # The caller stopped early or the stream is invalid.
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            proc.wait()
+
+        if proc.returncode != 0:
+            errors.seek(0)
+            raise IOError('{} failed with exit code {}: {}'.format(
+                cmd[0], proc.returncode, errors.read().decode('utf-8', 'replace').strip()))
+
+
+def read_ppm_frame(stream):
+    """
+    Read a binary PPM image from a stream.
+
+    Args:
+        stream (file): A binary stream.
+
+    Returns:
+        numpy.ndarray: An RGB image, or None at the end of the stream.
+    """
+    header = []
+    while len(header) < 4:
+        line = stream.readline()
+        if not line:
+            return None
+        if line.startswith(b'#'):
+            continue
+        header.extend(line.split())
+
+    magic, width, height, _ = header
+    if magic != b'P6':
+        raise ValueError('Unsupported PPM format: {}'.format(magic))
+    width, height = int(width), int(height)
+
+    size = width * height * 3
+    data = stream.read(size)
+    if len(data) != size:
+        return None
+    return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
 
 
 class ShotBasedFrameExtractor(VideoFrameExtractor):
     """
     ShotBasedFrameExtractor uses ffmpeg lavfi shot detection filter to detect frame
-    a high level of difference.  Only 1 frame is on disk at any given time, each
-    iteration writes over the previous frame.
+    a high level of difference.
+
+    The shot frames and a catalog of them are stored in the task temp dir, keyed by
+    the checksum of the video and the detection settings, so they're only extracted
+    once per task.  Every later processor and container running the same task reuses
+    the catalog, and a lock makes concurrent extractors wait for the first one.
     """
 
     def __init__(self, video_file, sensitivity=0.025, min_length=1.0):
@@ -181,10 +364,10 @@ class ShotBasedFrameExtractor(VideoFrameExtractor):
             min_length: (float): The minimum clip length.
         """
         super(ShotBasedFrameExtractor, self).__init__(video_file)
-        self.output_dir = self.make_output_dir()
-        self.catalog_path = f'{self.output_dir}/catalog.json'
         self.sensitivity = sensitivity
         self.min_length = min_length
+        self.output_dir = self.make_output_dir()
+        self.catalog_path = f'{self.output_dir}/catalog.json'
 
     def make_output_dir(self):
         """
@@ -194,8 +377,10 @@ class ShotBasedFrameExtractor(VideoFrameExtractor):
             str: The path to the temp dir.
         """
         tdir = tempfile.gettempdir()
-        hashval = hashlib.sha1(self.video_file.encode()).hexdigest()
-        out_dir = f'{tdir}/{hashval}'
+        key = '{}:{}:{}'.format(
+            get_video_checksum(self.video_file), self.sensitivity, self.min_length)
+        hashval = hashlib.sha1(key.encode()).hexdigest()
+        out_dir = f'{tdir}/shots/{hashval}'
         os.makedirs(out_dir, exist_ok=True)
         return out_dir
 
@@ -211,29 +396,57 @@ class ShotBasedFrameExtractor(VideoFrameExtractor):
         return self._generate()
 
     def _generate(self):
-        if not os.path.exists(f'{self.output_dir}/catalog.json'):
-            self._generate_catalog_file()
-
-        with open(self.catalog_path, "r") as fp:
-            catalog = json.load(fp)
+        catalog = self._read_catalog()
+        if catalog is None:
+            # The lock file is outside the output dir so clean() can't remove it.
+            with open(self.output_dir + '.lock', 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                catalog = self._read_catalog()
+                if catalog is None:
+                    catalog = self._generate_catalog_file()
+
+        for shot_time, file_name in catalog['frames']:
+            yield shot_time, os.path.join(self.output_dir, file_name)
+
+    def _read_catalog(self):
+        """
+        Read the catalog of shot frames.
 
-        for shot_time, file_path in catalog:
-            yield shot_time, file_path
+        Returns:
+            dict: The catalog, or None if it has not been generated.
+        """
+        try:
+            with open(self.catalog_path, "r") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
 
     def _generate_catalog_file(self):
         logger.info(f'Creating video frame catalog ${self.catalog_path}')
 
-        catalog = []
+        frames = []
         for idx, shot_time in enumerate(self._get_shot_times()):
-            file_name = f'{self.output_dir}/frame_{idx}.jpg'
+            file_name = f'frame_{idx}.jpg'
             try:
-                extract_thumbnail_from_video(self.video_file, file_name, shot_time)
-                catalog.append((shot_time, file_name))
+                extract_thumbnail_from_video(
+                    self.video_file, os.path.join(self.output_dir, file_name), shot_time)
+                frames.append((shot_time, file_name))
             except IOError:
                 logger.warning(f'Failed to extract frame at {shot_time}')
 
-        with open(self.catalog_path, "w") as fp:
+        catalog = {
+            'source': get_video_checksum(self.video_file),
+            'sensitivity': self.sensitivity,
+            'min_length': self.min_length,
+            'frames': frames
+        }
+
+        # Written to a temp file first so a partial catalog is never read.
+        tmp_path = f'{self.catalog_path}.{os.getpid()}.tmp'
+        with open(tmp_path, "w") as fp:
             json.dump(catalog, fp)
+        os.replace(tmp_path, self.catalog_path)
+        return catalog
 
     def _get_shot_times(self):
         keyframe_command = ('ffprobe -show_frames -of compact=p=0 -show_entries '
@@ -269,6 +482,31 @@ class ShotBasedFrameExtractor(VideoFrameExtractor):
         return shot_times
 
 
+@functools.lru_cache(maxsize=64)
+def _sample_checksum(video_file, size, mtime):
+    sha = hashlib.sha1(str(size).encode())
+    with open(video_file, 'rb') as fp:
+        for offset in (0, size // 2, max(size - 1024 * 1024, 0)):
+            fp.seek(offset)
+            sha.update(fp.read(1024 * 1024))
+    return sha.hexdigest()
+
+
+def get_video_checksum(video_file):
+    """
+    Return a checksum of a video file, made from its size and samples of
+    its start, middle and end, so large videos don't have to be read in full.
+
+    Args:
+        video_file (str): The video file path.
+
+    Returns:
+        str: The checksum.
+    """
+    stat = os.stat(video_file)
+    return _sample_checksum(video_file, stat.st_size, stat.st_mtime_ns)
+
+
 def save_timeline(asset, timeline):
     """
     Save the given timeline as Clips.
@@ -63,6 +63,9 @@ class AbstractVideoDetectProcessor(AssetProcessor):
     file_types = FileTypes.videos
     use_threads = False
 
+    # The AWS resources created by init() are removed by teardown().
+    resident = False
+
     def __init__(self, detector_func=None):
         super(AbstractVideoDetectProcessor, self).__init__()
         self.detector_func = detector_func
@@ -58,6 +58,9 @@ class AbstractAzureVisionProcessor(AssetProcessor):
 
     file_types = FileTypes.images | FileTypes.documents
 
+    # Most of the time is spent waiting on the API.
+    thread_profile = "io"
+
     def __init__(self, reactor=None):
         super(AbstractAzureVisionProcessor, self).__init__()
         self.add_arg(Argument('debug', 'bool', default=False))
@@ -1,4 +1,5 @@
 import logging
+import os
 import tempfile
 
 import cv2
@@ -107,6 +108,33 @@ def submit_clip_batch(app, asset_id, batch):
         app.client.put("/api/v1/clips/_batch_update_proxy", req)
 
 
+def store_clip_batch(app, sim, asset_id, pending):
+    """
+    Hash the thumbnails of a batch of clips in a single pass through the
+    similarity engine and store their proxies with a single bulk request,
+    then submit the batch.
+
+    Args:
+        app (BoonApp): An app instance.
+        sim (SimilarityEngine): The similarity engine for hashes.
+        asset_id (str): The asset Id.
+        pending (list): A list of (clip, proxy path, attrs, thumbnail path) tuples.
+
+    """
+    if not pending:
+        return
+    thumbnails = list(dict.fromkeys(thumb for _, _, _, thumb in pending))
+    simhashes = dict(zip(thumbnails, sim.calculate_simhashes(thumbnails)))
+
+    files = [(path, clip, "proxy", "proxy.jpg", attrs) for clip, path, attrs, _ in pending]
+    proxies = file_storage.projects.store_files(files, precache=False)
+
+    batch = {}
+    for (clip, _, _, thumb), prx in zip(pending, proxies):
+        batch[clip.id] = {'files': [prx], 'simhash': simhashes[thumb]}
+    submit_clip_batch(app, asset_id, batch)
+
+
 def analyze_timelines(app, sim, asset_id, timelines):
     """
     Analyze all the timelines for the given asset.
@@ -137,11 +165,11 @@ def analyze_timelines(app, sim, asset_id, timelines):
 
     size = media_size(video_path)
     psize = get_output_dimension(768, size[0], size[1])
-    jpg_file = tempfile.mkstemp(".jpg")[1]
 
-    simhash = None
+    jpg_file = None
     current_time = None
-    batch = {}
+    pending = []
+    tmp_files = []
 
     logger.info('Performing deep analysis "{}" for asset "{}"'.format(timelines, asset_id))
 
@@ -150,8 +178,16 @@ def analyze_timelines(app, sim, asset_id, timelines):
         if clip.start != current_time:
             current_time = clip.start
 
+            # Each proxy is kept until its batch is stored.
+            jpg_file = tempfile.mkstemp(".jpg")[1]
+            tmp_files.append(jpg_file)
             extract_thumbnail_from_video(video_path, jpg_file, current_time, psize)
-            simhash = sim.calculate_simhash(jpg_file)
+
+        # Always store the file even if we're storing the same file (for now)
+        # An optimization could be to share proxies in some cases but it gets
+        # difficult if people are rebuilding their timelines.
+        path = jpg_file
+        attrs = {"width": psize[0], "height": psize[1]}
 
         # If the clip has a bbox then we'll burn it into the proxy.
         if clip.bbox:
@@ -159,41 +195,22 @@ def analyze_timelines(app, sim, asset_id, timelines):
             bbox = denormalize_bbox(psize[0], psize[1], clip.bbox)
             cv2.rectangle(img, (bbox[0], bbox[1]), (bbox[2], bbox[3]), (0, 255, 0), 2)
 
-            with tempfile.NamedTemporaryFile(suffix=".jpg") as tf:
-                cv2.imwrite(tf.name, img)
-                prx = upload_clip_proxy(clip, tf.name, psize, bbox)
-        else:
-            # Always store the file even if we're storing the same file (for now)
-            # An optimization could be to share proxies in some cases but it gets
-            # difficult if people are rebuilding their timelines.
-            prx = upload_clip_proxy(clip, jpg_file, psize)
+            path = tempfile.mkstemp(".jpg")[1]
+            tmp_files.append(path)
+            cv2.imwrite(path, img)
+            attrs['bbox'] = bbox
 
-        if prx:
-            batch[clip.id] = {'files': [prx], 'simhash': simhash}
+        pending.append((clip, path, attrs, jpg_file))
 
-        if len(batch) >= 20:
-            submit_clip_batch(app, asset_id, batch)
-            batch = {}
+        if len(pending) >= 20:
+            store_clip_batch(app, sim, asset_id, pending)
+            pending = []
+            for tmp_file in tmp_files:
+                if tmp_file != jpg_file:
+                    os.unlink(tmp_file)
+            tmp_files = [jpg_file]
 
     # Add final batch
-    submit_clip_batch(app, asset_id, batch)
-
-
-def upload_clip_proxy(clip, path, size, bbox=None):
-    """
-    Upload a clip proxy.
-
-    Args:
-        clip (Clip): The clip proxy.
-        path (str): The file path to the clip proxy.
-        size (list): The image size in width, height
-        bbox (listO): The denormalized bbox.
-    Returns:
-        StoredFile: A StoredFile record.
-    """
-    attrs = {"width": size[0], "height": size[1]}
-    if bbox:
-        attrs['bbox'] = bbox
-    return file_storage.projects.store_file(path, clip, "proxy", "proxy.jpg",
-                                            attrs=attrs,
-                                            precache=False)
+    store_clip_batch(app, sim, asset_id, pending)
+    for tmp_file in tmp_files:
+        os.unlink(tmp_file)
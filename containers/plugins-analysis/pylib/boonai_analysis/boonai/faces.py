@@ -1,6 +1,7 @@
 import numpy as np
 from facenet_pytorch import MTCNN, InceptionResnetV1
 
+from boonsdk.simhash import encode_hash
 from boonflow import AssetProcessor, Singleton
 from boonflow import FileTypes
 from boonflow.analysis import LabelDetectionAnalysis
@@ -52,7 +53,7 @@ class MtCnnFaceDetectionEngine(metaclass=Singleton):
             img_embedding = self.resnet(img_cropped[i].unsqueeze(0))
             v_hash = np.clip(img_embedding.detach().numpy() + .25, 0, .5) * 50
             v_hash = v_hash.astype(int) + 65
-            f_hash = ''.join([chr(item) for item in v_hash[0]])
+            f_hash = encode_hash(v_hash[0])
 
             rect = calculate_normalized_bbox(img.size[0], img.size[1], item[0])
             result.append({'bbox': rect, 'score': item[1], 'simhash': f_hash})
@@ -1,8 +1,7 @@
-import cv2
 import cvlib as cv
 
 from boonflow import AssetProcessor
-from boonflow.proxy import get_proxy_level_path, calculate_normalized_bbox
+from boonflow.proxy import calculate_normalized_bbox
 from boonflow.analysis import LabelDetectionAnalysis
 
 
@@ -14,9 +13,7 @@ class ZviObjectDetectionProcessor(AssetProcessor):
 
     def process(self, frame):
         asset = frame.asset
-        p_path = get_proxy_level_path(asset, 1)
-
-        im = cv2.imread(p_path)
+        im = self.load_proxy_array(frame, mode='BGR')
         bbox, labels, conf = cv.detect_common_objects(im)
 
         if not bbox:
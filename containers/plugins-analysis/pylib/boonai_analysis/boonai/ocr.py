@@ -18,6 +18,9 @@ class ZviOcrProcessor(AssetProcessor):
     # Tesseract uses a lot of CPU
     use_threads = False
 
+    # Spread Tesseract across cores with worker processes.
+    use_processes = True
+
     def __init__(self):
         super(ZviOcrProcessor, self).__init__()
 
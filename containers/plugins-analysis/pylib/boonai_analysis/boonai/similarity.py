@@ -100,6 +100,12 @@ class ZviSimilarityProcessor(AssetProcessor):
     # MXNet is not thread safe.
     use_threads = False
 
+    # Each worker process loads its own copy of the model.
+    use_processes = True
+
+    # Proxies are hashed in batches.
+    batch_size = SimilarityEngine.max_batch_size
+
     model_path = "/models/resnet-152"
 
     def __init__(self):
@@ -110,12 +116,14 @@ class ZviSimilarityProcessor(AssetProcessor):
         self.engine = SimilarityEngine(self.model_path)
 
     def process(self, frame):
-        asset = frame.asset
-        p_path = get_proxy_level_path(asset, 0)
-        mxhash = self.engine.calculate_simhash(p_path)
-        struct = {
-            'type': 'similarity',
-            'simhash': mxhash
-        }
-
-        asset.add_analysis(self.namespace, struct)
+        self.process_batch([frame])
+
+    def process_batch(self, frames):
+        paths = [get_proxy_level_path(frame.asset, 0) for frame in frames]
+        for frame, mxhash in zip(frames, self.engine.calculate_simhashes(paths)):
+            struct = {
+                'type': 'similarity',
+                'simhash': mxhash
+            }
+            frame.asset.add_analysis(self.namespace, struct)
+        return [None] * len(frames)
@@ -40,7 +40,7 @@ class TestClipAnalysisProcessors(PluginUnitTestCase):
         assert args[1]['simhash'].startswith('OKOPPPNPNPPJPPPPPPI')
 
     @patch('boonai_analysis.boonai.clips.submit_clip_batch')
-    @patch.object(file_storage.projects, 'store_file')
+    @patch.object(file_storage.projects, 'store_files')
     @patch.object(VideoClipApp, 'scroll_search')
     @patch.object(file_storage, 'localize_file')
     @patch.object(AssetApp, 'get_asset')
@@ -52,7 +52,7 @@ class TestClipAnalysisProcessors(PluginUnitTestCase):
         get_asset_patch.return_value = TestAsset('12345')
         local_patch.return_value = test_path('video/ted_talk.mp4')
         search_patch.return_value = [clip]
-        store_file_patch.return_value = {'id': 'jonsnow'}
+        store_file_patch.return_value = [{'id': 'jonsnow'}]
 
         processor = self.init_processor(TimelineAnalysisProcessor(), {})
         processor.process(Frame(asset))
@@ -62,7 +62,7 @@ class TestClipAnalysisProcessors(PluginUnitTestCase):
         assert args[2]['56789']['simhash'].startswith('OKOPPPN')
 
     @patch('boonai_analysis.boonai.clips.submit_clip_batch')
-    @patch.object(file_storage.projects, 'store_file')
+    @patch.object(file_storage.projects, 'store_files')
     @patch.object(VideoClipApp, 'scroll_search')
     @patch.object(file_storage, 'localize_file')
     @patch.object(AssetApp, 'get_asset')
@@ -74,7 +74,7 @@ class TestClipAnalysisProcessors(PluginUnitTestCase):
         get_asset_patch.return_value = TestAsset('12345')
         local_patch.return_value = test_path('video/ted_talk.mp4')
         search_patch.return_value = [clip]
-        store_file_patch.return_value = {'id': 'jonsnow'}
+        store_file_patch.return_value = [{'id': 'jonsnow'}]
 
         processor = self.init_processor(MultipleTimelineAnalysisProcessor(), {
             'timelines': {'12345': ['test-timeline']}
@@ -86,7 +86,7 @@ class TestClipAnalysisProcessors(PluginUnitTestCase):
         assert args[2]['56789']['simhash'].startswith('OKOPPPN')
 
     @patch('boonai_analysis.boonai.clips.submit_clip_batch')
-    @patch.object(file_storage.projects, 'store_file')
+    @patch.object(file_storage.projects, 'store_files')
     @patch.object(VideoClipApp, 'scroll_search')
     @patch.object(file_storage, 'localize_file')
     @patch.object(AssetApp, 'get_asset')
@@ -98,7 +98,7 @@ class TestClipAnalysisProcessors(PluginUnitTestCase):
         get_asset_patch.return_value = TestAsset('12345')
         local_patch.return_value = test_path('video/ted_talk.mp4')
         search_patch.return_value = [clip]
-        store_file_patch.return_value = {'id': 'jonsnow'}
+        store_file_patch.return_value = [{'id': 'jonsnow'}]
 
         analyze_timelines(boonsdk.app_from_env(), simengine.SimilarityEngine(), asset.id, ["foo"])
 
@@ -107,4 +107,4 @@ class TestClipAnalysisProcessors(PluginUnitTestCase):
         assert args[2]['56789']['simhash'].startswith('OKOPPPN')
 
         args, kwargs = store_file_patch.call_args
-        assert kwargs['attrs']['bbox'] == [76, 43, 384, 215]
+        assert args[0][0][4]['bbox'] == [76, 43, 384, 215]
@@ -1,4 +1,3 @@
-import cv2
 from boonai_analysis.clarifai.util import AbstractClarifaiProcessor
 from boonflow.analysis import LabelDetectionAnalysis
 from boonflow.proxy import get_proxy_level_path
@@ -23,8 +22,6 @@ class AbstractClarifaiBboxProcessor(AbstractClarifaiProcessor):
     def process(self, frame):
         asset = frame.asset
         p_path = get_proxy_level_path(asset, 1)
-        im = cv2.imread(p_path)
-        h, w, _ = im.shape
         response = self.predict(p_path)
         regions = response.outputs[0].data.regions
         if not regions:
@@ -60,6 +60,9 @@ class AbstractClarifaiProcessor(AssetProcessor):
     attribute_name = None
     model_id = None
 
+    # Most of the time is spent waiting on the API.
+    thread_profile = "io"
+
     def __init__(self):
         super(AbstractClarifaiProcessor, self).__init__()
         self.attribute = 'clarifai-{}'.format(self.attribute_name)
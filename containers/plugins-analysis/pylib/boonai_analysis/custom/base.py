@@ -8,6 +8,9 @@ class CustomModelProcessor(AssetProcessor):
     """
     file_types = FileTypes.all
 
+    # The model version is resolved by init(), a new version may have been tagged.
+    resident = False
+
     def __init__(self):
         super(CustomModelProcessor, self).__init__()
         self.add_arg(Argument('model_id', 'str', required=True, toolTip='The model Id'))
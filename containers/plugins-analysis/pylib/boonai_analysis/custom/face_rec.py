@@ -1,8 +1,7 @@
 import os
 import pickle
 
-import numpy as np
-
+from boonsdk.simhash import decode_hashes
 from boonflow import Argument, Prediction, ImageInputStream
 from boonflow.analysis import LabelDetectionAnalysis
 from boonai_analysis.utils.prechecks import Prechecks
@@ -94,15 +93,7 @@ class KnnFaceRecognitionClassifier(CustomModelProcessor):
         Returns:
             nparray: Array of simhashes as a NP array.
         """
-        data = []
-        i = 0
-        for f in detections:
-            sim = f['simhash']
-            num_hash = [ord(char) for char in sim]
-            data.append(num_hash)
-            i += 1
-
-        return np.asarray(data, dtype=np.float64)
+        return decode_hashes([f['simhash'] for f in detections])
 
     def process_video(self, asset):
         """Process the given frame for predicting and adding labels to an asset
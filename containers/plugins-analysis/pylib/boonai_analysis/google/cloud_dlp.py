@@ -1,8 +1,6 @@
-import cv2
-
 import google.cloud.dlp
 
-from boonflow import file_storage, Argument, AssetProcessor, FileTypes
+from boonflow import file_storage, Argument, AssetProcessor, FileTypes, image_cache
 from boonflow.proxy import get_proxy_level_path, calculate_normalized_bbox
 from boonflow.analysis import LabelDetectionAnalysis, Prediction
 from boonflow.cloud import get_gcp_project_id
@@ -53,8 +51,10 @@ class CloudDLPDetectEntities(AssetProcessor):
         parent = f"projects/{pid}"
 
         p_path = self.get_proxy_image(frame.asset)
-
-        img = cv2.imread(p_path)
+        if frame.asset.get_files(category='ocr-proxy'):
+            img = image_cache.get_image(p_path, 'BGR')
+        else:
+            img = self.load_proxy_array(frame, 3, 'BGR')
         with open(p_path, mode="rb") as f:
             item = {"byte_item": {"type_": 1, "data": f.read()}}
 
@@ -31,6 +31,9 @@ class AbstractCloudVisionProcessor(AssetProcessor):
     file_types = FileTypes.images | FileTypes.documents
     analysis_name = None
 
+    # Most of the time is spent waiting on the API.
+    thread_profile = "io"
+
     def __init__(self):
         super(AbstractCloudVisionProcessor, self).__init__()
         self.image_annotator = None
@@ -34,12 +34,14 @@ class CloudDLPDetectEntitiesTests(PluginUnitTestCase):
            side_effect=MockDlpServiceClient)
     @patch('boonai_analysis.google.cloud_dlp.get_gcp_project_id')
     @patch('boonai_analysis.google.cloud_dlp.get_proxy_level_path')
+    @patch('boonflow.base.get_proxy_level_path')
     @patch.object(file_storage.assets, 'get_native_uri')
     @patch.object(file_storage, 'localize_file')
-    def test_extract_entities(self, localize_patch, native_patch,
+    def test_extract_entities(self, localize_patch, native_patch, base_proxy_patch,
                               proxy_patch, pid_patch, _, store_patch, store_blob_patch):
         localize_patch.return_value = TOUCAN
         native_patch.return_value = TOUCAN
+        base_proxy_patch.return_value = TOUCAN
         proxy_patch.return_value = TOUCAN
         pid_patch.return_value = 'foo'
         store_patch.return_value = get_mock_stored_file()
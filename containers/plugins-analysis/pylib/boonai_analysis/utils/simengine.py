@@ -1,11 +1,12 @@
 import os
+import queue
 from collections import namedtuple
-from threading import Lock
 
 import cv2
 import mxnet
 import numpy as np
 
+from boonsdk.simhash import decode_hash, encode_hashes
 from boonflow import Singleton
 
 Batch = namedtuple('Batch', ['data'])
@@ -14,14 +15,32 @@ Batch = namedtuple('Batch', ['data'])
 class SimilarityEngine(metaclass=Singleton):
     """
     Calculates similarity hashes using MXNET Resnet152.
+
+    Images are run through the model in batches.  Each replica of the model
+    keeps an executor for every batch size it has been asked to run, which
+    share the weights of the replica, and batches are padded up to the next
+    power of two so only a few executors are ever bound.  A replica runs one
+    batch at a time, so the number of replicas is the number of batches which
+    can run concurrently, each one costing another copy of the weights.
     """
     default_model_path = os.environ.get("SIMHASH_MODEL_PATH", "/models/resnet-152")
 
-    def __init__(self, model_path=None):
+    # The max number of images run through the model at once.
+    max_batch_size = int(os.environ.get("BOONAI_SIMHASH_BATCH_SIZE", 16))
+
+    # The number of copies of the model which can run at the same time.
+    default_replicas = int(os.environ.get("BOONAI_SIMHASH_REPLICAS", 1))
+
+    # The shape of a single prepped image.
+    image_shape = (3, 224, 224)
+
+    def __init__(self, model_path=None, replicas=None):
         if not model_path:
             model_path = self.default_model_path
-        self.mod = self._load_model(model_path)
-        self.lock = Lock()
+        self.symbol, self.arg_params, self.aux_params = self._load_checkpoint(model_path)
+        self.replicas = queue.Queue()
+        for _ in range(max(replicas or self.default_replicas, 1)):
+            self.replicas.put({1: self._bind(1)})
 
     def calculate_simhash(self, obj):
         """
@@ -32,8 +51,19 @@ class SimilarityEngine(metaclass=Singleton):
         Returns:
             str: The hash itself.
         """
-        img = self.load_image(obj)
-        return "".join([chr(item) for item in self.calculate_raw_simhash(img)])
+        return self.calculate_simhashes([obj])[0]
+
+    def calculate_simhashes(self, objs):
+        """
+        Calculate the similarity hashes of many images, which are run through
+        the model in batches.
+
+        Args:
+            objs (list): A list of file paths, file handles or prepped nparrays.
+        Returns:
+            list: The hashes, in the same order as the images.
+        """
+        return encode_hashes(self.calculate_raw_simhashes(objs))
 
     def calculate_raw_simhash(self, obj):
         """
@@ -45,11 +75,26 @@ class SimilarityEngine(metaclass=Singleton):
         Returns:
             numpy array: A numpy array of integers
         """
-        img = self.load_image(obj)
-        with self.lock:
-            self.mod.forward(Batch([img]))
-            features = self.mod.get_outputs()[0].asnumpy()
-        features = np.squeeze(features)
+        return self.calculate_raw_simhashes([obj])[0]
+
+    def calculate_raw_simhashes(self, objs):
+        """
+        Calculate the raw nparray hashes of many images, which are run through
+        the model in batches.
+
+        Args:
+            objs (list): A list of prepped nparrays, file paths, or file handles.
+
+        Returns:
+            numpy array: A 2D numpy array of integers with a row for each image.
+        """
+        results = []
+        for idx in range(0, len(objs), self.max_batch_size):
+            imgs = [self.load_image(obj) for obj in objs[idx:idx + self.max_batch_size]]
+            results.append(self._forward(imgs))
+        if not results:
+            return np.empty((0, 0), dtype=int)
+        features = np.concatenate(results)
         return np.clip((features*16).astype(int), 0, 15) + 65
 
     @staticmethod
@@ -64,7 +109,7 @@ class SimilarityEngine(metaclass=Singleton):
         Returns:
             nparray: simhash as a NP array.
         """
-        return np.asarray([ord(c) for c in simhash], dtype=np.float64)
+        return decode_hash(simhash)
 
     def prep_cvimage(self, img):
         """
@@ -78,7 +123,7 @@ class SimilarityEngine(metaclass=Singleton):
         """
         img = cv2.resize(img, (224, 224))
         if img.shape == (224, 224):
-            img = cv2.cvtColor(img, cv2.CV_GRAY2RGB)
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
         img = np.swapaxes(img, 0, 2)
         img = np.swapaxes(img, 1, 2)
         img = img[np.newaxis, :]
@@ -103,19 +148,77 @@ class SimilarityEngine(metaclass=Singleton):
 
         return self.prep_cvimage(img)
 
-    def _load_model(self, path):
+    def _forward(self, imgs):
         """
-        Load the model.
+        Run a batch of prepped images through a replica of the model.
+
+        Args:
+            imgs (list): A list of prepped images, no more than the max batch size.
 
         Returns:
-            mxnet.mod.Module: The mxnet model.
+            nparray: The features of each image.
+        """
+        size = self._get_batch_size(len(imgs))
+        data = mxnet.nd.concat(*imgs, dim=0)
+        if size > len(imgs):
+            padding = mxnet.nd.zeros((size - len(imgs),) + self.image_shape)
+            data = mxnet.nd.concat(data, padding, dim=0)
+
+        replica = self.replicas.get()
+        try:
+            mod = replica.get(size)
+            if not mod:
+                mod = replica[size] = self._bind(size, replica[1])
+            mod.forward(Batch([data]), is_train=False)
+            features = mod.get_outputs()[0].asnumpy()
+        finally:
+            self.replicas.put(replica)
+        return features[:len(imgs)]
+
+    def _get_batch_size(self, count):
+        """
+        Return the batch size a number of images is run at, which is the next
+        power of two up to the max batch size.
+
+        Args:
+            count (int): The number of images.
+
+        Returns:
+            int: The batch size.
+        """
+        size = 1
+        while size < count:
+            size *= 2
+        return min(size, max(self.max_batch_size, count))
+
+    def _load_checkpoint(self, path):
+        """
+        Load the model checkpoint.
+
+        Returns:
+            tuple: The feature extraction symbol, the arg params and the aux params.
         """
         mp = f"{path}/resnet-152"
         sym, arg_params, aux_params = mxnet.model.load_checkpoint(mp, 0)
 
         all_layers = sym.get_internals()
-        fe_sym = all_layers['flatten0_output']
-        fe_mod = mxnet.mod.Module(symbol=fe_sym, context=mxnet.cpu(), label_names=None)
-        fe_mod.bind(for_training=False, data_shapes=[('data', (1, 3, 224, 224))])
-        fe_mod.set_params(arg_params, aux_params)
+        return all_layers['flatten0_output'], arg_params, aux_params
+
+    def _bind(self, batch_size, shared_module=None):
+        """
+        Bind the model to the given batch size.
+
+        Args:
+            batch_size (int): The batch size.
+            shared_module (mxnet.mod.Module): A module of the same replica to share
+                the weights with, otherwise the weights are copied.
+
+        Returns:
+            mxnet.mod.Module: The mxnet model.
+        """
+        fe_mod = mxnet.mod.Module(symbol=self.symbol, context=mxnet.cpu(), label_names=None)
+        fe_mod.bind(for_training=False, data_shapes=[('data', (batch_size,) + self.image_shape)],
+                    shared_module=shared_module)
+        if not shared_module:
+            fe_mod.set_params(self.arg_params, self.aux_params)
         return fe_mod
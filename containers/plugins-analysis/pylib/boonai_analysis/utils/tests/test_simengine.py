@@ -21,6 +21,21 @@ class SimilarityEngineTests(TestCase):
         assert sim.startswith("PPPPGCBIPPK")
         assert len(sim) == 2048
 
+    def test_calculate_hashes_batched(self):
+        paths = [test_path("images/set01/faces.jpg"),
+                 test_path("images/set01/toucan.jpg"),
+                 test_path("images/set01/faces.jpg")]
+        sims = self.simeng.calculate_simhashes(paths)
+        assert len(sims) == 3
+        assert sims[0] == sims[2] == self.simeng.calculate_simhash(paths[0])
+        assert sims[1] == self.simeng.calculate_simhash(paths[1])
+
+    def test_get_batch_size(self):
+        assert self.simeng._get_batch_size(1) == 1
+        assert self.simeng._get_batch_size(3) == 4
+        assert self.simeng._get_batch_size(self.simeng.max_batch_size) == \
+            self.simeng.max_batch_size
+
     def test_hash_as_nparray(self):
         np = self.simeng.hash_as_nparray("AAAAAA")
         assert len(np) == 6
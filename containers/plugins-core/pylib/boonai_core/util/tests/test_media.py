@@ -33,6 +33,7 @@ def test_get_video_metadata():
 
 @patch('boonai_core.util.media.check_output')
 def test_get_image_metadata_invalid_chars(check_out_patch):
+    media.probe_cache.clear()
     xml = """
     <ImageSpec version="20">
     <attrib name="oiio:ColorSpace" type="string">sRGB</attrib>
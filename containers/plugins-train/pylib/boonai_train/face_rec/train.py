@@ -5,6 +5,7 @@ import tempfile
 import numpy as np
 from sklearn.neighbors import KNeighborsClassifier
 
+from boonsdk.simhash import decode_hashes
 from boonflow import ModelTrainer, file_storage, ProcessorException
 
 
@@ -90,20 +91,8 @@ class KnnFaceRecognitionTrainer(ModelTrainer):
         Returns:
             array: a tuple of NP array containg the hashes and labels.
         """
-        data = []
-        labels = []
-        i = 0
-        for f in hashes:
-            num_hash = []
-            simhah = f['simhash']
-            for char in simhah:
-                num_hash.append(ord(char))
-            data.append(num_hash)
-            labels.append(f['label'])
-            i += 1
-
-        x = np.asarray(data, dtype=np.float64)
-        y = np.asarray(labels)
+        x = decode_hashes([f['simhash'] for f in hashes])
+        y = np.asarray([f['label'] for f in hashes])
 
         return x, y
 
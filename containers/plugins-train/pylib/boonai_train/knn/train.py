@@ -8,6 +8,7 @@ from sklearn.metrics import pairwise_distances_argmin_min
 from sklearn.neighbors import KNeighborsClassifier
 
 import boonsdk
+from boonsdk.simhash import decode_hashes
 from boonflow import ModelTrainer, Argument, file_storage
 
 
@@ -48,23 +49,20 @@ class KnnLabelDetectionTrainer(ModelTrainer):
             n_points = 5000
             count = 0
             for asset in self.app.assets.scroll_search(query):
-                num_hash = []
                 shash = asset['analysis']['boonai-image-similarity']['simhash']
                 if shash is not None:
-                    for char in shash:
-                        num_hash.append(ord(char))
-                    hashes.append(num_hash)
+                    hashes.append(shash)
                     assets.append(asset)
                     count += 1
                     if count >= n_points:
                         break
 
-            x = np.asarray(hashes, dtype=np.float64)
-
             if not hashes:
                 self.logger.warning("No similarity hashes found. Can't pre-cluster.")
                 return
 
+            x = decode_hashes(hashes)
+
             status = "Clustering {} points".format(n_points)
             self.reactor.emit_status(status)
             kmeans = KMeans(n_clusters=n_clusters, random_state=0).fit(x)
@@ -106,20 +104,8 @@ class KnnLabelDetectionTrainer(ModelTrainer):
         Returns:
             array: a tuple of NP array containg the hashes and labels.
         """
-        data = []
-        labels = []
-        i = 0
-        for f in hashes:
-            num_hash = []
-            simhash = f['simhash']
-            for char in simhash:
-                num_hash.append(ord(char))
-            data.append(num_hash)
-            labels.append(f['label'])
-            i += 1
-
-        x = np.asarray(data, dtype=np.float64)
-        y = np.asarray(labels)
+        x = decode_hashes([f['simhash'] for f in hashes])
+        y = np.asarray([f['label'] for f in hashes])
 
         return x, y
 
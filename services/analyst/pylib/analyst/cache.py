@@ -9,7 +9,8 @@ logger = logging.getLogger(__name__)
 class FileCache:
     """
     A simple class for managing a cache of files for a given key
-    in a task dictionary.
+    in a task dictionary.  If the key is None, the cache root is
+    shared by all tasks.
 
     """
     def __init__(self, dirname, key):
@@ -64,6 +65,8 @@ class FileCache:
         Returns:
             str: The cache path
         """
+        if self.key is None:
+            return self.root
         return os.path.join(self.root, task[self.key])
 
     def clear_cache_root(self):
@@ -80,11 +83,13 @@ class FileCache:
 
 class ModelCacheManager:
     """
-    The ModelCacheManager handles creating and destroying per-project
-    model cache directories on the Analyst.
+    The ModelCacheManager handles creating the model cache directory on the Analyst.
+    The model cache is shared by the containers of every project, which install models
+    into it by checksum and evict the least recently used models when it's over the
+    BOONAI_MODEL_CACHE_SIZE_MB budget, see boonflow.modelcache.
     """
 
-    instance = FileCache("model-cache", "projectId")
+    instance = FileCache("model-cache", None)
 
     @classmethod
     def create_model_cache(cls, task):
@@ -99,30 +104,17 @@ class ModelCacheManager:
         """
         return cls.instance.create_cache_path(task)
 
-    @classmethod
-    def remove_model_cache(cls, task):
-        """
-        Remove the model cache.
-
-        Args:
-            task (dict): A Task dictionary.
-
-        """
-        cls.instance.remove_cache(task)
-
     @classmethod
     def get_model_cache_path(cls, task):
         """
-        Get the model cache path.  If the ZVI_MODEL_CACHE_ROOT environment variable
-        is set then that location is used for the model cache root.  This is
-        usually /model-cache on an analyst.  If no env car is set, then the
-        temp dir is used.  This would be the case in a unittest environment.
+        Get the model cache path.  The cache is created under the ANALYST_CACHE_ROOT
+        directory, which defaults to /tmp.
 
         Args:
             task (dict): The Task dictionary.
 
         Returns:
-            str: The path to the model cache for a task.
+            str: The path to the model cache, which is the same for every task.
 
         """
         return cls.instance.get_cache_path(task)
@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "EventPipeline"
+]
+
+
+class EventPipeline(object):
+    """
+    The EventPipeline is a bounded, background queue of task events which
+    are delivered to the Archivist in bulk by a single worker thread.
+
+    Status and progress events are coalesced, if an event of the same type
+    for the same task is still waiting to be sent, its payload is replaced
+    rather than a new event being queued.  When the pipeline is full, callers
+    block until the worker has made room.
+
+    Attributes:
+        client (ClusterClient): The client used to send event batches.
+        max_size (int): The max number of pending events before callers block.
+        batch_size (int): The max number of events sent in a single request.
+        flush_interval (float): Seconds the worker waits for a batch to fill.
+
+    """
+
+    # The max number of events waiting to be sent.
+    default_max_size = int(os.environ.get("ANALYST_EVENT_QUEUE_SIZE", 1000))
+
+    # The max number of events sent in a single request.
+    default_batch_size = int(os.environ.get("ANALYST_EVENT_BATCH_SIZE", 50))
+
+    # Seconds to wait for more events before sending a partial batch.
+    default_flush_interval = float(os.environ.get("ANALYST_EVENT_FLUSH_INTERVAL", 0.25))
+
+    # Event types where only the latest pending event matters.
+    coalesced_types = frozenset(["STATUS", "PROGRESS"])
+
+    def __init__(self, client, max_size=None, batch_size=None, flush_interval=None):
+        """
+        Create a new EventPipeline.
+
+        Args:
+            client (ClusterClient): A client with send_events() and send_event() methods.
+            max_size (int): The max number of pending events.
+            batch_size (int): The max number of events per request.
+            flush_interval (float): Seconds to wait for a batch to fill.
+        """
+        self.client = client
+        self.max_size = max(max_size or self.default_max_size, 1)
+        self.batch_size = max(batch_size or self.default_batch_size, 1)
+        self.flush_interval = self.default_flush_interval \
+            if flush_interval is None else flush_interval
+
+        self.pending = []
+        self.coalesced = {}
+        self.queued_count = 0
+        self.sent_count = 0
+        self.lock = threading.Condition()
+        self.worker = None
+
+    def put(self, event):
+        """
+        Add an event to the pipeline.  Blocks if the pipeline is full.
+
+        Args:
+            event (dict): An event created by ClusterClient.make_event().
+
+        """
+        with self.lock:
+            self.__start_worker()
+            key = (event["taskId"], event["type"])
+            if event["type"] in self.coalesced_types:
+                existing = self.coalesced.get(key)
+                if existing is not None:
+                    existing["payload"] = event["payload"]
+                    return
+
+            while len(self.pending) >= self.max_size:
+                self.lock.wait()
+
+            self.pending.append(event)
+            self.queued_count += 1
+            if event["type"] in self.coalesced_types:
+                self.coalesced[key] = event
+            self.lock.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Block until every event queued before this call has been sent.
+
+        Args:
+            timeout (float): The max number of seconds to wait, None to wait forever.
+
+        Returns:
+            bool: True if all events were sent, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            target = self.queued_count
+            while self.sent_count < target:
+                if deadline is None:
+                    self.lock.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self.lock.wait(remaining)
+            return True
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def __start_worker(self):
+        """
+        Start the worker thread if one has not already been started.  Must
+        be called with the lock held.
+        """
+        if not self.worker:
+            self.worker = threading.Thread(target=self.__worker_func)
+            self.worker.daemon = True
+            self.worker.start()
+
+    def __next_batch(self):
+        """
+        Block until there are events to send, give the batch a short time to
+        fill up, then remove and return the next batch of events.
+
+        Returns:
+            list: A list of events.
+        """
+        with self.lock:
+            while not self.pending:
+                self.lock.wait()
+
+            if len(self.pending) < self.batch_size and self.flush_interval:
+                self.lock.wait(self.flush_interval)
+
+            batch = self.pending[:self.batch_size]
+            del self.pending[:self.batch_size]
+            for event in batch:
+                key = (event["taskId"], event["type"])
+                if self.coalesced.get(key) is event:
+                    del self.coalesced[key]
+
+            # Wake up any callers blocked on a full pipeline.
+            self.lock.notify_all()
+            return batch
+
+    def __worker_func(self):
+        """
+        Send batches of events to the Archivist.  This function will block
+        forever and must be started from within a Thread.
+        """
+        while True:
+            batch = self.__next_batch()
+            try:
+                status = self.client.send_events(batch)
+                if status is not None and not 200 <= status < 300:
+                    logger.warning("Failed to send {} queued events, status {}, "
+                                   "sending them individually".format(len(batch), status))
+                    self.__send_individually(batch)
+            except Exception as e:
+                logger.warning("Failed to send {} queued events, {}".format(len(batch), e))
+            finally:
+                with self.lock:
+                    self.sent_count += len(batch)
+                    self.lock.notify_all()
+
+    def __send_individually(self, batch):
+        """
+        Send the events of a rejected batch one at a time, so a single bad
+        event doesn't lose the rest of the batch.
+
+        Args:
+            batch (list): A list of events.
+        """
+        for event in batch:
+            try:
+                status = self.client.send_event(event)
+            except Exception as e:
+                status = e
+            if not isinstance(status, int) or not 200 <= status < 300:
+                logger.warning("Failed to send {} event for task {}, {}".format(
+                    event["type"], event["taskId"], status))
@@ -9,6 +9,10 @@ import docker
 import zmq
 
 from .cache import TaskCacheManager, ModelCacheManager
+from .logs import LogFileRotator, set_thread_task_id
+from .pipeline import ProcessorPipeline
+from .pool import ContainerPool
+from .protocol import EventCodec
 
 logger = logging.getLogger('task')
 
@@ -25,6 +29,57 @@ EXIT_STATUS_HARD_FAIL = 9
 EXIT_STATUS_HAS_ERRORS = 8
 
 
+class TaskSlot(object):
+    """
+    A TaskSlot is a share of the Analyst's CPU and memory which runs
+    a single task at a time.
+
+    Attributes:
+        index (int): The slot number.
+        cpus (float): The CPUs available to the slot's containers, None for no limit.
+        memory_mb (int): The memory available to the slot's containers, None for no limit.
+        busy (bool): True if the slot has been reserved for a task.
+        task (ZpsExecutor): The task running in the slot, or None.
+        thread (Thread): The thread the task runs on.
+        log_rotator (LogFileRotator): Handles the task log for the slot.
+    """
+
+    def __init__(self, index, cpus=None, memory_mb=None):
+        """
+        Create a new TaskSlot.
+
+        Args:
+            index (int): The slot number.
+            cpus (float): The CPUs available to the slot, None for no limit.
+            memory_mb (int): The memory available to the slot, None for no limit.
+        """
+        self.index = index
+        self.cpus = cpus
+        self.memory_mb = memory_mb
+        self.busy = False
+        self.task = None
+        self.thread = None
+        self.log_rotator = LogFileRotator()
+
+    def get_container_limits(self):
+        """
+        Return the docker resource limits for containers started in this slot.
+
+        Returns:
+            dict: Keyword args for docker's containers.run().
+        """
+        limits = {}
+        if self.cpus:
+            limits["nano_cpus"] = int(self.cpus * 1e9)
+        if self.memory_mb:
+            limits["mem_limit"] = "{}m".format(self.memory_mb)
+        return limits
+
+    def __str__(self):
+        return "<TaskSlot index={} cpus={} memory_mb={}>".format(
+            self.index, self.cpus, self.memory_mb)
+
+
 class ZpsExecutor(object):
     """
     This class is responsible for iteration and interpretation of
@@ -33,6 +88,9 @@ class ZpsExecutor(object):
     Attributes:
         task (dict): The task tp execute.
         client (ClusterClient): A client for talking back to Archivist.
+        slot (TaskSlot): The slot the task is running in, or None.
+        pool (ContainerPool): A pool of warm containers, or None.
+        prefetcher (Prefetcher): Pulls images in the background, or None.
         killed (bool): If the script has been manually killed.
         new_state (string): A new task state set by a kill command.
         exit_status (int): The exit status of the task, >0 failure.
@@ -41,24 +99,32 @@ class ZpsExecutor(object):
         event_counts (dict): Counters for event messages by type.
     """
 
-    def __init__(self, task, client):
+    def __init__(self, task, client, slot=None, pool=None, prefetcher=None):
         """
         Create a new ZpsExecutor.
 
         Args:
             task (dict): A task.
             client (ClusterClient): An archivist client,.
+            slot (TaskSlot): The slot the task is running in, or None.
+            pool (ContainerPool): A pool of warm containers, or None.
+            prefetcher (Prefetcher): Pulls images in the background, or None.
         """
         self.task = task
         self.client = client
+        self.slot = slot
+        self.pool = pool
+        self.prefetcher = prefetcher
         self.killed = False
         self.new_state = None
         self.exit_status = 0
         self.container = None
+        self.pipeline = None
         self.script = self.task.get("script", {})
         # A roll up of event counts from the various containers
         # that are spawned during processing.
         self.event_counts = {}
+        self.event_counts_lock = threading.Lock()
 
     def run(self):
         """
@@ -77,7 +143,7 @@ class ZpsExecutor(object):
                     self.client.emit_event(
                         self.task, "index", {
                             "assets": payload, "settings": self.script.get("settings", {})})
-                    self.client.emit_event(self.task, "status", {
+                    self.client.queue_event(self.task, "status", {
                         "status": "Indexing {} assets".format(len(assets))
                     })
         except Exception as e:
@@ -119,9 +185,7 @@ class ZpsExecutor(object):
 
                 # Run containerized generator
                 if not self.container:
-                    self.container = DockerContainerWrapper(
-                        self.client, self.task, proc["image"])
-                    self.container.wait_for_container()
+                    self.start_container(proc["image"])
 
                 self.container.execute_generator(proc, settings)
 
@@ -149,32 +213,59 @@ class ZpsExecutor(object):
                     .format(len(processors), len(assets)))
 
         total_processors = len(processors)
+        stages = self.get_stages(processors)
 
         try:
-            for idx, proc in enumerate(processors):
+            if ProcessorPipeline.enabled and len(stages) > 1 and assets:
+                self.pipeline = ProcessorPipeline(self, stages, settings)
+                return self.pipeline.run(assets)
+
+            idx = 0
+            while idx < total_processors:
+                proc = processors[idx]
+                image = proc["image"]
+                # The remaining processors which run in the same image.
+                end = idx + 1
+                while end < total_processors and processors[end]["image"] == image:
+                    end += 1
+                run = processors[idx:end]
+
+                if len(run) > 1 and assets:
+                    if not self.container:
+                        self.start_container(image)
+                    if "fuse" in self.container.capabilities:
+                        assets = self.run_fused_processors(run, assets, settings)
+                        idx = end
+                        self.client.queue_event(self.task, "progress", {
+                            "progress": int(idx / float(total_processors) * 100)
+                        })
+                        for ref in run:
+                            self.teardown_processor(ref, ref is not run[-1])
+                        if not assets:
+                            logger.warning("All assets have been skipped")
+                            break
+                        continue
 
                 # If the next processor requires the same container
                 # then set keep_container=True
-                keep_container = False
-                image = proc["image"]
-                if idx < len(processors) - 1 and processors[idx + 1]["image"] == image:
-                    keep_container = True
+                keep_container = idx < end - 1
 
                 # Runs all objects through the processor, returning
                 # objects in their new state.
-                self.client.emit_event(self.task, "status", {
+                self.client.queue_event(self.task, "status", {
                     "status": "Running: {}".format(proc["className"])
                 })
 
                 assets = self.run_containerized_processor(proc, assets, settings)
 
-                self.client.emit_event(self.task, "progress", {
+                self.client.queue_event(self.task, "progress", {
                     "progress": int((idx + 1) / float(total_processors) * 100)
                 })
 
                 # Tear down the processor, optionally keeping the container
                 # if its needed again.
                 self.teardown_processor(proc, len(assets) and keep_container)
+                idx += 1
 
                 if not assets:
                     logger.warning("All assets have been skipped")
@@ -190,6 +281,26 @@ class ZpsExecutor(object):
 
         return assets
 
+    @staticmethod
+    def get_stages(processors):
+        """
+        Split a list of processors into stages of contiguous processors
+        which use the same image.
+
+        Args:
+            processors (list): A list of processor refs.
+
+        Returns:
+            list: A list of lists of processor refs.
+        """
+        stages = []
+        for proc in processors:
+            if stages and stages[-1][0]["image"] == proc["image"]:
+                stages[-1].append(proc)
+            else:
+                stages.append([proc])
+        return stages
+
     def teardown_processor(self, ref, keep_container):
         """
         Run the teardown on a given processor.
@@ -201,9 +312,9 @@ class ZpsExecutor(object):
         """
         logger.info("tearing down processor ref='{}'".format(ref["className"]))
         self.container.run_teardown(ref)
-        # Destroy container if we don't need it for next iteration
+        # Release container if we don't need it for next iteration
         if not keep_container:
-            self.stop_container("switching containers")
+            self.release_container()
         else:
             logger.info("keeping container {}".format(ref["image"]))
 
@@ -221,14 +332,100 @@ class ZpsExecutor(object):
         """
         results = []
         if not self.container:
-            self.container = DockerContainerWrapper(
-                self.client, self.task, ref["image"])
-            self.container.wait_for_container()
+            self.start_container(ref["image"])
 
         if assets:
             results = self.container.execute_processor_on_assets(ref, assets, settings)
         return results
 
+    def run_fused_processors(self, refs, assets, settings):
+        """
+        Runs a list of DocumentProcessors which use the same image on a list of
+        objects with a single request, each object is passed through all of the
+        processors inside the container.
+
+        Args:
+            refs (list): The processor references.
+            assets: (list): A list of assets.
+            settings (dict): A dict of settings.
+
+        Returns:
+            list: Returns the objects in their processed state.
+
+        """
+        self.client.queue_event(self.task, "status", {
+            "status": "Running: {}".format(", ".join([ref["className"] for ref in refs]))
+        })
+        return self.container.execute_processors_on_assets(refs, assets, settings)
+
+    def start_container(self, image):
+        """
+        Set the container property to a ready container for the given image.  A warm
+        container from the pool is reused if one is available.
+
+        Args:
+            image (str): The docker image.
+
+        """
+        self.container = self.checkout_container(image)
+
+    def checkout_container(self, image):
+        """
+        Return a ready container for the given image.  A warm container from
+        the pool is reused if one is available.
+
+        Args:
+            image (str): The docker image.
+
+        Returns:
+            DockerContainerWrapper: The container.
+        """
+        if self.pool:
+            key = DockerContainerWrapper.get_pool_key(self.task, image, self.slot)
+            container = self.pool.checkout(key, self.client, self.task, self.slot)
+            if container:
+                return container
+
+        container = DockerContainerWrapper(
+            self.client, self.task, image, self.slot, self.prefetcher)
+        try:
+            container.wait_for_container()
+        except Exception:
+            container.stop()
+            raise
+        return container
+
+    def release_container(self):
+        """
+        Return the current container to the pool and set the container
+        property to None.  If there is no pool, the container is stopped.
+        """
+        if not self.pool:
+            self.stop_container("switching containers")
+            return
+
+        if not self.container:
+            return
+
+        container = self.container
+        self.container = None
+        self.checkin_container(container)
+
+    def checkin_container(self, container):
+        """
+        Roll up the event counts of a container which is no longer needed and
+        return it to the pool.  If there is no pool, the container is stopped.
+
+        Args:
+            container (DockerContainerWrapper): The container.
+
+        """
+        self.add_event_counts(container)
+        if self.pool:
+            self.pool.checkin(container)
+        else:
+            container.stop()
+
     def kill(self, task_id, new_state, reason="manually killed"):
         """
         Stop the execution of the task by closing the event socket
@@ -256,22 +453,36 @@ class ZpsExecutor(object):
         Stops the current container instance and sets the
         container property to None.
         """
+        if self.pipeline and self.pipeline.stop(reason):
+            return True
+
         if not self.container:
             logger.warning("stop_container did not have a container instance to stop.")
             return False
 
         logger.warning("Stopping container, reason: {}".format(reason))
-        for k, v in self.container.event_counts.items():
-            if k in self.event_counts:
-                self.event_counts[k] += v
-            else:
-                self.event_counts[k] = v
+        self.add_event_counts(self.container)
 
         killed = self.container.stop()
         if killed:
             self.container = None
         return killed
 
+    def add_event_counts(self, container):
+        """
+        Roll up the event counts from the given container.
+
+        Args:
+            container (DockerContainerWrapper): The container.
+
+        """
+        with self.event_counts_lock:
+            for k, v in container.event_counts.items():
+                if k in self.event_counts:
+                    self.event_counts[k] += v
+                else:
+                    self.event_counts[k] = v
+
     def get_exit_status(self):
         """
         Return the final exit status of the task.
@@ -303,7 +514,13 @@ class DockerContainerWrapper:
 
     used_ports = set()
 
-    def __init__(self, client, task, image):
+    # Tasks in other slots allocate ports concurrently.
+    port_lock = threading.Lock()
+
+    # Milliseconds to wait for a pooled container to reset.
+    reset_timeout = 5000
+
+    def __init__(self, client, task, image, slot=None, prefetcher=None):
         """
         Create a new DockerContainerWrapper which manages the container process life cycle.
 
@@ -311,10 +528,15 @@ class DockerContainerWrapper:
             client (ClusterClient): A client for talking back to Archivist.
             task (dict): A task description.
             image (str): The docker image to run.
+            slot (TaskSlot): The slot which limits the container's resources, or None.
+            prefetcher (Prefetcher): Pulls images in the background, or None.
         """
         self.task = task
         self.image = image
         self.client = client
+        self.slot = slot
+        self.prefetcher = prefetcher
+        self.pool_key = self.get_pool_key(task, image, slot)
         self.docker_client = docker.from_env()
         self.event_counts = {}
         self.killed = False
@@ -324,6 +546,9 @@ class DockerContainerWrapper:
 
         ctx = zmq.Context()
         self.socket = ctx.socket(zmq.PAIR)
+        self.codec = EventCodec()
+        # The optional features supported by the container.
+        self.capabilities = set()
         self.port = self._find_port()
 
     def _find_port(self):
@@ -340,12 +565,26 @@ class DockerContainerWrapper:
 
         while True:
             port = random.randint(*CONTAINER_PORT_RANGE)
-            if port not in self.used_ports and test_port(port):
+            with self.port_lock:
+                if port in self.used_ports:
+                    continue
                 self.used_ports.add(port)
+            if test_port(port):
                 logger.info(f'Spawning container on port: {port}')
                 return port
 
     def _docker_login(self):
+        self.docker_login(self.docker_client)
+
+    @staticmethod
+    def docker_login(docker_client):
+        """
+        Log the docker client into docker-hub if there is a creds file.
+
+        Args:
+            docker_client (DockerClient): The docker client.
+
+        """
         creds_file = os.environ.get("ANALYST_DOCKER_CREDS_FILE",
                                     "/etc/docker/.dockerconfigjson")
         try:
@@ -354,10 +593,10 @@ class DockerContainerWrapper:
 
             reg = "https://index.docker.io/v1/"
             dh_creds = creds["auths"][reg]
-            self.docker_client.login(dh_creds["username"],
-                                     dh_creds["password"],
-                                     dh_creds["email"],
-                                     reg)
+            docker_client.login(dh_creds["username"],
+                                dh_creds["password"],
+                                dh_creds["email"],
+                                reg)
 
         except FileNotFoundError:
             logger.warning("No docker creds file found.")
@@ -377,16 +616,46 @@ class DockerContainerWrapper:
             logger.info("Skipping docker pull, ANALYST_DOCKER_PULL==false")
             return self.image
 
-        self._docker_login()
+        if self.prefetcher and self.prefetcher.wait_for_image(self.image):
+            full_name = self.get_image_name(self.image)
+            logger.info('Using prefetched image: {}'.format(full_name))
+            return full_name
 
-        if ":" in self.image:
-            full_name = self.image
-        else:
-            full_name = "{}:{}".format(self.image, os.environ.get("CLUSTER_TAG", "latest"))
+        return self.pull_image(self.docker_client, self.image)
+
+    @staticmethod
+    def get_image_name(image):
+        """
+        Return the full name of the image, including the tag.
+
+        Args:
+            image (str): The image name.
+
+        Returns:
+            str: The image name and tag.
+        """
+        if ":" in image:
+            return image
+        return "{}:{}".format(image, os.environ.get("CLUSTER_TAG", "latest"))
+
+    @classmethod
+    def pull_image(cls, docker_client, image):
+        """
+        Pull the latest version of the image from the remote repo.
+
+        Args:
+            docker_client (DockerClient): The docker client.
+            image (str): The image name.
+
+        Returns:
+            str: The full image name.
+        """
+        cls.docker_login(docker_client)
+        full_name = cls.get_image_name(image)
 
         logger.info('Checking for new image: {}'.format(full_name))
         try:
-            remote_img = self.docker_client.images.pull(full_name)
+            remote_img = docker_client.images.pull(full_name)
             logger.info("loaded new image {} id={}".format(full_name, remote_img.id))
         except docker.errors.APIError:
             # Image wasn't found in remote repo.
@@ -405,8 +674,8 @@ class DockerContainerWrapper:
         self.check_killed()
         image = self._pull_image()
 
-        task_cache = TaskCacheManager.create_task_cache(self.task)
-        model_cache = ModelCacheManager.create_model_cache(self.task)
+        TaskCacheManager.create_task_cache(self.task)
+        ModelCacheManager.create_model_cache(self.task)
 
         volumes = {
             "/tmp": {"bind": os.environ.get("ANALYST_TEMP", "/tmp"), "mode": "rw"}
@@ -420,20 +689,11 @@ class DockerContainerWrapper:
         else:
             ports = None
 
-        env = self.task.get("env", {})
-        env.update({
-            "BOONAI_BILLING_METRICS_SERVICE":
-                os.environ.get("BOONAI_BILLING_METRICS_SERVICE", "http://10.3.240.109"),
-            "ZVI_MODEL_CACHE": model_cache,
-            "TMPDIR": task_cache,
-            "BOONAI_SERVER": os.environ.get("BOONAI_SERVER"),
-            "OFFICER_URL": os.environ.get("OFFICER_URL"),
-            # Get threads from task env, or os env.
-            "ANALYST_THREADS": env.get("ANALYST_THREADS", os.environ.get("ANALYST_THREADS"))
-        })
+        limits = self.get_limits(self.slot)
+        env = self.get_environment(self.task, self.slot)
 
-        logger.info("starting container {} vols={} network={} port={}".format(
-            self.image, volumes, network, self.port))
+        logger.info("starting container {} vols={} network={} port={} limits={}".format(
+            self.image, volumes, network, self.port, limits))
         command = ["/usr/local/bin/server", "-p", str(self.port)]
         self.container = self.docker_client.containers.run(image, detach=True,
                                                            environment=env,
@@ -441,7 +701,8 @@ class DockerContainerWrapper:
                                                            entrypoint=command,
                                                            network=network,
                                                            ports=ports,
-                                                           labels=["zmlpcd"])
+                                                           labels=["zmlpcd"],
+                                                           **limits)
 
         logger.info("started container {} tags: {}".format(
             self.container.image.id, self.container.image.tags))
@@ -451,6 +712,106 @@ class DockerContainerWrapper:
         self.log_thread.daemon = True
         self.log_thread.start()
 
+    @staticmethod
+    def get_limits(slot):
+        """
+        Return the docker resource limits for a container.
+
+        Args:
+            slot (TaskSlot): The slot the container runs in, or None.
+
+        Returns:
+            dict: Keyword args for docker's containers.run().
+        """
+        return slot.get_container_limits() if slot else {}
+
+    @staticmethod
+    def get_environment(task, slot=None):
+        """
+        Return the container environment for the given task.
+
+        Args:
+            task (dict): The task.
+            slot (TaskSlot): The slot the container runs in, or None.
+
+        Returns:
+            dict: The container environment.
+        """
+        threads = os.environ.get("ANALYST_THREADS")
+        if not threads and slot and slot.cpus:
+            # Default to one processing thread per CPU in the slot.
+            threads = str(max(1, int(slot.cpus)))
+
+        env = dict(task.get("env", {}))
+        env.update({
+            "BOONAI_BILLING_METRICS_SERVICE":
+                os.environ.get("BOONAI_BILLING_METRICS_SERVICE", "http://10.3.240.109"),
+            "BOONAI_MODEL_CACHE": ModelCacheManager.get_model_cache_path(task),
+            "BOONAI_MODEL_CACHE_SIZE_MB": os.environ.get("BOONAI_MODEL_CACHE_SIZE_MB"),
+            "TMPDIR": TaskCacheManager.get_task_cache_path(task),
+            "BOONAI_SERVER": os.environ.get("BOONAI_SERVER"),
+            "OFFICER_URL": os.environ.get("OFFICER_URL"),
+            # Get threads from task env, or os env.
+            "ANALYST_THREADS": env.get("ANALYST_THREADS", threads)
+        })
+        return env
+
+    @classmethod
+    def get_pool_key(cls, task, image, slot=None):
+        """
+        Return the ContainerPool key for a container running the given image for a task.
+
+        Args:
+            task (dict): The task.
+            image (str): The docker image.
+            slot (TaskSlot): The slot the container runs in, or None.
+
+        Returns:
+            str: The pool key.
+        """
+        return ContainerPool.get_key(image, cls.get_environment(task, slot), cls.get_limits(slot))
+
+    def reset(self, client, task, slot=None):
+        """
+        Reset the container so it can run processors for another task.  The container
+        process is checked and the daemon is sent the new task environment, which
+        doubles as a health check before a pooled container is reused.
+
+        Args:
+            client (ClusterClient): A client for talking back to Archivist.
+            task (dict): The task the container will run.
+            slot (TaskSlot): The slot the container runs in, or None.
+
+        Returns:
+            bool: True if the container is healthy and was reset.
+        """
+        self.client = client
+        self.task = task
+        self.slot = slot
+        self.event_counts = {}
+
+        try:
+            self.check_killed()
+            self.container.reload()
+            if self.container.status != "running":
+                logger.warning("Container '{}' is not running, status={}".format(
+                    self.image, self.container.status))
+                return False
+
+            TaskCacheManager.create_task_cache(task)
+            ModelCacheManager.create_model_cache(task)
+            self.codec.send(self.socket, {
+                "type": "reset",
+                "payload": {
+                    "env": self.get_environment(task, slot)
+                }
+            })
+            event = self.receive_event(self.reset_timeout)
+            return event["type"] == "ok"
+        except Exception as e:
+            logger.warning("Failed to reset container '{}', {}".format(self.image, e))
+            return False
+
     def wait_for_container(self):
         """
         Start container and block until the process completes.
@@ -465,7 +826,12 @@ class DockerContainerWrapper:
         retry = True
         while True:
             self.socket.connect(uri)
-            self.socket.send_json({"type": "ready", "payload": {}})
+            self.codec.send(self.socket, {
+                "type": "ready",
+                "payload": {
+                    "protocols": self.codec.protocols
+                }
+            })
             event = self.receive_event(20000)
             if event["type"] == "timeout":
                 if retry:
@@ -475,7 +841,10 @@ class DockerContainerWrapper:
                 raise RuntimeError(
                     "Container {} in bad state, timed out".format(self.image))
             elif event["type"] == "ok":
-                logger.info("Container '{}' is ready to accept commands.".format(self.image))
+                protocol = self.codec.select(event["payload"].get("protocol"))
+                self.capabilities = set(event["payload"].get("capabilities") or [])
+                logger.info("Container '{}' is ready to accept commands, protocol={}".format(
+                    self.image, protocol))
                 return
             else:
                 raise RuntimeError(
@@ -492,6 +861,8 @@ class DockerContainerWrapper:
         for line in logs:
             if self.killed:
                 return
+            # Pooled containers are reused by other tasks.
+            set_thread_task_id(self.task.get("taskId"))
             line = line.decode("utf-8").rstrip()
             logger.info("CONTAINER:%s" % line)
 
@@ -523,11 +894,11 @@ class DockerContainerWrapper:
                 "ref": ref
             }
         }
-        self.socket.send_json(request)
+        self.codec.send(self.socket, request)
         rsp = self.receive_event(10000)
 
         # Emit the teardown event.
-        self.client.emit_event(self.task, rsp["type"], rsp["payload"])
+        self.client.queue_event(self.task, rsp["type"], rsp["payload"])
 
     def execute_generator(self, ref, settings):
         """
@@ -551,18 +922,18 @@ class DockerContainerWrapper:
             }
         }
 
-        self.client.emit_event(self.task, "status", {
+        self.client.queue_event(self.task, "status", {
             "status": "Running generator: {}".format(ref["className"])
         })
 
-        self.socket.send_json(request)
+        self.codec.send(self.socket, request)
         while True:
             event = self.receive_event()
             event_type = event["type"]
             if event_type == "finished":
                 break
             else:
-                self.client.emit_event(self.task, event_type, event["payload"])
+                self.client.queue_event(self.task, event_type, event["payload"])
 
     def execute_processor(self, ref, asset, settings):
         """
@@ -587,7 +958,7 @@ class DockerContainerWrapper:
             }
         }
         self.check_killed()
-        self.socket.send_json(request)
+        self.codec.send(self.socket, request)
         while True:
             event = self.receive_event()
             event_type = event["type"]
@@ -597,7 +968,7 @@ class DockerContainerWrapper:
                 if event_type == "error":
                     logger.warning("processing error {}".format(event["payload"]))
                 # Echo back to archivist.
-                self.client.emit_event(self.task, event_type, event["payload"])
+                self.client.queue_event(self.task, event_type, event["payload"])
 
     def execute_processor_on_assets(self, ref, assets, settings):
         """
@@ -613,9 +984,6 @@ class DockerContainerWrapper:
             assets (list): The asset or possibly None.
 
         """
-        result = []
-        result_counter = 0
-
         logger.info("processing {} assets".format(len(assets)))
 
         self.check_killed()
@@ -629,7 +997,7 @@ class DockerContainerWrapper:
                 "settings": settings
             }
         }
-        self.socket.send_json(preprocess)
+        self.codec.send(self.socket, preprocess)
         while True:
             event = self.receive_event()
             event_type = event["type"]
@@ -640,34 +1008,202 @@ class DockerContainerWrapper:
                     "Container {} in bad state. Error event received: {}".format(
                         self.image, event))
             else:
-                self.client.emit_event(self.task, event_type, event["payload"])
+                self.client.queue_event(self.task, event_type, event["payload"])
 
         # Execute processs
-        request = {
-            "type": "execute",
-            "payload": {
-                "ref": ref,
-                "assets": assets,
-                "settings": settings
-            }
-        }
-        self.socket.send_json(request)
+        return self.__execute({
+            "ref": ref,
+            "assets": assets,
+            "settings": settings
+        })
+
+    def execute_processors_on_assets(self, refs, assets, settings):
+        """
+        Execute a list of Processor refs on a list of objects with a single
+        request.  The container passes each object through every processor
+        and runs their preprocess steps, so no preprocess request is sent.
+
+        Once zpsd is contacted with the execute command, this
+        function blocks forever until the result is sent back
+        or a 'hardfailure' event is emitted by the container.
+
+        Args:
+            refs (list): The Processor references.
+            assets (list): The assets.
+            settings (dict): A dict of settings.
+
+        Returns:
+            list: The processed assets which were not skipped.
+        """
+        logger.info("processing {} assets with {} processors".format(len(assets), len(refs)))
+        self.check_killed()
+        return self.__execute({
+            "refs": refs,
+            "assets": assets,
+            "settings": settings
+        })
+
+    def __execute(self, payload):
+        """
+        Send an execute request and wait for an 'asset' event for each asset.
+
+        Args:
+            payload (dict): The execute request payload.
+
+        Returns:
+            list: The processed assets which were not skipped.
+        """
+        result = []
+        result_counter = 0
+        assets = payload["assets"]
+
+        # Patches are matched to assets by id, so each id must be unique.
+        assets_by_id = dict([(asset["id"], asset) for asset in assets])
+        payload["delta"] = len(assets_by_id) == len(assets)
+
+        self.codec.send(self.socket, {"type": "execute", "payload": payload})
         while True:
             event = self.receive_event()
             event_type = event["type"]
             if event_type == "asset":
                 result_counter += 1
-                if not event["payload"]["skip"]:
-                    result.append(event["payload"]["asset"])
+                payload = event["payload"]
+                if not payload["skip"]:
+                    if "patch" in payload:
+                        asset = assets_by_id[payload["id"]]
+                        self.apply_asset_patch(asset, payload["patch"])
+                        result.append(asset)
+                    else:
+                        result.append(payload["asset"])
                 if result_counter == len(assets):
                     logger.info("All assets processed")
                     break
+            elif event_type == "preprocess":
+                # Sent by the processors with a preprocess step in a fused request.
+                continue
             else:
                 # Echo back to archivist.
-                self.client.emit_event(self.task, event_type, event["payload"])
+                self.client.queue_event(self.task, event_type, event["payload"])
 
         return result
 
+    def stream_processors_on_assets(self, refs, settings, source, sink, chunk_size, max_pending):
+        """
+        Execute a list of Processor refs on assets as they arrive on the source
+        queue, putting the processed assets on the sink queue as the container
+        finishes them.  A chunk of assets is sent when the container is idle or
+        a full chunk is waiting, up to max_pending assets at a time.  The container
+        handles requests in order, so chunks sent while it's busy wait in the socket.
+
+        Args:
+            refs (list): The Processor references.
+            settings (dict): A dict of settings.
+            source (AssetQueue): The queue of assets to process.
+            sink (AssetQueue): The queue processed assets are put on, skipped assets
+                are dropped.
+            chunk_size (int): The max number of assets per request.
+            max_pending (int): The max number of assets sent but not returned.
+
+        Returns:
+            int: The number of assets processed.
+        """
+        self.check_killed()
+
+        # Maps an asset id to the assets sent with that id, oldest first.
+        pending = {}
+        pending_count = 0
+        total = 0
+
+        while True:
+            while pending_count < max_pending:
+                count = min(chunk_size, max_pending - pending_count)
+                chunk = source.take(count, count if pending_count else 1,
+                                    0 if pending_count else 0.5)
+                if not chunk:
+                    break
+
+                # Patches are matched by id, so they're only used when the ids are unique.
+                ids = set([asset["id"] for asset in chunk])
+                delta = len(ids) == len(chunk) and not any(i in pending for i in ids)
+                for asset in chunk:
+                    pending.setdefault(asset["id"], []).append(asset)
+                pending_count += len(chunk)
+                total += len(chunk)
+
+                self.codec.send(self.socket, {
+                    "type": "execute",
+                    "payload": {
+                        "refs": refs,
+                        "assets": chunk,
+                        "settings": settings,
+                        "delta": delta
+                    }
+                })
+
+            if not pending_count:
+                if source.is_done():
+                    return total
+                self.check_killed()
+                continue
+
+            # Check for new assets from the source while the container is busy.
+            if not self.socket.poll(50):
+                self.check_killed()
+                continue
+
+            event = self.receive_event()
+            event_type = event["type"]
+            if event_type == "asset":
+                payload = event["payload"]
+                asset_id = payload["id"] if "patch" in payload else payload["asset"]["id"]
+                asset = pending[asset_id].pop(0)
+                if not pending[asset_id]:
+                    del pending[asset_id]
+                pending_count -= 1
+
+                if not payload["skip"]:
+                    if "patch" in payload:
+                        sink.put(self.apply_asset_patch(asset, payload["patch"]))
+                    else:
+                        sink.put(payload["asset"])
+            elif event_type == "preprocess":
+                continue
+            else:
+                # Echo back to archivist.
+                self.client.queue_event(self.task, event_type, event["payload"])
+
+    @staticmethod
+    def apply_asset_patch(asset, patch):
+        """
+        Apply a patch of changed document paths sent by the container to an asset.
+
+        Args:
+            asset (dict): The asset.
+            patch (dict): A dict with a 'set' dict of paths to values
+                and an 'unset' list of deleted paths.
+
+        Returns:
+            dict: The asset.
+        """
+        document = asset.setdefault("document", {})
+        for attr in patch.get("unset", []):
+            doc = document
+            parts = attr.split(".")
+            for k in parts[:-1]:
+                doc = doc.get(k) if isinstance(doc, dict) else None
+            if isinstance(doc, dict):
+                doc.pop(parts[-1], None)
+
+        for attr, value in patch.get("set", {}).items():
+            doc = document
+            parts = attr.split(".")
+            for k in parts[:-1]:
+                if not isinstance(doc.get(k), dict):
+                    doc[k] = {}
+                doc = doc[k]
+            doc[parts[-1]] = value
+        return asset
+
     def receive_event(self, timeout=None):
         """
         Wait and receive events from ZPSD.   Blocks forever until
@@ -687,7 +1223,7 @@ class DockerContainerWrapper:
             # the container depends up in a deadlocked socket.
             poll = self.socket.poll(500)
             if poll > 0:
-                event = self.socket.recv_json()
+                event = self.codec.recv(self.socket)
             elif timeout:
                 wait_time -= 500
                 if wait_time <= 0:
@@ -710,7 +1246,8 @@ class DockerContainerWrapper:
             event (dict): An event sent from ZMQ.
         """
         try:
-            asset_id = event["payload"]["asset"]["id"]
+            payload = event["payload"]
+            asset_id = payload["id"] if "patch" in payload else payload["asset"]["id"]
         except (KeyError, TypeError):
             asset_id = None
 
@@ -718,7 +1255,7 @@ class DockerContainerWrapper:
             event["type"], self.image, asset_id))
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug('------------------------------------------------------')
-            logger.debug(json.dumps(event, indent=4))
+            logger.debug(json.dumps(event, indent=4, default=str))
             logger.debug('------------------------------------------------------')
 
         # Update the event counts
@@ -1,5 +1,6 @@
 import logging
 import os
+import threading
 
 import requests
 import google.cloud.logging
@@ -8,6 +9,41 @@ from google.cloud.logging_v2.handlers import CloudLoggingHandler
 task_logger = logging.getLogger('task')
 logger = logging.getLogger(__name__)
 
+# Tracks which task the current thread is working on.
+thread_task = threading.local()
+
+
+def set_thread_task_id(task_id):
+    """
+    Associate the calling thread with a task.  Task log records emitted by
+    the thread are only written to that task's log.  Records from threads
+    which are not associated with a task are not written to any task log.
+
+    Args:
+        task_id (str): The task id, or None to clear.
+
+    """
+    thread_task.task_id = task_id
+
+
+class TaskLogFilter(logging.Filter):
+    """
+    Filters out log records emitted by threads which are not working on the task.
+    """
+
+    def __init__(self, task_id):
+        """
+        Create a new TaskLogFilter.
+
+        Args:
+            task_id (str): The task id of the log being written.
+        """
+        super(TaskLogFilter, self).__init__()
+        self.task_id = task_id
+
+    def filter(self, record):
+        return getattr(thread_task, "task_id", None) == self.task_id
+
 
 class LogFileRotator:
     """
@@ -31,6 +67,7 @@ class LogFileRotator:
 
         """
         self.task = task
+        log_filter = TaskLogFilter(self.task_id)
 
         # The log file is intended for customer use and thus
         # is not set to debug level.  Debug gives away underlying
@@ -39,6 +76,7 @@ class LogFileRotator:
 
         self.handler = logging.FileHandler(self.log_path)
         self.handler.setLevel(logging.INFO)
+        self.handler.addFilter(log_filter)
         task_logger.addHandler(self.handler)
 
         # If we're not in local dev setup the GCP log handler.
@@ -46,6 +84,7 @@ class LogFileRotator:
             client = google.cloud.logging.Client()
             self.gc_logs_handler = CloudLoggingHandler(client, name=task['logName'])
             self.gc_logs_handler.setLevel(logging.INFO)
+            self.gc_logs_handler.addFilter(log_filter)
             task_logger.addHandler(self.gc_logs_handler)
 
         logger.info(f'Set up task log for {self.task_id}')
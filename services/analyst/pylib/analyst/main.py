@@ -24,6 +24,11 @@ def main():
                         help='Seconds to wait before polling for a new task. 0 to disable')
     parser.add_argument('-g', '--ping', default=30,
                         help='Seconds to wait between each ping, 0 to disable')
+    parser.add_argument('-s', '--slots', type=int, default=os.environ.get('ANALYST_SLOTS', 1),
+                        help='The number of tasks to run at the same time')
+    parser.add_argument('-k', '--lookahead', type=int,
+                        default=os.environ.get('ANALYST_LOOKAHEAD', 1),
+                        help='The number of tasks to claim and prefetch while all slots are busy')
     parser.add_argument('-v', '--verbose', action='store_true', default=False,
                         help='Enable verbose logging')
     args = parser.parse_args()
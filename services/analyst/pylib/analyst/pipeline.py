@@ -0,0 +1,309 @@
+import collections
+import logging
+import os
+import threading
+
+from .logs import set_thread_task_id
+
+logger = logging.getLogger('task')
+
+__all__ = [
+    "AssetQueue",
+    "ProcessorPipeline",
+    "PipelineAborted"
+]
+
+
+class PipelineAborted(RuntimeError):
+    """
+    Raised by an AssetQueue when another stage of the pipeline has failed.
+    """
+    pass
+
+
+class AssetQueue(object):
+    """
+    A bounded queue of assets between two stages of a ProcessorPipeline.  The
+    upstream stage closes the queue once it has put all of its assets.
+
+    Attributes:
+        max_size (int): The max number of assets in the queue, 0 for no limit.
+
+    """
+
+    def __init__(self, max_size=0):
+        """
+        Create a new AssetQueue.
+
+        Args:
+            max_size (int): The max number of assets in the queue, 0 for no limit.
+        """
+        self.max_size = max_size
+        self.items = collections.deque()
+        self.closed = False
+        self.aborted = False
+        self.cond = threading.Condition()
+
+    def put(self, asset):
+        """
+        Add an asset to the queue, blocking while the queue is full.
+
+        Args:
+            asset (dict): The asset.
+
+        """
+        with self.cond:
+            while self.max_size and len(self.items) >= self.max_size and not self.aborted:
+                self.cond.wait()
+            if self.aborted:
+                raise PipelineAborted("The pipeline was aborted")
+            self.items.append(asset)
+            self.cond.notify_all()
+
+    def take(self, max_count, min_count=1, timeout=0):
+        """
+        Remove and return up to max_count assets.  Assets are only returned if
+        there are at least min_count of them or the queue is closed.
+
+        Args:
+            max_count (int): The max number of assets to return.
+            min_count (int): The min number of assets to return.
+            timeout (float): Seconds to wait for min_count assets, None to wait forever.
+
+        Returns:
+            list: A list of assets, which may be empty.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.aborted or self.closed
+                               or len(self.items) >= min_count, timeout)
+            if self.aborted:
+                raise PipelineAborted("The pipeline was aborted")
+            if len(self.items) < min_count and not self.closed:
+                return []
+            count = min(max_count, len(self.items))
+            result = [self.items.popleft() for _ in range(count)]
+            self.cond.notify_all()
+            return result
+
+    def close(self):
+        """
+        Signal that no more assets will be put into the queue.
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def abort(self):
+        """
+        Abort the queue, waking up any blocked callers.
+        """
+        with self.cond:
+            self.aborted = True
+            self.cond.notify_all()
+
+    def is_done(self):
+        """
+        Return True if the queue is closed and empty.
+
+        Returns:
+            bool: True if there are no more assets.
+        """
+        with self.cond:
+            return self.closed and not self.items
+
+    def __len__(self):
+        with self.cond:
+            return len(self.items)
+
+
+class ProcessorPipeline(object):
+    """
+    The ProcessorPipeline runs consecutive stages of processors which use different
+    images at the same time, each stage in its own container.  Assets processed by
+    one stage stream into the next stage as they're finished, so a pipeline doesn't
+    have to wait on the slowest asset at every stage.
+
+    Each stage sends its container a chunk of assets whenever the container is idle
+    or a full chunk is waiting, with a bounded number of assets in flight.  Together
+    with the bounded queues between stages this caps the number of assets held in
+    memory.  A stage whose container doesn't support fused requests waits for all
+    of its assets and runs its processors one at a time.
+
+    Attributes:
+        executor (ZpsExecutor): The executor running the task.
+        stages (list): A list of lists of processor refs which use the same image.
+        settings (dict): The script settings.
+        chunk_size (int): The max number of assets per execute request.
+        queue_size (int): The max number of assets in flight or queued per stage.
+
+    """
+
+    # Set to false to run stages one after the other.
+    enabled = os.environ.get("ANALYST_PIPELINE", "true") == "true"
+
+    # The max number of assets sent to a container in one request.
+    default_chunk_size = int(os.environ.get("ANALYST_PIPELINE_CHUNK_SIZE", 10))
+
+    # The max number of assets in flight or queued for each stage.
+    default_queue_size = int(os.environ.get("ANALYST_PIPELINE_QUEUE_SIZE", 50))
+
+    def __init__(self, executor, stages, settings, chunk_size=None, queue_size=None):
+        """
+        Create a new ProcessorPipeline.
+
+        Args:
+            executor (ZpsExecutor): The executor running the task.
+            stages (list): A list of lists of processor refs which use the same image.
+            settings (dict): The script settings.
+            chunk_size (int): The max number of assets per execute request.
+            queue_size (int): The max number of assets in flight or queued per stage.
+        """
+        self.executor = executor
+        self.stages = stages
+        self.settings = settings
+        self.chunk_size = max(chunk_size or self.default_chunk_size, 1)
+        self.queue_size = max(queue_size or self.default_queue_size, self.chunk_size)
+
+        self.queues = []
+        self.containers = []
+        self.errors = []
+        self.completed = 0
+        self.lock = threading.Lock()
+
+    def run(self, assets):
+        """
+        Run the assets through every stage of the pipeline.
+
+        Args:
+            assets (list): The assets.
+
+        Returns:
+            list: The processed assets which were not skipped.
+        """
+        # The first queue holds every asset, the last collects the results.
+        self.queues = [AssetQueue()] + \
+            [AssetQueue(self.queue_size) for _ in self.stages[1:]] + [AssetQueue()]
+        for asset in assets:
+            self.queues[0].put(asset)
+        self.queues[0].close()
+
+        self.executor.client.queue_event(self.executor.task, "status", {
+            "status": "Running {} pipelined stages".format(len(self.stages))
+        })
+
+        threads = []
+        for idx, refs in enumerate(self.stages):
+            thread = threading.Thread(target=self.__run_stage, args=(idx, refs))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+        if self.queues[-1].aborted:
+            raise PipelineAborted("The pipeline was aborted")
+
+        result = self.queues[-1]
+        return result.take(len(result))
+
+    def stop(self, reason):
+        """
+        Abort the pipeline and stop all of its containers.
+
+        Args:
+            reason (str): Why the pipeline is being stopped.
+
+        Returns:
+            bool: True if any containers were stopped.
+        """
+        self.abort()
+        with self.lock:
+            containers = list(self.containers)
+
+        stopped = False
+        for container in containers:
+            logger.warning("Stopping pipeline container, reason: {}".format(reason))
+            if container.stop():
+                self.executor.add_event_counts(container)
+                stopped = True
+        return stopped
+
+    def abort(self):
+        """
+        Abort every queue in the pipeline.
+        """
+        for queue in self.queues:
+            queue.abort()
+
+    def __run_stage(self, idx, refs):
+        """
+        Run a stage of the pipeline.  This function must be started from within a Thread.
+
+        Args:
+            idx (int): The stage index.
+            refs (list): The processor refs.
+
+        """
+        # Attribute the stage's logging to the task.
+        set_thread_task_id(self.executor.task.get("taskId"))
+        source = self.queues[idx]
+        sink = self.queues[idx + 1]
+        container = None
+        try:
+            container = self.executor.checkout_container(refs[0]["image"])
+            with self.lock:
+                self.containers.append(container)
+
+            if "fuse" in container.capabilities:
+                count = container.stream_processors_on_assets(
+                    refs, self.settings, source, sink, self.chunk_size, self.queue_size)
+            else:
+                assets = source.take(self.queue_size, timeout=None)
+                while not source.is_done():
+                    assets.extend(source.take(self.queue_size, timeout=None))
+                count = len(assets)
+                ran = []
+                for ref in refs:
+                    if assets:
+                        assets = container.execute_processor_on_assets(ref, assets, self.settings)
+                        ran.append(ref)
+                for asset in assets:
+                    sink.put(asset)
+                refs = ran
+
+            if count:
+                for ref in refs:
+                    container.run_teardown(ref)
+            sink.close()
+
+            with self.lock:
+                self.containers.remove(container)
+            self.executor.checkin_container(container)
+            self.__add_progress(len(refs))
+
+        except Exception as e:
+            if not isinstance(e, PipelineAborted):
+                logger.exception("Pipeline stage {} failed, {}".format(idx, e))
+                self.errors.append(e)
+            self.abort()
+        finally:
+            set_thread_task_id(None)
+
+    def __add_progress(self, count):
+        """
+        Emit a progress event once processors are finished.
+
+        Args:
+            count (int): The number of processors which finished.
+
+        """
+        total = sum([len(refs) for refs in self.stages])
+        with self.lock:
+            self.completed += count
+            progress = int(self.completed / float(total) * 100)
+        self.executor.client.queue_event(self.executor.task, "progress", {
+            "progress": progress
+        })
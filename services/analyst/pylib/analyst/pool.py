@@ -0,0 +1,217 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "ContainerPool"
+]
+
+
+class ContainerPool(object):
+    """
+    The ContainerPool keeps a bounded number of idle plugin containers warm so
+    they can be reused by later tasks which need the same image and environment.
+    This saves the cost of starting the container and importing the processor
+    modules, which is often greater than the cost of processing a small batch.
+
+    Containers are checked out by pool key and reset before reuse, containers
+    which fail the health check are stopped.  The least recently used containers
+    are stopped when the pool is full, have been idle for too long, or the
+    Analyst is low on memory.
+
+    Attributes:
+        max_size (int): The max number of idle containers, 0 to disable pooling.
+        max_idle (float): The max number of seconds a container can sit idle.
+        min_free_memory (int): Idle containers are evicted when free memory
+            drops below this number of MB.
+
+    """
+
+    # The max number of idle containers.
+    default_max_size = int(os.environ.get("ANALYST_POOL_SIZE", 4))
+
+    # The max number of seconds a container can sit idle in the pool.
+    default_max_idle = float(os.environ.get("ANALYST_POOL_MAX_IDLE", 600))
+
+    # Evict idle containers when free memory falls below this many MB.
+    default_min_free_memory = int(os.environ.get("ANALYST_POOL_MIN_FREE_MB", 2048))
+
+    # Environment variables which differ for every task and are applied
+    # to a pooled container when it's reset.
+    task_env = frozenset(["BOONAI_TASK_ID", "TMPDIR"])
+
+    def __init__(self, max_size=None, max_idle=None, min_free_memory=None):
+        """
+        Create a new ContainerPool.
+
+        Args:
+            max_size (int): The max number of idle containers.
+            max_idle (float): The max number of seconds a container can sit idle.
+            min_free_memory (int): The min free memory in MB before evicting containers.
+        """
+        self.max_size = self.default_max_size if max_size is None else max_size
+        self.max_idle = self.default_max_idle if max_idle is None else max_idle
+        self.min_free_memory = self.default_min_free_memory \
+            if min_free_memory is None else min_free_memory
+
+        # A list of (idle since, container), oldest first.
+        self.idle = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_key(cls, image, env, limits=None):
+        """
+        Return the pool key for a container with the given image, environment
+        and resource limits.  Task specific environment is not part of the key.
+
+        Args:
+            image (str): The docker image.
+            env (dict): The container environment.
+            limits (dict): The container resource limits.
+
+        Returns:
+            str: The pool key.
+        """
+        shared_env = dict([(k, v) for k, v in env.items() if k not in cls.task_env])
+        sha = hashlib.sha256()
+        sha.update(json.dumps([image, shared_env, limits or {}],
+                              sort_keys=True, default=str).encode("utf-8"))
+        return sha.hexdigest()
+
+    def checkout(self, key, client, task, slot=None):
+        """
+        Remove and return a healthy idle container for the given key, reset
+        to run the given task.
+
+        Args:
+            key (str): The pool key.
+            client (ClusterClient): A client for talking back to Archivist.
+            task (dict): The task the container will run.
+            slot (TaskSlot): The slot the task is running in, or None.
+
+        Returns:
+            DockerContainerWrapper: A container, or None if there is no healthy container.
+        """
+        while True:
+            with self.lock:
+                matches = [item for item in self.idle if item[1].pool_key == key]
+                if not matches:
+                    return None
+                item = matches[-1]
+                self.idle.remove(item)
+
+            container = item[1]
+            if container.reset(client, task, slot):
+                logger.info("Reusing warm container '{}'".format(container.image))
+                return container
+
+            logger.warning("Stopping unhealthy container '{}'".format(container.image))
+            self.__stop(container)
+
+    def checkin(self, container):
+        """
+        Add an idle container to the pool.  The container is stopped
+        if pooling is disabled or it's no longer usable.
+
+        Args:
+            container (DockerContainerWrapper): The container.
+
+        Returns:
+            bool: True if the container was added to the pool.
+        """
+        if not self.max_size or container.killed or not container.pool_key:
+            self.__stop(container)
+            return False
+
+        with self.lock:
+            self.idle.append((time.monotonic(), container))
+        logger.info("Returned container '{}' to the pool".format(container.image))
+        self.trim()
+        return container in self.containers
+
+    def trim(self):
+        """
+        Stop idle containers until the pool is within its size limit, has no
+        containers which have been idle too long, and the Analyst has enough
+        free memory.
+
+        Returns:
+            int: The number of containers stopped.
+        """
+        evicted = []
+        with self.lock:
+            now = time.monotonic()
+            while self.idle:
+                idle_since, container = self.idle[0]
+                if len(self.idle) > self.max_size:
+                    reason = "pool is full"
+                elif self.max_idle and now - idle_since > self.max_idle:
+                    reason = "idle timeout"
+                elif self.low_memory():
+                    reason = "low memory"
+                else:
+                    break
+                logger.info("Evicting container '{}' from the pool, {}".format(
+                    container.image, reason))
+                evicted.append(container)
+                del self.idle[0]
+
+        for container in evicted:
+            self.__stop(container)
+        return len(evicted)
+
+    def clear(self):
+        """
+        Stop all idle containers.
+        """
+        with self.lock:
+            evicted = [item[1] for item in self.idle]
+            self.idle = []
+
+        for container in evicted:
+            self.__stop(container)
+
+    def low_memory(self):
+        """
+        Return True if the Analyst's free memory is below the min free memory.
+
+        Returns:
+            bool: True if memory is low.
+        """
+        free_mb = psutil.virtual_memory().available / 1024 ** 2
+        return free_mb < self.min_free_memory
+
+    @property
+    def containers(self):
+        """
+        The idle containers.
+
+        Returns:
+            list[DockerContainerWrapper]: The idle containers, oldest first.
+        """
+        with self.lock:
+            return [item[1] for item in self.idle]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.idle)
+
+    def __stop(self, container):
+        """
+        Stop a container, logging any failure.
+
+        Args:
+            container (DockerContainerWrapper): The container.
+
+        """
+        try:
+            container.stop()
+        except Exception as e:
+            logger.warning("Failed to stop container '{}', {}".format(container.image, e))
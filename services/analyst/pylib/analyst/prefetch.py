@@ -0,0 +1,337 @@
+import hashlib
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+import docker
+import requests
+
+from .cache import TaskCacheManager
+from .executor import DockerContainerWrapper
+
+logger = logging.getLogger(__name__)
+
+# Image pulls block starting containers, so they run before file downloads.
+IMAGE_PRIORITY = 0
+FILE_PRIORITY = 1
+
+__all__ = [
+    "Prefetcher",
+    "get_task_images"
+]
+
+
+class Prefetcher(object):
+    """
+    The Prefetcher overlaps network I/O with processing.  It pulls the plugin
+    images a task needs and localizes the source files of tasks which are waiting
+    to run into their task cache, using a small pool of background threads.
+
+    Attributes:
+        threads (int): The number of background threads.
+        image_ttl (float): The number of seconds a pulled image is considered current.
+
+    """
+
+    # The number of background threads.
+    default_threads = int(os.environ.get("ANALYST_PREFETCH_THREADS", 4))
+
+    # Seconds before an image pulled in the background is pulled again.
+    default_image_ttl = float(os.environ.get("ANALYST_PREFETCH_IMAGE_TTL", 300))
+
+    def __init__(self, threads=None, image_ttl=None):
+        """
+        Create a new Prefetcher.
+
+        Args:
+            threads (int): The number of background threads.
+            image_ttl (float): The number of seconds a pulled image is considered current.
+        """
+        self.threads = max(threads or self.default_threads, 1)
+        self.image_ttl = self.default_image_ttl if image_ttl is None else image_ttl
+
+        # Maps an image name to a (time pulled, threading.Event) tuple.
+        self.images = {}
+        # The ids of tasks whose files are being localized.
+        self.file_tasks = set()
+        self.lock = threading.Lock()
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.workers = []
+
+    def prefetch_images(self, task):
+        """
+        Pull the images used by the given task in the background.  Images
+        which have already been pulled recently are skipped.
+
+        Args:
+            task (dict): A task dictionary.
+
+        Returns:
+            int: The number of images queued to be pulled.
+        """
+        if os.environ.get("ANALYST_DOCKER_PULL", "true") == "false":
+            return 0
+
+        count = 0
+        for image in get_task_images(task):
+            name = DockerContainerWrapper.get_image_name(image)
+            with self.lock:
+                if self.__is_current(name):
+                    continue
+                self.images[name] = (None, threading.Event())
+            self.__submit(IMAGE_PRIORITY, self.__pull_image, name)
+            count += 1
+        return count
+
+    def wait_for_image(self, image, timeout=None):
+        """
+        Wait for a background pull of the given image to finish.
+
+        Args:
+            image (str): The image name.
+            timeout (float): The max number of seconds to wait, None to wait forever.
+
+        Returns:
+            bool: True if the image has been pulled recently and doesn't need to be pulled.
+        """
+        name = DockerContainerWrapper.get_image_name(image)
+        with self.lock:
+            entry = self.images.get(name)
+        if not entry:
+            return False
+        if not entry[1].wait(timeout):
+            return False
+        with self.lock:
+            return self.__is_current(name)
+
+    def prefetch_files(self, task):
+        """
+        Localize the source files of the given task's assets into the task
+        cache in the background.  The files are written to the same paths the
+        boonflow file cache in the container uses, so they are not downloaded
+        again when the task runs.
+
+        Args:
+            task (dict): A task dictionary.
+
+        Returns:
+            int: The number of files queued to be localized.
+        """
+        assets = task.get("script", {}).get("assets") or []
+        if not assets:
+            return 0
+
+        env = task.get("env", {})
+        server = env.get("BOONAI_SERVER", os.environ.get("BOONAI_SERVER"))
+        apikey = env.get("BOONAI_APIKEY")
+
+        with self.lock:
+            self.file_tasks.add(task["id"])
+
+        count = 0
+        for asset in assets:
+            doc = asset.get("document", {})
+            source_files = [f for f in doc.get("files", []) if f.get("category") == "source"]
+            if source_files:
+                if not apikey or not server:
+                    continue
+                file_id = source_files[0]["id"]
+                self.__submit(FILE_PRIORITY, self.__localize_stored_file,
+                              task, file_id, server, apikey)
+                count += 1
+            else:
+                uri = doc.get("source", {}).get("path")
+                # Cloud bucket files need the job's credentials, which only the container has.
+                if not uri or urlparse(uri).scheme not in ("http", "https"):
+                    continue
+                if uri.startswith("https://www.youtube.com/watch"):
+                    continue
+                self.__submit(FILE_PRIORITY, self.__localize_uri, task, uri)
+                count += 1
+
+        if count:
+            logger.info("Prefetching {} source files for task {}".format(count, task["id"]))
+        return count
+
+    def cancel(self, task):
+        """
+        Stop localizing files for the given task.  Files which are
+        currently being downloaded are allowed to finish.
+
+        Args:
+            task (dict): A task dictionary.
+
+        """
+        with self.lock:
+            self.file_tasks.discard(task["id"])
+
+    def __is_current(self, name):
+        """
+        Return True if the image is being pulled or was pulled within the image ttl.
+        Must be called with the lock held.
+
+        Args:
+            name (str): The full image name.
+
+        Returns:
+            bool: True if the image is current.
+        """
+        entry = self.images.get(name)
+        if not entry:
+            return False
+        pulled_time = entry[0]
+        if pulled_time is None:
+            return not entry[1].is_set()
+        return time.monotonic() - pulled_time < self.image_ttl
+
+    def __submit(self, priority, func, *args):
+        """
+        Queue a function to be run by a background thread.
+
+        Args:
+            priority (int): The priority, lower runs first.
+            func (function): The function.
+            *args: The function arguments.
+
+        """
+        with self.lock:
+            if not self.workers:
+                for _ in range(self.threads):
+                    worker = threading.Thread(target=self.__worker_func)
+                    worker.daemon = True
+                    worker.start()
+                    self.workers.append(worker)
+        self.queue.put((priority, next(self.counter), func, args))
+
+    def __worker_func(self):
+        """
+        Run queued functions.  This function will block forever and
+        must be started from within a Thread.
+        """
+        while True:
+            _, _, func, args = self.queue.get()
+            try:
+                func(*args)
+            except Exception as e:
+                logger.warning("Prefetch failed, {}".format(e))
+            finally:
+                self.queue.task_done()
+
+    def __pull_image(self, name):
+        """
+        Pull the given image.
+
+        Args:
+            name (str): The full image name.
+
+        """
+        pulled_time = None
+        try:
+            docker_client = docker.from_env()
+            DockerContainerWrapper.pull_image(docker_client, name)
+            pulled_time = time.monotonic()
+        finally:
+            with self.lock:
+                event = self.images[name][1]
+                if pulled_time is None:
+                    del self.images[name]
+                else:
+                    self.images[name] = (pulled_time, event)
+            event.set()
+
+    def __localize_stored_file(self, task, file_id, server, apikey):
+        """
+        Download a file from project storage into the task cache.
+
+        Args:
+            task (dict): The task.
+            file_id (str): The StoredFile id.
+            server (str): The Boon AI server URL.
+            apikey (str): The task's API key.
+
+        """
+        # Imported here since boonsdk is provided by the boonflow base image.
+        from boonsdk import BoonClient
+
+        path = self.__get_cache_path(task, file_id)
+        if not path or os.path.exists(path):
+            return
+
+        tmp_path = path + ".prefetch"
+        BoonClient(apikey, server).stream("/api/v3/files/_stream/{}".format(file_id), tmp_path)
+        os.rename(tmp_path, path)
+
+    def __localize_uri(self, task, uri):
+        """
+        Download an HTTP URI into the task cache.
+
+        Args:
+            task (dict): The task.
+            uri (str): The URI.
+
+        """
+        path = self.__get_cache_path(task, uri)
+        if not path or os.path.exists(path):
+            return
+
+        tmp_path = path + ".prefetch"
+        with requests.get(uri, stream=True, timeout=30) as rsp:
+            rsp.raise_for_status()
+            with open(tmp_path, "wb") as fp:
+                for block in rsp.iter_content(64 * 1024):
+                    fp.write(block)
+        os.rename(tmp_path, path)
+
+    def __get_cache_path(self, task, key):
+        """
+        Return the path boonflow's FileCache uses for the given key in the task's
+        cache, creating the cache directory if needed.
+
+        Args:
+            task (dict): The task.
+            key (str): The file id or URI.
+
+        Returns:
+            str: The path, or None if the task has been cancelled.
+        """
+        with self.lock:
+            if task["id"] not in self.file_tasks:
+                return None
+
+        # Must match boonflow.storage.FileCache.get_path()
+        task_id = task.get("env", {}).get("BOONAI_TASK_ID", task["id"])
+        root = os.path.join(TaskCacheManager.get_task_cache_path(task), task_id)
+        if not os.path.exists(root):
+            TaskCacheManager.create_task_cache(task)
+            os.makedirs(root, exist_ok=True)
+            os.chmod(root, 0o777)
+
+        _, suffix = os.path.splitext(key)
+        sha = hashlib.sha1()
+        sha.update(key.encode('utf-8'))
+        sha.update(suffix.encode('utf-8'))
+        return os.path.join(root, sha.hexdigest() + suffix)
+
+
+def get_task_images(task):
+    """
+    Return the plugin images used by the given task in the order they're needed.
+
+    Args:
+        task (dict): A task dictionary.
+
+    Returns:
+        list[str]: The image names.
+    """
+    script = task.get("script", {})
+    images = []
+    for proc in (script.get("generate") or []) + (script.get("execute") or []):
+        image = proc.get("image")
+        if image and image not in images:
+            images.append(image)
+    return images
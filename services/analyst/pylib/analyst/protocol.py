@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+
+import msgpack
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "EventCodec",
+    "MSGPACK",
+    "JSON"
+]
+
+MSGPACK = "msgpack"
+JSON = "json"
+
+
+class EventCodec(object):
+    """
+    Encodes and decodes the events sent over the ZMQ socket to a plugin container.
+
+    Events start out as single frame JSON, which every container understands.
+    The Analyst offers the protocols it supports in the 'ready' event and switches
+    to the one the container picks, containers which predate msgpack support don't
+    pick one and continue with JSON.  Msgpack events are sent as a header frame
+    naming the protocol followed by the packed event.  Received events are always
+    decoded based on their frames.
+
+    Attributes:
+        protocol (str): The protocol used to send events.
+
+    """
+
+    # The protocols offered to containers, most preferred first.
+    protocols = [p.strip() for p in
+                 os.environ.get("ANALYST_ZMQ_PROTOCOLS", "msgpack,json").split(",")]
+
+    def __init__(self):
+        """
+        Create a new EventCodec which sends JSON until a protocol is selected.
+        """
+        self.protocol = JSON
+
+    def select(self, protocol):
+        """
+        Select the protocol picked by the container, if it was offered.
+
+        Args:
+            protocol (str): The protocol from the container's 'ok' event, or None.
+
+        Returns:
+            str: The selected protocol.
+        """
+        self.protocol = protocol if protocol in self.protocols \
+            and protocol in (MSGPACK, JSON) else JSON
+        return self.protocol
+
+    def encode(self, event):
+        """
+        Encode an event into ZMQ frames.
+
+        Args:
+            event (dict): The event.
+
+        Returns:
+            list[bytes]: The frames.
+        """
+        if self.protocol == MSGPACK:
+            try:
+                return [MSGPACK.encode("utf-8"), msgpack.packb(event, use_bin_type=True)]
+            except (TypeError, ValueError, OverflowError) as e:
+                logger.debug("Unable to pack event, falling back to JSON: {}".format(e))
+        return [json.dumps(event).encode("utf-8")]
+
+    @staticmethod
+    def decode(frames):
+        """
+        Decode an event from ZMQ frames.
+
+        Args:
+            frames (list[bytes]): The frames.
+
+        Returns:
+            dict: The event.
+        """
+        if len(frames) == 2 and frames[0] == MSGPACK.encode("utf-8"):
+            return msgpack.unpackb(frames[1], raw=False, strict_map_key=False)
+        return json.loads(frames[-1])
+
+    def send(self, socket, event):
+        """
+        Send an event.
+
+        Args:
+            socket (zmq.Socket): The socket.
+            event (dict): The event.
+
+        """
+        socket.send_multipart(self.encode(event))
+
+    def recv(self, socket):
+        """
+        Receive an event, the socket must have been polled.
+
+        Args:
+            socket (zmq.Socket): The socket.
+
+        Returns:
+            dict: The event.
+        """
+        return self.decode(socket.recv_multipart())
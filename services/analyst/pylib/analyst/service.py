@@ -11,10 +11,14 @@ import jwt
 import psutil
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 
-from .executor import ZpsExecutor
-from .cache import ModelCacheManager
-from .logs import LogFileRotator
+from .executor import ZpsExecutor, TaskSlot, EXIT_STATUS_HARD_FAIL
+from .cache import ModelCacheManager, TaskCacheManager
+from .events import EventPipeline
+from .pool import ContainerPool
+from .prefetch import Prefetcher
+from .logs import set_thread_task_id
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -41,7 +45,9 @@ class ServiceComponents(object):
         self.client = ClusterClient(args.archivist, shared_key, args.port)
         self.executor = Executor(self.client,
                                  ping_timer_seconds=args.ping,
-                                 poll_timer_seconds=args.poll)
+                                 poll_timer_seconds=args.poll,
+                                 slots=args.slots,
+                                 lookahead=args.lookahead)
 
 
 class ClusterClient(object):
@@ -49,8 +55,18 @@ class ClusterClient(object):
     The ClusterClient is the client side implementation of the /cluster
     endpoints on the Archivist.
 
+    Requests are made over a pooled HTTP session and the signed JWT is reused
+    until it is close to expiring.  Events which do not need to be delivered
+    synchronously are sent in batches by an EventPipeline, see queue_event().
+
     """
 
+    # The number of seconds a signed token is valid for.
+    token_lifetime = 60
+
+    # Tokens are re-signed when they are this many seconds from expiring.
+    token_refresh_margin = 10
+
     def __init__(self, remote_url, shared_key, my_port=5000):
         self.remote_url = remote_url or os.environ.get("BOONAI_SERVER")
         self.shared_key = shared_key or os.environ.get("ANALYST_SHAREDKEY")
@@ -69,6 +85,19 @@ class ClusterClient(object):
         except socket.gaierror as e:
             logger.warning("Unable to determine his machines hostname, %s" % e)
 
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=4))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=4))
+        self.session.verify = False
+
+        self.token = None
+        self.token_expires = None
+        self.token_lock = threading.Lock()
+
+        # Set to False if the Archivist does not have the bulk event endpoint.
+        self.bulk_events = True
+        self.events = EventPipeline(self)
+
         logger.info("Remote URL: %s" % self.remote_url)
 
     def ping(self, ping):
@@ -79,8 +108,8 @@ class ClusterClient(object):
         Args:
             ping (dict): The ping to send.
         """
-        return requests.post(self.remote_url + "/cluster/_ping",
-                             verify=False, json=ping, headers=self._headers()).json()
+        return self.session.post(self.remote_url + "/cluster/_ping",
+                                 json=ping, headers=self._headers()).json()
 
     def get_next_task(self):
         """
@@ -89,8 +118,8 @@ class ClusterClient(object):
         """
         data = {}
         try:
-            rsp = requests.put(self.remote_url + "/cluster/_queue",
-                               verify=False, json=data, headers=self._headers())
+            rsp = self.session.put(self.remote_url + "/cluster/_queue",
+                                   json=data, headers=self._headers())
             if rsp.ok:
                 return rsp.json()
         except requests.exceptions.ConnectionError as e:
@@ -103,6 +132,9 @@ class ClusterClient(object):
         Emit an event to the Archivist.  Events are things like processing errors,
         expand requests, and started/stopped events.
 
+        Any events waiting in the event pipeline are sent first, so events
+        arrive at the Archivist in the order they were emitted.
+
         If the Archivist is down at the time an event is emitted, the function will
         hang and continually retry the event until the Archivist comes back online.
 
@@ -111,14 +143,95 @@ class ClusterClient(object):
             payload (dict): An event
 
         """
+        self.flush_events()
         data = self.make_event(task, etype, payload)
         logger.debug("POST %s/cluster/_event %s" % (self.remote_url, data))
+        return self._post_event_data("/cluster/_event", data)
+
+    def queue_event(self, task, etype, payload):
+        """
+        Queue an event to be sent to the Archivist in the background.  Use this
+        for high volume events emitted while processing, like status, progress,
+        errors and expands.  Queued events are sent in batches, and queued status
+        and progress events are replaced by newer ones if they have not been sent.
+
+        Blocks only if the event pipeline is full.
+
+        Args:
+            task (dict): A dict of Task properties.
+            etype (str): The event type.
+            payload (dict): An event payload.
+
+        """
+        self.events.put(self.make_event(task, etype, payload))
+
+    def flush_events(self, timeout=None):
+        """
+        Block until all queued events have been sent to the Archivist.
+
+        Args:
+            timeout (float): The max number of seconds to wait, None to wait forever.
+
+        Returns:
+            bool: True if all events were sent, False on timeout.
+        """
+        return self.events.flush(timeout)
+
+    def send_events(self, events):
+        """
+        Send a batch of events to the Archivist in a single request. If the
+        Archivist does not support bulk events, fall back to sending them one
+        at a time.
+
+        Args:
+            events (list): A list of events created by make_event().
+
+        Returns:
+            int: The HTTP status code of the last request.
+        """
+        if self.bulk_events:
+            logger.debug("POST %s/cluster/_events %d events" % (self.remote_url, len(events)))
+            status = self._post_event_data("/cluster/_events", events)
+            if status not in (404, 405):
+                return status
+            logger.warning("The Archivist does not support bulk events, sending individually")
+            self.bulk_events = False
+
+        status = None
+        for event in events:
+            status = self.send_event(event)
+        return status
+
+    def send_event(self, event):
+        """
+        Send a single event created by make_event() to the Archivist.
+
+        Args:
+            event (dict): The event.
+
+        Returns:
+            int: The HTTP status code.
+        """
+        return self._post_event_data("/cluster/_event", event)
+
+    def _post_event_data(self, path, data):
+        """
+        POST the given event data to the Archivist, retrying forever if the
+        Archivist is down or asks us to back off.
+
+        Args:
+            path (str): The endpoint path.
+            data (mixed): A single event or a list of events.
+
+        Returns:
+            int: The HTTP status code.
+        """
         # Run forever until server comes back online
         backoff = 2
         while True:
             try:
-                rsp = requests.post(self.remote_url + "/cluster/_event", verify=False,
-                                    json=data, headers=self._headers())
+                rsp = self.session.post(self.remote_url + path,
+                                        json=data, headers=self._headers())
                 if rsp.status_code == 429:
                     logger.warning("Received backoff 429 from Archivist, waiting....")
                     raise RuntimeError("Received backoff from Archivist")
@@ -151,44 +264,55 @@ class ClusterClient(object):
         }
         return new_event
 
-    def event_worker(self):
-        while True:
-            item = self.queue.get()
-            try:
-                self.emit_event(*item)
-            except Exception as e:
-                logger.warning("Failed to process queued event, %s" % e)
-            finally:
-                self.queue.task_done()
-
     def _headers(self):
-        claims = {
-            "aud": self.remote_url,
-            "exp": datetime.datetime.utcnow() + datetime.timedelta(seconds=60),
-            "port": self.my_port,
-            "host": self.hostname,
-            "version": self.version
-        }
-        token = jwt.encode(claims, self.shared_key, algorithm='HS256')
-
         headers = {
             "Content-Type": "application/json",
-            "Authorization": "Bearer {}".format(token)
+            "Authorization": "Bearer {}".format(self._token())
         }
         return headers
 
+    def _token(self):
+        """
+        Return a signed token, signing a new one if the current token
+        is close to expiring.
+
+        Returns:
+            str: The signed token.
+        """
+        with self.token_lock:
+            now = datetime.datetime.utcnow()
+            margin = datetime.timedelta(seconds=self.token_refresh_margin)
+            if not self.token or now + margin >= self.token_expires:
+                self.token_expires = now + datetime.timedelta(seconds=self.token_lifetime)
+                claims = {
+                    "aud": self.remote_url,
+                    "exp": self.token_expires,
+                    "port": self.my_port,
+                    "host": self.hostname,
+                    "version": self.version
+                }
+                self.token = jwt.encode(claims, self.shared_key, algorithm='HS256')
+            return self.token
+
 
 class Executor(object):
     """
-    The Executor handles the scheduling, execution, and monitoring of a single task.
+    The Executor handles the scheduling, execution, and monitoring of tasks.
 
     Upon construction, the Executor will being polling the configured Archivist for Waiting
-    tasks.  When a task is found, a ZpsGoProcessWrapper is created. The ZpsGoProcessWrapper
-    shells out to ZpsGo, reads it's events from STDIN, and emits them back to the Archivist.
+    tasks.  The Analyst's resources are divided into a number of TaskSlots, each of which
+    runs a single ZpsExecutor on its own thread.  The ZpsExecutor runs the task's processors
+    in containers limited to the slot's share of CPU and memory.  Idle containers are kept
+    warm in a ContainerPool for reuse by later tasks.
+
+    When all slots are busy, the Executor can look ahead and claim the next tasks early.
+    The images and source files of those tasks are prefetched in the background while
+    the running tasks execute.
 
     """
 
-    def __init__(self, client, ping_timer_seconds=0, poll_timer_seconds=0):
+    def __init__(self, client, ping_timer_seconds=0, poll_timer_seconds=0, slots=1,
+                 lookahead=0):
         """
         Create a new Executor.
 
@@ -196,6 +320,8 @@ class Executor(object):
             client (:obj:`ClusterClient`): A ClusterClient instance for talking to Archivist.
             ping_timer_seconds (int): Ping timer interval in seconds.  0 to disable.
             poll_timer_seconds (int): Task polling timer interval in seconds.  0 to disable.
+            slots (int): The number of tasks which can run at the same time.
+            lookahead (int): The number of tasks to claim and prefetch while all slots are busy.
 
         """
         self.client = client
@@ -204,13 +330,18 @@ class Executor(object):
 
         self.disable_poll_timer = False
         self.poll_count = 0
-        self.current_task = None
-        self.previous_task = None
+        self.slots = self.create_slots(slots)
+        self.slot_lock = threading.RLock()
+        self.pool = ContainerPool()
+        self.prefetcher = Prefetcher()
+        self.lookahead = max(0, int(lookahead))
+        self.lookahead_tasks = []
+        # Set to wake up the poll timer when a slot is released.
+        self.wakeup = threading.Event()
         self.first_ping = True
         self.ping_timer = None
         self.poll_timer = None
         self.version = get_sdk_version()
-        self.log_rotator = LogFileRotator()
 
         # Setup the ping timer thread.
         if self.ping_timer_seconds:
@@ -223,9 +354,79 @@ class Executor(object):
         # Clear out model cache.
         ModelCacheManager.instance.clear_cache_root()
 
+    @staticmethod
+    def create_slots(count):
+        """
+        Create the given number of TaskSlots.  If there is more than one slot, the
+        CPU and memory of the Analyst are divided evenly between them.
+
+        Args:
+            count (int): The number of slots.
+
+        Returns:
+            list[TaskSlot]: The task slots.
+        """
+        count = max(1, int(count))
+        if count == 1:
+            return [TaskSlot(0)]
+
+        cpus = psutil.cpu_count() / count
+        memory_mb = int(psutil.virtual_memory().total / 1024 ** 2 / count)
+        logger.info("Creating {} task slots, cpus={} memory={}mb".format(
+            count, cpus, memory_mb))
+        return [TaskSlot(i, cpus, memory_mb) for i in range(count)]
+
+    @property
+    def running_tasks(self):
+        """
+        The ZpsExecutor for each running task.
+
+        Returns:
+            list[ZpsExecutor]: The running tasks.
+        """
+        with self.slot_lock:
+            return [slot.task for slot in self.slots if slot.task]
+
+    def acquire_slot(self):
+        """
+        Reserve a free task slot.
+
+        Returns:
+            TaskSlot: The reserved slot or None if all slots are busy.
+        """
+        with self.slot_lock:
+            for slot in self.slots:
+                if not slot.busy:
+                    slot.busy = True
+                    return slot
+        return None
+
+    def release_slot(self, slot):
+        """
+        Release a task slot so it can run another task.
+
+        Args:
+            slot (TaskSlot): The slot to release.
+
+        """
+        with self.slot_lock:
+            slot.task = None
+            slot.thread = None
+            slot.busy = False
+
+    def has_free_slot(self):
+        """
+        Return True if there is a slot available to run a task.
+
+        Returns:
+            bool: True if a slot is free.
+        """
+        with self.slot_lock:
+            return any(not slot.busy for slot in self.slots)
+
     def kill_task(self, task_id, new_state, reason):
         """
-        Kill the current task if the task_id arg matches the current task id.
+        Kill the running or look ahead task with the given task_id.
 
         Args:
             param task_id (str):  the task ID to kill
@@ -235,46 +436,103 @@ class Executor(object):
         Returns:
             bool: The return value. True for success, False otherwise.
         """
-        try:
-            return self.current_task.kill(task_id, new_state, reason)
-        except Exception as e:
-            logger.warning("Failed to kill task %s, %s" % (task_id, e))
+        for task in self.running_tasks:
+            if task.task["id"] != task_id:
+                continue
+            try:
+                return task.kill(task_id, new_state, reason)
+            except Exception as e:
+                logger.warning("Failed to kill task %s, %s" % (task_id, e))
+                return False
+
+        with self.slot_lock:
+            tasks = [t for t in self.lookahead_tasks if t["id"] == task_id]
+            for task in tasks:
+                self.lookahead_tasks.remove(task)
+        if tasks:
+            logger.info("killing look ahead task id: {}".format(task_id))
+            self.stop_lookahead_task(tasks[0], new_state)
+            return True
+
+        logger.warning("Failed to kill task %s, the task is not running" % task_id)
         return False
 
-    def run_task(self, task):
+    def stop_lookahead_task(self, task, new_state):
+        """
+        Stop a task which was claimed but never started.
+
+        Args:
+            task (dict): A task dictionary.
+            new_state (str): The new state the task should be in.
+
         """
-        Create and run a the given task.
+        self.prefetcher.cancel(task)
+        TaskCacheManager.remove_task_cache(task)
+        self.client.emit_event(task, "stopped", {
+            "exitStatus": EXIT_STATUS_HARD_FAIL,
+            "newState": new_state,
+            "manualKill": True
+        })
+
+    def start_task(self, task, slot):
+        """
+        Run the given task in a new thread.
 
         Args:
             task (dict): A task dictionary.
+            slot (TaskSlot): A slot reserved with acquire_slot().
+
+        """
+        thread = threading.Thread(target=self.run_task, args=(task, slot))
+        thread.daemon = True
+        slot.thread = thread
+        thread.start()
 
+    def run_task(self, task, slot=None):
         """
-        # If a previous task was from another project, remove the model cache.
-        if self.previous_task:
-            if self.previous_task['projectId'] != task['projectId']:
-                ModelCacheManager.remove_model_cache(self.previous_task)
+        Create and run a the given task.  Blocks until the task is complete.
+
+        Args:
+            task (dict): A task dictionary.
+            slot (TaskSlot): A slot reserved with acquire_slot(), or None to reserve one.
+
+        Returns:
+            dict: The task's event counts and exit status.
+        """
+        if not slot:
+            slot = self.acquire_slot()
+            if not slot:
+                raise RuntimeError("Unable to run task {}, all slots are busy".format(
+                    task["id"]))
 
-        self.log_rotator.start_task_logging(task)
-        self.current_task = ZpsExecutor(task, self.client)
         try:
+            with self.slot_lock:
+                slot.task = ZpsExecutor(task, self.client, slot, self.pool, self.prefetcher)
+
+            # Let the container download any files the prefetch has not, and
+            # pull the images for later processors while the first one starts.
+            self.prefetcher.cancel(task)
+            self.prefetcher.prefetch_images(task)
+
+            set_thread_task_id(task.get('taskId'))
+            slot.log_rotator.start_task_logging(task)
             # blocks until completed or killed
-            return self.current_task.run()
+            return slot.task.run()
         finally:
-            self.log_rotator.stop_task_logging()
-            self.current_task = None
-            self.previous_task = task
+            slot.log_rotator.stop_task_logging()
+            set_thread_task_id(None)
+            self.release_slot(slot)
+            self.wakeup.set()
 
     def queue_next_task(self):
         """
-        Continually poll for and execute tasks. Return if no task
-        is found or a current task is already set.
+        Fetch the next task from the Archivist.  Return None if no task
+        is found or all of the task slots are busy.
 
-        If a task is found, set the current_task property to a new
-        ZpsGoProcessWrapper object, then run it. Continue to loop if tasks are found.
-
-        :return:
+        Returns:
+            dict: A task dictionary or None.
         """
-        if self.current_task:
+        if not self.has_free_slot():
             return None
         task = self.client.get_next_task()
         if task:
@@ -282,25 +540,72 @@ class Executor(object):
             return task
         return None
 
+    def fill_slots(self):
+        """
+        Start tasks until all slots are busy or there are no more tasks waiting.
+        Look ahead tasks are started first.  Once all slots are busy, look ahead
+        tasks are claimed and prefetched.
+
+        Returns:
+            int: The number of tasks started.
+        """
+        started = 0
+        while True:
+            slot = self.acquire_slot()
+            if not slot:
+                break
+
+            task = None
+            try:
+                with self.slot_lock:
+                    if self.lookahead_tasks:
+                        task = self.lookahead_tasks.pop(0)
+                if not task and not self.disable_poll_timer:
+                    task = self.client.get_next_task()
+            finally:
+                if not task:
+                    self.release_slot(slot)
+            if not task:
+                return started
+
+            logger.debug("Fetched next task: %s, slot: %s" % (task, slot))
+            self.start_task(task, slot)
+            started += 1
+
+        while not self.disable_poll_timer and len(self.lookahead_tasks) < self.lookahead:
+            task = self.client.get_next_task()
+            if not task:
+                break
+            logger.debug("Fetched look ahead task: %s" % task)
+            with self.slot_lock:
+                self.lookahead_tasks.append(task)
+            self.prefetcher.prefetch_images(task)
+            self.prefetcher.prefetch_files(task)
+        return started
+
     def start_shutdown(self):
         """
-        Disables the poll time and return true if the current task is None
+        Disables the poll time and return true if there are no running tasks.
 
         Returns:
-            bool: True if there is no current task.
+            dict: The running tasks and exit flag, exit is True if there are no running tasks.
         """
-        logger.info("Analyst shutting down, current task={}".format(self.current_task))
+        tasks = [t.task for t in self.running_tasks] + list(self.lookahead_tasks)
+        logger.info("Analyst shutting down, tasks={}".format([t['taskId'] for t in tasks]))
         self.disable_poll_timer = True
-        if self.current_task:
+        if tasks:
             return {
-                "task": self.current_task.task['taskId'],
-                "name": self.current_task.task['name'],
+                "task": tasks[0]['taskId'],
+                "name": tasks[0]['name'],
+                "tasks": [t['taskId'] for t in tasks],
                 "exit": False
             }
         else:
+            self.pool.clear()
             return {
                 "task": None,
                 "name": None,
+                "tasks": [],
                 "exit": True
             }
 
@@ -318,9 +623,11 @@ class Executor(object):
             "freeDiskMb": psutil.disk_usage(tempfile.gettempdir()).free / bytes_to_megabytes
         }
 
-        # Add the current task if there is one.
-        if self.current_task:
-            data["taskId"] = self.current_task.task["id"]
+        # Add the running and look ahead tasks if there are any.
+        tasks = [t.task for t in self.running_tasks] + list(self.lookahead_tasks)
+        if tasks:
+            data["taskId"] = tasks[0]["id"]
+            data["taskIds"] = [t["id"] for t in tasks]
 
         self.client.ping(data)
         return data
@@ -349,8 +656,9 @@ class Executor(object):
 
     def __ping_timer_func(self):
         """
-        Send ping to Archivist at regular interval.  This function
-        will block forever and must be started from within a Thread.
+        Send ping to Archivist and trim the container pool at regular
+        interval.  This function will block forever and must be started
+        from within a Thread.
         """
         while True:
             time.sleep(self.ping_timer_seconds)
@@ -359,6 +667,10 @@ class Executor(object):
                 self.first_ping = False
             except Exception:
                 logger.exception("Failed to send ping.")
+            try:
+                self.pool.trim()
+            except Exception:
+                logger.exception("Failed to trim the container pool.")
 
     def ___poll_timer_func(self):
         """
@@ -368,23 +680,19 @@ class Executor(object):
         # Don't poll for tasks until the first ping is handled
         # by the archivist.
         while True:
-            if self.disable_poll_timer:
+            if self.disable_poll_timer and not any(slot.busy for slot in self.slots) \
+                    and not self.lookahead_tasks:
                 logger.info("terminating, shutdown by prestop")
+                self.pool.clear()
                 os._exit(0)
-            time.sleep(self.poll_timer_seconds)
+            self.wakeup.wait(self.poll_timer_seconds)
+            self.wakeup.clear()
             if not self.first_ping:
                 self.poll_count += 1
                 if self.poll_count % 25 == 0:
                     logger.debug("Polling Archivist for Task, count=%d" % self.poll_count)
                 try:
-                    while True:
-                        if self.disable_poll_timer:
-                            break
-                        task = self.queue_next_task()
-                        if task:
-                            self.run_task(task)
-                        else:
-                            break
+                    self.fill_slots()
                 except Exception as e:
                     logger.warning("Failed to queue next task %s" % e)
 
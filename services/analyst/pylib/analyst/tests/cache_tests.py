@@ -20,17 +20,16 @@ class TestModelCacheManager(unittest.TestCase):
     def test_create_model_cache(self):
         path = ModelCacheManager.create_model_cache(task)
         assert os.path.exists(path)
-        assert path.endswith(task['projectId'])
+        assert path.endswith('model-cache')
 
     def test_get_model_cache(self):
         path = ModelCacheManager.get_model_cache_path(task)
-        assert path.endswith(task['projectId'])
+        assert path.endswith('model-cache')
 
-    def test_remove_model_cache(self):
-        path = ModelCacheManager.create_model_cache(task)
-        assert os.path.exists(path)
-        ModelCacheManager.remove_model_cache(task)
-        assert not os.path.exists(path)
+    def test_get_model_cache_shared(self):
+        other = dict(task, projectId='AAAA4046-6452-4669-BD71-719E9D5C2BBF')
+        assert ModelCacheManager.get_model_cache_path(task) == \
+            ModelCacheManager.get_model_cache_path(other)
 
 
 class TestTaskCacheManager(unittest.TestCase):
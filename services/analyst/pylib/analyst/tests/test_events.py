@@ -0,0 +1,114 @@
+import threading
+import time
+import unittest
+
+from analyst.events import EventPipeline
+
+
+class MockEventClient:
+    """
+    A pretend ClusterClient which records the batches it was asked to send.
+    """
+
+    def __init__(self, delay=0, status=200):
+        self.batches = []
+        self.delay = delay
+        self.status = status
+
+    def send_events(self, events):
+        time.sleep(self.delay)
+        if self.status != 200:
+            return self.status
+        self.batches.append([dict(e) for e in events])
+        return 200
+
+    def send_event(self, event):
+        if event["payload"].get("bad"):
+            return 400
+        self.batches.append([dict(event)])
+        return 200
+
+    def events(self):
+        return [e for batch in self.batches for e in batch]
+
+
+def make_event(etype, payload=None, task_id="abc"):
+    return {"type": etype.upper(), "taskId": task_id, "jobId": "def", "payload": payload or {}}
+
+
+class TestEventPipeline(unittest.TestCase):
+
+    def test_put_and_flush(self):
+        client = MockEventClient()
+        pipeline = EventPipeline(client, batch_size=10, flush_interval=0)
+        pipeline.put(make_event("error", {"message": "one"}))
+        pipeline.put(make_event("expand", {"assets": []}))
+        assert pipeline.flush(5)
+
+        assert ["ERROR", "EXPAND"] == [e["type"] for e in client.events()]
+        assert 0 == len(pipeline)
+
+    def test_flush_nothing_queued(self):
+        pipeline = EventPipeline(MockEventClient())
+        assert pipeline.flush(0)
+
+    def test_batching(self):
+        client = MockEventClient()
+        pipeline = EventPipeline(client, batch_size=5, flush_interval=1)
+        for i in range(12):
+            pipeline.put(make_event("error", {"message": i}))
+        assert pipeline.flush(5)
+
+        assert 12 == len(client.events())
+        assert all(len(batch) <= 5 for batch in client.batches)
+        assert list(range(12)) == [e["payload"]["message"] for e in client.events()]
+
+    def test_coalesce_status_and_progress(self):
+        client = MockEventClient()
+        pipeline = EventPipeline(client, batch_size=100, flush_interval=1)
+        pipeline.put(make_event("status", {"status": "one"}))
+        pipeline.put(make_event("progress", {"progress": 10}))
+        pipeline.put(make_event("status", {"status": "two"}))
+        pipeline.put(make_event("progress", {"progress": 20}))
+        pipeline.put(make_event("status", {"status": "other task"}, task_id="xyz"))
+        assert pipeline.flush(5)
+
+        events = client.events()
+        assert 3 == len(events)
+        assert "two" == events[0]["payload"]["status"]
+        assert 20 == events[1]["payload"]["progress"]
+        assert "other task" == events[2]["payload"]["status"]
+
+    def test_backpressure(self):
+        client = MockEventClient(delay=0.2)
+        pipeline = EventPipeline(client, max_size=2, batch_size=1, flush_interval=0)
+
+        def producer():
+            for i in range(6):
+                pipeline.put(make_event("error", {"message": i}))
+
+        thread = threading.Thread(target=producer)
+        thread.start()
+        time.sleep(0.1)
+        assert len(pipeline) <= 2
+        thread.join(10)
+        assert pipeline.flush(10)
+        assert 6 == len(client.events())
+
+    def test_failed_batch_sent_individually(self):
+        client = MockEventClient(status=400)
+        pipeline = EventPipeline(client, batch_size=10, flush_interval=1)
+        pipeline.put(make_event("error", {"message": "one"}))
+        pipeline.put(make_event("expand", {"bad": True}))
+        pipeline.put(make_event("stats", {"message": "two"}))
+        assert pipeline.flush(5)
+
+        assert ["ERROR", "STATS"] == [e["type"] for e in client.events()]
+        assert all(len(batch) == 1 for batch in client.batches)
+
+    def test_flush_timeout(self):
+        client = MockEventClient(delay=1)
+        pipeline = EventPipeline(client, flush_interval=0)
+        pipeline.put(make_event("error"))
+        assert not pipeline.flush(0.1)
+        assert pipeline.flush(5)
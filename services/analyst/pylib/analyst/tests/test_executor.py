@@ -5,8 +5,10 @@ import tempfile
 import threading
 import time
 import unittest
+from unittest.mock import MagicMock, patch
 
-from analyst.executor import ZpsExecutor, DockerContainerWrapper
+from analyst.executor import ZpsExecutor, DockerContainerWrapper, TaskSlot
+from analyst.pipeline import ProcessorPipeline
 from .test_service import test_task
 
 logging.basicConfig(level=logging.DEBUG)
@@ -27,6 +29,9 @@ class MockClusterClient:
     def emit_event(self, task, etype, payload):
         self.events.append((etype, task, payload))
 
+    def queue_event(self, task, etype, payload):
+        self.events.append((etype, task, payload))
+
     def event_count(self, event_type):
         return len(self.get_events(event_type))
 
@@ -118,6 +123,85 @@ class TestZpsExecutor(unittest.TestCase):
         assert result.get("hardfailure_events") == 1
         assert result.get("exit_status") == 9
 
+    def test_release_container(self):
+        pool = MagicMock()
+        container = MagicMock(event_counts={"error_events": 2})
+        self.wrapper = ZpsExecutor(test_task(), self.client, pool=pool)
+        self.wrapper.container = container
+
+        self.wrapper.release_container()
+        assert self.wrapper.container is None
+        assert self.wrapper.event_counts["error_events"] == 2
+        pool.checkin.assert_called_once_with(container)
+
+    def test_start_container_from_pool(self):
+        pool = MagicMock()
+        container = MagicMock()
+        pool.checkout.return_value = container
+        self.wrapper = ZpsExecutor(test_task(), self.client, pool=pool)
+
+        self.wrapper.start_container("boonai/plugins-base")
+        assert self.wrapper.container is container
+        key = DockerContainerWrapper.get_pool_key(test_task(), "boonai/plugins-base")
+        pool.checkout.assert_called_once_with(key, self.client, self.wrapper.task, None)
+
+    @patch.object(ProcessorPipeline, "enabled", False)
+    def test_process_fused(self):
+        task = test_task()
+        proc = task["script"]["execute"][0]
+        other = dict(proc, image="boonai/plugins-analysis")
+        task["script"]["execute"] = [proc, dict(proc), dict(proc), other]
+        assets = task["script"]["assets"]
+
+        pool = MagicMock()
+        container = MagicMock(capabilities={"fuse"}, event_counts={})
+        container.execute_processors_on_assets.return_value = assets
+        container.execute_processor_on_assets.return_value = assets
+        pool.checkout.return_value = container
+
+        self.wrapper = ZpsExecutor(task, self.client, pool=pool)
+        assert self.wrapper.process() == assets
+        container.execute_processors_on_assets.assert_called_once_with(
+            [proc, proc, proc], assets, {})
+        container.execute_processor_on_assets.assert_called_once_with(other, assets, {})
+        assert container.run_teardown.call_count == 4
+        assert pool.checkin.call_count == 2
+
+    def test_process_pipelined(self):
+        task = test_task()
+        proc = task["script"]["execute"][0]
+        other = dict(proc, image="boonai/plugins-analysis")
+        task["script"]["execute"] = [proc, other]
+
+        pool = MagicMock()
+        pool.checkout.return_value = MagicMock(capabilities=set(), event_counts={})
+        self.wrapper = ZpsExecutor(task, self.client, pool=pool)
+        with patch.object(ProcessorPipeline, "run", return_value=[]) as run:
+            assert self.wrapper.process() == []
+            run.assert_called_once_with(task["script"]["assets"])
+        assert self.wrapper.pipeline.stages == [[proc], [other]]
+
+    def test_get_stages(self):
+        procs = [{"image": "a"}, {"image": "a"}, {"image": "b"}, {"image": "a"}]
+        stages = ZpsExecutor.get_stages(procs)
+        assert stages == [procs[0:2], [procs[2]], [procs[3]]]
+
+    def test_process_not_fused(self):
+        task = test_task()
+        proc = task["script"]["execute"][0]
+        task["script"]["execute"] = [proc, dict(proc)]
+        assets = task["script"]["assets"]
+
+        pool = MagicMock()
+        container = MagicMock(capabilities=set(), event_counts={})
+        container.execute_processor_on_assets.return_value = assets
+        pool.checkout.return_value = container
+
+        self.wrapper = ZpsExecutor(task, self.client, pool=pool)
+        self.wrapper.process()
+        assert container.execute_processor_on_assets.call_count == 2
+        assert pool.checkin.call_count == 1
+
     def test_get_exit_status(self):
         zexec = ZpsExecutor(self.gen_task, self.client)
         zexec.event_counts["hardfailure_events"] = 1
@@ -143,6 +227,29 @@ class TestDockerContainerWrapper(unittest.TestCase):
     def tearDown(self):
         self.container.stop()
 
+    def test_get_pool_key(self):
+        task1 = test_task()
+        task2 = dict(test_task(), id="81C54046-6452-4669-BD71-719E9D5C2BBF")
+        task2["env"] = {"BOONAI_TASK_ID": task2["id"]}
+        key = DockerContainerWrapper.get_pool_key(task1, "boonai/plugins-base")
+        assert key == DockerContainerWrapper.get_pool_key(task2, "boonai/plugins-base")
+        assert key != DockerContainerWrapper.get_pool_key(
+            task1, "boonai/plugins-base", TaskSlot(0, 2, 1024))
+
+    def test_apply_asset_patch(self):
+        asset = {"id": "1234", "document": {
+            "source": {"path": "/foo.jpg"}, "media": {"width": 100}, "tmp": "foo"}}
+        DockerContainerWrapper.apply_asset_patch(asset, {
+            "set": {"media.height": 50, "tmp.produced": ["test"], "analysis.test": {"a": 1}},
+            "unset": ["media.width", "foo.bar"]
+        })
+        assert asset["document"] == {
+            "source": {"path": "/foo.jpg"},
+            "media": {"height": 50},
+            "tmp": {"produced": ["test"]},
+            "analysis": {"test": {"a": 1}}
+        }
+
     def test_get_network_id(self):
         # Running locally this is false, running in CI/CD it's true
         self.container.get_network_id()
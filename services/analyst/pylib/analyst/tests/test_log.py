@@ -3,7 +3,7 @@ import os
 import unittest
 from unittest.mock import patch
 
-from analyst.logs import LogFileRotator
+from analyst.logs import LogFileRotator, TaskLogFilter, set_thread_task_id
 
 logging.basicConfig(level=logging.INFO)
 
@@ -62,7 +62,30 @@ class LogFileRotatorTests(unittest.TestCase):
         r.start_task_logging(self.test_task)
         log_path = r.log_path
         logger = logging.getLogger('task')
-        logger.info("hello")
+        logger.info("unattributed")
+        set_thread_task_id(self.test_task['taskId'])
+        try:
+            logger.info("hello")
+        finally:
+            set_thread_task_id(None)
 
         log = open(log_path, "r").read()
         self.assertTrue("hello" in log)
+        self.assertFalse("unattributed" in log)
+
+
+class TaskLogFilterTests(unittest.TestCase):
+
+    def tearDown(self):
+        set_thread_task_id(None)
+
+    def test_filter(self):
+        record = logging.makeLogRecord({"msg": "hello"})
+        log_filter = TaskLogFilter("task1")
+        self.assertFalse(log_filter.filter(record))
+
+        set_thread_task_id("task1")
+        self.assertTrue(log_filter.filter(record))
+
+        set_thread_task_id("task2")
+        self.assertFalse(log_filter.filter(record))
@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+import unittest
+
+from analyst.logs import TaskLogFilter
+from analyst.pipeline import AssetQueue, ProcessorPipeline, PipelineAborted
+from .test_executor import MockClusterClient
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+class MockContainer:
+    """
+    A pretend DockerContainerWrapper which tags the assets it processes.
+    """
+
+    def __init__(self, image, fuse=True, fail=False):
+        self.image = image
+        self.capabilities = {"fuse"} if fuse else set()
+        self.fail = fail
+        self.event_counts = {}
+        self.teardowns = []
+        self.killed = False
+
+    def stream_processors_on_assets(self, refs, settings, source, sink, chunk_size, max_pending):
+        logging.getLogger('task').info("Streaming assets through '{}'".format(self.image))
+        count = 0
+        while not source.is_done():
+            for asset in source.take(chunk_size, timeout=0.1):
+                if self.fail:
+                    raise RuntimeError("Container failure")
+                sink.put(self.tag(asset))
+                count += 1
+        return count
+
+    def execute_processor_on_assets(self, ref, assets, settings):
+        logging.getLogger('task').info("Processing assets in '{}'".format(self.image))
+        return [self.tag(asset) for asset in assets]
+
+    def tag(self, asset):
+        asset = dict(asset)
+        asset["images"] = asset.get("images", []) + [self.image]
+        return asset
+
+    def run_teardown(self, ref):
+        self.teardowns.append(ref)
+
+    def stop(self):
+        self.killed = True
+        return True
+
+
+class MockExecutor:
+    """
+    A pretend ZpsExecutor which hands out MockContainers.
+    """
+
+    def __init__(self, **kwargs):
+        self.client = MockClusterClient()
+        self.task = {"id": "1234", "taskId": "1234"}
+        self.kwargs = kwargs
+        self.containers = []
+        self.checked_in = []
+
+    def checkout_container(self, image):
+        container = MockContainer(image, **self.kwargs.get(image, {}))
+        self.containers.append(container)
+        return container
+
+    def checkin_container(self, container):
+        self.checked_in.append(container)
+
+    def add_event_counts(self, container):
+        pass
+
+
+class RecordingHandler(logging.Handler):
+    """
+    A log handler which keeps the messages of the records it's handed.
+    """
+
+    def __init__(self, task_id):
+        super(RecordingHandler, self).__init__()
+        self.addFilter(TaskLogFilter(task_id))
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class AssetQueueTests(unittest.TestCase):
+
+    def test_take_min_count(self):
+        queue = AssetQueue()
+        queue.put({"id": "1"})
+        assert queue.take(10, 2) == []
+        queue.put({"id": "2"})
+        assert len(queue.take(10, 2)) == 2
+
+    def test_take_closed(self):
+        queue = AssetQueue()
+        queue.put({"id": "1"})
+        queue.close()
+        assert queue.take(10, 5) == [{"id": "1"}]
+        assert queue.is_done()
+
+    def test_put_blocks_when_full(self):
+        queue = AssetQueue(1)
+        queue.put({"id": "1"})
+
+        def take():
+            time.sleep(0.2)
+            queue.take(1)
+
+        thread = threading.Thread(target=take)
+        thread.start()
+        start = time.monotonic()
+        queue.put({"id": "2"})
+        assert time.monotonic() - start >= 0.1
+        thread.join()
+
+    def test_abort(self):
+        queue = AssetQueue()
+        queue.abort()
+        self.assertRaises(PipelineAborted, queue.take, 1)
+        self.assertRaises(PipelineAborted, queue.put, {"id": "1"})
+
+
+class ProcessorPipelineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.stages = [
+            [{"className": "a.A", "image": "a"}, {"className": "a.B", "image": "a"}],
+            [{"className": "b.C", "image": "b"}],
+            [{"className": "c.D", "image": "c"}]
+        ]
+        self.assets = [{"id": str(i)} for i in range(25)]
+
+    def test_run(self):
+        executor = MockExecutor()
+        pipeline = ProcessorPipeline(executor, self.stages, {}, chunk_size=2, queue_size=4)
+        result = pipeline.run(self.assets)
+
+        assert sorted([a["id"] for a in result]) == sorted([a["id"] for a in self.assets])
+        assert all(a["images"] == ["a", "b", "c"] for a in result)
+        assert len(executor.checked_in) == 3
+        assert len(executor.containers[0].teardowns) == 2
+        assert executor.client.get_events("progress")[-1][2]["progress"] == 100
+
+    def test_run_not_fused(self):
+        executor = MockExecutor(b={"fuse": False})
+        pipeline = ProcessorPipeline(executor, self.stages, {}, chunk_size=2, queue_size=4)
+        result = pipeline.run(self.assets)
+        assert len(result) == 25
+        assert all(a["images"] == ["a", "b", "c"] for a in result)
+
+    def test_run_task_logging(self):
+        task_log = RecordingHandler("1234")
+        other_log = RecordingHandler("5678")
+        task_logger = logging.getLogger('task')
+        level = task_logger.level
+        task_logger.setLevel(logging.INFO)
+        task_logger.addHandler(task_log)
+        task_logger.addHandler(other_log)
+        try:
+            executor = MockExecutor(b={"fuse": False})
+            pipeline = ProcessorPipeline(executor, self.stages, {}, chunk_size=2, queue_size=4)
+            pipeline.run(self.assets)
+        finally:
+            task_logger.removeHandler(task_log)
+            task_logger.removeHandler(other_log)
+            task_logger.setLevel(level)
+
+        assert "Streaming assets through 'a'" in task_log.messages
+        assert "Processing assets in 'b'" in task_log.messages
+        assert not other_log.messages
+
+    def test_run_failure(self):
+        executor = MockExecutor(b={"fail": True})
+        pipeline = ProcessorPipeline(executor, self.stages, {}, chunk_size=2, queue_size=4)
+        self.assertRaises(RuntimeError, pipeline.run, self.assets)
+        assert not executor.checked_in
+
+        assert pipeline.stop("test")
+        assert all(c.killed for c in executor.containers)
@@ -0,0 +1,115 @@
+import logging
+import unittest
+from unittest.mock import patch
+
+from analyst.pool import ContainerPool
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+class MockContainer:
+    """
+    A pretend DockerContainerWrapper.
+    """
+
+    def __init__(self, pool_key="abc", healthy=True):
+        self.pool_key = pool_key
+        self.image = "boonai/plugins-base"
+        self.healthy = healthy
+        self.killed = False
+        self.resets = 0
+
+    def reset(self, client, task, slot=None):
+        self.resets += 1
+        self.task = task
+        return self.healthy
+
+    def stop(self):
+        self.killed = True
+        return True
+
+
+class ContainerPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ContainerPool(max_size=2, max_idle=600, min_free_memory=0)
+
+    def test_get_key(self):
+        env = {"BOONAI_JOB_ID": "1234", "BOONAI_TASK_ID": "abc", "TMPDIR": "/tmp/abc"}
+        key = ContainerPool.get_key("plugins-base", env)
+        env2 = dict(env, BOONAI_TASK_ID="def", TMPDIR="/tmp/def")
+        assert key == ContainerPool.get_key("plugins-base", env2)
+
+        assert key != ContainerPool.get_key("plugins-analysis", env2)
+        assert key != ContainerPool.get_key("plugins-base", dict(env, BOONAI_JOB_ID="5678"))
+        assert key != ContainerPool.get_key("plugins-base", env, {"nano_cpus": 1000})
+
+    def test_checkout(self):
+        container = MockContainer()
+        assert self.pool.checkin(container)
+        assert len(self.pool) == 1
+
+        assert self.pool.checkout("def", None, {}) is None
+        assert self.pool.checkout("abc", None, {"id": "task"}) is container
+        assert container.task == {"id": "task"}
+        assert len(self.pool) == 0
+        assert not container.killed
+
+    def test_checkout_unhealthy(self):
+        unhealthy = MockContainer(healthy=False)
+        healthy = MockContainer()
+        self.pool.checkin(healthy)
+        self.pool.checkin(unhealthy)
+
+        assert self.pool.checkout("abc", None, {}) is healthy
+        assert unhealthy.killed
+        assert len(self.pool) == 0
+
+    def test_checkin_killed(self):
+        container = MockContainer()
+        container.killed = True
+        assert not self.pool.checkin(container)
+        assert len(self.pool) == 0
+
+    def test_checkin_disabled(self):
+        pool = ContainerPool(max_size=0)
+        container = MockContainer()
+        assert not pool.checkin(container)
+        assert container.killed
+
+    def test_trim_full(self):
+        containers = [MockContainer() for _ in range(3)]
+        for container in containers:
+            self.pool.checkin(container)
+
+        assert len(self.pool) == 2
+        assert containers[0].killed
+        assert self.pool.containers == containers[1:]
+
+    def test_trim_idle(self):
+        pool = ContainerPool(max_size=2, max_idle=0.001, min_free_memory=0)
+        container = MockContainer()
+        with patch("analyst.pool.time.monotonic") as time_patch:
+            time_patch.return_value = 100
+            pool.checkin(container)
+            assert len(pool) == 1
+            time_patch.return_value = 101
+            assert pool.trim() == 1
+        assert container.killed
+
+    def test_trim_low_memory(self):
+        container = MockContainer()
+        self.pool.checkin(container)
+        with patch.object(ContainerPool, "low_memory") as memory_patch:
+            memory_patch.return_value = True
+            assert self.pool.trim() == 1
+        assert container.killed
+        assert len(self.pool) == 0
+
+    def test_clear(self):
+        containers = [MockContainer() for _ in range(2)]
+        for container in containers:
+            self.pool.checkin(container)
+        self.pool.clear()
+        assert len(self.pool) == 0
+        assert all(c.killed for c in containers)
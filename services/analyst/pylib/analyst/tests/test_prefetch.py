@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+from analyst.cache import TaskCacheManager
+from analyst.executor import DockerContainerWrapper
+from analyst.prefetch import Prefetcher, get_task_images
+from .test_service import test_task
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+def file_cache_path(task, key):
+    """
+    The path boonflow's FileCache would use for the key.
+    """
+    _, suffix = os.path.splitext(key)
+    sha = hashlib.sha1()
+    sha.update(key.encode('utf-8'))
+    sha.update(suffix.encode('utf-8'))
+    return os.path.join(TaskCacheManager.get_task_cache_path(task), task["id"],
+                        sha.hexdigest() + suffix)
+
+
+class MockStreamResponse:
+    """
+    A mock streaming requests response.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        return [self.data]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class PrefetcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pull = os.environ.get("ANALYST_DOCKER_PULL")
+        os.environ["ANALYST_DOCKER_PULL"] = "true"
+        self.prefetcher = Prefetcher(threads=2, image_ttl=60)
+
+    def tearDown(self):
+        os.environ["ANALYST_DOCKER_PULL"] = self.pull or "true"
+        TaskCacheManager.remove_task_cache(test_task())
+
+    def test_get_task_images(self):
+        task = test_task()
+        task["script"]["generate"] = [{"image": "boonai/plugins-core"}]
+        task["script"]["execute"].append({"image": "boonai/plugins-analysis"})
+        task["script"]["execute"].append({"image": "boonai/plugins-core"})
+        assert get_task_images(task) == ["boonai/plugins-core", "zmlp/plugins-base:latest",
+                                         "boonai/plugins-analysis"]
+
+    @patch("analyst.prefetch.docker.from_env")
+    @patch.object(DockerContainerWrapper, "pull_image")
+    def test_prefetch_images(self, pull_patch, docker_patch):
+        task = test_task()
+        assert self.prefetcher.prefetch_images(task) == 1
+        assert self.prefetcher.wait_for_image("zmlp/plugins-base:latest", 5)
+        pull_patch.assert_called_once()
+
+        # Recently pulled images are not pulled again.
+        assert self.prefetcher.prefetch_images(task) == 0
+        assert not self.prefetcher.wait_for_image("boonai/plugins-analysis", 5)
+
+    @patch("analyst.prefetch.docker.from_env")
+    @patch.object(DockerContainerWrapper, "pull_image")
+    def test_prefetch_images_failure(self, pull_patch, docker_patch):
+        pull_patch.side_effect = RuntimeError("no docker")
+        assert self.prefetcher.prefetch_images(test_task()) == 1
+        assert not self.prefetcher.wait_for_image("zmlp/plugins-base:latest", 5)
+        assert self.prefetcher.prefetch_images(test_task()) == 1
+
+    def test_prefetch_images_disabled(self):
+        os.environ["ANALYST_DOCKER_PULL"] = "false"
+        assert self.prefetcher.prefetch_images(test_task()) == 0
+
+    @patch("analyst.prefetch.requests.get")
+    def test_prefetch_files_uri(self, get_patch):
+        get_patch.return_value = MockStreamResponse(b"image data")
+        uri = "https://i.imgur.com/WkomVeG.jpg"
+        task = test_task()
+        task["script"]["assets"][0]["document"]["source"]["path"] = uri
+
+        assert self.prefetcher.prefetch_files(task) == 1
+        self.prefetcher.queue.join()
+
+        with open(file_cache_path(task, uri), "rb") as fp:
+            assert fp.read() == b"image data"
+
+    @patch("boonsdk.BoonClient")
+    def test_prefetch_files_stored_file(self, client_patch):
+        file_id = "assets/123/source/bilbo.jpg"
+        client_patch.return_value = MagicMock()
+        client_patch.return_value.stream.side_effect = \
+            lambda url, dst: open(dst, "wb").write(b"stored data")
+
+        task = test_task()
+        task["env"] = {"BOONAI_APIKEY": "abc", "BOONAI_SERVER": "http://localhost"}
+        task["script"]["assets"][0]["document"]["files"] = [
+            {"id": file_id, "category": "source"}
+        ]
+
+        assert self.prefetcher.prefetch_files(task) == 1
+        self.prefetcher.queue.join()
+
+        with open(file_cache_path(task, file_id), "rb") as fp:
+            assert fp.read() == b"stored data"
+
+    def test_prefetch_files_skip_cloud(self):
+        task = test_task()
+        task["script"]["assets"][0]["document"]["source"]["path"] = "gs://bucket/bilbo.jpg"
+        assert self.prefetcher.prefetch_files(task) == 0
+
+    @patch("analyst.prefetch.requests.get")
+    def test_cancel(self, get_patch):
+        uri = "https://i.imgur.com/WkomVeG.jpg"
+        task = test_task()
+        task["script"]["assets"][0]["document"]["source"]["path"] = uri
+
+        with patch.object(Prefetcher, "_Prefetcher__submit") as submit_patch:
+            assert self.prefetcher.prefetch_files(task) == 1
+        self.prefetcher.cancel(task)
+
+        _, func, *args = submit_patch.call_args[0]
+        func(*args)
+        get_patch.assert_not_called()
+        assert not os.path.exists(file_cache_path(task, uri))
@@ -0,0 +1,70 @@
+import json
+import unittest
+
+import msgpack
+import zmq
+
+from analyst.protocol import EventCodec, MSGPACK, JSON
+
+
+class EventCodecTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event = {
+            "type": "execute",
+            "payload": {
+                "ref": {"className": "boonflow.testing.TestProcessor", "args": {}},
+                "assets": [{"id": "12345", "document": {"source": {"path": "/foo.jpg"}}}],
+                "settings": {}
+            }
+        }
+
+    def test_select(self):
+        codec = EventCodec()
+        assert codec.protocol == JSON
+        assert codec.select(MSGPACK) == MSGPACK
+        assert codec.select(None) == JSON
+        assert codec.select("cbor") == JSON
+
+    def test_encode_json(self):
+        frames = EventCodec().encode(self.event)
+        assert len(frames) == 1
+        assert json.loads(frames[0]) == self.event
+
+    def test_encode_msgpack(self):
+        codec = EventCodec()
+        codec.select(MSGPACK)
+        frames = codec.encode(self.event)
+        assert frames[0] == b"msgpack"
+        assert msgpack.unpackb(frames[1]) == self.event
+
+    def test_encode_msgpack_fallback(self):
+        codec = EventCodec()
+        codec.select(MSGPACK)
+        event = {"type": "ok", "payload": {"count": 2 ** 70}}
+        frames = codec.encode(event)
+        assert len(frames) == 1
+        assert EventCodec.decode(frames) == event
+
+    def test_send_recv(self):
+        ctx = zmq.Context()
+        server = ctx.socket(zmq.PAIR)
+        client = ctx.socket(zmq.PAIR)
+        try:
+            server.bind("inproc://test-protocol")
+            client.connect("inproc://test-protocol")
+
+            codec = EventCodec()
+            codec.send(client, self.event)
+            assert codec.recv(server) == self.event
+
+            codec.select(MSGPACK)
+            codec.send(client, self.event)
+            assert codec.recv(server) == self.event
+
+            # Older containers send JSON strings.
+            server.send_string(json.dumps(self.event))
+            assert codec.recv(client) == self.event
+        finally:
+            client.close()
+            server.close()
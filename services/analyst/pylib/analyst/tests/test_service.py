@@ -1,4 +1,5 @@
 import collections
+import datetime
 import logging
 import os
 import tempfile
@@ -8,10 +9,10 @@ import unittest
 import uuid
 from unittest.mock import patch, MagicMock
 
-from requests import Response
+from requests import Response, Session
 
 from analyst import main
-from analyst.executor import ZpsExecutor
+from analyst.executor import ZpsExecutor, TaskSlot
 from analyst.main import setup_routes
 from analyst.service import ClusterClient, get_sdk_version, ServiceComponents
 
@@ -63,7 +64,7 @@ class TestClusterClient(unittest.TestCase):
     def setUp(self):
         self.client = ClusterClient("http://localhost:8080", "12345", 5000)
 
-    @patch("requests.post")
+    @patch.object(Session, "post")
     def test_send_ping(self, mock_post):
         ping = {
             "freeRamMb": 1000,
@@ -85,7 +86,7 @@ class TestClusterClient(unittest.TestCase):
     def test_get_next_task(self):
         assert not self.client.get_next_task()
 
-    @patch("requests.post")
+    @patch.object(Session, "post")
     def test_emit_event(self, mock_post):
         mock_post.return_value = MagicMock(spec=Response, status_code=404)
 
@@ -99,11 +100,56 @@ class TestClusterClient(unittest.TestCase):
         arg, kwargs = mock_post.call_args
         self.assertEqual("burp!", kwargs["json"]["payload"]["message"])
 
+    @patch.object(Session, "post")
+    def test_queue_event(self, mock_post):
+        mock_post.return_value = MagicMock(spec=Response, status_code=200)
+        task = {"id": str(uuid.uuid4()), "jobId": str(uuid.uuid4())}
+
+        self.client.queue_event(task, "error", {"message": "burp!"})
+        self.client.queue_event(task, "status", {"status": "one"})
+        self.client.queue_event(task, "status", {"status": "two"})
+        assert self.client.flush_events(10)
+
+        events = []
+        for call in mock_post.call_args_list:
+            assert call[0][0].endswith("/cluster/_events")
+            events.extend(call[1]["json"])
+        self.assertEqual(["ERROR", "STATUS"], [e["type"] for e in events])
+        self.assertEqual("two", events[1]["payload"]["status"])
+
+    @patch.object(Session, "post")
+    def test_send_events_fallback(self, mock_post):
+        mock_post.side_effect = [
+            MagicMock(spec=Response, status_code=404),
+            MagicMock(spec=Response, status_code=200),
+            MagicMock(spec=Response, status_code=200)
+        ]
+        task = {"id": str(uuid.uuid4()), "jobId": str(uuid.uuid4())}
+        events = [self.client.make_event(task, "error", {"message": "burp!"}),
+                  self.client.make_event(task, "expand", {"assets": []})]
+
+        assert 200 == self.client.send_events(events)
+        assert not self.client.bulk_events
+        assert mock_post.call_args_list[1][0][0].endswith("/cluster/_event")
+        self.assertEqual("EXPAND", mock_post.call_args_list[2][1]["json"]["type"])
+
     def test_headers(self):
         header = self.client._headers()
         assert header["Content-Type"] == "application/json"
         assert header["Authorization"].startswith("Bearer")
 
+    @patch("analyst.service.jwt.encode")
+    def test_headers_reuse_token(self, encode_patch):
+        encode_patch.return_value = "abc"
+        self.client._headers()
+        self.client._headers()
+        assert encode_patch.call_count == 1
+
+        # Force the token to be near expiration
+        self.client.token_expires = datetime.datetime.utcnow()
+        self.client._headers()
+        assert encode_patch.call_count == 2
+
 
 class EndpointUnitTestCases(unittest.TestCase):
     @classmethod
@@ -124,13 +170,14 @@ class TestExecutor(unittest.TestCase):
     def setUp(self):
         os.environ["ANALYST_DOCKER_PULL"] = "false"
         creds_file = os.path.join(os.path.dirname(__file__), "creds.txt")
-        ArgTuple = collections.namedtuple('ArgTuple', 'credentials archivist ping poll port')
+        ArgTuple = collections.namedtuple('ArgTuple',
+                                          'credentials archivist ping poll port slots lookahead')
         args = ArgTuple(credentials=creds_file, archivist="https://localhost:8080",
-                        ping=0, poll=0, port=5000)
+                        ping=0, poll=0, port=5000, slots=1, lookahead=0)
 
         self.api = ServiceComponents(args)
 
-    @patch("requests.post")
+    @patch.object(Session, "post")
     def test_send_ping(self, port_patch):
         api = self.api
         ping = api.executor.send_ping()
@@ -140,7 +187,7 @@ class TestExecutor(unittest.TestCase):
         assert ("load" in ping)
         assert ("taskId" not in ping)
 
-        api.executor.current_task = ZpsExecutor({
+        api.executor.slots[0].task = ZpsExecutor({
             "id": "71C54046-6452-4669-BD71-719E9D5C2BBF",
             "jobId": "71C54046-6452-4669-BD71-719E9D5C2BBF",
             "organizationId": "71C54046-6452-4669-BD71-719E9D5C2BBF",
@@ -149,23 +196,37 @@ class TestExecutor(unittest.TestCase):
 
         ping = api.executor.send_ping()
         assert ("taskId" in ping)
+        assert ping["taskIds"] == ["71C54046-6452-4669-BD71-719E9D5C2BBF"]
 
+    @patch.object(Session, "post")
+    def test_send_ping_multiple_tasks(self, post_patch):
+        executor = self.api.executor
+        executor.slots = [TaskSlot(0), TaskSlot(1)]
+        for slot in executor.slots:
+            slot.task = ZpsExecutor(test_task(), self.api.client, slot)
+        executor.slots[1].task.task = dict(executor.slots[1].task.task, id="task2")
+
+        ping = executor.send_ping()
+        assert ping["taskId"] == "71C54046-6452-4669-BD71-719E9D5C2BBF"
+        assert ping["taskIds"] == ["71C54046-6452-4669-BD71-719E9D5C2BBF", "task2"]
+
+    @patch.object(ClusterClient, "queue_event")
     @patch.object(ClusterClient, "emit_event")
-    def test_emit_error(self, event_patch):
+    def test_emit_error(self, event_patch, queue_patch):
         event_patch.return_value = {}
         api = self.api
         result = api.executor.run_task(test_task("error"))
         assert (result["exit_status"] == 8)
         assert (result["error_events"] == 1)
-        assert (api.executor.current_task is None)
+        assert not api.executor.running_tasks
 
-    @patch("requests.post")
+    @patch.object(Session, "post")
     def test_emit_expand(self, post_patch):
         api = self.api
         result = api.executor.run_task(test_task("expand"))
         assert (result["exit_status"] == 0)
         assert (result["expand_events"] == 1)
-        assert (api.executor.current_task is None)
+        assert not api.executor.running_tasks
 
     @patch.object(ClusterClient, "get_next_task")
     def test_queue_next_task(self, put_patch):
@@ -173,12 +234,117 @@ class TestExecutor(unittest.TestCase):
         api = self.api
         assert (api.executor.queue_next_task())
 
-    @patch("requests.post")
+    @patch.object(Session, "post")
     def test_kill_no_task(self, post_patch):
         api = self.api
         assert (api.executor.kill_task("ABC123", None, "test kill") is False)
 
-    @patch("requests.post")
+    def test_kill_task_by_id(self):
+        executor = self.api.executor
+        executor.slots = [TaskSlot(0), TaskSlot(1)]
+        executor.slots[0].task = MagicMock(task={"id": "task1"})
+        executor.slots[1].task = MagicMock(task={"id": "task2"})
+        executor.slots[1].task.kill.return_value = True
+
+        assert executor.kill_task("task2", "skipped", "test kill")
+        executor.slots[0].task.kill.assert_not_called()
+        executor.slots[1].task.kill.assert_called_once_with("task2", "skipped", "test kill")
+        assert not executor.kill_task("task3", "skipped", "test kill")
+
+    def test_create_slots(self):
+        slots = self.api.executor.create_slots(1)
+        assert len(slots) == 1
+        assert slots[0].get_container_limits() == {}
+
+        slots = self.api.executor.create_slots(2)
+        assert len(slots) == 2
+        assert slots[0].cpus == slots[1].cpus
+        limits = slots[1].get_container_limits()
+        assert limits["nano_cpus"] > 0
+        assert limits["mem_limit"].endswith("m")
+
+    def test_acquire_slot(self):
+        executor = self.api.executor
+        executor.slots = executor.create_slots(2)
+        slot1 = executor.acquire_slot()
+        slot2 = executor.acquire_slot()
+        assert slot1 is not slot2
+        assert executor.acquire_slot() is None
+        assert not executor.has_free_slot()
+
+        executor.release_slot(slot1)
+        assert executor.acquire_slot() is slot1
+
+    @patch.object(ClusterClient, "get_next_task")
+    def test_queue_next_task_no_free_slot(self, get_patch):
+        get_patch.return_value = test_task()
+        self.api.executor.acquire_slot()
+        assert self.api.executor.queue_next_task() is None
+        get_patch.assert_not_called()
+
+    @patch.object(ClusterClient, "get_next_task")
+    def test_fill_slots(self, get_patch):
+        executor = self.api.executor
+        executor.slots = executor.create_slots(2)
+        get_patch.side_effect = [test_task(), test_task(), test_task()]
+
+        with patch.object(executor, "start_task") as start_patch:
+            assert executor.fill_slots() == 2
+        assert start_patch.call_count == 2
+        assert get_patch.call_count == 2
+        assert not executor.has_free_slot()
+
+    @patch.object(ClusterClient, "get_next_task")
+    def test_fill_slots_lookahead(self, get_patch):
+        executor = self.api.executor
+        executor.lookahead = 1
+        task1 = test_task()
+        task2 = dict(test_task(), id="task2")
+        get_patch.side_effect = [task1, task2, None]
+
+        with patch.object(executor, "start_task") as start_patch, \
+                patch.object(executor, "prefetcher") as prefetch_patch:
+            assert executor.fill_slots() == 1
+            start_patch.assert_called_once_with(task1, executor.slots[0])
+            assert executor.lookahead_tasks == [task2]
+            prefetch_patch.prefetch_images.assert_called_once_with(task2)
+            prefetch_patch.prefetch_files.assert_called_once_with(task2)
+
+            # The look ahead task is started once the slot is free.
+            executor.release_slot(executor.slots[0])
+            assert executor.fill_slots() == 1
+            start_patch.assert_called_with(task2, executor.slots[0])
+            assert executor.lookahead_tasks == []
+
+    @patch.object(ClusterClient, "emit_event")
+    def test_kill_lookahead_task(self, event_patch):
+        executor = self.api.executor
+        task = test_task()
+        executor.lookahead_tasks.append(task)
+
+        with patch.object(executor, "prefetcher") as prefetch_patch:
+            assert executor.kill_task(task["id"], "skipped", "test kill")
+            prefetch_patch.cancel.assert_called_once_with(task)
+        assert executor.lookahead_tasks == []
+        assert event_patch.call_args[0][1] == "stopped"
+        assert event_patch.call_args[0][2]["newState"] == "skipped"
+
+    @patch.object(Session, "post")
+    def test_send_ping_lookahead(self, post_patch):
+        executor = self.api.executor
+        executor.lookahead_tasks.append(test_task())
+        ping = executor.send_ping()
+        assert ping["taskIds"] == [test_task()["id"]]
+        assert not executor.start_shutdown()["exit"]
+
+    @patch.object(ClusterClient, "get_next_task")
+    def test_fill_slots_no_task(self, get_patch):
+        get_patch.return_value = None
+        executor = self.api.executor
+        assert executor.fill_slots() == 0
+        assert executor.has_free_slot()
+
+    @patch.object(Session, "post")
     def test_kill_sleep_task(self, post_patch):
         api = self.api
         arg = test_task(sleep=20)
@@ -188,7 +354,7 @@ class TestExecutor(unittest.TestCase):
 
         while True:
             time.sleep(10)
-            if api.executor.current_task is not None:
+            if api.executor.running_tasks:
                 logger.info("killing")
                 killed = api.executor.kill_task("71C54046-6452-4669-BD71-719E9D5C2BBF",
                                                 "skipped", "test kill")
@@ -198,38 +364,26 @@ class TestExecutor(unittest.TestCase):
         thread.join(5)
         time.sleep(2)
 
-    @patch("requests.post")
-    def test_model_cache_clear(self, post_patch):
+    @patch.object(Session, "post")
+    def test_model_cache_shared_across_projects(self, post_patch):
         task = test_task(sleep=1)
         self.api.executor.run_task(task)
-        assert self.api.executor.previous_task["id"] == task["id"]
 
-        model_cache_dir = "/tmp/model-cache/{}".format(task["projectId"])
-        os.makedirs(model_cache_dir, exist_ok=True)
+        model_dir = "/tmp/model-cache/models/abc123"
+        os.makedirs(model_dir, exist_ok=True)
 
         task2 = test_task(sleep=1)
         task2["projectId"] = "AAAA4046-6452-4669-BD71-719E9D5C2BBF"
         self.api.executor.run_task(task2)
 
-        assert not os.path.exists(model_cache_dir)
-
-    @patch("requests.post")
-    def test_model_cache_keep(self, post_patch):
-        task = test_task(sleep=1)
-        model_cache_dir = "/tmp/model-cache/{}".format(task["projectId"])
-        os.makedirs(model_cache_dir, exist_ok=True)
-
-        self.api.executor.previous_task = task
-        self.api.executor.run_task(task)
-
-        assert os.path.exists(model_cache_dir)
+        assert os.path.exists(model_dir)
 
-    @patch("requests.put")
+    @patch.object(Session, "put")
     def test_start_shutdown_true(self, post_patch):
         post_patch.return_value = MockResponse(200)
         assert self.api.executor.start_shutdown()
 
-    @patch("requests.post")
+    @patch.object(Session, "post")
     def test_start_shutdown_false(self, post_patch):
         post_patch.return_value = MockResponse(200)
         task = test_task(sleep=5)
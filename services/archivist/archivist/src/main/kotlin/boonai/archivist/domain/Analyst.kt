@@ -22,7 +22,8 @@ class AnalystSpec(
     val freeDiskMb: Int,
     val load: Float,
     val version: String,
-    val taskId: UUID? = null
+    val taskId: UUID? = null,
+    val taskIds: List<UUID>? = null
 ) {
     @JsonIgnore
     var endpoint: String? = null
@@ -106,6 +106,70 @@ class ProjectStorageRequest(
     }
 }
 
+@ApiModel("Multipart Upload Request", description = "Properties needed to upload a file into ProjectStorage in parts.")
+class MultipartUploadRequest(
+
+    @ApiModelProperty("The entity the file is related to.")
+    var entity: ProjectStorageEntity,
+
+    @ApiModelProperty("The Id the entity the file is related to.")
+    var entityId: String,
+
+    @ApiModelProperty("The name of the file, overrides the local file name.")
+    var name: String,
+
+    @ApiModelProperty("The category of the file.")
+    var category: String,
+
+    @ApiModelProperty("The number of parts the file is split into.")
+    var parts: Int,
+
+    @ApiModelProperty("The Id of an upload to resume, or null to start a new upload.")
+    var uploadId: String? = null
+) {
+
+    fun getLocator(): ProjectFileLocator {
+        return ProjectFileLocator(entity, entityId, category, name)
+    }
+}
+
+@ApiModel("Multipart Upload Part", description = "A part of a multipart upload which has been uploaded.")
+class MultipartUploadPart(
+
+    @ApiModelProperty("The number of the part, starting from 1.")
+    var partNumber: Int,
+
+    @ApiModelProperty("The ETag returned when the part was uploaded.")
+    var etag: String? = null
+)
+
+@ApiModel("Multipart Upload Complete Request", description = "Properties needed to assemble the parts of a multipart upload.")
+class MultipartUploadCompleteRequest(
+
+    @ApiModelProperty("The entity the file is related to.")
+    var entity: ProjectStorageEntity,
+
+    @ApiModelProperty("The Id the entity the file is related to.")
+    var entityId: String,
+
+    @ApiModelProperty("The name of the file, overrides the local file name.")
+    var name: String,
+
+    @ApiModelProperty("The category of the file.")
+    var category: String,
+
+    @ApiModelProperty("The Id of the upload.")
+    var uploadId: String,
+
+    @ApiModelProperty("The uploaded parts.")
+    var parts: List<MultipartUploadPart>
+) {
+
+    fun getLocator(): ProjectFileLocator {
+        return ProjectFileLocator(entity, entityId, category, name)
+    }
+}
+
 /**
  * The ProjectStorageLocator Interface defines the based properties needed
  * for a project storage locator. A Locator handles converting properties
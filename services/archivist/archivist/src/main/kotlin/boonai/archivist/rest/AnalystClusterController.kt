@@ -55,6 +55,17 @@ class AnalystClusterController @Autowired constructor(
         return HttpUtils.status("event", "foo", true)
     }
 
+    /**
+     * Handle a batch of events from an Analyst.  Events are handled in the
+     * order they were sent.
+     */
+    @PostMapping(value = ["/cluster/_events"])
+    @Throws(IOException::class)
+    fun events(@RequestBody events: List<TaskEvent>): Any {
+        events.forEach { dispatcherService.handleEvent(it) }
+        return HttpUtils.status("event", "foo", true)
+    }
+
     companion object {
         private val logger = LoggerFactory.getLogger(AnalystClusterController::class.java)
     }
@@ -1,5 +1,7 @@
 package boonai.archivist.rest
 
+import boonai.archivist.domain.MultipartUploadCompleteRequest
+import boonai.archivist.domain.MultipartUploadRequest
 import boonai.archivist.domain.ProjectDirLocator
 import boonai.archivist.domain.ProjectStorageEntity
 import boonai.archivist.domain.ProjectStorageRequest
@@ -10,6 +12,7 @@ import boonai.archivist.service.ModelService
 import boonai.archivist.storage.BoonLibStorageService
 import boonai.archivist.storage.ProjectStorageService
 import boonai.archivist.util.FileUtils
+import boonai.archivist.util.HttpUtils
 import io.swagger.annotations.ApiOperation
 import org.springframework.core.io.Resource
 import org.springframework.http.ResponseEntity
@@ -133,6 +136,48 @@ class FileStorageController(
         )
     }
 
+    @ApiOperation("Sign a batch of storage entities for write.")
+    // Only job runner keys can upload files..
+    @PreAuthorize("hasAnyAuthority('SystemProjectDecrypt','SystemManage')")
+    @PostMapping(value = ["/api/v3/files/_batch_signed_upload_uri"])
+    @ResponseBody
+    fun getBatchSignedUploadUri(
+        @RequestBody req: List<ProjectStorageRequest>
+    ): Any {
+        return req.map {
+            projectStorageService.getSignedUrl(
+                getValidLocator(it), true, 20, TimeUnit.MINUTES
+            )
+        }
+    }
+
+    @ApiOperation("Sign the parts of a storage entity for a multipart upload.")
+    // Only job runner keys can upload files..
+    @PreAuthorize("hasAnyAuthority('SystemProjectDecrypt','SystemManage')")
+    @PostMapping(value = ["/api/v3/files/_signed_multipart_upload_uris"])
+    @ResponseBody
+    fun getSignedMultipartUploadUris(
+        @RequestBody req: MultipartUploadRequest
+    ): Any {
+        return projectStorageService.getSignedMultipartUrls(
+            validateLocator(req.getLocator()), req.uploadId, req.parts, 20, TimeUnit.MINUTES
+        )
+    }
+
+    @ApiOperation("Assemble the parts of a multipart upload.")
+    // Only job runner keys can upload files..
+    @PreAuthorize("hasAnyAuthority('SystemProjectDecrypt','SystemManage')")
+    @PostMapping(value = ["/api/v3/files/_complete_multipart_upload"])
+    @ResponseBody
+    fun completeMultipartUpload(
+        @RequestBody req: MultipartUploadCompleteRequest
+    ): Any {
+        projectStorageService.completeMultipartUpload(
+            validateLocator(req.getLocator()), req.uploadId, req.parts
+        )
+        return HttpUtils.status("file", "completeMultipartUpload", true)
+    }
+
     @ApiOperation("Store an additional file to an asset.")
     // Only job runner keys can store files.
     @PreAuthorize("hasAnyAuthority('SystemProjectDecrypt','SystemManage')")
@@ -143,6 +188,17 @@ class FileStorageController(
         return projectStorageService.setAttrs(locator, req.attrs)
     }
 
+    @ApiOperation("Store the attrs of a batch of files.")
+    // Only job runner keys can store files.
+    @PreAuthorize("hasAnyAuthority('SystemProjectDecrypt','SystemManage')")
+    @PutMapping(value = ["/api/v3/files/_batch_attrs"])
+    @ResponseBody
+    fun setBatchAttrs(@RequestBody req: List<ProjectStorageRequest>): Any {
+        return req.map {
+            projectStorageService.setAttrs(getValidLocator(it), it.attrs)
+        }
+    }
+
     /**
      * Get a [ProjectFileLocator] and validate the naming and existence of
      * associated entity.
@@ -49,8 +49,10 @@ class AnalystServicImpl @Autowired constructor(
 
     override fun upsert(spec: AnalystSpec): Analyst {
         val analyst = getAnalyst()
-        if (spec.taskId != null) {
-            taskDao.updatePingTime(spec.taskId, analyst.endpoint)
+        // An Analyst with multiple task slots reports every running task.
+        val taskIds = (spec.taskIds ?: listOf()).plus(listOfNotNull(spec.taskId)).toSet()
+        taskIds.forEach {
+            taskDao.updatePingTime(it, analyst.endpoint)
         }
 
         return if (analystDao.update(spec)) {
@@ -10,11 +10,15 @@ import com.amazonaws.regions.Regions
 import com.amazonaws.services.s3.AmazonS3
 import com.amazonaws.services.s3.AmazonS3ClientBuilder
 import com.amazonaws.services.s3.model.AmazonS3Exception
+import com.amazonaws.services.s3.model.CompleteMultipartUploadRequest
 import com.amazonaws.services.s3.model.GeneratePresignedUrlRequest
 import com.amazonaws.services.s3.model.GetObjectRequest
+import com.amazonaws.services.s3.model.InitiateMultipartUploadRequest
 import com.amazonaws.services.s3.model.ObjectMetadata
+import com.amazonaws.services.s3.model.PartETag
 import com.amazonaws.services.s3.model.PutObjectRequest
 import boonai.archivist.domain.FileStorage
+import boonai.archivist.domain.MultipartUploadPart
 import boonai.archivist.domain.ProjectDirLocator
 import boonai.archivist.domain.ProjectStorageLocator
 import boonai.archivist.domain.ProjectStorageSpec
@@ -212,6 +216,58 @@ class AwsProjectStorageService constructor(
         )
     }
 
+    override fun getSignedMultipartUrls(
+        locator: ProjectStorageLocator,
+        uploadId: String?,
+        parts: Int,
+        duration: Long,
+        unit: TimeUnit
+    ): Map<String, Any> {
+        val path = locator.getPath()
+        val mediaType = FileUtils.getMediaType(path)
+        val expireTime = Date(System.currentTimeMillis() + unit.toMillis(duration))
+
+        val id = uploadId ?: run {
+            val metadata = ObjectMetadata()
+            metadata.contentType = mediaType
+            s3Client.initiateMultipartUpload(
+                InitiateMultipartUploadRequest(properties.bucket, path, metadata)
+            ).uploadId
+        }
+
+        val urls = (1..parts).map { part ->
+            val req = GeneratePresignedUrlRequest(properties.bucket, path)
+                .withMethod(HttpMethod.PUT)
+                .withExpiration(expireTime)
+            req.addRequestParameter("uploadId", id)
+            req.addRequestParameter("partNumber", part.toString())
+            mapOf(
+                "partNumber" to part,
+                "uri" to s3Client.generatePresignedUrl(req).toString()
+            )
+        }
+
+        logSignEvent(path, mediaType, true)
+        return mapOf(
+            "uploadId" to id,
+            "mediaType" to mediaType,
+            "parts" to urls
+        )
+    }
+
+    override fun completeMultipartUpload(
+        locator: ProjectStorageLocator,
+        uploadId: String,
+        parts: List<MultipartUploadPart>
+    ) {
+        s3Client.completeMultipartUpload(
+            CompleteMultipartUploadRequest(
+                properties.bucket, locator.getPath(), uploadId,
+                parts.sortedBy { it.partNumber }.map { PartETag(it.partNumber, it.etag) }
+            )
+        )
+    }
+
     override fun setAttrs(locator: ProjectStorageLocator, attrs: Map<String, Any>): FileStorage {
         val path = locator.getPath()
         val metadata = s3Client.getObjectMetadata(properties.bucket, path)
@@ -1,6 +1,7 @@
 package boonai.archivist.storage
 
 import boonai.archivist.domain.FileStorage
+import boonai.archivist.domain.MultipartUploadPart
 import boonai.archivist.domain.ProjectDirLocator
 import boonai.archivist.domain.ProjectStorageLocator
 import boonai.archivist.domain.ProjectStorageSpec
@@ -27,6 +28,7 @@ import org.springframework.http.MediaType
 import org.springframework.http.ResponseEntity
 import org.springframework.stereotype.Service
 import java.nio.channels.Channels
+import java.util.UUID
 import java.util.concurrent.TimeUnit
 import javax.annotation.PostConstruct
 
@@ -154,6 +156,79 @@ class GcsProjectStorageService constructor(
         )
     }
 
+    override fun getSignedMultipartUrls(
+        locator: ProjectStorageLocator,
+        uploadId: String?,
+        parts: Int,
+        duration: Long,
+        unit: TimeUnit
+    ): Map<String, Any> {
+        val path = locator.getPath()
+        val mediaType = FileUtils.getMediaType(path)
+
+        // GCS has no multipart upload for signed URLs, so each part is uploaded
+        // as a separate object and the parts are composed once they're all uploaded.
+        val id = uploadId?.let { UUID.fromString(it).toString() } ?: UUID.randomUUID().toString()
+        val urls = (1..parts).map { part ->
+            val info = BlobInfo.newBuilder(properties.bucket, getPartPath(path, id, part)).build()
+            mapOf(
+                "partNumber" to part,
+                "uri" to gcs.signUrl(info, duration, unit, Storage.SignUrlOption.httpMethod(HttpMethod.PUT)).toString()
+            )
+        }
+
+        logSignEvent(path, mediaType, true)
+        return mapOf(
+            "uploadId" to id,
+            "mediaType" to mediaType,
+            "parts" to urls
+        )
+    }
+
+    override fun completeMultipartUpload(
+        locator: ProjectStorageLocator,
+        uploadId: String,
+        parts: List<MultipartUploadPart>
+    ) {
+        val path = locator.getPath()
+        val id = UUID.fromString(uploadId).toString()
+        var sources = parts.sortedBy { it.partNumber }.map { getPartPath(path, id, it.partNumber) }
+
+        // A compose request takes a limited number of sources, so larger
+        // uploads are composed into intermediate objects first.
+        var round = 0
+        while (sources.size > MAX_COMPOSE_SOURCES) {
+            round += 1
+            sources = sources.chunked(MAX_COMPOSE_SOURCES).mapIndexed { idx, chunk ->
+                val dst = "${getPartPrefix(path, id)}compose-$round-$idx"
+                compose(chunk, BlobInfo.newBuilder(properties.bucket, dst).build())
+                dst
+            }
+        }
+
+        val info = BlobInfo.newBuilder(properties.bucket, path)
+            .setContentType(FileUtils.getMediaType(path)).build()
+        compose(sources, info)
+        recursiveDelete(getPartPrefix(path, id))
+    }
+
+    private fun compose(sources: List<String>, target: BlobInfo) {
+        gcs.compose(
+            Storage.ComposeRequest.newBuilder()
+                .addSource(sources)
+                .setTarget(target)
+                .build()
+        )
+    }
+
+    private fun getPartPrefix(path: String, uploadId: String): String {
+        return "$path.upload-$uploadId/"
+    }
+
+    private fun getPartPath(path: String, uploadId: String, part: Int): String {
+        return "${getPartPrefix(path, uploadId)}part-$part"
+    }
+
     override fun setAttrs(locator: ProjectStorageLocator, attrs: Map<String, Any>): FileStorage {
         val path = locator.getPath()
         val mediaType = FileUtils.getMediaType(path)
@@ -233,5 +308,10 @@ class GcsProjectStorageService constructor(
 
     companion object {
         val logger = LoggerFactory.getLogger(GcsProjectStorageService::class.java)
+
+        /**
+         * The max number of objects GCS will compose at once.
+         */
+        const val MAX_COMPOSE_SOURCES = 32
     }
 }
@@ -2,6 +2,7 @@ package boonai.archivist.storage
 
 import boonai.archivist.domain.ArchivistException
 import boonai.archivist.domain.FileStorage
+import boonai.archivist.domain.MultipartUploadPart
 import boonai.archivist.domain.ProjectDirLocator
 import boonai.archivist.domain.ProjectStorageLocator
 import boonai.archivist.domain.ProjectStorageSpec
@@ -85,6 +86,27 @@ interface ProjectStorageService {
         unit: TimeUnit
     ): Map<String, Any>
 
+    /**
+     * Start or resume an upload of the given [ProjectStorageLocator] in parts, returning
+     * the upload Id and a signed URL to PUT each part to.
+     */
+    fun getSignedMultipartUrls(
+        locator: ProjectStorageLocator,
+        uploadId: String?,
+        parts: Int,
+        duration: Long,
+        unit: TimeUnit
+    ): Map<String, Any>
+
+    /**
+     * Assemble the uploaded parts of a multipart upload into the file.
+     */
+    fun completeMultipartUpload(
+        locator: ProjectStorageLocator,
+        uploadId: String,
+        parts: List<MultipartUploadPart>
+    )
+
     /**
      * Set a [Map] of arbitrary attrs for the given [ProjectStorageLocator].
      */
@@ -146,6 +146,45 @@ class AnalystClusterControllerTests : MockMvcTest() {
         }
     }
 
+    @Test
+    fun testBulkEvents() {
+        val job = launchJob()
+        authenticateAsAnalyst()
+        val task = dispatchQueueManager.getNext()
+
+        if (task != null) {
+            val events = listOf(
+                TaskEvent(
+                    TaskEventType.STATUS,
+                    task.id,
+                    job.id,
+                    mapOf("status" to "testingBulkStatus")
+                ),
+                TaskEvent(
+                    TaskEventType.PROGRESS,
+                    task.id,
+                    job.id,
+                    mapOf("progress" to 50)
+                )
+            )
+
+            mvc.perform(
+                MockMvcRequestBuilders.post("/cluster/_events")
+                    .headers(analyst())
+                    .contentType(MediaType.APPLICATION_JSON_VALUE)
+                    .content(Json.serialize(events))
+            )
+                .andExpect(MockMvcResultMatchers.status().isOk)
+                .andReturn()
+
+            val rtask = jobService.getTask(task.id)
+            assertEquals("testingBulkStatus", rtask.status)
+            assertEquals(50, rtask.progress)
+        } else {
+            assertNotNull(task)
+        }
+    }
+
     @Test
     fun testStoppedEventSuccess() {
         val job = launchJob()
@@ -89,6 +89,46 @@ class FileStorageControllerTests : MockMvcTest() {
             .andReturn()
     }
 
+    @Test
+    fun testGetBatchSignedUploadUri() {
+
+        val spec = AssetSpec("https://i.imgur.com/SSN26nN.jpg")
+        val rsp = assetService.batchCreate(
+            BatchCreateAssetsRequest(
+                assets = listOf(spec)
+            )
+        )
+        val id = rsp.created[0]
+        val payload =
+            """
+            [
+                {
+                    "entityId": "$id",
+                    "entity": "assets",
+                    "category": "image",
+                    "name": "toucan.jpg"
+                },
+                {
+                    "entityId": "$id",
+                    "entity": "assets",
+                    "category": "image",
+                    "name": "toucan.png"
+                }
+            ]
+            """.trimIndent()
+        mvc.perform(
+            MockMvcRequestBuilders.post("/api/v3/files/_batch_signed_upload_uri")
+                .content(payload)
+                .contentType(MediaType.APPLICATION_JSON)
+                .headers(job())
+        )
+            .andExpect(status().isOk)
+            .andExpect(jsonPath("$.length()", CoreMatchers.equalTo(2)))
+            .andExpect(jsonPath("$[0].mediaType", CoreMatchers.equalTo("image/jpeg")))
+            .andExpect(jsonPath("$[1].mediaType", CoreMatchers.equalTo("image/png")))
+            .andReturn()
+    }
+
     @Test
     fun testGetSignedDownloadUri() {
 
@@ -111,6 +111,21 @@ class AwsProjectStorageServiceTests : AbstractTest() {
         Json.prettyPrint(rsp)
     }
 
+    @Test
+    fun testGetSignedMultipartUrls() {
+        val loc = ProjectFileLocator(ProjectStorageEntity.ASSETS, "1234", ProjectStorageCategory.SOURCE, "bob.mp4")
+        val rsp = projectStorageService.getSignedMultipartUrls(loc, null, 3, 60, TimeUnit.MINUTES)
+        val parts = rsp["parts"] as List<Map<String, Any>>
+        assertEquals(3, parts.size)
+        assertEquals(listOf(1, 2, 3), parts.map { it["partNumber"] })
+        assertEquals("video/mp4", rsp["mediaType"])
+
+        val resumed = projectStorageService.getSignedMultipartUrls(
+            loc, rsp["uploadId"] as String, 3, 60, TimeUnit.MINUTES
+        )
+        assertEquals(rsp["uploadId"], resumed["uploadId"])
+    }
+
     @Test
     fun testNotAlphaNumericFileName() {
         val loc = ProjectFileLocator(ProjectStorageEntity.ASSETS, "1234", ProjectStorageCategory.SOURCE, "bob test.txt")
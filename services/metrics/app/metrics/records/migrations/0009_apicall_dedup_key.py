@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0008_auto_20210811_1742'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apicall',
+            name='dedup_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -12,6 +12,7 @@ class ApiCall(models.Model):
     asset_path = models.TextField(blank=True, default='')
     image_count = models.IntegerField(blank=True, default=0)
     video_seconds = models.FloatField(blank=True, default=0.0)
+    dedup_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
     created_date = models.DateTimeField(auto_now_add=True)
     modified_date = models.DateTimeField(auto_now=True)
 
@@ -7,8 +7,10 @@ class ApiCallSerializer(serializers.ModelSerializer):
     class Meta:
         model = ApiCall
         fields = ['id', 'project', 'service', 'asset_id', 'asset_path', 'image_count',
-                  'video_seconds', 'created_date', 'modified_date']
+                  'video_seconds', 'dedup_key', 'created_date', 'modified_date']
         validators = []
+        # Duplicate keys are ignored by the bulk action rather than rejected.
+        extra_kwargs = {'dedup_key': {'validators': []}}
 
 
 class ReportSerializer(serializers.Serializer):
@@ -133,6 +133,22 @@ class TestAPICallsViewSet:
                                               'video_minutes': 0.0,
                                               'video_seconds': 0.0}}
 
+    def test_bulk(self, api_client):
+        records = [{'project': '00000000-0000-0000-0000-000000000000',
+                    'service': 'boonai-label-detection',
+                    'asset_id': f'asset-{i}',
+                    'image_count': 1,
+                    'dedup_key': f'key-{i}'} for i in range(3)]
+        response = api_client.post(reverse('apicalls-bulk'), records, format='json')
+        assert response.status_code == 201
+        assert response.json() == {'received': 3}
+        assert ApiCall.objects.count() == 3
+
+        # Retrying the same records doesn't create duplicates.
+        response = api_client.post(reverse('apicalls-bulk'), records, format='json')
+        assert response.status_code == 201
+        assert ApiCall.objects.count() == 3
+
 
 class TestTiers:
 
@@ -1,7 +1,7 @@
 from dateparser import parse as parse_date
 from django.db.models import Sum, Q, Value as V
 from django.db.models.functions import Coalesce
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action, renderer_classes
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
@@ -127,6 +127,26 @@ class ApiCallViewSet(CSVFileMixin, viewsets.ModelViewSet):
         serializer = ReportSerializer(data, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create many API Call records in a single request.
+
+        Records with a `dedup_key` that already exists are skipped, so a client
+        can safely retry a request which failed without double billing.
+
+        Args:
+            request: The DRF request, the body is a list of API Call records.
+
+        Returns:
+            (Response): JSON response with the number of records received.
+
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        records = [ApiCall(**data) for data in serializer.validated_data]
+        ApiCall.objects.bulk_create(records, ignore_conflicts=True)
+        return Response({'received': len(records)}, status=status.HTTP_201_CREATED)
+
     @action(detail=False, methods=['get'])
     def tiered_usage(self, request):
         after = self.request.query_params.get('after')
@@ -20,7 +20,7 @@ def setup_endpoints(app):
         files = flask.request.files.getlist("files")
         logger.info(f"Calculating {len(files)} simhash(s) for {user['name']}")
         try:
-            return jsonify([simengine.calculate_simhash(imgdata.stream) for imgdata in files])
+            return jsonify(simengine.calculate_simhashes([imgdata.stream for imgdata in files]))
         except Exception as e:
             logger.exception("Failed to calculate similarity hash {}".format(e))
             flask.abort(500, description=str(e))